@@ -0,0 +1 @@
+# RAG API benchmarks
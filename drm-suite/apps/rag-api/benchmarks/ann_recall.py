@@ -0,0 +1,110 @@
+"""
+ANN recall benchmark
+Compares IVFIndex against exact cosine search on a synthetic clustered corpus
+
+    python -m benchmarks.ann_recall --vectors 20000 --dim 256 --queries 200
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from src.services.ann_index import IVFIndex, save_tenant_index, ANNIndexRetriever
+
+DOC_TYPES = ["estimate_pdf", "cost_pdf", "contract_pdf", "inventory_csv", "manual_md"]
+
+
+def synthetic_corpus(count: int, dim: int, clusters: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=count)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(count, dim)).astype(np.float32)
+    metadatas = [
+        {"document_id": f"doc-{i // 10}", "chunk_index": i % 10, "doc_type": DOC_TYPES[i % len(DOC_TYPES)],
+         "store_id": f"store-{i % 7}"}
+        for i in range(count)
+    ]
+    documents = [f"chunk {i}" for i in range(count)]
+    query_labels = rng.integers(clusters, size=max(1, count // 100))
+    queries = centers[query_labels] + 0.35 * rng.normal(size=(len(query_labels), dim)).astype(np.float32)
+    return vectors, documents, metadatas, queries
+
+
+def exact_search(normalized: np.ndarray, query: np.ndarray, k: int, mask: np.ndarray) -> set:
+    scores = normalized @ (query / np.linalg.norm(query))
+    scores[~mask] = -np.inf
+    return set(np.argsort(-scores)[:k].tolist())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors, documents, metadatas, queries = synthetic_corpus(args.vectors, args.dim, args.clusters, args.seed)
+    queries = queries[:args.queries]
+
+    started = time.perf_counter()
+    index = IVFIndex.build(vectors, documents, metadatas)
+    build_s = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        save_tenant_index(index, index_dir, "bench")
+        started = time.perf_counter()
+        loaded = asyncio.run(ANNIndexRetriever(index_dir).get_index("bench"))
+        load_ms = (time.perf_counter() - started) * 1000
+
+        # Map index positions back to corpus rows via chunk metadata
+        row_of = np.array([
+            int(loaded.document(p).page_content.split()[1]) for p in range(len(loaded))
+        ])
+        filters = [None, {"doc_type": {"$in": ["estimate_pdf", "cost_pdf"]}}]
+        doc_type_array = np.array([m["doc_type"] for m in metadatas])
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        results = {
+            "vectors": args.vectors, "dim": args.dim, "nlist": loaded.nlist, "k": args.k,
+            "build_s": round(build_s, 3), "load_ms": round(load_ms, 3), "runs": []
+        }
+        for search_filter in filters:
+            mask = np.ones(len(vectors), dtype=bool) if search_filter is None else np.isin(
+                doc_type_array, search_filter["doc_type"]["$in"]
+            )
+            exact_ms = 0.0
+            truths = []
+            for query in queries:
+                started = time.perf_counter()
+                truths.append(exact_search(normalized, query, args.k, mask))
+                exact_ms += (time.perf_counter() - started) * 1000
+
+            for nprobe in args.nprobe:
+                recall = 0.0
+                ann_ms = 0.0
+                for query, truth in zip(queries, truths):
+                    started = time.perf_counter()
+                    hits = loaded.search(query, args.k, search_filter, nprobe=nprobe)
+                    ann_ms += (time.perf_counter() - started) * 1000
+                    recall += len({int(row_of[p]) for p, _ in hits} & truth) / args.k
+                results["runs"].append({
+                    "filter": search_filter,
+                    "nprobe": nprobe,
+                    "recall_at_k": round(recall / len(queries), 4),
+                    "ann_ms_per_query": round(ann_ms / len(queries), 3),
+                    "exact_ms_per_query": round(exact_ms / len(queries), 3)
+                })
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Change event benchmark
+Replays bursts of CRM document create/update/delete events through the
+in-memory broker and compares full re-ingestion per event, incremental
+reindex per event, and coalesced micro-batches; then replays an uncommitted
+batch to check redelivery is idempotent. Reports chunks embedded, time and
+the final index as JSON
+
+    python -m benchmarks.change_events --documents 50 --updates 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Set, Tuple
+
+from src.core.config import settings
+from src.services.change_events import DocumentChangeConsumer, InMemoryBroker, next_offsets
+from src.services.ingestion import IngestionPipeline
+from src.models.schemas import DocumentUpload
+from tests.fakes import FakeEmbeddings, InMemoryVectorStore
+
+TENANT = "bench"
+TOPICS = ["外壁塗装", "屋根葺き替え", "キッチン交換", "浴室リフォーム", "給湯器交換", "内装クロス", "防水工事", "外構工事"]
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self, latency: float):
+        super().__init__(latency=latency)
+        self.texts = 0
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.texts += len(texts)
+        return await super().aembed_documents(texts)
+
+
+def write_version(directory: str, document: int, version: int, sections: int, rng: random.Random) -> str:
+    """A Markdown estimate whose sections change a little from version to version"""
+    path = os.path.join(directory, f"doc-{document:04d}-v{version}.md")
+    changed = {rng.randrange(sections) for _ in range(version)}
+    with open(path, "w", encoding="utf-8") as f:
+        for section in range(sections):
+            topic = TOPICS[(document + section) % len(TOPICS)]
+            revision = version if section in changed else 0
+            f.write(f"# {topic} 第{section}節\n")
+            f.write(f"{topic}の仕様と標準工期について。改訂{revision}。" * 12 + "\n\n")
+    return path
+
+
+def make_events(directory: str, args) -> List[Tuple[str, Dict]]:
+    """Per document: created, a burst of updates, sometimes deleted; documents interleaved"""
+    rng = random.Random(args.seed)
+    streams: List[List[Tuple[str, Dict]]] = []
+    for document in range(args.documents):
+        document_id = f"crm-{document:04d}"
+        stream = []
+        for version in range(args.updates + 1):
+            path = write_version(directory, document, version, args.sections, rng)
+            stream.append((document_id, {
+                "type": "document.created" if version == 0 else "document.updated",
+                "company_id": TENANT,
+                "document_id": document_id,
+                "document": {
+                    "file_name": os.path.basename(path),
+                    "file_url": f"file://{path}",
+                    "file_size": os.path.getsize(path),
+                    "doc_type": "manual_md",
+                    "document_date": "2024-04-01",
+                },
+            }))
+        if rng.random() < args.delete_ratio:
+            stream.append((document_id, {"type": "document.deleted", "company_id": TENANT, "document_id": document_id}))
+        streams.append(stream)
+
+    events = []
+    while streams:
+        stream = rng.choice(streams)
+        events.append(stream.pop(0))
+        if not stream:
+            streams.remove(stream)
+    return events
+
+
+def index_state(store: InMemoryVectorStore) -> Set[Tuple[str, str]]:
+    return {(metadata["document_id"], metadata["content_hash"]) for _, metadata, _ in store._rows.values()}
+
+
+def new_pipeline(args) -> IngestionPipeline:
+    return IngestionPipeline(embeddings=CountingEmbeddings(args.embed_latency_ms / 1000), vector_store=InMemoryVectorStore())
+
+
+async def full_ingest_per_event(events: List[Tuple[str, Dict]], args) -> Tuple[Dict, IngestionPipeline]:
+    """What the CRM could do today: POST /documents/upload (or delete) for every change"""
+    pipeline = new_pipeline(args)
+    started = time.perf_counter()
+    for document_id, event in events:
+        if event["type"] == "document.deleted":
+            await pipeline.vector_store.delete_document(TENANT, document_id)
+        else:
+            document = DocumentUpload(**event["document"], company_id=TENANT)
+            await pipeline.ingest(document, document_id=document_id)
+    return {"seconds": round(time.perf_counter() - started, 2)}, pipeline
+
+
+async def consume(events: List[Tuple[str, Dict]], args, batch_size: int) -> Tuple[Dict, IngestionPipeline]:
+    broker = InMemoryBroker(partitions=args.partitions)
+    for document_id, event in events:
+        broker.produce(settings.CHANGE_EVENTS_TOPIC, document_id, event)
+    pipeline = new_pipeline(args)
+    source = broker.consumer(settings.CHANGE_EVENTS_TOPIC, "bench")
+    consumer = DocumentChangeConsumer(source, pipeline, batch_size=batch_size, window_seconds=args.window)
+
+    started = time.perf_counter()
+    totals: Dict[str, int] = {}
+    batches = 0
+    while sum((await source.lag()).values()):
+        stats = await consumer.process(await consumer.next_batch())
+        batches += 1
+        for name, count in stats.items():
+            totals[name] = totals.get(name, 0) + count
+    await source.close()
+    return {"seconds": round(time.perf_counter() - started, 2), "batches": batches, **totals}, pipeline
+
+
+async def redelivery(events: List[Tuple[str, Dict]], args) -> Dict:
+    """Apply a batch, lose its commit, and let a restarted consumer read it again"""
+    broker = InMemoryBroker(partitions=args.partitions)
+    for document_id, event in events:
+        broker.produce(settings.CHANGE_EVENTS_TOPIC, document_id, event)
+    pipeline = new_pipeline(args)
+
+    source = broker.consumer(settings.CHANGE_EVENTS_TOPIC, "bench")
+    consumer = DocumentChangeConsumer(source, pipeline, batch_size=args.batch_size, window_seconds=args.window)
+    records = await consumer.next_batch()
+
+    async def crash(offsets) -> None:
+        raise RuntimeError("consumer crashed before committing")
+
+    source.commit = crash
+    try:
+        await consumer.process(records)
+    except RuntimeError:
+        pass
+    state_before, embedded_before = index_state(pipeline.vector_store), pipeline.embeddings.texts
+
+    restarted = broker.consumer(settings.CHANGE_EVENTS_TOPIC, "bench")
+    replayed = await restarted.poll(args.window, args.batch_size)
+    consumer = DocumentChangeConsumer(restarted, pipeline, batch_size=args.batch_size, window_seconds=args.window)
+    await consumer.process(replayed)
+    return {
+        "redelivered_events": len(replayed),
+        "same_offsets": next_offsets(replayed) == next_offsets(records),
+        "chunks_embedded_on_redelivery": pipeline.embeddings.texts - embedded_before,
+        "index_unchanged": index_state(pipeline.vector_store) == state_before,
+        "lag_after_replay": sum((await restarted.lag()).values()),
+    }
+
+
+def summary(stats: Dict, pipeline: IngestionPipeline) -> Dict:
+    return {
+        **stats,
+        "chunks_embedded": pipeline.embeddings.texts,
+        "embedding_calls": pipeline.embeddings.calls,
+        "index_chunks": len(pipeline.vector_store._rows),
+    }
+
+
+async def benchmark(args) -> Dict:
+    directory = tempfile.mkdtemp(prefix="rag-change-bench-")
+    # Event file_urls are read from this directory only
+    settings.INGEST_LOCAL_FILE_ROOT = directory
+    try:
+        events = make_events(directory, args)
+        full_stats, full = await full_ingest_per_event(events, args)
+        single_stats, single = await consume(events, args, batch_size=1)
+        batched_stats, batched = await consume(events, args, batch_size=args.batch_size)
+        replay = await redelivery(events, args)
+    finally:
+        shutil.rmtree(directory)
+
+    expected = index_state(full.vector_store)
+    return {
+        "documents": args.documents,
+        "events": len(events),
+        "full_ingest_per_event": summary(full_stats, full),
+        "incremental_per_event": summary(single_stats, single),
+        "micro_batches": summary(batched_stats, batched),
+        "same_final_index": index_state(single.vector_store) == expected == index_state(batched.vector_store),
+        "redelivery": replay,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=5, help="updates per document after it is created")
+    parser.add_argument("--sections", type=int, default=20, help="Markdown sections (about one chunk each)")
+    parser.add_argument("--delete-ratio", type=float, default=0.1)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=settings.CHANGE_EVENTS_BATCH_SIZE)
+    parser.add_argument("--window", type=float, default=0.05, help="seconds; events are all queued up front")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0, help="per embedding API call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(benchmark(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Worker cold-start benchmark
+Time from a fresh interpreter to a ready worker, per startup phase, with the
+services built at import time (previous main.py) versus in the lifespan
+
+    python -m benchmarks.cold_start --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# What main.py did on import before: every LangChain module rag_service pulled
+# in (including the unused langchain.chains), then both services built
+EAGER = """
+import json, time
+started = time.perf_counter()
+import langchain.chains, langchain_openai, langchain_community.chat_models
+from src.services.rag_service import RAGService
+from src.services.document_service import DocumentService
+import main
+imported = time.perf_counter()
+RAGService(); DocumentService()
+print(json.dumps({"import": imported - started, "init": time.perf_counter() - imported}))
+"""
+
+# Now: importing main is light, init_services() runs in the lifespan, warm-up in the background
+LAZY = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.init_services()
+initialized = time.perf_counter()
+asyncio.run(main.rag_service.warm_up())
+print(json.dumps({
+    "import": imported - started,
+    "init": initialized - imported,
+    "warmup": time.perf_counter() - initialized,
+}))
+"""
+
+TOKENIZER = """
+import json, time
+started = time.perf_counter()
+import tiktoken
+tiktoken.get_encoding("cl100k_base")
+print(json.dumps({"load": time.perf_counter() - started}))
+"""
+
+
+def run_child(code: str, env: Dict[str, str]) -> Dict[str, float]:
+    """Run `code` in a fresh interpreter; `process` is wall time including interpreter start"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=300
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed")
+    phases = json.loads(completed.stdout.strip().splitlines()[-1])
+    phases["process"] = elapsed
+    return phases
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """Median of each phase, in milliseconds"""
+    return {phase: round(statistics.median(run[phase] for run in runs) * 1000, 1) for phase in runs[0]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # The OpenAI / Anthropic clients are built, but nothing is called: dummy keys are fine
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-cold-start")
+    env.setdefault("ANTHROPIC_API_KEY", "sk-cold-start")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    eager = summarize([run_child(EAGER, env) for _ in range(args.runs)])
+    lazy = summarize([run_child(LAZY, env) for _ in range(args.runs)])
+
+    # A fresh TIKTOKEN_CACHE_DIR per worker downloads the BPE file; a shared one (serve.py) reads it
+    tokenizer: Dict[str, object] = {}
+    with tempfile.TemporaryDirectory(prefix="rag-tiktoken-") as cache_dir:
+        tokenizer_env = {**env, "TIKTOKEN_CACHE_DIR": cache_dir}
+        try:
+            tokenizer["first_load_ms"] = summarize([run_child(TOKENIZER, tokenizer_env)])["load"]
+            tokenizer["shared_cache_ms"] = summarize(
+                [run_child(TOKENIZER, tokenizer_env) for _ in range(args.runs)]
+            )["load"]
+        except Exception as e:
+            tokenizer["error"] = str(e)
+
+    result = {
+        "runs": args.runs,
+        "import_time_services_ms": eager,
+        "lifespan_services_ms": lazy,
+        "ready_ms_before": round(eager["import"] + eager["init"], 1),
+        "ready_ms_after": round(lazy["import"] + lazy["init"] + lazy["warmup"], 1),
+        "tokenizer": tokenizer,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
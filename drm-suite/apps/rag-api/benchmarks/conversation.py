@@ -0,0 +1,182 @@
+"""
+Conversation session benchmark
+Runs long sessions of follow-up questions through RAGService with fake
+embeddings / LLM and reports, per turn, prompt tokens, history tokens and
+stored session bytes against a naive full-history buffer as JSON
+
+    python -m benchmarks.conversation --turns 30 --sessions 5
+"""
+
+# Services deployed separately (database, auth middleware, ...) are stood in for
+from benchmarks import standins
+
+standins.install()
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.models.schemas import MaskPolicy, UserContext
+from src.services.conversation import Session, SessionStore, Turn
+from src.services.mask_engine import MaskEngine
+from src.services.query_log_writer import InMemoryLogSink, QueryLogWriter
+from src.services.rag_service import RAGService
+from tests.fakes import FakeChatModel, FakeEmbeddings, InMemoryVectorStore
+
+TENANT = "bench"
+TOPICS = ["外壁塗装", "屋根葺き替え", "キッチン交換", "浴室リフォーム", "給湯器交換", "内装クロス", "防水工事", "外構工事"]
+ASPECTS = ["標準単価", "工期", "保証内容", "使用材料", "注意事項", "見積の内訳"]
+FOLLOW_UPS = ["それの{aspect}は？", "では{aspect}はどうなりますか", "{aspect}についてもう少し詳しく", "前の案件と比べて{aspect}は？"]
+
+
+class StaticPolicyService:
+    async def get_mask_policy(self, user_context: UserContext) -> MaskPolicy:
+        return MaskPolicy(mask_cost_data=True, mask_profit_data=True)
+
+
+class NullMonitoring:
+    async def record_query_metrics(self, **kwargs) -> None:
+        pass
+
+    async def record_error(self, error: str) -> None:
+        pass
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    p50, p95 = np.percentile(samples, [50, 95])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2)}
+
+
+async def seed_documents(rag: RAGService, store: InMemoryVectorStore, documents: int) -> None:
+    texts, metadatas = [], []
+    for index in range(documents):
+        topic = TOPICS[index % len(TOPICS)]
+        for section, aspect in enumerate(ASPECTS):
+            texts.append(f"{topic}の{aspect}について。標準的な{aspect}は案件ごとに異なります。資料No.{index:04d}-{section}")
+            metadatas.append({
+                "company_id": TENANT, "document_id": f"doc-{index:04d}", "chunk_index": section,
+                "doc_type": "manual_md", "file_name": f"doc-{index:04d}.md",
+            })
+    await store.add_embeddings(texts, await rag.embeddings.aembed_documents(texts), metadatas)
+
+
+def questions(rng: random.Random, turns: int) -> List[str]:
+    first = f"{rng.choice(TOPICS)}の{rng.choice(ASPECTS)}を教えてください"
+    return [first] + [rng.choice(FOLLOW_UPS).format(aspect=rng.choice(ASPECTS)) for _ in range(turns - 1)]
+
+
+def series_at(samples: List[List[float]], checkpoints: List[int]) -> Dict[str, float]:
+    """Mean over sessions of a per-turn measurement at selected turn numbers"""
+    return {
+        str(turn): round(float(np.mean([session[turn - 1] for session in samples])), 1)
+        for turn in checkpoints if turn <= len(samples[0])
+    }
+
+
+async def benchmark(args) -> Dict:
+    rag = RAGService(openai_llm=FakeChatModel(), claude_llm=FakeChatModel(), embedder=FakeEmbeddings())
+    store = InMemoryVectorStore()
+    rag.attach_vector_store(store)
+    rag.mask_service = MaskEngine(StaticPolicyService())
+    rag.monitoring = NullMonitoring()
+    rag.answer_cache = None  # every turn goes through retrieval and generation
+    for llm in (rag.openai_llm, rag.claude_llm):
+        llm.latency = args.llm_latency_ms / 1000
+    log_writer = QueryLogWriter(InMemoryLogSink())
+    await log_writer.start()
+    rag.attach_log_writer(log_writer)
+    await seed_documents(rag, store, args.documents)
+    user = UserContext(user_id="bench-user", company_id=TENANT, role="staff")
+    tokenizer = rag.tokenizer
+
+    # Capture the exact prompt sent for each answer
+    prompts: List[str] = []
+    build_prompt = rag._build_prompt
+
+    def recording_build_prompt(query, documents, history=""):
+        prompt = build_prompt(query, documents, history)
+        prompts.append(prompt)
+        return prompt
+
+    rag._build_prompt = recording_build_prompt
+
+    prompt_tokens, history_tokens, session_bytes = [], [], []
+    naive_history_tokens, naive_bytes = [], []
+    latencies: List[float] = []
+    condensed = 0
+    for index in range(args.sessions):
+        session_id = f"session-{index}"
+        key = SessionStore.make_key(TENANT, user.user_id, session_id)
+        naive = Session(key=key)
+        per_turn = {name: [] for name in ("prompt", "history", "bytes", "naive_history", "naive_bytes")}
+        for query in questions(random.Random(args.seed + index), args.turns):
+            session = await rag.conversations.store.get(key) or Session(key=key)
+            history = rag.conversations.history_text(session)
+            naive_history = rag.conversations.history_text(naive)
+
+            prompts.clear()
+            started = time.perf_counter()
+            response = await rag.retrieve_and_generate(
+                query, TENANT, user_context=user, max_results=args.k, session_id=session_id
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            # The next question is asked after this turn is stored
+            await rag.drain_background_tasks()
+            condensed += response.get("condensed_query") is not None
+
+            naive.turns.append(Turn(query, response["answer"]))
+            stored = await rag.conversations.store.get(key)
+            per_turn["prompt"].append(len(tokenizer.encode(prompts[-1])) if prompts else 0)
+            per_turn["history"].append(len(tokenizer.encode(history)) if history else 0)
+            per_turn["bytes"].append(len(stored.to_json().encode("utf-8")))
+            per_turn["naive_history"].append(len(tokenizer.encode(naive_history)) if naive_history else 0)
+            per_turn["naive_bytes"].append(len(naive.to_json().encode("utf-8")))
+        prompt_tokens.append(per_turn["prompt"])
+        history_tokens.append(per_turn["history"])
+        session_bytes.append(per_turn["bytes"])
+        naive_history_tokens.append(per_turn["naive_history"])
+        naive_bytes.append(per_turn["naive_bytes"])
+
+    await log_writer.close()
+    checkpoints = [1, 2, 5, 10, 20, 30, 50, 100]
+    return {
+        "sessions": args.sessions,
+        "turns": args.turns,
+        "max_history_tokens": rag.conversations.max_history_tokens,
+        "condensed_follow_ups": condensed,
+        "latency_ms": percentiles(latencies),
+        "prompt_tokens_by_turn": series_at(prompt_tokens, checkpoints),
+        "history_tokens_by_turn": series_at(history_tokens, checkpoints),
+        "session_bytes_by_turn": series_at(session_bytes, checkpoints),
+        "naive_history_tokens_by_turn": series_at(naive_history_tokens, checkpoints),
+        "naive_session_bytes_by_turn": series_at(naive_bytes, checkpoints),
+        "max": {
+            "prompt_tokens": int(np.max(prompt_tokens)),
+            "history_tokens": int(np.max(history_tokens)),
+            "session_bytes": int(np.max(session_bytes)),
+            "naive_history_tokens": int(np.max(naive_history_tokens)),
+            "naive_session_bytes": int(np.max(naive_bytes)),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(benchmark(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
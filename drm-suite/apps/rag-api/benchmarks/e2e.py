@@ -0,0 +1,354 @@
+"""
+End-to-end RAG API benchmark
+Uploads a synthetic corpus through the job queue, then drives /rag/query and
+/rag/query/stream in-process with fake embeddings, a fake LLM and an in-memory
+vector store; reports throughput and p50/p95/p99 per stage as JSON
+
+    python -m benchmarks.e2e --requests 1000 --concurrency 32 --output bench.json
+"""
+
+import os
+
+# The job queue is created when main is imported
+os.environ.setdefault("JOB_QUEUE_BACKEND", "memory")
+
+# Services deployed separately (database, auth middleware, ...) are stood in for
+from benchmarks import standins
+
+standins.install()
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+from fastapi import Security
+from fastapi.security import HTTPAuthorizationCredentials
+
+import main
+from src.core.auth import TokenCache, get_user_context, security
+from src.core.config import settings
+from src.models.schemas import MaskPolicy, UserContext
+from src.services.ingestion import IngestionPipeline
+from src.services.job_queue import COMPLETED, DEAD
+from src.services.job_worker import JobWorker
+from src.services.mask_engine import MaskEngine
+from src.services.query_log_writer import InMemoryLogSink, QueryLogWriter
+from src.services.rag_service import RAGService
+from tests.fakes import FakeChatModel, FakeEmbeddings, InMemoryVectorStore
+
+TENANT = "bench"
+TOPICS = ["外壁塗装", "屋根葺き替え", "キッチン交換", "浴室リフォーム", "給湯器交換", "内装クロス", "防水工事", "外構工事"]
+ASPECTS = ["標準単価", "工期", "保証内容", "使用材料", "注意事項", "見積の内訳"]
+STAGES = ["auth", "policy", "embed", "answer_cache", "retrieve", "pack", "generate", "mask", "log"]
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2)}
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def make_token(user: UserContext, ttl: int = 3600) -> str:
+    """HS256 token signed with JWT_SECRET_KEY, so verification does real HMAC work"""
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = _b64(json.dumps({**user.model_dump(), "exp": int(time.time()) + ttl}).encode())
+    signature = hmac.new(settings.JWT_SECRET_KEY.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{_b64(signature)}"
+
+
+async def verify_bench_token(token: str) -> UserContext:
+    header, payload, signature = token.split(".")
+    expected = hmac.new(settings.JWT_SECRET_KEY.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(_b64(expected), signature):
+        raise ValueError("bad signature")
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    if claims.pop("exp") < time.time():
+        raise ValueError("expired")
+    return UserContext(**claims)
+
+
+class StaticPolicyService:
+    """Mask policy lookup with a fixed database round-trip"""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    async def get_mask_policy(self, user_context: UserContext) -> MaskPolicy:
+        await asyncio.sleep(self.latency_s)
+        return MaskPolicy(mask_cost_data=not user_context.is_admin, mask_profit_data=not user_context.is_admin)
+
+
+class NullMonitoring:
+    async def record_query_metrics(self, **kwargs) -> None:
+        pass
+
+    async def record_error(self, error: str) -> None:
+        pass
+
+
+def make_document(rng: random.Random, index: int, sections: int) -> str:
+    topic = TOPICS[index % len(TOPICS)]
+    lines = [f"# {topic} 施工資料 No.{index:04d}", ""]
+    for section in range(sections):
+        aspect = ASPECTS[section % len(ASPECTS)]
+        lines += [
+            f"## {aspect}",
+            f"{topic}の{aspect}について。案件番号P{index:04d}-{section}、"
+            f"標準単価は{rng.randint(20, 400) * 100:,}円/m2、工期は約{rng.randint(2, 30)}日です。"
+            f"材料は{rng.choice(['シリコン', 'フッ素', 'ウレタン', 'ガルバリウム', 'ステンレス'])}系を使用し、"
+            f"保証期間は{rng.randint(1, 15)}年です。施工前に現地調査と近隣挨拶を行います。",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def make_queries(rng: random.Random, count: int, popular: int, repeat_ratio: float) -> List[str]:
+    def question() -> str:
+        return (
+            f"{rng.choice(TOPICS)}の{rng.choice(ASPECTS)}を教えてください"
+            f"（案件P{rng.randint(0, 9999):04d}）"
+        )
+
+    hot = [question() for _ in range(popular)]
+    return [rng.choice(hot) if rng.random() < repeat_ratio else question() for _ in range(count)]
+
+
+async def ingest(client: httpx.AsyncClient, token: str, args, directory: str) -> dict:
+    rng = random.Random(args.seed)
+    documents = []
+    for index in range(args.documents):
+        path = os.path.join(directory, f"doc-{index:04d}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(make_document(rng, index, args.sections))
+        documents.append({
+            "file_name": os.path.basename(path),
+            "file_url": f"file://{path}",
+            "file_size": os.path.getsize(path),
+            "doc_type": "manual_md",
+            "company_id": TENANT,
+        })
+
+    started = time.perf_counter()
+    submitted: Dict[str, float] = {}
+    for document in documents:
+        response = await client.post("/documents/upload", json=document, headers={"Authorization": f"Bearer {token}"})
+        response.raise_for_status()
+        submitted[response.json()["document_id"]] = time.perf_counter()
+
+    latencies, failed, chunks = [], 0, 0
+    pending = set(submitted)
+    while pending:
+        await asyncio.sleep(0.02)
+        for job_id in list(pending):
+            job = await main.job_queue.get(job_id)
+            if job is not None and job.status in (COMPLETED, DEAD):
+                pending.discard(job_id)
+                latencies.append((time.perf_counter() - submitted[job_id]) * 1000)
+                failed += job.status == DEAD
+                chunks += job.result.get("chunks_created", 0)
+    wall = time.perf_counter() - started
+    return {
+        "documents": len(documents),
+        "failed": failed,
+        "chunks": chunks,
+        "wall_s": round(wall, 3),
+        "documents_per_s": round(len(documents) / wall, 2),
+        "chunks_per_s": round(chunks / wall, 1),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def drive(client: httpx.AsyncClient, tokens: List[str], queries: List[str], args, auth_ms: List[float]) -> dict:
+    rng = random.Random(args.seed + 1)
+    plan = [(query, rng.random() < args.stream_ratio, rng.choice(tokens)) for query in queries]
+    work = iter(plan)
+    query_ms, stream_ms, first_byte_ms = [], [], []
+    stages: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    errors = {"query": 0, "stream": 0}
+    cached = 0
+
+    async def one(query: str, stream: bool, token: str) -> None:
+        nonlocal cached
+        headers = {"Authorization": f"Bearer {token}"}
+        body = {"query": query, "max_results": args.k}
+        started = time.perf_counter()
+        if stream:
+            response = await client.post("/rag/query/stream", json=body, headers=headers)
+            elapsed = (time.perf_counter() - started) * 1000
+            events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+            summary = json.loads(events[-1]) if events else {}
+            if response.status_code != 200 or "stage_timings_ms" not in summary:
+                errors["stream"] += 1
+                return
+            stream_ms.append(elapsed)
+            if summary.get("time_to_first_byte_ms") is not None:
+                first_byte_ms.append(summary["time_to_first_byte_ms"])
+            return
+
+        response = await client.post("/rag/query", json=body, headers=headers)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code != 200:
+            errors["query"] += 1
+            return
+        result = response.json()
+        query_ms.append(elapsed)
+        cached += bool(result.get("cached"))
+        for stage, ms in (result.get("stage_timings_ms") or {}).items():
+            stages.setdefault(stage, []).append(ms)
+
+    async def client_loop() -> None:
+        for query, stream, token in work:
+            await one(query, stream, token)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    # Auth runs in the dependency, before the handler's StageTimer starts
+    stages["auth"] = list(auth_ms)
+    completed = len(query_ms) + len(stream_ms)
+    return {
+        "requests": len(plan),
+        "concurrency": args.concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(completed / wall, 1),
+        "query": {
+            "completed": len(query_ms),
+            "errors": errors["query"],
+            "answer_cache_hit_ratio": round(cached / len(query_ms), 4) if query_ms else None,
+            "latency_ms": percentiles(query_ms),
+            "stages_ms": {stage: percentiles(samples) for stage, samples in stages.items() if samples},
+        },
+        "stream": {
+            "completed": len(stream_ms),
+            "errors": errors["stream"],
+            "latency_ms": percentiles(stream_ms),
+            "time_to_first_byte_ms": percentiles(first_byte_ms),
+        },
+    }
+
+
+async def benchmark(args) -> dict:
+    # ASGITransport does not run the lifespan: build the services it would have,
+    # with local models and embeddings in place of the providers
+    main.rag_service = RAGService(openai_llm=FakeChatModel(), claude_llm=FakeChatModel(), embedder=FakeEmbeddings())
+    main.init_services()
+    rag = main.rag_service
+    store = InMemoryVectorStore()
+    rag.attach_vector_store(store)
+    rag.mask_service = MaskEngine(StaticPolicyService(args.policy_latency_ms / 1000))
+    rag.monitoring = NullMonitoring()
+    rag.embeddings.embedder.latency = args.embed_latency_ms / 1000
+    for llm in (rag.openai_llm, rag.claude_llm):
+        llm.latency = args.llm_latency_ms / 1000
+        llm.token_latency = args.token_latency_ms / 1000
+    if args.no_answer_cache:
+        rag.answer_cache = None
+    log_sink = InMemoryLogSink()
+    log_writer = QueryLogWriter(log_sink)
+    await log_writer.start()
+    rag.attach_log_writer(log_writer)
+
+    # Auth goes through the real token cache; only the signature check is local
+    auth_ms: List[float] = []
+    token_cache = TokenCache(verifier=verify_bench_token)
+
+    async def timed_user_context(credentials: HTTPAuthorizationCredentials = Security(security)) -> UserContext:
+        started = time.perf_counter()
+        try:
+            return await token_cache.verify(credentials.credentials)
+        finally:
+            auth_ms.append((time.perf_counter() - started) * 1000)
+
+    main.app.dependency_overrides[get_user_context] = timed_user_context
+    users = [
+        UserContext(user_id=f"user-{i}", company_id=TENANT, role="admin" if i == 0 else "staff", is_admin=i == 0)
+        for i in range(args.users)
+    ]
+    tokens = [make_token(user) for user in users]
+
+    pipeline = IngestionPipeline(embeddings=rag.embeddings, vector_store=store, on_complete=rag.invalidate_tenant)
+    pipeline.start()
+    worker = JobWorker(main.job_queue, pipeline)
+    worker_task = asyncio.create_task(worker.run())
+
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+            with tempfile.TemporaryDirectory(prefix="rag-bench-") as directory:
+                # Uploads are read from this directory only
+                settings.INGEST_LOCAL_FILE_ROOT = directory
+                ingestion = await ingest(client, tokens[0], args, directory)
+
+            rng = random.Random(args.seed)
+            warmup = make_queries(rng, args.warmup, args.popular, args.repeat_ratio)
+            await drive(client, tokens, warmup, args, [])
+            auth_ms.clear()
+            queries = make_queries(rng, args.requests, args.popular, args.repeat_ratio)
+            load = await drive(client, tokens, queries, args, auth_ms)
+    finally:
+        await worker.stop()
+        await asyncio.gather(worker_task, return_exceptions=True)
+        await pipeline.close()
+        await rag.drain_background_tasks()
+        await log_writer.close()
+        main.app.dependency_overrides.clear()
+
+    return {
+        "ingestion": ingestion,
+        "load": load,
+        "vector_store_chunks": len(store),
+        "query_logs_written": len(log_sink.rows),
+    }
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--sections", type=int, default=24)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--popular", type=int, default=30, help="distinct questions in the repeated set")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3)
+    parser.add_argument("--stream-ratio", type=float, default=0.1)
+    parser.add_argument("--no-answer-cache", action="store_true")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0)
+    parser.add_argument("--policy-latency-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    result = {
+        "benchmark": "e2e",
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **asyncio.run(benchmark(args)),
+    }
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main_cli()
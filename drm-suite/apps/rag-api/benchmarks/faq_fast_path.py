@@ -0,0 +1,177 @@
+"""
+FAQ fast-path benchmark
+Replays a query mix with repeated popular questions against RAGService with
+fake embeddings / LLM, first to build query history, then with the FAQ index
+off and on; reports latency, LLM calls and FAQ hit rate as JSON
+
+    python -m benchmarks.faq_fast_path --requests 1000 --popular 20 --repeat-ratio 0.6
+"""
+
+# Services deployed separately (database, auth middleware, ...) are stood in for
+from benchmarks import standins
+
+standins.install()
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.core.metrics import FAQ_LLM_CALLS_SAVED, FAQ_LOOKUPS
+from src.models.schemas import MaskPolicy, UserContext
+from src.services.faq_index import FAQIndex, InMemoryFAQStore
+from src.services.mask_engine import MaskEngine
+from src.services.query_log_writer import InMemoryLogSink, QueryLogWriter
+from src.services.rag_service import GENERATION_ERROR_MESSAGE, RAGService
+from tests.fakes import FakeChatModel, FakeEmbeddings, InMemoryVectorStore
+
+TENANT = "bench"
+TOPICS = ["外壁塗装", "屋根葺き替え", "キッチン交換", "浴室リフォーム", "給湯器交換", "内装クロス", "防水工事", "外構工事"]
+ASPECTS = ["標準単価", "工期", "保証内容", "使用材料", "注意事項", "見積の内訳"]
+
+
+class StaticPolicyService:
+    async def get_mask_policy(self, user_context: UserContext) -> MaskPolicy:
+        return MaskPolicy(mask_cost_data=True, mask_profit_data=True)
+
+
+class NullMonitoring:
+    async def record_query_metrics(self, **kwargs) -> None:
+        pass
+
+    async def record_error(self, error: str) -> None:
+        pass
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    p50, p95 = np.percentile(samples, [50, 95])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2)}
+
+
+def make_queries(rng: random.Random, count: int, popular: int, repeat_ratio: float) -> List[str]:
+    def question() -> str:
+        return f"{rng.choice(TOPICS)}の{rng.choice(ASPECTS)}を教えてください（案件P{rng.randint(0, 9999):04d}）"
+
+    hot = [question() for _ in range(popular)]
+    return [rng.choice(hot) if rng.random() < repeat_ratio else question() for _ in range(count)]
+
+
+async def seed_documents(rag: RAGService, store: InMemoryVectorStore, documents: int) -> None:
+    texts, metadatas = [], []
+    for index in range(documents):
+        topic = TOPICS[index % len(TOPICS)]
+        for section, aspect in enumerate(ASPECTS):
+            texts.append(f"{topic}の{aspect}について。標準的な{aspect}は案件ごとに異なります。資料No.{index:04d}-{section}")
+            metadatas.append({
+                "company_id": TENANT, "document_id": f"doc-{index:04d}", "chunk_index": section,
+                "doc_type": "manual_md", "file_name": f"doc-{index:04d}.md",
+            })
+    await store.add_embeddings(texts, await rag.embeddings.aembed_documents(texts), metadatas)
+
+
+async def replay(rag: RAGService, queries: List[str], user: UserContext, k: int) -> Dict:
+    calls_before = rag.openai_llm.calls + rag.claude_llm.calls
+    latencies, faq_ms, generated_ms = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        response = await rag.retrieve_and_generate(query, TENANT, user_context=user, max_results=k)
+        elapsed = (time.perf_counter() - started) * 1000
+        latencies.append(elapsed)
+        (faq_ms if response.get("faq_id") else generated_ms).append(elapsed)
+    return {
+        "requests": len(queries),
+        "llm_calls": rag.openai_llm.calls + rag.claude_llm.calls - calls_before,
+        "faq_answers": len(faq_ms),
+        "latency_ms": percentiles(latencies),
+        "faq_answer_ms": percentiles(faq_ms) if faq_ms else None,
+        "generated_answer_ms": percentiles(generated_ms) if generated_ms else None,
+    }
+
+
+def lookup_counts() -> Dict[str, float]:
+    return {result: FAQ_LOOKUPS.labels(result=result)._value.get() for result in ("answer", "suggest", "miss")}
+
+
+async def benchmark(args) -> Dict:
+    rag = RAGService(openai_llm=FakeChatModel(), claude_llm=FakeChatModel(), embedder=FakeEmbeddings())
+    store = InMemoryVectorStore()
+    rag.attach_vector_store(store)
+    rag.mask_service = MaskEngine(StaticPolicyService())
+    rag.monitoring = NullMonitoring()
+    rag.answer_cache = None  # isolate the FAQ effect from the semantic answer cache
+    for llm in (rag.openai_llm, rag.claude_llm):
+        llm.latency = args.llm_latency_ms / 1000
+    log_writer = QueryLogWriter(InMemoryLogSink())
+    await log_writer.start()
+    rag.attach_log_writer(log_writer)
+    await seed_documents(rag, store, args.documents)
+    user = UserContext(user_id="bench-user", company_id=TENANT, role="staff")
+
+    # 1. History: answered queries as they would land in rag_query_logs
+    rng = random.Random(args.seed)
+    faq_store = InMemoryFAQStore()
+    for query in make_queries(rng, args.history, args.popular, args.repeat_ratio):
+        response = await rag.retrieve_and_generate(query, TENANT, user_context=user, max_results=args.k)
+        faq_store.record_answer(TENANT, query, response["answer"], response["retrieved_docs"], response["confidence"])
+
+    queries = make_queries(random.Random(args.seed), args.requests, args.popular, args.repeat_ratio)
+
+    # 2. Without the FAQ index
+    without_faq = await replay(rag, queries, user, args.k)
+
+    # 3. With the FAQ index built from that history
+    faq_index = FAQIndex(
+        faq_store,
+        rag.embeddings,
+        store.list_documents,
+        min_confidence=args.min_confidence,
+        min_occurrences=args.min_occurrences,
+        ignore_answers=[GENERATION_ERROR_MESSAGE]
+    )
+    started = time.perf_counter()
+    entries = await faq_index.build_tenant(TENANT)
+    build_ms = (time.perf_counter() - started) * 1000
+    rag.attach_faq_index(faq_index)
+
+    lookups_before, saved_before = lookup_counts(), FAQ_LLM_CALLS_SAVED._value.get()
+    with_faq = await replay(rag, queries, user, args.k)
+    lookups = {result: count - lookups_before[result] for result, count in lookup_counts().items()}
+    await rag.drain_background_tasks()
+    await log_writer.close()
+    await faq_index.close()
+
+    return {
+        "faq_entries": entries,
+        "faq_build_ms": round(build_ms, 1),
+        "without_faq": without_faq,
+        "with_faq": with_faq,
+        "faq_lookups": lookups,
+        "faq_hit_rate": round(lookups["answer"] / max(1, sum(lookups.values())), 4),
+        "llm_calls_saved": FAQ_LLM_CALLS_SAVED._value.get() - saved_before,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--history", type=int, default=1000, help="queries answered before the FAQ index is built")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--popular", type=int, default=20, help="distinct questions in the repeated set")
+    parser.add_argument("--repeat-ratio", type=float, default=0.6)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--min-confidence", type=float, default=0.0,
+                        help="fake embeddings give low similarities; production uses FAQ_MIN_CONFIDENCE")
+    parser.add_argument("--min-occurrences", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(benchmark(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+LLM gateway benchmark
+Traffic spike against a fake provider that rejects calls over its concurrency
+limit: direct calls vs the gateway (single-flight, caps, hedged failover)
+
+    python -m benchmarks.llm_gateway --requests 400 --distinct 120
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+
+from src.services.llm_gateway import LLMGateway, LLMProvider
+from tests.fakes import FakeChatModel
+
+
+class LimitedChatModel(FakeChatModel):
+    """Fake provider that answers 429 once more than `limit` calls are in flight"""
+
+    def __init__(self, limit: int, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+
+    async def ainvoke(self, prompt: str, **kwargs):
+        self.active += 1
+        try:
+            if self.active > self.limit:
+                self.rejected += 1
+                await asyncio.sleep(0.005)
+                raise RuntimeError("429 rate limited")
+            return await super().ainvoke(prompt, **kwargs)
+        finally:
+            self.active -= 1
+
+
+def spike(count: int, distinct: int, seed: int):
+    """Zipf-like mix: a few popular questions asked many times at once"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    return [f"質問 {rng.choices(range(distinct), weights)[0]}" for _ in range(count)]
+
+
+async def run(prompts, call) -> dict:
+    latencies = []
+    failures = 0
+
+    async def one(prompt: str) -> None:
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            await call(prompt)
+        except Exception:
+            failures += 1
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(prompt) for prompt in prompts))
+    wall = time.perf_counter() - started
+    return {
+        "success_rate": round(1 - failures / len(prompts), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+        "wall_s": round(wall, 2),
+    }
+
+
+async def benchmark(args) -> dict:
+    prompts = spike(args.requests, args.distinct, args.seed)
+
+    def providers():
+        primary = LimitedChatModel(args.limit, latency=args.latency_ms / 1000, failure_rate=args.failure_rate, seed=1)
+        fallback = LimitedChatModel(args.limit, latency=args.latency_ms / 1000, seed=2)
+        return primary, fallback
+
+    primary, _ = providers()
+    direct = await run(prompts, primary.ainvoke)
+    direct.update(provider_calls=primary.calls, rejected_429=primary.rejected)
+
+    primary, fallback = providers()
+    gateway = LLMGateway(
+        {
+            "claude": LLMProvider("claude", primary, max_concurrency=args.limit),
+            "openai": LLMProvider("openai", fallback, max_concurrency=args.limit),
+        },
+        failover={"claude": "openai"},
+        hedge_delay=args.hedge_ms / 1000
+    )
+    gated = await run(prompts, lambda prompt: gateway.ainvoke(prompt, "claude"))
+    gated.update(
+        provider_calls=primary.calls + fallback.calls,
+        fallback_calls=fallback.calls,
+        rejected_429=primary.rejected + fallback.rejected,
+    )
+    return {"direct": direct, "gateway": gated}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--distinct", type=int, default=120)
+    parser.add_argument("--limit", type=int, default=16, help="provider-side concurrency limit")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--hedge-ms", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = {
+        "requests": args.requests,
+        "distinct_prompts": args.distinct,
+        "provider_concurrency_limit": args.limit,
+        **asyncio.run(benchmark(args)),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Masking microbenchmark
+Single-pass compiled mask vs one regex pass per rule, on Japanese answers
+dense with yen figures, plus cached vs uncached policy lookup
+
+    python -m benchmarks.masking --answers 2000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+from src.core.config import settings
+from src.models.schemas import MaskPolicy, UserContext
+from src.services.mask_engine import (
+    PERCENT,
+    RATE_UNIT,
+    YEN_AMOUNT,
+    MaskEngine,
+    compile_policy,
+)
+
+SENTENCES = [
+    "外壁塗装の見積金額は{yen}で、うち材料費は{yen}です。",
+    "原価は{yen}、粗利率は{pct}となっています。",
+    "足場工事の外注費{yen}を含め、工事原価は合計{yen}です。",
+    "職人の日当は{yen}、常用単価は{yen}/人工で計算しています。",
+    "屋根葺き替えは{sqm}㎡あたり{yen}、総額{yen}（税込）です。",
+    "前回の同規模案件では利益が{yen}、マージンは{pct}でした。",
+    "キッチン交換の標準仕様は¥{num}、オプション追加で￥{num}となります。",
+    "協力業者単価は{yen}/日、手間賃は別途{yen}です。",
+    "お客様への提示価格は{yen}ですので、値引き後でも{yen}を確保できます。",
+]
+
+
+def yen(rng: random.Random) -> str:
+    style = rng.random()
+    if style < 0.5:
+        return f"{rng.randint(1_000, 9_999_999):,}円"
+    if style < 0.8:
+        return f"{rng.randint(1, 999)}万円"
+    return f"{rng.randint(1, 9)}億{rng.randint(1, 9_999):,}万円"
+
+
+def make_answer(rng: random.Random, sentences: int) -> str:
+    parts = []
+    for _ in range(sentences):
+        template = rng.choice(SENTENCES)
+        parts.append(template.format_map(_Values(rng)))
+    return "".join(parts)
+
+
+class _Values(dict):
+    def __init__(self, rng: random.Random):
+        super().__init__()
+        self.rng = rng
+
+    def __missing__(self, key: str) -> str:
+        if key == "yen":
+            return yen(self.rng)
+        if key == "pct":
+            return f"{self.rng.randint(5, 45)}.{self.rng.randint(0, 9)}%"
+        if key == "sqm":
+            return str(self.rng.randint(20, 300))
+        return f"{self.rng.randint(10_000, 9_999_999):,}"
+
+
+def per_rule_patterns():
+    """Baseline: the same rules as separate patterns, one pass over the text each"""
+    label_tail = r"(?:\s|[:：=＝]|は|が|を|で|約|およそ){0,6}"
+    value = rf"(?:{YEN_AMOUNT}(?:{RATE_UNIT})?|{PERCENT})"
+    rules = []
+    for keyword in settings.MASK_PROFIT_KEYWORDS + settings.MASK_COST_KEYWORDS + settings.MASK_CONTRACTOR_KEYWORDS:
+        rules.append((re.compile(rf"({re.escape(keyword)}{label_tail}){value}"), r"\g<1>" + settings.MASK_REPLACEMENT))
+    rules.append((re.compile(rf"{YEN_AMOUNT}{RATE_UNIT}"), settings.MASK_REPLACEMENT))
+    rules.append((re.compile(YEN_AMOUNT), settings.MASK_REPLACEMENT))
+    return rules
+
+
+def mask_per_rule(text: str, rules) -> str:
+    for pattern, replacement in rules:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class SlowPolicyService:
+    """Stands in for a policy lookup that round-trips to the database"""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+
+    async def get_mask_policy(self, user_context: UserContext) -> MaskPolicy:
+        await asyncio.sleep(self.latency_s)
+        return MaskPolicy(mask_cost_data=True, mask_profit_data=True, mask_contractor_rates=True)
+
+
+def time_masking(answers, fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for answer in answers:
+            fn(answer)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def time_policy_lookups(lookups: int, latency_s: float) -> dict:
+    users = [
+        UserContext(user_id=f"u{i}", company_id=f"c{i % 5}", role=("admin", "sales", "staff")[i % 3])
+        for i in range(lookups)
+    ]
+    service = SlowPolicyService(latency_s)
+    engine = MaskEngine(service)
+
+    started = time.perf_counter()
+    for user in users:
+        await service.get_mask_policy(user)
+    uncached = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for user in users:
+        await engine.get_mask_policy(user)
+    cached = time.perf_counter() - started
+    return {
+        "lookups": lookups,
+        "uncached_us_per_lookup": round(uncached / lookups * 1e6, 2),
+        "cached_us_per_lookup": round(cached / lookups * 1e6, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--answers", type=int, default=2000)
+    parser.add_argument("--sentences", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--policy-lookups", type=int, default=500)
+    parser.add_argument("--policy-latency-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    answers = [make_answer(rng, args.sentences) for _ in range(args.answers)]
+    policy = MaskPolicy(mask_cost_data=True, mask_profit_data=True, mask_contractor_rates=True)
+    compiled = compile_policy(policy)
+    rules = per_rule_patterns()
+
+    mismatches = sum(compiled.mask(answer) != mask_per_rule(answer, rules) for answer in answers)
+    total_chars = sum(len(answer) for answer in answers)
+    per_rule_s = time_masking(answers, lambda text: mask_per_rule(text, rules), args.repeat)
+    compiled_s = time_masking(answers, compiled.mask, args.repeat)
+
+    result = {
+        "answers": args.answers,
+        "avg_chars": round(total_chars / args.answers),
+        "yen_figures_per_answer": round(sum(len(re.findall(YEN_AMOUNT, a)) for a in answers) / args.answers, 1),
+        "rules": len(rules),
+        "per_rule_us_per_answer": round(per_rule_s / args.answers * 1e6, 2),
+        "compiled_us_per_answer": round(compiled_s / args.answers * 1e6, 2),
+        "speedup": round(per_rule_s / compiled_s, 2),
+        "outputs_differing_from_per_rule": mismatches,
+        "sample": compiled.mask(answers[0])[:160],
+        "policy_lookup": asyncio.run(time_policy_lookups(args.policy_lookups, args.policy_latency_ms / 1000)),
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Observability overhead benchmark
+Per-request cost of stage histograms, score / token / tenant metrics and
+trace spans, on top of the bare StageTimer the pipeline always ran
+
+    python -m benchmarks.observability --requests 20000
+"""
+
+import argparse
+import json
+import time
+
+from src.core.metrics import LLM_TOKENS
+from src.core.observability import (
+    Trace,
+    TraceStore,
+    activate,
+    deactivate,
+    observe_query,
+    observe_scores,
+    span,
+)
+from src.core.timing import StageTimer
+
+STAGES = ["policy", "embed", "answer_cache", "retrieve", "pack", "generate", "mask", "log"]
+SCORES = [0.12, 0.18, 0.21, 0.25, 0.31]
+# LLMProvider resolves its token counters once, at construction
+PROMPT_TOKENS = LLM_TOKENS.labels(model="claude-3-haiku-20240307", direction="prompt")
+COMPLETION_TOKENS = LLM_TOKENS.labels(model="claude-3-haiku-20240307", direction="completion")
+
+
+def simulate(index: int, instrument: bool, trace_store) -> None:
+    """One request's worth of bookkeeping with the real work left out"""
+    query_id = f"q-{index}"
+    trace = Trace(query_id, tenant_id=f"tenant-{index % 80}") if trace_store is not None else None
+    token = activate(trace) if trace is not None else None
+    timer = StageTimer(trace)
+    for stage in STAGES:
+        with timer.stage(stage):
+            if stage == "generate":
+                with span("llm.claude.queue"):
+                    pass
+                with span("llm.claude", model="claude-3-haiku-20240307"):
+                    pass
+    if instrument:
+        observe_scores(SCORES)
+        PROMPT_TOKENS.inc(1800)
+        COMPLETION_TOKENS.inc(240)
+        observe_query(timer.stages, timer.elapsed_ms(), f"tenant-{index % 80}", "answered", trace, trace_store)
+    if token is not None:
+        deactivate(token)
+
+
+def time_variant(requests: int, repeat: int, instrument: bool, trace_store=None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for index in range(requests):
+            simulate(index, instrument, trace_store)
+        best = min(best, time.perf_counter() - started)
+    return best / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reference-p50-ms", type=float, default=150.0,
+                        help="end-to-end p50 to express overhead against (see benchmarks.e2e)")
+    args = parser.parse_args()
+
+    baseline = time_variant(args.requests, args.repeat, instrument=False)
+    metrics = time_variant(args.requests, args.repeat, instrument=True)
+    # Nothing is slow enough to be kept: the usual case
+    traced = time_variant(args.requests, args.repeat, instrument=True, trace_store=TraceStore(slow_ms=float("inf")))
+
+    overhead = traced - baseline
+    result = {
+        "requests": args.requests,
+        "stages": len(STAGES),
+        "stage_timer_only_us": round(baseline, 2),
+        "with_metrics_us": round(metrics, 2),
+        "with_metrics_and_trace_us": round(traced, 2),
+        "overhead_us_per_request": round(overhead, 2),
+        "overhead_pct_of_reference_p50": round(overhead / (args.reference_p50_ms * 1000) * 100, 4),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
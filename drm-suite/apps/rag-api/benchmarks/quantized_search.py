@@ -0,0 +1,127 @@
+"""
+Quantized two-stage search benchmark
+Memory, latency and recall@k of IVFIndex first passes (truncated / int8 / PQ)
+with full-precision re-scoring, against exact search over 3072-dim vectors
+
+    python -m benchmarks.quantized_search --vectors 20000 --queries 200
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.services.ann_index import IVFIndex
+from src.services.quantization import FirstPass
+
+DOC_TYPES = ["estimate_pdf", "cost_pdf", "contract_pdf", "inventory_csv", "manual_md"]
+
+# kind:dims, dims 0 = all dimensions; "none" is the plain float32 IVF scan
+DEFAULT_VARIANTS = ["none", "float:1024", "float:256", "int8:0", "int8:1024", "pq:0", "pq:1024"]
+
+
+def synthetic_corpus(count: int, dim: int, clusters: int, decay: float, seed: int):
+    """
+    Clustered vectors whose variance falls off with the dimension index, as in
+    Matryoshka-trained embeddings where leading dimensions carry most signal
+    """
+    rng = np.random.default_rng(seed)
+    weights = ((1.0 + np.arange(dim) / 64.0) ** -decay).astype(np.float32)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32) * weights
+    labels = rng.integers(clusters, size=count)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(count, dim)).astype(np.float32) * weights
+    query_labels = rng.integers(clusters, size=max(1, count // 100))
+    queries = centers[query_labels] + 0.35 * rng.normal(size=(len(query_labels), dim)).astype(np.float32) * weights
+    metadatas = [
+        {"document_id": f"doc-{i // 10}", "chunk_index": i % 10, "doc_type": DOC_TYPES[i % len(DOC_TYPES)]}
+        for i in range(count)
+    ]
+    documents = [f"chunk {i}" for i in range(count)]
+    return vectors, documents, metadatas, queries
+
+
+def parse_variant(variant: str) -> Optional[Dict]:
+    if variant == "none":
+        return None
+    kind, _, dims = variant.partition(":")
+    return {"kind": kind, "dims": int(dims or 0) or None}
+
+
+def time_searches(index: IVFIndex, queries: np.ndarray, k: int, nprobe: int, rescore_factor: int):
+    hits: List[List[int]] = []
+    started = time.perf_counter()
+    for query in queries:
+        hits.append([position for position, _ in index.search(query, k, None, nprobe, rescore_factor)])
+    return hits, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--decay", type=float, default=0.75)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[1, 4, 10, 50],
+                        help="shortlist = k * factor; 1 ranks by the first pass alone")
+    parser.add_argument("--pq-subspaces", type=int, default=64)
+    parser.add_argument("--variants", nargs="+", default=DEFAULT_VARIANTS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors, documents, metadatas, queries = synthetic_corpus(
+        args.vectors, args.dim, args.clusters, args.decay, args.seed
+    )
+    queries = queries[:args.queries]
+
+    index = IVFIndex.build(vectors, documents, metadatas)
+    normalized = index.vectors
+
+    # Ground truth: exact full-precision search over every row
+    exact_ms = 0.0
+    truths = []
+    for query in queries:
+        started = time.perf_counter()
+        scores = normalized @ (query / np.linalg.norm(query))
+        truths.append(set(np.argpartition(-scores, args.k - 1)[:args.k].tolist()))
+        exact_ms += (time.perf_counter() - started) * 1000
+
+    full_bytes = index.vectors.nbytes
+    results = {
+        "vectors": args.vectors, "dim": args.dim, "nlist": index.nlist, "nprobe": args.nprobe, "k": args.k,
+        "full_vectors_mb": round(full_bytes / 2 ** 20, 1),
+        "exact_ms_per_query": round(exact_ms / len(queries), 3),
+        "runs": []
+    }
+    for variant in args.variants:
+        spec = parse_variant(variant)
+        started = time.perf_counter()
+        index.first_pass = None if spec is None else FirstPass.build(
+            index.vectors, spec["kind"], spec["dims"], args.pq_subspaces, args.seed
+        )
+        build_s = time.perf_counter() - started
+        scanned = index.first_pass.nbytes if index.first_pass is not None else full_bytes
+
+        for factor in ([1] if spec is None else args.rescore_factor):
+            hits, ms = time_searches(index, queries, args.k, args.nprobe, factor)
+            recall = sum(len(set(h) & truth) / args.k for h, truth in zip(hits, truths)) / len(queries)
+            results["runs"].append({
+                "variant": variant,
+                "rescore_factor": factor if spec is not None else None,
+                "scan_mb": round(scanned / 2 ** 20, 1),
+                "scan_bytes_per_vector": round(scanned / len(index), 1),
+                "compression": round(full_bytes / scanned, 1),
+                "build_s": round(build_s, 2),
+                "ms_per_query": round(ms, 3),
+                "recall_at_k": round(recall, 4),
+            })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
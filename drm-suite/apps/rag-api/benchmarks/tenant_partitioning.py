@@ -0,0 +1,172 @@
+"""
+Tenant partitioning benchmark
+Filtered search latency on the shared LangChain collection (JSON metadata
+filters) versus per-tenant partitions with indexed filter columns, as the
+number of tenants grows. Needs a Postgres with pgvector; everything is
+created in a scratch schema that is dropped afterwards.
+
+    python -m benchmarks.tenant_partitioning --database-url postgresql://... --tenants 10 50 200
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Dict, List
+
+import asyncpg
+import numpy as np
+
+from src.core.config import settings
+from src.models.schemas import QueryFilter
+from src.services.partitioned_store import PartitionedPGVectorStore
+from src.services.retriever import build_search_filter
+from src.services.vector_store import PGVectorStore, _asyncpg_dsn
+
+DOC_TYPES = ["estimate_pdf", "cost_pdf", "contract_pdf", "inventory_csv", "manual_md"]
+FIRST_DAY = date(2023, 1, 1)
+
+# The tables LangChain's PGVector creates, without the indexes it does not create either
+COLLECTION_DDL = """
+CREATE TABLE langchain_pg_collection (uuid uuid PRIMARY KEY, name varchar, cmetadata json);
+CREATE TABLE langchain_pg_embedding (
+    uuid uuid PRIMARY KEY,
+    collection_id uuid REFERENCES langchain_pg_collection (uuid) ON DELETE CASCADE,
+    embedding vector,
+    document varchar,
+    cmetadata json,
+    custom_id varchar
+);
+"""
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    p50, p95 = np.percentile(samples, [50, 95])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2)}
+
+
+def tenant_chunks(tenant: str, count: int, dim: int, rng: np.random.Generator):
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    metadatas = [
+        {
+            "company_id": tenant,
+            "document_id": f"{tenant}-doc-{i // 10}",
+            "chunk_index": i % 10,
+            "doc_type": DOC_TYPES[(i // 10) % len(DOC_TYPES)],
+            "document_date": (FIRST_DAY + timedelta(days=int(rng.integers(0, 3 * 365)))).isoformat(),
+        }
+        for i in range(count)
+    ]
+    texts = [f"{tenant} chunk {i}" for i in range(count)]
+    return texts, list(vectors), metadatas
+
+
+def query_filter(tenant: str, rng: random.Random) -> Dict:
+    start = FIRST_DAY + timedelta(days=rng.randrange(0, 2 * 365))
+    return build_search_filter(
+        tenant,
+        QueryFilter(
+            doc_types=rng.sample(DOC_TYPES, 2),
+            date_range={"start": start, "end": start + timedelta(days=365)},
+        ),
+    )
+
+
+async def time_queries(store: PGVectorStore, tenants: List[str], queries: int, dim: int, k: int, seed: int):
+    rng = random.Random(seed)
+    vectors = np.random.default_rng(seed).normal(size=(queries, dim)).astype(np.float32)
+    samples = []
+    for vector in vectors:
+        search_filter = query_filter(rng.choice(tenants), rng)
+        started = time.perf_counter()
+        await store.asimilarity_search_by_vector_with_score(list(vector), k=k, filter=search_filter)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def run(args) -> Dict:
+    schema = f"rag_bench_{uuid.uuid4().hex[:8]}"
+    base_dsn = _asyncpg_dsn(args.database_url)
+    # asyncpg passes unknown DSN parameters through as server settings
+    dsn = f"{base_dsn}{'&' if '?' in base_dsn else '?'}search_path={schema},public"
+
+    admin = await asyncpg.connect(base_dsn)
+    await admin.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    await admin.execute(f"CREATE SCHEMA {schema}")
+    await admin.execute(f"SET search_path TO {schema}, public")
+    await admin.execute(COLLECTION_DDL)
+    await admin.execute(
+        "INSERT INTO langchain_pg_collection (uuid, name) VALUES ($1, $2)",
+        uuid.uuid4(), settings.VECTOR_COLLECTION_NAME
+    )
+
+    collection = PGVectorStore(embeddings=None, dsn=dsn, min_size=1, max_size=2)
+    partitioned = PartitionedPGVectorStore(embeddings=None, dsn=dsn, min_size=1, max_size=2)
+    await collection.start()
+    await partitioned.start()
+
+    rng = np.random.default_rng(args.seed)
+    tenants: List[str] = []
+    steps = []
+    try:
+        for target in sorted(args.tenants):
+            load_started = time.perf_counter()
+            while len(tenants) < target:
+                tenant = f"tenant-{len(tenants):05d}"
+                texts, vectors, metadatas = tenant_chunks(tenant, args.chunks_per_tenant, args.dim, rng)
+                await collection.add_embeddings(texts, vectors, metadatas)
+                await partitioned.add_embeddings(texts, vectors, metadatas)
+                tenants.append(tenant)
+            await admin.execute("ANALYZE")
+            load_s = time.perf_counter() - load_started
+
+            # Warm both layouts so the first timed query does not pay for planning caches
+            await time_queries(collection, tenants, 5, args.dim, args.k, args.seed + 1)
+            await time_queries(partitioned, tenants, 5, args.dim, args.k, args.seed + 1)
+
+            step = {"tenants": target, "rows": target * args.chunks_per_tenant, "load_s": round(load_s, 2)}
+            for name, store in (("collection", collection), ("partitioned", partitioned)):
+                step[name] = percentiles(await time_queries(store, tenants, args.queries, args.dim, args.k, args.seed))
+            steps.append(step)
+    finally:
+        await collection.close()
+        await partitioned.close()
+        if not args.keep:
+            await admin.execute(f"DROP SCHEMA {schema} CASCADE")
+        await admin.close()
+
+    first, last = steps[0], steps[-1]
+    return {
+        "chunks_per_tenant": args.chunks_per_tenant,
+        "dim": args.dim,
+        "queries": args.queries,
+        "k": args.k,
+        "steps": steps,
+        # p50 at the largest tenant count relative to the smallest; ~1.0 means flat
+        "p50_growth": {
+            name: round(last[name]["p50"] / first[name]["p50"], 2) for name in ("collection", "partitioned")
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--tenants", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--chunks-per-tenant", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=256,
+                        help="vector width; 3072 matches text-embedding-3-large but loads slowly")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema for inspection")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
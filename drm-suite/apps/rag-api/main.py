@@ -3,36 +3,67 @@ DRM Suite RAG API Service
 FastAPI + LangChain + pgvector implementation
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Security
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import os
+import time
+import uuid
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from src.services.rag_service import RAGService
-from src.services.document_service import DocumentService
-from src.services.embedding_service import EmbeddingService
+from src.services.job_queue import create_job_queue
+from src.services.job_worker import JobWorker, ingest_job, reindex_job
+from src.services.streaming import sse_event
+from src.services.query_log_writer import QueryLogWriter, PostgresLogSink
 from src.models.schemas import (
     RAGQuery,
     RAGResponse,
+    RAGBatchQuery,
+    RAGBatchResponse,
     DocumentUpload,
     DocumentResponse,
-    HealthResponse
+    HealthResponse,
+    ProcessingStatus,
+    UserContext,
+    FAQTemplate
 )
 from src.core.database import init_db
 from src.core.config import settings
-from src.middleware.auth import verify_token
+from src.core.auth import get_user_context, require_admin
+from src.core.lifecycle import process_uptime, readiness
 from src.middleware.metrics import setup_metrics
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize security
-security = HTTPBearer()
+
+def init_services() -> None:
+    """
+    Build the query services on first call. Kept out of module import so
+    importing `main` stays cheap and each worker's startup is timed in the lifespan.
+    """
+    global rag_service, document_service
+    if rag_service is not None:
+        return
+    from src.services.rag_service import RAGService
+    from src.services.document_service import DocumentService
+    rag_service = RAGService()
+    document_service = DocumentService()
+
+
+async def warm_up() -> None:
+    """Warm per-worker caches; /ready reports 503 until this has run"""
+    try:
+        with readiness.phase("warmup"):
+            await rag_service.warm_up()
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {str(e)}")
+    readiness.warm = True
 
 
 @asynccontextmanager
@@ -40,11 +71,87 @@ async def lifespan(app: FastAPI):
     """Application lifespan management"""
     # Startup
     logger.info("Starting RAG API service...")
-    await init_db()
-    setup_metrics(app)
+    boot_seconds = process_uptime()
+    if boot_seconds is not None:
+        # Interpreter start and module imports, up to this point
+        readiness.record("boot", boot_seconds)
+    with readiness.phase("init"):
+        init_services()
+    with readiness.phase("start"):
+        from src.services.vector_store import create_vector_store
+        
+        await init_db()
+        setup_metrics(app)
+        vector_store = create_vector_store(rag_service.embeddings)
+        await vector_store.start()
+        if settings.RETRIEVAL_BACKEND == "ann":
+            from src.services.ann_index import ANNIndexRetriever
+            # Tenants whose first index build has not finished are searched in pgvector
+            ann_retriever = ANNIndexRetriever(fallback=vector_store)
+            await ann_retriever.start()
+            rag_service.attach_vector_store(ann_retriever)
+        else:
+            rag_service.attach_vector_store(vector_store)
+        if settings.RETRIEVAL_MODE == "hybrid":
+            from src.services.lexical_index import LexicalIndex
+            rag_service.attach_lexical_index(LexicalIndex(source=vector_store.iterate_chunks))
+        log_writer = QueryLogWriter(PostgresLogSink(vector_store.connection))
+        await log_writer.start()
+        rag_service.attach_log_writer(log_writer)
+        if settings.FAQ_ENABLED:
+            from src.services.faq_index import FAQIndex, PostgresFAQStore
+            from src.services.rag_service import GENERATION_ERROR_MESSAGE
+            
+            faq_store = PostgresFAQStore(vector_store.connection)
+            await faq_store.start()
+            rag_service.attach_faq_index(FAQIndex(
+                faq_store,
+                rag_service.embeddings,
+                vector_store.list_documents,
+                ignore_answers=[GENERATION_ERROR_MESSAGE]
+            ))
+        # Workers publish tenant changes so this process drops stale caches
+        tenant_watch = asyncio.create_task(job_queue.watch_tenant_changes(rag_service.invalidate_tenant))
+        # Other API workers publish mask policy invalidations
+        mask_watch = asyncio.create_task(rag_service.mask_service.watch_invalidations())
+        local_worker = None
+        if settings.JOB_RUN_IN_API:
+            from src.services.ingestion import IngestionPipeline
+            
+            # Development without worker.py: run queued jobs in this process
+            logger.warning("JOB_RUN_IN_API is set: ingestion runs in the API process (dev / tests only)")
+            ingestion_pipeline = IngestionPipeline(embeddings=rag_service.embeddings, vector_store=vector_store)
+            ingestion_pipeline.start()
+            local_worker = JobWorker(job_queue, ingestion_pipeline)
+            worker_task = asyncio.create_task(local_worker.run())
+        elif settings.JOB_QUEUE_BACKEND != "redis":
+            logger.warning("JOB_QUEUE_BACKEND is not 'redis' and JOB_RUN_IN_API is off: queued jobs will not run")
+    readiness.add_check("vector_store", vector_store.health_check)
+    readiness.started = True
+    warmup_task = asyncio.create_task(warm_up())
+    logger.info(f"RAG API worker started: {readiness.phases}")
     yield
     # Shutdown
     logger.info("Shutting down RAG API service...")
+    # Fail readiness first so the load balancer stops routing here while requests drain
+    readiness.draining = True
+    warmup_task.cancel()
+    await rag_service.drain_background_tasks()
+    if local_worker is not None:
+        await local_worker.stop()
+        await asyncio.gather(worker_task, return_exceptions=True)
+        await ingestion_pipeline.close()
+    tenant_watch.cancel()
+    mask_watch.cancel()
+    await asyncio.gather(tenant_watch, mask_watch, warmup_task, return_exceptions=True)
+    if rag_service.faq_index is not None:
+        await rag_service.faq_index.close()
+    await rag_service.conversations.store.close()
+    await job_queue.close()
+    await log_writer.close()
+    await vector_store.close()
+    await rag_service.embeddings.cache.close()
+    await rag_service.mask_service.close()
 
 
 # Initialize FastAPI app
@@ -64,15 +171,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-rag_service = RAGService()
-document_service = DocumentService()
-embedding_service = EmbeddingService()
+# Services are built in the lifespan (init_services)
+rag_service = None
+document_service = None
+job_queue = create_job_queue()
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is up and serving requests"""
     return HealthResponse(
         status="healthy",
         service="rag-api",
@@ -80,22 +187,38 @@ async def health_check():
     )
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: started, warmed up, dependencies reachable and not draining"""
+    ready, checks = await readiness.check()
+    
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "startup_seconds": readiness.phases,
+            "pid": os.getpid()
+        }
+    )
+
+
 @app.post("/rag/query", response_model=RAGResponse)
 async def query_rag(
     query: RAGQuery,
-    credentials: HTTPAuthorizationCredentials = Security(security)
+    user_context: UserContext = Depends(get_user_context)
 ):
     """Query RAG system with retrieval and generation"""
     try:
-        # Verify token and get user context
-        user_context = await verify_token(credentials.credentials)
-        
         # Perform RAG query with user context for security filtering
         result = await rag_service.retrieve_and_generate(
             query=query.query,
             tenant_id=user_context.company_id,
             filters=query.filters,
-            user_context=user_context
+            user_context=user_context,
+            max_results=query.max_results,
+            include_sources=query.include_sources is not False,
+            session_id=query.session_id
         )
         
         return RAGResponse(**result)
@@ -105,22 +228,92 @@ async def query_rag(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/rag/query/batch", response_model=RAGBatchResponse)
+async def query_rag_batch(
+    batch: RAGBatchQuery,
+    user_context: UserContext = Depends(get_user_context)
+):
+    """Answer multiple queries in one request with per-item results or errors"""
+    try:
+        start_time = time.time()
+        results = await rag_service.batch_retrieve_and_generate(
+            queries=batch.queries,
+            tenant_id=user_context.company_id,
+            user_context=user_context
+        )
+        
+        return RAGBatchResponse(
+            results=results,
+            response_time_ms=int((time.time() - start_time) * 1000)
+        )
+    
+    except Exception as e:
+        logger.error(f"RAG batch query error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/rag/query/stream")
+async def query_rag_stream(
+    query: RAGQuery,
+    user_context: UserContext = Depends(get_user_context)
+):
+    """Query RAG system, streaming sources then answer tokens as server-sent events"""
+    async def event_stream():
+        async for event, data in rag_service.stream_retrieve_and_generate(
+            query=query.query,
+            tenant_id=user_context.company_id,
+            filters=query.filters,
+            user_context=user_context,
+            max_results=query.max_results,
+            include_sources=query.include_sources is not False,
+            session_id=query.session_id
+        ):
+            yield sse_event(event, data)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.delete("/rag/sessions/{session_id}")
+async def delete_session(
+    session_id: str,
+    user_context: UserContext = Depends(get_user_context)
+):
+    """Forget the caller's conversation history for a session"""
+    if not await rag_service.conversations.clear(user_context.company_id, user_context.user_id, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    return {"status": "deleted", "session_id": session_id}
+
+
 @app.post("/documents/upload", response_model=DocumentResponse)
 async def upload_document(
     document: DocumentUpload,
-    credentials: HTTPAuthorizationCredentials = Security(security)
+    user_context: UserContext = Depends(get_user_context)
 ):
     """Upload and process document for RAG"""
+    # Documents are always written to the caller's own tenant
+    if document.company_id != user_context.company_id:
+        raise HTTPException(status_code=403, detail="Cannot upload documents for another company")
+    
+    from src.services.ingestion import UnsafeFileURL, validate_file_url
+    try:
+        validate_file_url(document.file_url)
+    except UnsafeFileURL as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
-        user_context = await verify_token(credentials.credentials)
+        # Parsed, embedded and stored by a worker; poll /documents/{id}/status
+        job = await job_queue.enqueue(ingest_job(document, str(uuid.uuid4())))
         
-        # Process document
-        result = await document_service.process_document(
-            document=document,
-            user_context=user_context
+        return DocumentResponse(
+            document_id=job.job_id,
+            status=ProcessingStatus.PENDING,
+            message="Document queued for processing"
         )
-        
-        return DocumentResponse(**result)
     
     except Exception as e:
         logger.error(f"Document upload error: {str(e)}")
@@ -130,11 +323,14 @@ async def upload_document(
 @app.get("/documents/{document_id}/status")
 async def get_document_status(
     document_id: str,
-    credentials: HTTPAuthorizationCredentials = Security(security)
+    user_context: UserContext = Depends(get_user_context)
 ):
     """Get document processing status"""
     try:
-        user_context = await verify_token(credentials.credentials)
+        # Live progress reported by the worker
+        job = await job_queue.get(document_id)
+        if job is not None and job.company_id == user_context.company_id:
+            return {"document_id": document_id, **job.as_status()}
         
         status = await document_service.get_processing_status(
             document_id=document_id,
@@ -150,25 +346,129 @@ async def get_document_status(
 
 @app.post("/embeddings/reindex")
 async def reindex_embeddings(
-    credentials: HTTPAuthorizationCredentials = Security(security)
+    user_context: UserContext = Depends(require_admin)
 ):
     """Trigger embedding reindexing"""
     try:
-        user_context = await verify_token(credentials.credentials)
-        
-        # Only allow admin users to trigger reindexing
-        if not user_context.is_admin:
-            raise HTTPException(status_code=403, detail="Admin access required")
+        # Incremental: only chunks whose content hash changed are re-embedded.
+        # A tenant's reindex that is still queued or running is returned as is.
+        job = await job_queue.enqueue(reindex_job(user_context.company_id))
         
-        result = await embedding_service.reindex_all(user_context.company_id)
-        
-        return {"status": "started", "task_id": result}
+        return {"status": "started", "task_id": job.job_id}
     
     except Exception as e:
         logger.error(f"Reindex error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/embeddings/reindex/{task_id}")
+async def get_reindex_status(
+    task_id: str,
+    user_context: UserContext = Depends(get_user_context)
+):
+    """Get reindex progress and skipped/updated/deleted chunk counts"""
+    job = await job_queue.get(task_id)
+    if job is None or job.company_id != user_context.company_id:
+        raise HTTPException(status_code=404, detail="Reindex task not found")
+    
+    return job.as_status()
+
+
+@app.post("/admin/mask-policies/invalidate")
+async def invalidate_mask_policies(
+    role: Optional[str] = None,
+    user_context: UserContext = Depends(require_admin)
+):
+    """Drop cached mask policies for the caller's company after a policy change"""
+    # Also clears the shared Redis tier and notifies the other API workers
+    invalidated = await rag_service.mask_service.invalidate_shared(user_context.company_id, role)
+    
+    return {"status": "invalidated", "entries": invalidated}
+
+
+@app.get("/admin/faq")
+async def list_faq_entries(
+    user_context: UserContext = Depends(require_admin)
+):
+    """FAQ entries currently served for the caller's company (templates and frequent questions)"""
+    faq_index = _require_faq_index()
+    entries = faq_index.entries(user_context.company_id)
+    
+    return {"entries": [entry.as_dict() for entry in entries]}
+
+
+@app.post("/admin/faq/templates")
+async def add_faq_template(
+    template: FAQTemplate,
+    user_context: UserContext = Depends(require_admin)
+):
+    """Add a curated Q&A template for the caller's company"""
+    faq_index = _require_faq_index()
+    try:
+        entry = await faq_index.store.add_template(
+            user_context.company_id,
+            template.question,
+            template.answer,
+            [doc_type.value for doc_type in template.doc_types],
+            user_context.user_id
+        )
+        # Rebuild the FAQ index and drop shadowing cached answers in every worker
+        await job_queue.notify_tenant_changed(user_context.company_id)
+        
+        return entry.as_dict()
+    
+    except Exception as e:
+        logger.error(f"FAQ template error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.delete("/admin/faq/templates/{entry_id}")
+async def delete_faq_template(
+    entry_id: str,
+    user_context: UserContext = Depends(require_admin)
+):
+    """Remove one of the caller's company's Q&A templates"""
+    faq_index = _require_faq_index()
+    if not await faq_index.store.delete_template(user_context.company_id, entry_id):
+        raise HTTPException(status_code=404, detail="FAQ template not found")
+    await job_queue.notify_tenant_changed(user_context.company_id)
+    
+    return {"status": "deleted", "entry_id": entry_id}
+
+
+def _require_faq_index():
+    if rag_service.faq_index is None:
+        raise HTTPException(status_code=404, detail="FAQ fast path is disabled")
+    return rag_service.faq_index
+
+
+@app.get("/admin/traces")
+async def list_slow_traces(
+    limit: int = 50,
+    user_context: UserContext = Depends(require_admin)
+):
+    """Recent slow queries of the caller's company, with their stage spans"""
+    traces = rag_service.trace_store.recent(user_context.company_id, limit)
+    
+    return {
+        "slow_query_ms": rag_service.trace_store.slow_ms,
+        "traces": [trace.as_dict() for trace in traces]
+    }
+
+
+@app.get("/admin/traces/{query_id}")
+async def get_trace(
+    query_id: str,
+    user_context: UserContext = Depends(require_admin)
+):
+    """Span breakdown of one slow query, looked up by the query_id it returned"""
+    trace = rag_service.trace_store.get(query_id)
+    if trace is None or trace.attributes.get("tenant_id") != user_context.company_id:
+        raise HTTPException(status_code=404, detail="Trace not found (only slow queries are kept)")
+    
+    return trace.as_dict()
+
+
 @app.get("/metrics")
 async def get_metrics():
     """Prometheus metrics endpoint"""
@@ -179,11 +479,12 @@ async def get_metrics():
 
 
 if __name__ == "__main__":
+    # Development server; production runs multiple workers via serve.py
     import uvicorn
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=settings.HOST,
+        port=settings.PORT,
+        reload=settings.DEBUG,
         log_level="info"
     )
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+DRM Suite RAG API launcher
+Runs the API in multiple uvicorn worker processes sharing warm caches
+
+    python serve.py --workers 4
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from src.core.config import settings
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def share_caches(workers: int) -> None:
+    """
+    Point every worker at the same warm state. Workers are spawned, so they
+    inherit the environment, not memory: the tokenizer is shared through
+    a file cache, embeddings and mask policies through Redis.
+    Explicit environment settings win.
+    """
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", settings.TIKTOKEN_CACHE_DIR)
+    if workers > 1:
+        os.environ.setdefault("EMBEDDING_CACHE_REDIS_ENABLED", "true")
+        os.environ.setdefault("MASK_POLICY_CACHE_REDIS_ENABLED", "true")
+
+
+def preload_tokenizer() -> None:
+    """Fetch the BPE file once here instead of once per worker"""
+    os.makedirs(os.environ["TIKTOKEN_CACHE_DIR"], exist_ok=True)
+    started = time.perf_counter()
+    import tiktoken
+    tiktoken.get_encoding("cl100k_base")
+    logger.info(f"Tokenizer cached in {os.environ['TIKTOKEN_CACHE_DIR']} ({time.perf_counter() - started:.2f}s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--workers", type=int, default=settings.WEB_CONCURRENCY)
+    parser.add_argument("--graceful-shutdown", type=int, default=30,
+                        help="seconds to drain requests after /ready starts failing")
+    args = parser.parse_args()
+
+    if args.workers > 1 and settings.JOB_QUEUE_BACKEND != "redis":
+        logger.warning(
+            "JOB_QUEUE_BACKEND is not 'redis': each worker keeps its own job queue, "
+            "so job status requests may reach a worker that does not know the job"
+        )
+
+    share_caches(args.workers)
+    try:
+        preload_tokenizer()
+    except Exception as e:
+        logger.warning(f"Tokenizer preload failed, workers will load it themselves: {str(e)}")
+
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_shutdown,
+        log_level="info"
+    )
+
+
+if __name__ == "__main__":
+    main()
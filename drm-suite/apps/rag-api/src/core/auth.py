@@ -0,0 +1,113 @@
+"""
+Request authentication
+Verified-token cache and the FastAPI dependencies that resolve UserContext
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Security
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from .config import settings
+from .metrics import AUTH_CACHE_HITS, AUTH_CACHE_MISSES
+from ..middleware.auth import verify_token
+from ..models.schemas import UserContext
+
+logger = logging.getLogger(__name__)
+
+security = HTTPBearer()
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """The `exp` claim of a JWT as a UNIX timestamp, read without verifying the signature"""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        exp = claims.get("exp")
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens, keyed by SHA-256 so raw tokens are never held.
+    An entry lives until the token's `exp` (at most `max_ttl_seconds`) and is
+    rejected, not served, from that instant on.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_ttl_seconds: Optional[float] = None,
+        verifier: Optional[Callable[[str], Awaitable[UserContext]]] = None
+    ):
+        self.verifier = verifier or verify_token
+        self.max_entries = max_entries or settings.AUTH_CACHE_MAX_ENTRIES
+        self.max_ttl_seconds = max_ttl_seconds or settings.AUTH_CACHE_MAX_TTL_SECONDS
+        self._entries: "OrderedDict[str, Tuple[float, UserContext]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    async def verify(self, token: str) -> UserContext:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.time() < entry[0]:
+                self._entries.move_to_end(key)
+                AUTH_CACHE_HITS.inc()
+                return entry[1]
+            del self._entries[key]
+
+        AUTH_CACHE_MISSES.inc()
+        user_context = await self.verifier(token)
+
+        now = time.time()
+        expires_at = now + self.max_ttl_seconds
+        exp = token_expiry(token)
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        if expires_at > now:
+            self._entries[key] = (expires_at, user_context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user_context
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+async def get_user_context(
+    credentials: HTTPAuthorizationCredentials = Security(security)
+) -> UserContext:
+    """Verify the bearer token once per request (FastAPI caches the result within a request)"""
+    try:
+        return await token_cache.verify(credentials.credentials)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.warning(f"Token verification failed: {str(e)}")
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+
+async def require_admin(user_context: UserContext = Depends(get_user_context)) -> UserContext:
+    """403 for authenticated non-admins; never wrapped, so clients do not retry it"""
+    if not user_context.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user_context
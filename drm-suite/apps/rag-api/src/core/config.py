@@ -3,7 +3,7 @@ Configuration management for RAG API
 """
 
 import os
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 
@@ -30,6 +30,9 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Verified tokens are cached until their exp, capped at this TTL
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_MAX_TTL_SECONDS: float = JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60
     
     # RAG Settings
     EMBEDDING_MODEL: str = "text-embedding-3-large"
@@ -37,8 +40,180 @@ class Settings(BaseSettings):
     CHUNK_OVERLAP: int = 50
     MAX_FILE_SIZE_MB: int = 2
     
+    # Context Packing ("claude" = claude-3-haiku, "openai" = gpt-4)
+    CONTEXT_MODEL: str = os.getenv("CONTEXT_MODEL", "claude")
+    CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {"openai": 3000, "claude": 3000}
+    CONTEXT_TOKEN_CACHE_SIZE: int = 20000
+    
+    # Vector Store
+    VECTOR_COLLECTION_NAME: str = "rag_embeddings"
+    VECTOR_POOL_MIN_SIZE: int = int(os.getenv("VECTOR_POOL_MIN_SIZE", "2"))
+    VECTOR_POOL_MAX_SIZE: int = int(os.getenv("VECTOR_POOL_MAX_SIZE", "10"))
+    VECTOR_POOL_ACQUIRE_TIMEOUT: float = 5.0
+    VECTOR_POOL_HEALTH_CHECK_INTERVAL: float = 30.0
+    # "collection" (shared LangChain table, JSON metadata filters) or "partitioned" (per-tenant partitions)
+    VECTOR_STORE_LAYOUT: str = os.getenv("VECTOR_STORE_LAYOUT", "collection")
+    VECTOR_PARTITIONED_TABLE: str = "rag_tenant_embeddings"
+    
+    # Retrieval Backend ("pgvector" or "ann")
+    RETRIEVAL_BACKEND: str = os.getenv("RETRIEVAL_BACKEND", "pgvector")
+    ANN_INDEX_DIR: str = os.getenv("ANN_INDEX_DIR", "/var/lib/rag-api/ann")
+    ANN_NPROBE: int = 8
+    # Queries re-read a tenant's CURRENT version at most this often, so a rebuilt index is served within it
+    ANN_RELOAD_CHECK_SECONDS: float = 5.0
+    # Two-stage search: scan a compressed copy ("float", "int8" or "pq"; "" = off) of
+    # the first ANN_FIRST_PASS_DIMS dimensions (0 = all, Matryoshka truncation), then
+    # re-score the best k * ANN_RESCORE_FACTOR rows against the full vectors
+    ANN_FIRST_PASS: str = os.getenv("ANN_FIRST_PASS", "")
+    ANN_FIRST_PASS_DIMS: int = int(os.getenv("ANN_FIRST_PASS_DIMS", "0"))
+    ANN_PQ_SUBSPACES: int = 64
+    ANN_RESCORE_FACTOR: int = 4
+    
+    # Retrieval Mode ("vector" or "hybrid" = vector + n-gram BM25 with RRF)
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "vector")
+    HYBRID_CANDIDATES: int = 20
+    HYBRID_RRF_K: int = 60
+    # Loaded tenant BM25 indexes, least recently searched evicted first
+    LEXICAL_INDEX_MAX_TENANTS: int = 100
+    LEXICAL_INDEX_MAX_BYTES: int = 1024 * 1024 * 1024
+    
+    # Embedding Cache
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000
+    EMBEDDING_CACHE_TTL_SECONDS: int = 86400
+    EMBEDDING_CACHE_REDIS_ENABLED: bool = os.getenv("EMBEDDING_CACHE_REDIS_ENABLED", "false").lower() == "true"
+    
+    # Answer Cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.97
+    ANSWER_CACHE_MAX_ENTRIES: int = 5000
+    ANSWER_CACHE_MAX_ENTRIES_PER_SCOPE: int = 200
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    
+    # FAQ Fast Path (admin templates + frequent high-confidence answers from rag_query_logs)
+    FAQ_ENABLED: bool = os.getenv("FAQ_ENABLED", "true").lower() == "true"
+    FAQ_ANSWER_THRESHOLD: float = 0.95
+    FAQ_SUGGEST_THRESHOLD: float = 0.80
+    FAQ_MAX_SUGGESTIONS: int = 3
+    FAQ_MAX_ENTRIES_PER_TENANT: int = 500
+    FAQ_MIN_CONFIDENCE: float = 0.75
+    FAQ_MIN_OCCURRENCES: int = 3
+    FAQ_LOG_WINDOW_DAYS: int = 90
+    FAQ_REFRESH_SECONDS: float = 900.0
+    
+    # Conversation Sessions (history tokens are taken out of the context budget)
+    SESSION_STORE_REDIS_ENABLED: bool = os.getenv("SESSION_STORE_REDIS_ENABLED", "false").lower() == "true"
+    SESSION_MAX_SESSIONS: int = 10000
+    SESSION_TTL_SECONDS: int = 86400
+    SESSION_MAX_RECENT_TURNS: int = 4
+    SESSION_RECENT_TOKEN_BUDGET: int = 800
+    SESSION_TURN_MAX_TOKENS: int = 400
+    SESSION_SUMMARY_MAX_TOKENS: int = 300
+    SESSION_LLM_PROVIDER: str = "claude"  # condensation and summaries use the cheaper model
+    
+    # Retrieval
+    RAG_DEFAULT_RESULTS: int = 5
+    RAG_MAX_RESULTS_CAP: int = 20
+    RAG_RERANK_ENABLED: bool = os.getenv("RAG_RERANK_ENABLED", "false").lower() == "true"
+    RAG_OVERFETCH_FACTOR: int = 3
+    
+    # Batch Queries
+    BATCH_QUERY_CONCURRENCY: int = 8
+    
+    # Query Log Writer
+    QUERY_LOG_BATCH_SIZE: int = 200
+    QUERY_LOG_FLUSH_INTERVAL: float = 1.0
+    QUERY_LOG_MAX_BUFFER: int = 10000
+    
+    # Ingestion Pipeline
+    INGEST_PARSE_WORKERS: int = int(os.getenv("INGEST_PARSE_WORKERS", "2"))
+    INGEST_PDF_PAGES_PER_TASK: int = 8
+    INGEST_TEXT_UNIT_CHARS: int = 8000
+    INGEST_CSV_ROWS_PER_PAGE: int = 50
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_EMBED_BATCH_MAX_CHARS: int = 60000
+    INGEST_EMBED_CONCURRENCY: int = 4
+    INGEST_EMBED_MAX_RETRIES: int = 5
+    INGEST_RETRY_BASE_DELAY: float = 0.5
+    INGEST_RETRY_MAX_DELAY: float = 30.0
+    INGEST_MAX_CONCURRENT_DOCUMENTS: int = 2
+    INGEST_STATUS_RETENTION: int = 1000
+    INGEST_DOWNLOAD_CHUNK_BYTES: int = 1 << 20
+    # Document sources: comma-separated hosts uploads may be fetched from ("files.example.com",
+    # or ".example.com" for any subdomain). file:// URLs are only accepted under
+    # INGEST_LOCAL_FILE_ROOT, which is unset in production (dev / benchmarks only).
+    INGEST_ALLOWED_URL_HOSTS: str = os.getenv("INGEST_ALLOWED_URL_HOSTS", "")
+    INGEST_LOCAL_FILE_ROOT: str = os.getenv("INGEST_LOCAL_FILE_ROOT", "")
+    INGEST_MAX_REDIRECTS: int = 3
+    
+    # Incremental Reindex
+    REINDEX_CHECKPOINT_DIR: str = os.getenv("REINDEX_CHECKPOINT_DIR", "/var/lib/rag-api/reindex")
+    REINDEX_TASK_RETENTION: int = 200
+    
+    # Mask Policies
+    MASK_POLICY_CACHE_TTL_SECONDS: int = 300
+    MASK_POLICY_CACHE_MAX_ENTRIES: int = 1000
+    MASK_POLICY_CACHE_REDIS_ENABLED: bool = os.getenv("MASK_POLICY_CACHE_REDIS_ENABLED", "false").lower() == "true"
+    MASK_REPLACEMENT: str = "***"
+    MASK_COST_KEYWORDS: List[str] = ["原価", "原価率", "仕入価格", "仕入値", "仕入", "材料費", "外注費", "工事原価", "実行予算"]
+    MASK_PROFIT_KEYWORDS: List[str] = ["粗利", "粗利益", "粗利率", "利益", "利益率", "営業利益", "マージン", "利幅", "値入率"]
+    MASK_CONTRACTOR_KEYWORDS: List[str] = ["日当", "人工単価", "常用単価", "労務単価", "外注単価", "協力業者単価", "手間賃", "施工単価"]
+    
+    # Job Queue: the API only enqueues and worker.py runs the jobs ("redis").
+    # "memory" with JOB_RUN_IN_API runs them inside a single API process (dev / tests only).
+    JOB_QUEUE_BACKEND: str = os.getenv("JOB_QUEUE_BACKEND", "redis")
+    JOB_RUN_IN_API: bool = os.getenv("JOB_RUN_IN_API", "false").lower() == "true"
+    JOB_QUEUE_PREFIX: str = "rag:jobs:"
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BASE_DELAY: float = 5.0
+    JOB_RETRY_MAX_DELAY: float = 300.0
+    JOB_LEASE_SECONDS: float = 120.0
+    JOB_HEARTBEAT_INTERVAL: float = 5.0
+    JOB_POLL_INTERVAL: float = 0.5
+    JOB_BULK_EVERY: int = 4
+    JOB_RESULT_TTL_SECONDS: int = 7 * 86400
+    
+    # Document Change Events (CRM create/update/delete events consumed by worker.py;
+    # "kafka", or "memory" for an in-process broker in tests and benchmarks)
+    CHANGE_EVENTS_ENABLED: bool = os.getenv("CHANGE_EVENTS_ENABLED", "false").lower() == "true"
+    CHANGE_EVENTS_BACKEND: str = os.getenv("CHANGE_EVENTS_BACKEND", "kafka")
+    CHANGE_EVENTS_TOPIC: str = os.getenv("CHANGE_EVENTS_TOPIC", "drm.document-changes")
+    CHANGE_EVENTS_GROUP_ID: str = os.getenv("CHANGE_EVENTS_GROUP_ID", "rag-ingestion")
+    # A micro-batch closes at this many events or this long after its first event
+    CHANGE_EVENTS_BATCH_SIZE: int = 500
+    CHANGE_EVENTS_WINDOW_SECONDS: float = 2.0
+    # Events still failing after CHANGE_EVENTS_MAX_ATTEMPTS are copied here and committed past
+    CHANGE_EVENTS_DEAD_LETTER_TOPIC: str = os.getenv("CHANGE_EVENTS_DEAD_LETTER_TOPIC", "drm.document-changes.dead-letter")
+    CHANGE_EVENTS_CONCURRENCY: int = 4
+    CHANGE_EVENTS_MAX_ATTEMPTS: int = 3
+    CHANGE_EVENTS_LAG_INTERVAL: float = 15.0
+    # Kafka drops a member that does not poll again within this long, so it must cover
+    # applying one full batch: CHANGE_EVENTS_BATCH_SIZE / CHANGE_EVENTS_CONCURRENCY
+    # reindexes in a row, each with up to CHANGE_EVENTS_MAX_ATTEMPTS attempts
+    CHANGE_EVENTS_MAX_POLL_INTERVAL_SECONDS: float = 1800.0
+    
+    # LLM Gateway
+    LLM_MAX_CONCURRENCY: Dict[str, int] = {"openai": 16, "claude": 16}
+    LLM_REQUESTS_PER_MINUTE: Dict[str, int] = {"openai": 500, "claude": 1000}
+    LLM_TOKENS_PER_MINUTE: Dict[str, int] = {"openai": 300000, "claude": 400000}
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_HEDGE_DELAY_SECONDS: float = 10.0
+    LLM_FAILOVER: Dict[str, str] = {"claude": "openai", "openai": "claude"}
+    
     # Monitoring
     PROMETHEUS_PORT: int = 9090
+    METRICS_TENANT_LABEL_LIMIT: int = 50
+    TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+    TRACE_SLOW_QUERY_MS: float = float(os.getenv("TRACE_SLOW_QUERY_MS", "2000"))
+    TRACE_BUFFER_SIZE: int = 500
+    
+    # Server (serve.py)
+    HOST: str = os.getenv("HOST", "0.0.0.0")
+    PORT: int = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # tiktoken reads BPE files from here; a shared directory means one download for all workers
+    TIKTOKEN_CACHE_DIR: str = os.getenv("TIKTOKEN_CACHE_DIR", "/var/lib/rag-api/tiktoken")
+    READINESS_CHECK_TIMEOUT: float = 2.0
     
     # Development
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
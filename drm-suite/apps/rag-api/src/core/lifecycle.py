@@ -0,0 +1,79 @@
+"""
+Process lifecycle
+Startup phase timing, readiness checks and drain state behind /ready
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+from .metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def process_uptime() -> Optional[float]:
+    """Seconds since this process was started (Linux), covering interpreter start and imports"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 is the start time in clock ticks after boot; the name (field 2) may contain spaces
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Readiness:
+    """
+    Readiness is separate from liveness: /health answers as soon as the process
+    serves requests, /ready only once startup and warm-up finished, every
+    registered dependency check passes, and the process is not draining.
+    """
+
+    def __init__(self, check_timeout: Optional[float] = None):
+        self.check_timeout = check_timeout or settings.READINESS_CHECK_TIMEOUT
+        self.phases: Dict[str, float] = {}
+        self.started = False
+        self.warm = False
+        self.draining = False
+        self._checks: Dict[str, Callable[[], Awaitable[bool]]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase into STARTUP_SECONDS and the /ready payload"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = round(seconds, 3)
+        STARTUP_SECONDS.labels(phase=name).set(seconds)
+
+    def add_check(self, name: str, check: Callable[[], Awaitable[bool]]) -> None:
+        self._checks[name] = check
+
+    async def _run_check(self, name: str) -> bool:
+        try:
+            return bool(await asyncio.wait_for(self._checks[name](), timeout=self.check_timeout))
+        except Exception as e:
+            logger.warning(f"Readiness check {name} failed: {str(e) or type(e).__name__}")
+            return False
+
+    async def check(self) -> Tuple[bool, Dict[str, Any]]:
+        names = list(self._checks)
+        results = await asyncio.gather(*(self._run_check(name) for name in names))
+        checks: Dict[str, Any] = dict(zip(names, results))
+        checks.update(started=self.started, warm=self.warm, draining=self.draining)
+        ready = self.started and self.warm and not self.draining and all(results)
+        return ready, checks
+
+
+readiness = Readiness()
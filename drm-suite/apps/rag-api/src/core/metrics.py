@@ -0,0 +1,344 @@
+"""
+Prometheus collectors for RAG API
+Registered on the default registry so /metrics exports them via generate_latest()
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Vector store connection pool
+VECTOR_POOL_SIZE = Gauge(
+    "rag_vector_pool_size",
+    "Open connections in the vector store pool"
+)
+VECTOR_POOL_IN_USE = Gauge(
+    "rag_vector_pool_in_use",
+    "Vector store connections currently checked out"
+)
+VECTOR_POOL_MAX_SIZE = Gauge(
+    "rag_vector_pool_max_size",
+    "Configured maximum size of the vector store pool"
+)
+VECTOR_POOL_WAITING = Gauge(
+    "rag_vector_pool_waiting",
+    "Requests waiting to acquire a vector store connection"
+)
+VECTOR_POOL_ACQUIRE_TIMEOUTS = Counter(
+    "rag_vector_pool_acquire_timeouts_total",
+    "Vector store connection acquisitions that timed out"
+)
+VECTOR_POOL_HEALTHY = Gauge(
+    "rag_vector_pool_healthy",
+    "1 if the last vector store health check succeeded, 0 otherwise"
+)
+
+# Query embedding cache
+EMBEDDING_CACHE_HITS = Counter(
+    "rag_embedding_cache_hits_total",
+    "Query embedding cache hits",
+    ["tier"]
+)
+EMBEDDING_CACHE_MISSES = Counter(
+    "rag_embedding_cache_misses_total",
+    "Query embedding cache misses"
+)
+EMBEDDING_CACHE_EVICTIONS = Counter(
+    "rag_embedding_cache_evictions_total",
+    "Query embedding cache evictions",
+    ["reason"]
+)
+EMBEDDING_CACHE_SIZE = Gauge(
+    "rag_embedding_cache_entries",
+    "Entries in the in-process query embedding cache"
+)
+
+# Semantic answer cache
+ANSWER_CACHE_HITS = Counter(
+    "rag_answer_cache_hits_total",
+    "Queries answered from the semantic answer cache"
+)
+ANSWER_CACHE_MISSES = Counter(
+    "rag_answer_cache_misses_total",
+    "Semantic answer cache misses"
+)
+ANSWER_CACHE_INVALIDATIONS = Counter(
+    "rag_answer_cache_invalidations_total",
+    "Tenant-wide answer cache invalidations"
+)
+ANSWER_CACHE_SIZE = Gauge(
+    "rag_answer_cache_entries",
+    "Entries in the semantic answer cache"
+)
+
+# FAQ fast path
+FAQ_LOOKUPS = Counter(
+    "rag_faq_lookups_total",
+    "FAQ index lookups by result (answer, suggest, miss); answer / total is the hit rate",
+    ["result"]
+)
+FAQ_LLM_CALLS_SAVED = Counter(
+    "rag_faq_llm_calls_saved_total",
+    "Queries answered from the FAQ index without retrieval or an LLM call"
+)
+FAQ_ENTRIES = Gauge(
+    "rag_faq_entries",
+    "Entries in the FAQ index by source (template, log)",
+    ["source"]
+)
+FAQ_BUILD_SECONDS = Histogram(
+    "rag_faq_build_seconds",
+    "Time to (re)build one tenant's FAQ index",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+# Hybrid lexical index
+LEXICAL_INDEX_BYTES = Gauge(
+    "rag_lexical_index_bytes",
+    "Approximate memory held by loaded per-tenant lexical indexes"
+)
+LEXICAL_INDEX_EVICTIONS = Counter(
+    "rag_lexical_index_evictions_total",
+    "Tenant lexical indexes evicted to stay within LEXICAL_INDEX_MAX_TENANTS / LEXICAL_INDEX_MAX_BYTES"
+)
+
+# Verified token cache
+AUTH_CACHE_HITS = Counter(
+    "rag_auth_cache_hits_total",
+    "Requests authenticated from the verified-token cache"
+)
+AUTH_CACHE_MISSES = Counter(
+    "rag_auth_cache_misses_total",
+    "Requests whose token was verified with verify_token"
+)
+
+# Mask policy cache
+MASK_POLICY_CACHE_HITS = Counter(
+    "rag_mask_policy_cache_hits_total",
+    "Mask policies served from the per-(company, role) cache",
+    ["tier"]
+)
+MASK_POLICY_CACHE_MISSES = Counter(
+    "rag_mask_policy_cache_misses_total",
+    "Mask policy lookups that went to MaskPolicyService"
+)
+
+# Streaming
+STREAM_TIME_TO_FIRST_BYTE = Histogram(
+    "rag_stream_time_to_first_byte_ms",
+    "Time from request start to the first streamed event (ms)",
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 15000)
+)
+
+# Query log writer
+QUERY_LOG_BUFFERED = Gauge(
+    "rag_query_log_buffered",
+    "Query log rows waiting to be flushed"
+)
+QUERY_LOG_WRITTEN = Counter(
+    "rag_query_log_written_total",
+    "Query log rows written to the sink"
+)
+QUERY_LOG_DROPPED = Counter(
+    "rag_query_log_dropped_total",
+    "Query log rows dropped",
+    ["reason"]
+)
+QUERY_LOG_FLUSH_SECONDS = Histogram(
+    "rag_query_log_flush_seconds",
+    "Duration of query log batch writes"
+)
+
+# Document ingestion
+INGEST_DOCUMENTS = Counter(
+    "rag_ingest_documents_total",
+    "Documents finished by the ingestion pipeline",
+    ["status"]
+)
+INGEST_IN_PROGRESS = Gauge(
+    "rag_ingest_documents_in_progress",
+    "Documents currently being ingested"
+)
+INGEST_CHUNKS = Counter(
+    "rag_ingest_chunks_total",
+    "Chunks embedded and written to the vector store"
+)
+INGEST_RETRIES = Counter(
+    "rag_ingest_retries_total",
+    "Ingestion batch attempts that failed and were retried",
+    ["stage"]
+)
+INGEST_EMBED_BATCH_SECONDS = Histogram(
+    "rag_ingest_embed_batch_seconds",
+    "Duration of one embedding API call during ingestion"
+)
+
+# Incremental reindex
+REINDEX_CHUNKS = Counter(
+    "rag_reindex_chunks_total",
+    "Chunks visited by incremental reindexing",
+    ["result"]
+)
+REINDEX_TASKS = Counter(
+    "rag_reindex_tasks_total",
+    "Reindex tasks finished",
+    ["status"]
+)
+
+# Job queue
+JOB_ENQUEUED = Counter(
+    "rag_jobs_enqueued_total",
+    "Jobs added to the background queue",
+    ["kind", "lane"]
+)
+JOB_FINISHED = Counter(
+    "rag_jobs_finished_total",
+    "Jobs that completed or were dead-lettered",
+    ["kind", "status"]
+)
+JOB_RETRIES = Counter(
+    "rag_jobs_retries_total",
+    "Job attempts that failed and were scheduled for retry",
+    ["kind"]
+)
+JOB_QUEUE_WAIT_SECONDS = Histogram(
+    "rag_jobs_queue_wait_seconds",
+    "Time from enqueue to a worker picking the job up",
+    ["lane"],
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+)
+JOB_RUNNING = Gauge(
+    "rag_jobs_running",
+    "Jobs currently executing in this worker",
+    ["kind"]
+)
+
+# Document change events
+CHANGE_EVENTS = Counter(
+    "rag_change_events_total",
+    "Document change events consumed, by op and result (applied, coalesced, invalid, failed)",
+    ["op", "result"]
+)
+CHANGE_CHUNKS = Counter(
+    "rag_change_chunks_total",
+    "Chunks touched while applying change events (embedded, skipped, deleted)",
+    ["result"]
+)
+CHANGE_BATCH_EVENTS = Histogram(
+    "rag_change_batch_events",
+    "Events in one consumed micro-batch, before coalescing",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+CHANGE_BATCH_SECONDS = Histogram(
+    "rag_change_batch_seconds",
+    "Time to apply and commit one micro-batch",
+    buckets=(0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+CHANGE_EVENT_DELAY_SECONDS = Histogram(
+    "rag_change_event_delay_seconds",
+    "Time from an event being produced to its change being searchable",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+)
+CHANGE_COMMIT_FAILURES = Counter(
+    "rag_change_commit_failures_total",
+    "Batches whose offsets could not be committed because the consumer group rebalanced"
+)
+CHANGE_CONSUMER_LAG = Gauge(
+    "rag_change_consumer_lag",
+    "Events on the broker not yet committed by the consumer group",
+    ["topic", "partition"]
+)
+
+# LLM gateway
+LLM_REQUESTS = Counter(
+    "rag_llm_requests_total",
+    "LLM provider calls by outcome (success, error, timeout)",
+    ["provider", "outcome"]
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "rag_llm_queue_wait_seconds",
+    "Time a call waited for rate limit tokens and a concurrency slot",
+    ["provider"],
+    buckets=(0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+LLM_IN_FLIGHT = Gauge(
+    "rag_llm_in_flight",
+    "LLM calls currently holding a provider concurrency slot",
+    ["provider"]
+)
+LLM_COALESCED = Counter(
+    "rag_llm_coalesced_total",
+    "Calls that joined an identical in-flight prompt instead of calling the provider"
+)
+LLM_FAILOVERS = Counter(
+    "rag_llm_failovers_total",
+    "Calls sent to the fallback provider after a slow or failed primary",
+    ["provider", "reason"]
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Tokens sent to and received from each model",
+    ["model", "direction"]
+)
+
+# Query pipeline
+QUERY_STAGE_SECONDS = Histogram(
+    "rag_query_stage_seconds",
+    "Duration of each query pipeline stage",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+QUERY_DURATION_SECONDS = Histogram(
+    "rag_query_duration_seconds",
+    "End-to-end query duration by outcome (answered, cached, no_results, generation_error, error)",
+    ["outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+RETRIEVAL_SCORE = Histogram(
+    "rag_retrieval_score",
+    "Cosine distance of retrieved chunks (lower is closer), for the top hit and the rest",
+    ["rank"],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 2.0)
+)
+TENANT_QUERIES = Counter(
+    "rag_tenant_queries_total",
+    "Queries per tenant; tenants beyond METRICS_TENANT_LABEL_LIMIT are counted as 'other'",
+    ["tenant", "outcome"]
+)
+
+# Conversation sessions
+SESSION_HISTORY_TOKENS = Histogram(
+    "rag_session_history_tokens",
+    "Conversation history tokens (summary + recent turns) added to an answer prompt",
+    buckets=(0, 50, 100, 200, 400, 600, 800, 1000, 1500, 2000)
+)
+SESSION_BYTES = Histogram(
+    "rag_session_bytes",
+    "Serialized size of a conversation session when stored",
+    buckets=(256, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+)
+SESSIONS_ACTIVE = Gauge(
+    "rag_sessions_active",
+    "Conversation sessions held in this process"
+)
+SESSION_CONDENSE = Counter(
+    "rag_session_condense_total",
+    "Follow-up questions by condensation outcome (condensed, skipped, rejected, error)",
+    ["outcome"]
+)
+SESSION_SUMMARIZATIONS = Counter(
+    "rag_session_summarizations_total",
+    "Older turns folded into a session summary, by outcome",
+    ["outcome"]
+)
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens",
+    "Context, history and question tokens in each answer prompt",
+    ["mode"],
+    buckets=(250, 500, 1000, 1500, 2000, 2500, 3000, 3500, 4000, 6000, 8000)
+)
+
+# Process lifecycle
+STARTUP_SECONDS = Gauge(
+    "rag_startup_seconds",
+    "Duration of each worker startup phase (boot, init, start, warmup)",
+    ["phase"]
+)
@@ -0,0 +1,195 @@
+"""
+Query pipeline observability
+Trace spans keyed by query_id, slow-trace retention and per-query Prometheus observations
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import settings
+from .metrics import QUERY_DURATION_SECONDS, QUERY_STAGE_SECONDS, RETRIEVAL_SCORE, TENANT_QUERIES
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """Spans of one query; the trace id is the query_id returned to the client"""
+
+    __slots__ = ("trace_id", "attributes", "started_at", "start", "end", "spans")
+
+    def __init__(self, trace_id: str, **attributes: Any):
+        self.trace_id = trace_id
+        self.attributes = attributes
+        self.started_at = datetime.utcnow().isoformat()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.spans: List[Tuple[str, float, float, Dict[str, Any]]] = []
+
+    def add_span(self, name: str, started: float, ended: Optional[float] = None, **attributes: Any) -> None:
+        self.spans.append((name, started, ended if ended is not None else time.perf_counter(), attributes))
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms(), 2),
+            "attributes": self.attributes,
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((started - self.start) * 1000, 2),
+                    "duration_ms": round((ended - started) * 1000, 2),
+                    **attributes
+                }
+                for name, started, ended, attributes in sorted(self.spans, key=lambda span: span[1])
+            ]
+        }
+
+
+def start_trace(trace_id: str, **attributes: Any) -> Optional[Trace]:
+    """A new trace when tracing is enabled (TRACE_ENABLED), else None"""
+    return Trace(trace_id, **attributes) if settings.TRACE_ENABLED else None
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def activate(trace: Optional[Trace]) -> Token:
+    """Make `trace` current for this task and the tasks it creates"""
+    return _current_trace.set(trace)
+
+
+def deactivate(token: Token) -> None:
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # Async generators may be closed from another context
+        _current_trace.set(None)
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """Record a span on the current trace; a no-op when there is none"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, started, **attributes)
+
+
+class TraceStore:
+    """Most recent traces slower than `slow_ms`, bounded to `max_entries`"""
+
+    def __init__(self, slow_ms: Optional[float] = None, max_entries: Optional[int] = None):
+        self.slow_ms = slow_ms if slow_ms is not None else settings.TRACE_SLOW_QUERY_MS
+        self.max_entries = max_entries or settings.TRACE_BUFFER_SIZE
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+
+    def offer(self, trace: Trace) -> bool:
+        trace.finish()
+        duration_ms = trace.duration_ms()
+        if duration_ms < self.slow_ms:
+            return False
+        self._traces[trace.trace_id] = trace
+        while len(self._traces) > self.max_entries:
+            self._traces.popitem(last=False)
+        logger.warning(f"Slow query {trace.trace_id}: {duration_ms:.0f}ms, spans={self._summary(trace)}")
+        return True
+
+    @staticmethod
+    def _summary(trace: Trace) -> str:
+        return ", ".join(f"{name}={(ended - started) * 1000:.0f}ms" for name, started, ended, _ in trace.spans)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        return self._traces.get(trace_id)
+
+    def recent(self, tenant_id: Optional[str] = None, limit: int = 50) -> List[Trace]:
+        traces = [
+            trace for trace in reversed(self._traces.values())
+            if tenant_id is None or trace.attributes.get("tenant_id") == tenant_id
+        ]
+        return traces[:limit]
+
+
+class TenantLabels:
+    """
+    Bounded tenant label values: the first `limit` tenants seen get their own
+    label, the rest are reported as "other" so series count stays fixed.
+    """
+
+    OTHER = "other"
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit if limit is not None else settings.METRICS_TENANT_LABEL_LIMIT
+        self._known: Set[str] = set()
+
+    def label(self, tenant_id: Optional[str]) -> str:
+        if not tenant_id:
+            return self.OTHER
+        if tenant_id in self._known:
+            return tenant_id
+        if len(self._known) < self.limit:
+            self._known.add(tenant_id)
+            return tenant_id
+        return self.OTHER
+
+
+tenant_labels = TenantLabels()
+
+# labels() resolves a child by hashing its label values on every call; keep the children
+_stage_histograms: Dict[str, Any] = {}
+_duration_histograms: Dict[str, Any] = {}
+_tenant_counters: Dict[Tuple[str, str], Any] = {}
+_TOP_SCORE = RETRIEVAL_SCORE.labels(rank="top")
+_REST_SCORE = RETRIEVAL_SCORE.labels(rank="rest")
+
+
+def _child(cache: Dict, key, metric, **labels):
+    child = cache.get(key)
+    if child is None:
+        child = cache[key] = metric.labels(**labels)
+    return child
+
+
+def observe_query(
+    stages: Dict[str, float],
+    total_ms: float,
+    tenant_id: Optional[str],
+    outcome: str,
+    trace: Optional[Trace] = None,
+    trace_store: Optional[TraceStore] = None
+) -> None:
+    """Export one finished query: stage and total histograms, tenant counter, slow trace"""
+    for stage, ms in stages.items():
+        _child(_stage_histograms, stage, QUERY_STAGE_SECONDS, stage=stage).observe(ms / 1000)
+    _child(_duration_histograms, outcome, QUERY_DURATION_SECONDS, outcome=outcome).observe(total_ms / 1000)
+    tenant = tenant_labels.label(tenant_id)
+    _child(_tenant_counters, (tenant, outcome), TENANT_QUERIES, tenant=tenant, outcome=outcome).inc()
+    if trace is not None and trace_store is not None:
+        trace.attributes["outcome"] = outcome
+        trace_store.offer(trace)
+
+
+def observe_scores(scores: Iterable[float]) -> None:
+    """Cosine distances of one retrieval, best first (lower is closer)"""
+    for rank, score in enumerate(scores):
+        (_TOP_SCORE if rank == 0 else _REST_SCORE).observe(score)
@@ -0,0 +1,49 @@
+"""
+Per-stage timing for the query pipeline
+"""
+
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Awaitable, Dict, Optional, TypeVar
+
+if TYPE_CHECKING:
+    from .observability import Trace
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """Collects wall-clock durations (ms) of named pipeline stages, mirrored as spans on `trace`"""
+
+    def __init__(self, trace: Optional["Trace"] = None):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.trace = trace
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, started)
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Await and time a coroutine; usable inside asyncio.gather"""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._record(name, started)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(ms, 2) for name, ms in self.stages.items()}
+
+    def _record(self, name: str, started: float) -> None:
+        ended = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (ended - started) * 1000
+        if self.trace is not None:
+            self.trace.add_span(name, started, ended)
@@ -2,9 +2,9 @@
 Pydantic models for RAG API
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from typing import List, Optional, Dict, Any, Union
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
 
@@ -23,11 +23,39 @@ class ProcessingStatus(str, Enum):
     FAILED = "failed"
 
 
+class DateRange(BaseModel):
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+    @model_validator(mode="after")
+    def check_order(self) -> "DateRange":
+        if self.start and self.end and self.start > self.end:
+            raise ValueError("date_range.start must not be after date_range.end")
+        return self
+
+
+class QueryFilter(BaseModel):
+    # Unknown keys are rejected rather than silently searching unfiltered
+    model_config = ConfigDict(extra="forbid")
+
+    doc_types: Optional[List[DocumentType]] = None
+    store_ids: Optional[List[str]] = None
+    project_ids: Optional[List[str]] = None
+    date_range: Optional[DateRange] = None  # {"start": "2024-01-01", "end": "2024-12-31"}, on document_date
+
+
 class RAGQuery(BaseModel):
     query: str = Field(..., description="User query text")
-    filters: Optional[Dict[str, Any]] = Field(default={}, description="Query filters")
+    filters: Optional[QueryFilter] = Field(default=None, description="Query filters")
     max_results: Optional[int] = Field(default=5, description="Maximum results to return")
     include_sources: Optional[bool] = Field(default=True, description="Include source documents")
+    session_id: Optional[str] = Field(
+        default=None, max_length=128, description="Conversation session for follow-up questions"
+    )
+
+
+class RAGBatchQuery(BaseModel):
+    queries: List[RAGQuery] = Field(..., min_length=1, max_length=100, description="Queries to answer")
 
 
 class DocumentChunk(BaseModel):
@@ -45,6 +73,23 @@ class RAGResponse(BaseModel):
     retrieved_docs: List[str] = Field(default_factory=list)
     response_time_ms: int
     query_id: str
+    cached: bool = False
+    faq_id: Optional[str] = None
+    session_id: Optional[str] = None
+    condensed_query: Optional[str] = None
+    suggested_questions: List[str] = Field(default_factory=list)
+    stage_timings_ms: Dict[str, float] = Field(default_factory=dict)
+
+
+class RAGBatchItem(BaseModel):
+    index: int
+    result: Optional[RAGResponse] = None
+    error: Optional[str] = None
+
+
+class RAGBatchResponse(BaseModel):
+    results: List[RAGBatchItem]
+    response_time_ms: int
 
 
 class DocumentUpload(BaseModel):
@@ -55,6 +100,8 @@ class DocumentUpload(BaseModel):
     company_id: str
     store_id: Optional[str] = None
     project_id: Optional[str] = None
+    # Filterable with QueryFilter.date_range; defaults to the upload date
+    document_date: Optional[date] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
@@ -95,15 +142,16 @@ class UserContext(BaseModel):
     is_admin: bool = False
 
 
-class QueryFilter(BaseModel):
-    doc_types: Optional[List[DocumentType]] = None
-    store_ids: Optional[List[str]] = None
-    project_ids: Optional[List[str]] = None
-    date_range: Optional[Dict[str, str]] = None  # {"start": "2024-01-01", "end": "2024-12-31"}
-
 
 class MaskPolicy(BaseModel):
     mask_cost_data: bool = False
     mask_profit_data: bool = False
     mask_contractor_rates: bool = False
-    allowed_doc_types: List[DocumentType] = Field(default_factory=list)
\ No newline at end of file
+    allowed_doc_types: List[DocumentType] = Field(default_factory=list)
+
+class FAQTemplate(BaseModel):
+    question: str = Field(..., min_length=1, description="Question as users would ask it")
+    answer: str = Field(..., min_length=1, description="Stored answer (masked per user when served)")
+    doc_types: List[DocumentType] = Field(
+        default_factory=list, description="Only shown to users allowed these document types"
+    )
@@ -0,0 +1,422 @@
+"""
+Local approximate nearest neighbour index
+Per-tenant IVF index over float32 NumPy arrays, persisted as memory-mapped
+files so several workers can share one copy and start without a rebuild
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from ..core.config import settings
+from .quantization import FirstPass
+from .retriever import Retriever, matches_filter
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields encoded as integer columns for pre-filtering
+FILTER_FIELDS = ("doc_type", "store_id", "project_id")
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _spherical_kmeans(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int,
+    seed: int,
+    sample_size: int
+) -> np.ndarray:
+    """Train unit-norm centroids on a sample of (already normalized) vectors"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = vectors[assignments == c]
+            centroids[c] = members.mean(axis=0) if len(members) else vectors[rng.integers(len(vectors))]
+        centroids = _normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are clustered around `nlist` centroids and
+    stored sorted by cluster, so each inverted list is a contiguous slice.
+    A search scans the `nprobe` closest lists only.
+
+    With a first pass (int8 / PQ codes, optionally of truncated vectors) the
+    lists are scanned in compressed form and only the best k * rescore_factor
+    rows are read at full precision for the final ranking.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        codes: Dict[str, np.ndarray],
+        vocab: Dict[str, Dict[str, int]],
+        payload: np.ndarray,
+        payload_offsets: np.ndarray,
+        first_pass: Optional[FirstPass] = None
+    ):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self.codes = codes
+        self.vocab = vocab
+        self.payload = payload
+        self.payload_offsets = payload_offsets
+        self.first_pass = first_pass
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """Bytes scanned per search (first pass or full vectors) and held on disk"""
+        return {
+            "vectors": int(self.vectors.nbytes),
+            "first_pass": self.first_pass.nbytes if self.first_pass is not None else 0,
+            "payload": int(self.payload.nbytes),
+        }
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        nlist: Optional[int] = None,
+        iterations: int = 10,
+        seed: int = 0,
+        first_pass: Optional[str] = None,
+        first_pass_dims: Optional[int] = None,
+        pq_subspaces: Optional[int] = None
+    ) -> "IVFIndex":
+        vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        count = len(vectors)
+        if nlist is None:
+            nlist = min(4096, max(1, int(np.sqrt(count))))
+        nlist = max(1, min(nlist, count))
+
+        if nlist == 1:
+            centroids = _normalize_rows(vectors.mean(axis=0, keepdims=True))
+            assignments = np.zeros(count, dtype=np.int64)
+        else:
+            centroids = _spherical_kmeans(vectors, nlist, iterations, seed, sample_size=256 * nlist)
+            assignments = np.concatenate([
+                np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+                for start in range(0, count, 65536)
+            ])
+
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignments, minlength=nlist))
+
+        vocab: Dict[str, Dict[str, int]] = {field: {} for field in FILTER_FIELDS}
+        codes = {field: np.full(count, -1, dtype=np.int32) for field in FILTER_FIELDS}
+        chunks = []
+        payload_offsets = np.zeros(count + 1, dtype=np.int64)
+        for position, row in enumerate(order):
+            metadata = metadatas[row]
+            for field in FILTER_FIELDS:
+                value = metadata.get(field)
+                if value is not None:
+                    codes[field][position] = vocab[field].setdefault(str(value), len(vocab[field]))
+            encoded = json.dumps({"t": documents[row], "m": metadata}, ensure_ascii=False, default=str).encode("utf-8")
+            chunks.append(encoded)
+            payload_offsets[position + 1] = payload_offsets[position] + len(encoded)
+
+        payload = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+        vectors = vectors[order]
+        compressed = None
+        if first_pass:
+            compressed = FirstPass.build(
+                vectors, first_pass, first_pass_dims, pq_subspaces or settings.ANN_PQ_SUBSPACES, seed
+            )
+        return cls(vectors, centroids, offsets, codes, vocab, payload, payload_offsets, compressed)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), self.vectors)
+        np.save(os.path.join(path, "centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "payload_offsets.npy"), self.payload_offsets)
+        np.save(os.path.join(path, "payload.npy"), self.payload)
+        for field, column in self.codes.items():
+            np.save(os.path.join(path, f"codes_{field}.npy"), column)
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        if self.first_pass is not None:
+            self.first_pass.save(path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFIndex":
+        mode = "r" if mmap else None
+
+        def load_array(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, name), mmap_mode=mode)
+
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        return cls(
+            vectors=load_array("vectors.npy"),
+            centroids=np.load(os.path.join(path, "centroids.npy")),
+            offsets=np.load(os.path.join(path, "offsets.npy")),
+            codes={field: load_array(f"codes_{field}.npy") for field in FILTER_FIELDS},
+            vocab=vocab,
+            payload=load_array("payload.npy"),
+            payload_offsets=load_array("payload_offsets.npy"),
+            first_pass=FirstPass.load(path, mmap=mmap)
+        )
+
+    def document(self, position: int) -> Document:
+        start, end = self.payload_offsets[position], self.payload_offsets[position + 1]
+        row = json.loads(self.payload[start:end].tobytes().decode("utf-8"))
+        return Document(page_content=row["t"], metadata=row["m"])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        search_filter: Optional[Dict[str, Any]] = None,
+        nprobe: int = 8,
+        rescore_factor: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """Return (position, cosine distance) for the k nearest filtered rows"""
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        if self.nlist <= nprobe:
+            probe = np.arange(self.nlist)
+        else:
+            probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        candidates = np.concatenate([
+            np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe
+        ]) if len(probe) else np.empty(0, dtype=np.int64)
+
+        candidates, extra_filter = self._prefilter(candidates, search_filter or {})
+        if len(candidates) == 0:
+            return []
+
+        shortlist = max(k, 1) * (rescore_factor or settings.ANN_RESCORE_FACTOR)
+        # Row-checked filters could reject the whole shortlist: those searches stay exact
+        if self.first_pass is not None and not extra_filter and len(candidates) > shortlist:
+            approx = self.first_pass.scores(candidates, query)
+            # Sorted positions keep the full-precision reads in file order
+            candidates = np.sort(candidates[np.argpartition(-approx, shortlist - 1)[:shortlist]])
+
+        scores = self.vectors[candidates] @ query
+        if extra_filter:
+            # Fields without an encoded column are checked row by row, best first
+            ranked = np.argsort(-scores)
+            results = []
+            for i in ranked:
+                if matches_filter(self.document(int(candidates[i])).metadata, extra_filter):
+                    results.append((int(candidates[i]), 1.0 - float(scores[i])))
+                    if len(results) >= k:
+                        break
+            return results
+
+        top = min(k, len(candidates))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return [(int(candidates[i]), 1.0 - float(scores[i])) for i in best]
+
+    def _prefilter(
+        self,
+        candidates: np.ndarray,
+        search_filter: Dict[str, Any]
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
+        extra = {}
+        for key, expected in search_filter.items():
+            if key == "company_id":
+                continue  # one index per tenant
+            if key not in self.codes:
+                extra[key] = expected
+                continue
+            values = expected["$in"] if isinstance(expected, dict) and "$in" in expected else [expected]
+            allowed = [
+                self.vocab[key][str(v.value if hasattr(v, "value") else v)]
+                for v in values
+                if str(v.value if hasattr(v, "value") else v) in self.vocab[key]
+            ]
+            if not allowed:
+                return candidates[:0], extra
+            candidates = candidates[np.isin(self.codes[key][candidates], allowed)]
+        return candidates, extra
+
+
+def _tenant_dir(index_dir: str, tenant_id: str) -> str:
+    if not re.fullmatch(r"[A-Za-z0-9_.-]+", tenant_id):
+        raise ValueError(f"Invalid tenant id for index path: {tenant_id}")
+    return os.path.join(index_dir, tenant_id)
+
+
+def save_tenant_index(index: IVFIndex, index_dir: str, tenant_id: str, keep_versions: int = 2) -> str:
+    """
+    Write a new index version and atomically repoint CURRENT at it, so
+    workers reading the previous version are never disturbed.
+    """
+    tenant_dir = _tenant_dir(index_dir, tenant_id)
+    version = f"v{time.time_ns()}"
+    index.save(os.path.join(tenant_dir, version))
+
+    current_tmp = os.path.join(tenant_dir, "CURRENT.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(tenant_dir, "CURRENT"))
+
+    versions = sorted(d for d in os.listdir(tenant_dir) if d.startswith("v"))
+    for old in versions[:-keep_versions]:
+        shutil.rmtree(os.path.join(tenant_dir, old), ignore_errors=True)
+    return version
+
+
+async def build_tenant_index_from_store(store, tenant_id: str, index_dir: Optional[str] = None) -> int:
+    """Export a tenant's vectors from a PGVectorStore into a local IVF index"""
+    documents: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    vectors: List[np.ndarray] = []
+    async for batch in store.iterate_embeddings(filter={"company_id": tenant_id}):
+        for document, metadata, embedding in batch:
+            documents.append(document)
+            metadatas.append(metadata)
+            vectors.append(np.asarray(embedding, dtype=np.float32))
+
+    if not vectors:
+        # Every document was deleted: stop serving the previous version
+        try:
+            os.remove(os.path.join(_tenant_dir(index_dir or settings.ANN_INDEX_DIR, tenant_id), "CURRENT"))
+        except FileNotFoundError:
+            pass
+        return 0
+
+    index = await asyncio.to_thread(
+        IVFIndex.build,
+        np.vstack(vectors),
+        documents,
+        metadatas,
+        first_pass=settings.ANN_FIRST_PASS or None,
+        first_pass_dims=settings.ANN_FIRST_PASS_DIMS or None
+    )
+    await asyncio.to_thread(save_tenant_index, index, index_dir or settings.ANN_INDEX_DIR, tenant_id)
+    first_pass = index.first_pass.kind if index.first_pass is not None else "none"
+    logger.info(f"Built ANN index for tenant {tenant_id} ({len(index)} vectors, nlist={index.nlist}, first_pass={first_pass})")
+    return len(index)
+
+
+def _read_current(tenant_dir: str) -> Optional[str]:
+    """The version CURRENT points at, or None when the tenant has no index"""
+    try:
+        with open(os.path.join(tenant_dir, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class ANNIndexRetriever(Retriever):
+    """
+    Retriever over per-tenant IVF indexes loaded from ANN_INDEX_DIR. Workers
+    rebuild a tenant's index after its documents change (ann_build jobs) and
+    the new version is picked up within ANN_RELOAD_CHECK_SECONDS. Tenants
+    without an index yet are served by `fallback` when one is given.
+    """
+
+    def __init__(
+        self,
+        index_dir: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        rescore_factor: Optional[int] = None,
+        fallback: Optional[Retriever] = None,
+        reload_check_seconds: Optional[float] = None
+    ):
+        self.index_dir = index_dir or settings.ANN_INDEX_DIR
+        self.nprobe = nprobe or settings.ANN_NPROBE
+        self.rescore_factor = rescore_factor or settings.ANN_RESCORE_FACTOR
+        self.fallback = fallback
+        self.reload_check_seconds = (
+            settings.ANN_RELOAD_CHECK_SECONDS if reload_check_seconds is None else reload_check_seconds
+        )
+        self._indexes: Dict[str, Tuple[str, IVFIndex]] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    async def start(self) -> None:
+        if not os.path.isdir(self.index_dir):
+            raise RuntimeError(f"ANN index directory {self.index_dir} does not exist (RETRIEVAL_BACKEND=ann)")
+        tenants = [
+            name for name in os.listdir(self.index_dir)
+            if os.path.exists(os.path.join(self.index_dir, name, "CURRENT"))
+        ]
+        logger.info(f"ANN indexes available for {len(tenants)} tenants in {self.index_dir}")
+
+    async def get_index(self, tenant_id: str) -> Optional[IVFIndex]:
+        """
+        Load (or reload after a rebuild) the tenant's current index version.
+        CURRENT is re-read at most every reload_check_seconds; reads and
+        loads run on a thread so the event loop never waits on the disk.
+        """
+        cached = self._indexes.get(tenant_id)
+        if cached is not None and cached[0] == "memory":
+            return cached[1]
+        checked_at = self._checked_at.get(tenant_id)
+        if checked_at is not None and time.monotonic() - checked_at < self.reload_check_seconds:
+            return cached[1] if cached is not None else None
+
+        tenant_dir = _tenant_dir(self.index_dir, tenant_id)
+        version = await asyncio.to_thread(_read_current, tenant_dir)
+        if version is None:
+            self._indexes.pop(tenant_id, None)
+        elif cached is None or cached[0] != version:
+            index = await asyncio.to_thread(IVFIndex.load, os.path.join(tenant_dir, version), mmap=True)
+            self._indexes[tenant_id] = (version, index)
+        self._checked_at[tenant_id] = time.monotonic()
+        cached = self._indexes.get(tenant_id)
+        return cached[1] if cached is not None else None
+
+    def set_index(self, tenant_id: str, index: IVFIndex) -> None:
+        """Serve an in-memory index directly (tests and offline runs)"""
+        self._indexes[tenant_id] = ("memory", index)
+
+    async def asimilarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        search_filter = filter or {}
+        tenant_id = search_filter.get("company_id")
+        if tenant_id is None:
+            raise ValueError("ANN retrieval requires a company_id filter")
+
+        index = await self.get_index(str(tenant_id))
+        if index is None:
+            if self.fallback is not None:
+                return await self.fallback.asimilarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+            return []
+
+        hits = await asyncio.to_thread(index.search, embedding, k, search_filter, self.nprobe, self.rescore_factor)
+        return [(index.document(position), distance) for position, distance in hits]
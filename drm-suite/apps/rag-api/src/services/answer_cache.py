@@ -0,0 +1,185 @@
+"""
+Semantic answer cache
+Reuses generated answers for near-duplicate queries within the same
+tenant / mask policy / filter scope
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.metrics import (
+    ANSWER_CACHE_HITS,
+    ANSWER_CACHE_MISSES,
+    ANSWER_CACHE_INVALIDATIONS,
+    ANSWER_CACHE_SIZE,
+)
+from ..models.schemas import MaskPolicy
+
+logger = logging.getLogger(__name__)
+
+ScopeKey = Tuple[str, str, str]
+
+
+class _ScopeEntries:
+    """Normalized query vectors and cached responses for one scope"""
+
+    def __init__(self):
+        self.vectors: List[np.ndarray] = []
+        self.responses: List[Dict[str, Any]] = []
+        self.expires_at: List[float] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def add(self, vector: np.ndarray, response: Dict[str, Any], expires_at: float) -> None:
+        self.vectors.append(vector)
+        self.responses.append(response)
+        self.expires_at.append(expires_at)
+        self._matrix = None
+
+    def drop_oldest(self) -> None:
+        self.vectors.pop(0)
+        self.responses.pop(0)
+        self.expires_at.pop(0)
+        self._matrix = None
+
+    def prune_expired(self, now: float) -> int:
+        keep = [i for i, expires_at in enumerate(self.expires_at) if expires_at >= now]
+        removed = len(self.expires_at) - len(keep)
+        if removed:
+            self.vectors = [self.vectors[i] for i in keep]
+            self.responses = [self.responses[i] for i in keep]
+            self.expires_at = [self.expires_at[i] for i in keep]
+            self._matrix = None
+        return removed
+
+    def best_match(self, vector: np.ndarray) -> Tuple[int, float]:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors)
+        similarities = self._matrix @ vector
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by (tenant_id, mask policy, filters) with cosine
+    similarity lookup inside each scope. Entries never cross scopes, so
+    masking and RLS decisions cannot leak between users.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_entries_per_scope: Optional[int] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.similarity_threshold = similarity_threshold or settings.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        self.max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+        self.max_entries_per_scope = max_entries_per_scope or settings.ANSWER_CACHE_MAX_ENTRIES_PER_SCOPE
+        self.ttl_seconds = ttl_seconds or settings.ANSWER_CACHE_TTL_SECONDS
+
+        self._scopes: "OrderedDict[ScopeKey, _ScopeEntries]" = OrderedDict()
+        self._tenant_scopes: Dict[str, Set[ScopeKey]] = {}
+        self._size = 0
+
+    @staticmethod
+    def scope_key(
+        tenant_id: str,
+        mask_policy: Optional[MaskPolicy],
+        filters: Optional[Dict[str, Any]],
+        variant: Optional[Dict[str, Any]] = None
+    ) -> ScopeKey:
+        """`variant` carries request options that change the response (result count, sources)"""
+        policy_json = mask_policy.model_dump_json() if mask_policy else ""
+        filters_json = json.dumps(
+            {"filters": filters or {}, "variant": variant or {}}, sort_keys=True, default=str
+        )
+        return (
+            tenant_id,
+            hashlib.sha256(policy_json.encode("utf-8")).hexdigest(),
+            hashlib.sha256(filters_json.encode("utf-8")).hexdigest(),
+        )
+
+    def get(self, scope: ScopeKey, query_vector: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return the cached response closest to the query if above threshold"""
+        entries = self._scopes.get(scope)
+        if entries is not None:
+            self._size -= entries.prune_expired(time.monotonic())
+            if len(entries) == 0:
+                self._remove_scope(scope)
+                entries = None
+
+        if entries is None:
+            ANSWER_CACHE_MISSES.inc()
+            ANSWER_CACHE_SIZE.set(self._size)
+            return None
+
+        index, similarity = entries.best_match(self._normalize(query_vector))
+        if similarity < self.similarity_threshold:
+            ANSWER_CACHE_MISSES.inc()
+            return None
+
+        self._scopes.move_to_end(scope)
+        ANSWER_CACHE_HITS.inc()
+        logger.debug(f"Answer cache hit (similarity={similarity:.4f})")
+        return entries.responses[index]
+
+    def put(self, scope: ScopeKey, query_vector: np.ndarray, response: Dict[str, Any]) -> None:
+        entries = self._scopes.get(scope)
+        if entries is None:
+            entries = _ScopeEntries()
+            self._scopes[scope] = entries
+            self._tenant_scopes.setdefault(scope[0], set()).add(scope)
+
+        entries.add(self._normalize(query_vector), response, time.monotonic() + self.ttl_seconds)
+        self._size += 1
+        if len(entries) > self.max_entries_per_scope:
+            entries.drop_oldest()
+            self._size -= 1
+        self._scopes.move_to_end(scope)
+
+        # Evict least recently used scopes until within the global bound
+        while self._size > self.max_entries and self._scopes:
+            oldest = next(iter(self._scopes))
+            self._remove_scope(oldest)
+        ANSWER_CACHE_SIZE.set(self._size)
+
+    def invalidate_tenant(self, tenant_id: str) -> None:
+        """Drop every cached answer for a tenant (after uploads or reindexing)"""
+        for scope in list(self._tenant_scopes.get(tenant_id, ())):
+            self._remove_scope(scope)
+        ANSWER_CACHE_INVALIDATIONS.inc()
+        ANSWER_CACHE_SIZE.set(self._size)
+        logger.info(f"Answer cache invalidated for tenant {tenant_id}")
+
+    def clear(self) -> None:
+        self._scopes.clear()
+        self._tenant_scopes.clear()
+        self._size = 0
+        ANSWER_CACHE_SIZE.set(0)
+
+    def _remove_scope(self, scope: ScopeKey) -> None:
+        entries = self._scopes.pop(scope, None)
+        if entries is not None:
+            self._size -= len(entries)
+        tenant_scopes = self._tenant_scopes.get(scope[0])
+        if tenant_scopes is not None:
+            tenant_scopes.discard(scope)
+            if not tenant_scopes:
+                del self._tenant_scopes[scope[0]]
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
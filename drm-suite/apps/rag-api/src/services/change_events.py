@@ -0,0 +1,535 @@
+"""
+Document change events
+Consumes CRM document create/update/delete events in micro-batches (Kafka, or
+in-memory for tests and benchmarks) and applies only the resulting chunk changes
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import random
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from ..core.metrics import (
+    CHANGE_BATCH_EVENTS,
+    CHANGE_BATCH_SECONDS,
+    CHANGE_CHUNKS,
+    CHANGE_COMMIT_FAILURES,
+    CHANGE_CONSUMER_LAG,
+    CHANGE_EVENT_DELAY_SECONDS,
+    CHANGE_EVENTS,
+)
+from ..models.schemas import DocumentUpload
+from .ingestion import IngestionPipeline, validate_file_url
+
+logger = logging.getLogger(__name__)
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Event types published by the CRM
+EVENT_OPS = {"document.created": UPSERT, "document.updated": UPSERT, "document.deleted": DELETE}
+
+TopicPartition = Tuple[str, int]
+TenantCallback = Callable[[str], Awaitable[Any]]
+
+
+@dataclass
+class EventRecord:
+    """One message as read from the broker"""
+
+    topic: str
+    partition: int
+    offset: int
+    key: Optional[bytes]
+    value: bytes
+    timestamp: float  # producer time, seconds since the epoch
+
+
+@dataclass
+class DocumentChange:
+    op: str
+    company_id: str
+    document_id: str
+    document: Optional[DocumentUpload]
+    record: EventRecord
+    produced_at: float
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.company_id, self.document_id
+
+
+def parse_change(record: EventRecord) -> DocumentChange:
+    """
+    Decode {"type": "document.updated", "company_id", "document_id", "document": {DocumentUpload fields}}.
+    Raises ValueError for events that can never be applied.
+    """
+    data = json.loads(record.value)
+    if not isinstance(data, dict):
+        raise ValueError("event is not a JSON object")
+    op = EVENT_OPS.get(data.get("type"))
+    if op is None:
+        raise ValueError(f"unknown event type {data.get('type')!r}")
+    company_id, document_id = data.get("company_id"), data.get("document_id")
+    if not company_id or not document_id:
+        raise ValueError("company_id and document_id are required")
+
+    document = None
+    if op == UPSERT:
+        # The tenant comes from the event envelope, never from the payload
+        document = DocumentUpload(**{**(data.get("document") or {}), "company_id": company_id})
+        validate_file_url(document.file_url)
+    return DocumentChange(op, str(company_id), str(document_id), document, record, record.timestamp)
+
+
+def coalesce(changes: List[DocumentChange]) -> List[DocumentChange]:
+    """Keep only the last change per document; its delay is measured from the first"""
+    latest: Dict[Tuple[str, str], DocumentChange] = {}
+    for change in changes:
+        previous = latest.get(change.key)
+        if previous is not None:
+            CHANGE_EVENTS.labels(op=previous.op, result="coalesced").inc()
+            change.produced_at = min(change.produced_at, previous.produced_at)
+        latest[change.key] = change
+    return list(latest.values())
+
+
+def next_offsets(records: List[EventRecord]) -> Dict[TopicPartition, int]:
+    """Offsets to commit: one past the last record read from each partition"""
+    offsets: Dict[TopicPartition, int] = {}
+    for record in records:
+        key = (record.topic, record.partition)
+        offsets[key] = max(offsets.get(key, 0), record.offset + 1)
+    return offsets
+
+
+class CommitFailed(Exception):
+    """The group rebalanced before offsets were committed; the events will be read again"""
+
+
+class EventSource:
+    """One consumer-group member on the change topic; offsets are committed explicitly"""
+
+    async def poll(self, timeout: float, max_records: int) -> List[EventRecord]:
+        """Up to max_records events, waiting at most `timeout` seconds for the first"""
+        raise NotImplementedError
+
+    async def commit(self, offsets: Dict[TopicPartition, int]) -> None:
+        """Commit the next offset to read per partition; raises CommitFailed after a rebalance"""
+        raise NotImplementedError
+
+    async def rewind(self) -> None:
+        """Seek back to the committed offsets so uncommitted events are read again"""
+        raise NotImplementedError
+
+    async def dead_letter(self, record: EventRecord, error: str) -> None:
+        """Park an event that keeps failing so the partition can move on"""
+        raise NotImplementedError
+
+    async def lag(self) -> Dict[TopicPartition, int]:
+        """Events not yet committed, per assigned partition"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class KafkaEventSource(EventSource):
+    """
+    kafka-python consumer with auto-commit off. The client is not thread-safe,
+    so every call runs on one dedicated thread instead of the event loop.
+    A poll returns at most one batch, and the poll interval covers applying it.
+    """
+
+    def __init__(
+        self,
+        topic: Optional[str] = None,
+        group_id: Optional[str] = None,
+        bootstrap_servers: Optional[List[str]] = None
+    ):
+        from kafka import KafkaConsumer
+
+        self.topic = topic or settings.CHANGE_EVENTS_TOPIC
+        self.bootstrap_servers = bootstrap_servers or settings.KAFKA_BOOTSTRAP_SERVERS
+        self.consumer = KafkaConsumer(
+            self.topic,
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=group_id or settings.CHANGE_EVENTS_GROUP_ID,
+            enable_auto_commit=False,
+            auto_offset_reset="earliest",
+            max_poll_records=settings.CHANGE_EVENTS_BATCH_SIZE,
+            max_poll_interval_ms=int(settings.CHANGE_EVENTS_MAX_POLL_INTERVAL_SECONDS * 1000)
+        )
+        self._producer = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="change-events")
+
+    async def _call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def poll(self, timeout: float, max_records: int) -> List[EventRecord]:
+        batches = await self._call(self.consumer.poll, timeout_ms=int(timeout * 1000), max_records=max_records)
+        return [
+            EventRecord(
+                topic=partition.topic,
+                partition=partition.partition,
+                offset=message.offset,
+                key=message.key,
+                value=message.value,
+                timestamp=message.timestamp / 1000 if message.timestamp and message.timestamp > 0 else time.time()
+            )
+            for partition, messages in batches.items()
+            for message in messages
+        ]
+
+    async def commit(self, offsets: Dict[TopicPartition, int]) -> None:
+        from kafka import TopicPartition as KafkaTopicPartition
+        from kafka.errors import CommitFailedError
+        from kafka.structs import OffsetAndMetadata
+
+        try:
+            await self._call(self.consumer.commit, {
+                KafkaTopicPartition(topic, partition): OffsetAndMetadata(offset, None)
+                for (topic, partition), offset in offsets.items()
+            })
+        except CommitFailedError as e:
+            raise CommitFailed(str(e)) from e
+
+    async def rewind(self) -> None:
+        await self._call(self._rewind)
+
+    def _rewind(self) -> None:
+        for partition in self.consumer.assignment():
+            committed = self.consumer.committed(partition)
+            if committed is None:
+                self.consumer.seek_to_beginning(partition)
+            else:
+                self.consumer.seek(partition, committed)
+
+    async def dead_letter(self, record: EventRecord, error: str) -> None:
+        await self._call(self._send_dead_letter, record, error)
+
+    def _send_dead_letter(self, record: EventRecord, error: str) -> None:
+        if self._producer is None:
+            from kafka import KafkaProducer
+            self._producer = KafkaProducer(bootstrap_servers=self.bootstrap_servers, acks="all")
+        self._producer.send(
+            settings.CHANGE_EVENTS_DEAD_LETTER_TOPIC,
+            key=record.key,
+            value=record.value,
+            headers=[
+                ("error", error.encode("utf-8")[:1024]),
+                ("source", f"{record.topic}/{record.partition}/{record.offset}".encode("utf-8")),
+            ]
+        ).get(timeout=30)
+
+    async def lag(self) -> Dict[TopicPartition, int]:
+        return await self._call(self._lag)
+
+    def _lag(self) -> Dict[TopicPartition, int]:
+        partitions = list(self.consumer.assignment())
+        if not partitions:
+            return {}
+        end_offsets = self.consumer.end_offsets(partitions)
+        return {
+            (partition.topic, partition.partition): max(0, end_offsets[partition] - (self.consumer.committed(partition) or 0))
+            for partition in partitions
+        }
+
+    async def close(self) -> None:
+        await self._call(self.consumer.close)
+        if self._producer is not None:
+            await self._call(self._producer.close)
+        self._executor.shutdown(wait=False)
+
+
+class InMemoryBroker:
+    """
+    Partitioned append-only topics with committed offsets per consumer group,
+    standing in for Kafka in tests and benchmarks. Messages are partitioned by
+    key, so one document's events stay in order as with Kafka's partitioner.
+    """
+
+    def __init__(self, partitions: int = 4):
+        self.partitions = partitions
+        self._logs: Dict[str, List[List[EventRecord]]] = {}
+        self._committed: Dict[Tuple[str, str, int], int] = {}
+        self._wakeups: Set[asyncio.Event] = set()
+
+    def produce(self, topic: str, key: str, value: Any, timestamp: Optional[float] = None) -> EventRecord:
+        """Append one event (dicts are JSON-encoded) and wake waiting consumers"""
+        if not isinstance(value, bytes):
+            value = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        key_bytes = key.encode("utf-8")
+        partition = zlib.crc32(key_bytes) % self.partitions
+        log = self.log(topic)[partition]
+        record = EventRecord(topic, partition, len(log), key_bytes, value, timestamp or time.time())
+        log.append(record)
+        for wakeup in self._wakeups:
+            wakeup.set()
+        return record
+
+    def log(self, topic: str) -> List[List[EventRecord]]:
+        return self._logs.setdefault(topic, [[] for _ in range(self.partitions)])
+
+    def committed(self, group_id: str, topic: str, partition: int) -> int:
+        return self._committed.get((group_id, topic, partition), 0)
+
+    def commit(self, group_id: str, topic: str, partition: int, offset: int) -> None:
+        key = (group_id, topic, partition)
+        self._committed[key] = max(self._committed.get(key, 0), offset)
+
+    def consumer(self, topic: str, group_id: str) -> "InMemoryEventSource":
+        return InMemoryEventSource(self, topic, group_id)
+
+
+class InMemoryEventSource(EventSource):
+    """
+    The only member of its group, reading every partition from the group's
+    committed offsets. A new source after a crash therefore sees uncommitted
+    events again, as with Kafka.
+    """
+
+    def __init__(self, broker: InMemoryBroker, topic: str, group_id: str):
+        self.broker = broker
+        self.topic = topic
+        self.group_id = group_id
+        self._positions = [broker.committed(group_id, topic, partition) for partition in range(broker.partitions)]
+        self._wakeup = asyncio.Event()
+        broker._wakeups.add(self._wakeup)
+
+    async def poll(self, timeout: float, max_records: int) -> List[EventRecord]:
+        self._wakeup.clear()
+        records = self._read(max_records)
+        if not records:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+            records = self._read(max_records)
+        return records
+
+    def _read(self, max_records: int) -> List[EventRecord]:
+        records: List[EventRecord] = []
+        for partition, log in enumerate(self.broker.log(self.topic)):
+            taken = log[self._positions[partition]:self._positions[partition] + max_records - len(records)]
+            records.extend(taken)
+            self._positions[partition] += len(taken)
+        return records
+
+    async def commit(self, offsets: Dict[TopicPartition, int]) -> None:
+        for (topic, partition), offset in offsets.items():
+            self.broker.commit(self.group_id, topic, partition, offset)
+
+    async def rewind(self) -> None:
+        self._positions = [
+            self.broker.committed(self.group_id, self.topic, partition) for partition in range(self.broker.partitions)
+        ]
+
+    async def dead_letter(self, record: EventRecord, error: str) -> None:
+        key = (record.key or b"").decode("utf-8")
+        self.broker.produce(settings.CHANGE_EVENTS_DEAD_LETTER_TOPIC, key, record.value, record.timestamp)
+
+    async def lag(self) -> Dict[TopicPartition, int]:
+        return {
+            (self.topic, partition): len(log) - self.broker.committed(self.group_id, self.topic, partition)
+            for partition, log in enumerate(self.broker.log(self.topic))
+        }
+
+    async def close(self) -> None:
+        self.broker._wakeups.discard(self._wakeup)
+
+
+def create_event_source() -> EventSource:
+    """Kafka when CHANGE_EVENTS_BACKEND=kafka, otherwise a process-local broker nothing else publishes to"""
+    if settings.CHANGE_EVENTS_BACKEND == "kafka":
+        return KafkaEventSource()
+    return InMemoryBroker().consumer(settings.CHANGE_EVENTS_TOPIC, settings.CHANGE_EVENTS_GROUP_ID)
+
+
+class DocumentChangeConsumer:
+    """
+    Reads change events in micro-batches (CHANGE_EVENTS_BATCH_SIZE events, or
+    CHANGE_EVENTS_WINDOW_SECONDS after the first one) and keeps only the last
+    change per document. Deletes remove the document's chunks; creates and
+    updates go through IngestionPipeline.reindex_document, so only chunks whose
+    content hash changed are embedded.
+
+    Offsets are committed after the whole batch is applied (at-least-once).
+    Both operations are idempotent, so a redelivered batch converges to the
+    same index. If the group rebalanced while a batch was applied, the commit
+    fails and the batch is read again; the batch size is then halved so the
+    next batches finish within the poll interval. Producers must key events
+    by document_id so one document's events are read in order.
+    """
+
+    def __init__(
+        self,
+        source: EventSource,
+        pipeline: IngestionPipeline,
+        on_tenant_changed: Optional[TenantCallback] = None,
+        batch_size: Optional[int] = None,
+        window_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None
+    ):
+        self.source = source
+        self.pipeline = pipeline
+        self.on_tenant_changed = on_tenant_changed
+        self.batch_size = batch_size or settings.CHANGE_EVENTS_BATCH_SIZE
+        self.window_seconds = window_seconds if window_seconds is not None else settings.CHANGE_EVENTS_WINDOW_SECONDS
+        self.max_attempts = max_attempts or settings.CHANGE_EVENTS_MAX_ATTEMPTS
+        self._slots = asyncio.Semaphore(settings.CHANGE_EVENTS_CONCURRENCY)
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        """Consume until stop() is called; the batch in progress is finished first"""
+        logger.info(f"Change consumer started (batch {self.batch_size}, window {self.window_seconds}s)")
+        lag_task = asyncio.create_task(self._report_lag_periodically())
+        try:
+            while not self._stopping.is_set():
+                records = await self.next_batch()
+                if not records:
+                    continue
+                try:
+                    await self.process(records)
+                except Exception as e:
+                    logger.error(f"Change batch failed, re-reading from the last commit: {str(e)}")
+                    await self.source.rewind()
+                    await asyncio.sleep(settings.INGEST_RETRY_BASE_DELAY)
+        finally:
+            lag_task.cancel()
+            await asyncio.gather(lag_task, return_exceptions=True)
+            logger.info("Change consumer stopped")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def next_batch(self) -> List[EventRecord]:
+        """Wait for a first event, then collect until the batch is full or the window closes"""
+        records = await self.source.poll(self.window_seconds, self.batch_size)
+        if not records:
+            return records
+        deadline = time.monotonic() + self.window_seconds
+        while len(records) < self.batch_size and not self._stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            records += await self.source.poll(remaining, self.batch_size - len(records))
+        return records
+
+    async def process(self, records: List[EventRecord]) -> Dict[str, int]:
+        """Apply one micro-batch and commit its offsets; returns event and chunk counts"""
+        started = time.perf_counter()
+        CHANGE_BATCH_EVENTS.observe(len(records))
+        stats: Dict[str, int] = defaultdict(int)
+        stats["events"] = len(records)
+
+        changes: List[DocumentChange] = []
+        for record in records:
+            try:
+                changes.append(parse_change(record))
+            except ValueError as e:
+                # Retrying cannot fix a malformed event; park it instead of blocking the partition
+                logger.warning(f"Invalid change event {record.topic}/{record.partition}/{record.offset}: {str(e)}")
+                CHANGE_EVENTS.labels(op="unknown", result="invalid").inc()
+                await self.source.dead_letter(record, str(e))
+                stats["invalid"] += 1
+
+        pending = coalesce(changes)
+        stats["coalesced"] = len(changes) - len(pending)
+        outcomes = await asyncio.gather(*[self._apply_with_retry(change) for change in pending])
+
+        tenants: Set[str] = set()
+        for change, (counts, error) in zip(pending, outcomes):
+            if error is not None:
+                await self.source.dead_letter(change.record, error)
+                stats["failed"] += 1
+                continue
+            stats["applied"] += 1
+            tenants.add(change.company_id)
+            for result, count in counts.items():
+                stats[f"chunks_{result}"] += count
+
+        try:
+            await self.source.commit(next_offsets(records))
+        except CommitFailed as e:
+            CHANGE_COMMIT_FAILURES.inc()
+            self.batch_size = max(1, self.batch_size // 2)
+            logger.warning(
+                f"Change batch of {len(records)} events applied but not committed, "
+                f"reading again with batches of {self.batch_size}: {str(e)}"
+            )
+            await self.source.rewind()
+            stats["uncommitted"] = len(records)
+        for company_id in sorted(tenants):
+            await self._notify(company_id)
+        await self.report_lag()
+
+        CHANGE_BATCH_SECONDS.observe(time.perf_counter() - started)
+        logger.info(f"Applied change batch: {dict(stats)}")
+        return dict(stats)
+
+    async def apply(self, change: DocumentChange) -> Dict[str, int]:
+        """Apply one change; repeating it leaves the index unchanged"""
+        if change.op == DELETE:
+            deleted = await self.pipeline.vector_store.delete_document(change.company_id, change.document_id)
+            return {"deleted": deleted}
+        return await self.pipeline.reindex_document(change.document, change.document_id)
+
+    async def _apply_with_retry(self, change: DocumentChange) -> Tuple[Dict[str, int], Optional[str]]:
+        """Exponential backoff with full jitter; returns (chunk counts, final error)"""
+        async with self._slots:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    counts = await self.apply(change)
+                    break
+                except Exception as e:
+                    if attempt >= self.max_attempts:
+                        logger.error(
+                            f"Change {change.op} of {change.document_id} failed after {attempt} attempts: {str(e)}"
+                        )
+                        CHANGE_EVENTS.labels(op=change.op, result="failed").inc()
+                        return {}, str(e)
+                    delay = random.uniform(
+                        0, min(settings.INGEST_RETRY_MAX_DELAY, settings.INGEST_RETRY_BASE_DELAY * 2 ** attempt)
+                    )
+                    logger.warning(
+                        f"Change {change.op} of {change.document_id} failed (attempt {attempt}), "
+                        f"retrying in {delay:.1f}s: {str(e)}"
+                    )
+                    await asyncio.sleep(delay)
+
+        CHANGE_EVENTS.labels(op=change.op, result="applied").inc()
+        CHANGE_EVENT_DELAY_SECONDS.observe(max(0.0, time.time() - change.produced_at))
+        for result, count in counts.items():
+            CHANGE_CHUNKS.labels(result=result).inc(count)
+        return counts, None
+
+    async def _notify(self, company_id: str) -> None:
+        if self.on_tenant_changed is None:
+            return
+        try:
+            await self.on_tenant_changed(company_id)
+        except Exception as e:
+            logger.warning(f"Tenant change notification for {company_id} failed: {str(e)}")
+
+    async def report_lag(self) -> None:
+        try:
+            for (topic, partition), lag in (await self.source.lag()).items():
+                CHANGE_CONSUMER_LAG.labels(topic=topic, partition=str(partition)).set(lag)
+        except Exception as e:
+            logger.warning(f"Consumer lag check failed: {str(e)}")
+
+    async def _report_lag_periodically(self) -> None:
+        # Keeps lag current while a long batch is being applied
+        while True:
+            await self.report_lag()
+            await asyncio.sleep(settings.CHANGE_EVENTS_LAG_INTERVAL)
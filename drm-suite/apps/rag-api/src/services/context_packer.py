@@ -0,0 +1,139 @@
+"""
+Token-budgeted context packing
+Selects, deduplicates and truncates retrieved chunks to fit a model budget
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain.schema import Document
+
+from ..core.config import settings
+
+# Joins context blocks in the prompt; its tokens count against the budget too
+CONTEXT_SEPARATOR = "\\n\\n"
+
+
+def format_context_block(doc: Document) -> str:
+    """Render one retrieved chunk as it appears in the prompt"""
+    return f"[出典: {doc.metadata.get('file_name', '不明')}]\\n{doc.page_content}"
+
+
+@dataclass
+class PackedContext:
+    documents: List[Document] = field(default_factory=list)
+    token_count: int = 0
+    dropped: int = 0
+    truncated: int = 0
+    deduplicated_chars: int = 0
+
+
+class ContextPacker:
+    """
+    Packs best-first retrieved chunks into a token budget.
+
+    - exact duplicate chunks are dropped, and text that overlaps an already
+      selected chunk of the same document (CHUNK_OVERLAP) is trimmed
+    - a chunk that does not fit is truncated if enough budget is left, or
+      skipped so that smaller chunks further down can still be packed
+    - per-chunk token counts are cached so tiktoken runs once per chunk text
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        cache_size: Optional[int] = None,
+        min_truncated_tokens: int = 64
+    ):
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size or settings.CONTEXT_TOKEN_CACHE_SIZE
+        self.min_truncated_tokens = min_truncated_tokens
+        self._token_counts: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count_tokens(self, text: str) -> int:
+        """Token count with an LRU cache keyed by a digest of the text"""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            count = self._token_counts.get(key)
+            if count is not None:
+                self._token_counts.move_to_end(key)
+                return count
+
+        count = len(self.tokenizer.encode(text))
+        with self._lock:
+            self._token_counts[key] = count
+            if len(self._token_counts) > self.cache_size:
+                self._token_counts.popitem(last=False)
+        return count
+
+    def pack(self, query: str, documents: List[Document], budget: int) -> PackedContext:
+        """Fit documents (ranked best-first) plus the query into `budget` tokens"""
+        packed = PackedContext()
+        remaining = budget - self.count_tokens(query)
+        seen_texts = set()
+        selected_by_doc = {}
+
+        separator_tokens = self.count_tokens(CONTEXT_SEPARATOR)
+
+        for doc in documents:
+            text = doc.page_content
+            if text in seen_texts:
+                packed.dropped += 1
+                continue
+            seen_texts.add(text)
+
+            document_id = doc.metadata.get("document_id")
+            trimmed = self._trim_overlap(text, selected_by_doc.get(document_id, []))
+            if not trimmed.strip():
+                packed.dropped += 1
+                continue
+            packed.deduplicated_chars += len(text) - len(trimmed)
+
+            candidate = doc if trimmed == text else Document(page_content=trimmed, metadata=doc.metadata)
+            separator = separator_tokens if packed.documents else 0
+            tokens = self.count_tokens(format_context_block(candidate))
+
+            if separator + tokens > remaining:
+                truncated = self._truncate(candidate, remaining - separator)
+                if truncated is None:
+                    packed.dropped += 1
+                    continue
+                candidate = truncated
+                tokens = self.count_tokens(format_context_block(candidate))
+                packed.truncated += 1
+
+            packed.documents.append(candidate)
+            remaining -= separator + tokens
+            selected_by_doc.setdefault(document_id, []).append(candidate.page_content)
+
+        packed.token_count = budget - remaining
+        return packed
+
+    def _truncate(self, doc: Document, remaining: int) -> Optional[Document]:
+        header_tokens = self.count_tokens(format_context_block(Document(page_content="", metadata=doc.metadata)))
+        available = remaining - header_tokens
+        if available < self.min_truncated_tokens:
+            return None
+        tokens = self.tokenizer.encode(doc.page_content)[:available]
+        return Document(page_content=self.tokenizer.decode(tokens), metadata=doc.metadata)
+
+    @staticmethod
+    def _trim_overlap(text: str, selected: List[str]) -> str:
+        """Drop text of `text` that repeats the edge of an already selected chunk"""
+        max_overlap = settings.CHUNK_OVERLAP * 4
+        for other in selected:
+            if text in other:
+                return ""
+            limit = min(len(text), len(other), max_overlap)
+            for size in range(limit, 8, -1):
+                if other.endswith(text[:size]):
+                    text = text[size:]
+                    break
+                if text.endswith(other[:size]):
+                    text = text[:-size]
+                    break
+        return text
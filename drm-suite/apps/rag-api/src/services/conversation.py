@@ -0,0 +1,290 @@
+"""
+Conversation sessions
+Bounded per-session history: recent turns verbatim, older turns folded into a
+token-capped summary, and follow-up questions condensed before retrieval
+"""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import (
+    SESSION_BYTES,
+    SESSION_CONDENSE,
+    SESSION_HISTORY_TOKENS,
+    SESSION_SUMMARIZATIONS,
+    SESSIONS_ACTIVE,
+)
+
+logger = logging.getLogger(__name__)
+
+CONDENSE_PROMPT = """以下の会話の履歴と追加の質問を踏まえ、追加の質問を履歴を読まなくても意味が通じる独立した質問に書き換えてください。
+書き換えた質問だけを出力してください。
+
+会話の履歴:
+{history}
+
+追加の質問: {question}
+
+独立した質問:"""
+
+SUMMARY_PROMPT = """建設・リフォーム業務に関する会話の要約を更新してください。
+既存の要約に新しいやり取りの要点（対象の案件・工事、数値、決定事項、未解決の質問）を統合し、
+{max_tokens}トークン以内の日本語で出力してください。要約だけを出力してください。
+
+既存の要約:
+{summary}
+
+新しいやり取り:
+{turns}
+
+更新した要約:"""
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+
+@dataclass
+class Session:
+    key: str
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    turn_count: int = 0
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.summary or self.turns)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "Session":
+        data = json.loads(raw)
+        data["turns"] = [Turn(**turn) for turn in data.get("turns", [])]
+        return cls(**data)
+
+
+class SessionStore:
+    """
+    Sessions serialized as JSON in an in-process LRU with TTL. With Redis
+    attached, Redis is the source of truth so any worker can continue a session.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        redis_client=None,
+        redis_prefix: str = "rag:session:"
+    ):
+        self.max_sessions = max_sessions or settings.SESSION_MAX_SESSIONS
+        self.ttl_seconds = ttl_seconds or settings.SESSION_TTL_SECONDS
+        self.redis = redis_client
+        self.redis_prefix = redis_prefix
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "SessionStore":
+        """Build the store, attaching Redis when SESSION_STORE_REDIS_ENABLED is set"""
+        redis_client = None
+        if settings.SESSION_STORE_REDIS_ENABLED:
+            import redis.asyncio as aioredis
+            redis_client = aioredis.from_url(settings.REDIS_URL)
+        return cls(redis_client=redis_client)
+
+    @staticmethod
+    def make_key(tenant_id: str, user_id: Optional[str], session_id: str) -> str:
+        # Sessions are private to the user who started them
+        return f"{tenant_id}:{user_id or '-'}:{session_id}"
+
+    async def get(self, key: str) -> Optional[Session]:
+        raw = None
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.redis_prefix + key)
+            except Exception as e:
+                logger.warning(f"Session store Redis read error: {str(e)}")
+        if raw is None:
+            raw = self._get_local(key)
+        return Session.from_json(raw) if raw else None
+
+    async def put(self, session: Session) -> None:
+        raw = session.to_json()
+        SESSION_BYTES.observe(len(raw.encode("utf-8")))
+        self._entries[session.key] = (time.monotonic() + self.ttl_seconds, raw)
+        self._entries.move_to_end(session.key)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+        SESSIONS_ACTIVE.set(len(self._entries))
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.redis_prefix + session.key, raw, ex=int(self.ttl_seconds))
+            except Exception as e:
+                logger.warning(f"Session store Redis write error: {str(e)}")
+
+    async def delete(self, key: str) -> bool:
+        deleted = self._entries.pop(key, None) is not None
+        SESSIONS_ACTIVE.set(len(self._entries))
+        if self.redis is not None:
+            try:
+                deleted = bool(await self.redis.delete(self.redis_prefix + key)) or deleted
+            except Exception as e:
+                logger.warning(f"Session store Redis delete error: {str(e)}")
+        return deleted
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            SESSIONS_ACTIVE.set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        return raw
+
+
+class ConversationManager:
+    """
+    Keeps each session within a fixed token footprint: at most
+    `max_recent_turns` verbatim turns within `recent_token_budget`, each turn
+    capped at `turn_max_tokens`, plus a summary of everything older capped at
+    `summary_max_tokens`. The history added to a prompt is therefore bounded
+    no matter how long the conversation runs.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        llm_gateway,
+        tokenizer,
+        provider: Optional[str] = None,
+        max_recent_turns: Optional[int] = None,
+        recent_token_budget: Optional[int] = None,
+        summary_max_tokens: Optional[int] = None,
+        turn_max_tokens: Optional[int] = None
+    ):
+        self.store = store
+        self.llm_gateway = llm_gateway
+        self.tokenizer = tokenizer
+        self.provider = provider or settings.SESSION_LLM_PROVIDER
+        self.max_recent_turns = max_recent_turns or settings.SESSION_MAX_RECENT_TURNS
+        self.recent_token_budget = recent_token_budget or settings.SESSION_RECENT_TOKEN_BUDGET
+        self.summary_max_tokens = summary_max_tokens or settings.SESSION_SUMMARY_MAX_TOKENS
+        self.turn_max_tokens = turn_max_tokens or settings.SESSION_TURN_MAX_TOKENS
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @property
+    def max_history_tokens(self) -> int:
+        """Upper bound on history_text() tokens, reserved out of the context budget"""
+        # The newest turn is always kept verbatim, even when it alone exceeds the recent budget
+        recent = max(self.recent_token_budget, 2 * self.turn_max_tokens)
+        return self.summary_max_tokens + recent + 16 * (self.max_recent_turns + 1)
+
+    async def load(self, tenant_id: str, user_id: Optional[str], session_id: str) -> Session:
+        key = SessionStore.make_key(tenant_id, user_id, session_id)
+        return await self.store.get(key) or Session(key=key)
+
+    def history_text(self, session: Session) -> str:
+        lines = []
+        if session.summary:
+            lines.append(f"これまでの要約: {session.summary}")
+        for turn in session.turns:
+            lines.append(f"ユーザー: {turn.question}")
+            lines.append(f"アシスタント: {turn.answer}")
+        return "\n".join(lines)
+
+    def history_tokens(self, history: str) -> int:
+        tokens = len(self.tokenizer.encode(history)) if history else 0
+        SESSION_HISTORY_TOKENS.observe(tokens)
+        return tokens
+
+    async def condense(self, session: Session, question: str) -> str:
+        """Rewrite a follow-up into a standalone question for retrieval"""
+        if not session.has_history:
+            SESSION_CONDENSE.labels(outcome="skipped").inc()
+            return question
+        try:
+            condensed = (await self.llm_gateway.ainvoke(
+                CONDENSE_PROMPT.format(history=self.history_text(session), question=question),
+                self.provider
+            )).strip()
+        except Exception as e:
+            logger.warning(f"Query condensation failed, using the raw follow-up: {str(e)}")
+            SESSION_CONDENSE.labels(outcome="error").inc()
+            return question
+        # A rewrite that is empty or rambles is worse for retrieval than the original
+        if not condensed or len(self.tokenizer.encode(condensed)) > self.turn_max_tokens:
+            SESSION_CONDENSE.labels(outcome="rejected").inc()
+            return question
+        SESSION_CONDENSE.labels(outcome="condensed").inc()
+        return condensed
+
+    async def record(self, key: str, question: str, answer: str) -> None:
+        """Append a turn and fold the oldest turns into the summary when over budget"""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        async with lock:
+            # Re-read: another turn of this session may have been recorded meanwhile
+            session = await self.store.get(key) or Session(key=key)
+            session.turns.append(Turn(
+                self._truncate(question, self.turn_max_tokens),
+                self._truncate(answer, self.turn_max_tokens)
+            ))
+            session.turn_count += 1
+
+            folded: List[Turn] = []
+            while len(session.turns) > 1 and (
+                len(session.turns) > self.max_recent_turns
+                or self._turn_tokens(session.turns) > self.recent_token_budget
+            ):
+                folded.append(session.turns.pop(0))
+            if folded:
+                session.summary = await self._summarize(session.summary, folded)
+            await self.store.put(session)
+
+    async def clear(self, tenant_id: str, user_id: Optional[str], session_id: str) -> bool:
+        return await self.store.delete(SessionStore.make_key(tenant_id, user_id, session_id))
+
+    async def _summarize(self, summary: str, turns: List[Turn]) -> str:
+        turns_text = self.history_text(Session(key="", turns=turns))
+        try:
+            updated = (await self.llm_gateway.ainvoke(
+                SUMMARY_PROMPT.format(max_tokens=self.summary_max_tokens, summary=summary or "なし", turns=turns_text),
+                self.provider
+            )).strip()
+            SESSION_SUMMARIZATIONS.labels(outcome="success").inc()
+        except Exception as e:
+            logger.warning(f"Session summarization failed, keeping the latest text: {str(e)}")
+            SESSION_SUMMARIZATIONS.labels(outcome="error").inc()
+            # Without a model, keep the most recent text that fits
+            combined = f"{summary}\n{turns_text}".strip()
+            tokens = self.tokenizer.encode(combined)
+            return self.tokenizer.decode(tokens[-self.summary_max_tokens:])
+        return self._truncate(updated, self.summary_max_tokens)
+
+    def _turn_tokens(self, turns: List[Turn]) -> int:
+        return sum(len(self.tokenizer.encode(turn.question + turn.answer)) for turn in turns)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.tokenizer.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.tokenizer.decode(tokens[:max_tokens]) + "…"
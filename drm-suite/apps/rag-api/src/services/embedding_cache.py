@@ -0,0 +1,182 @@
+"""
+Query embedding cache
+In-process LRU/TTL tier with an optional shared Redis tier
+"""
+
+import hashlib
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.metrics import (
+    EMBEDDING_CACHE_HITS,
+    EMBEDDING_CACHE_MISSES,
+    EMBEDDING_CACHE_EVICTIONS,
+    EMBEDDING_CACHE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """NFKC-normalize, lowercase and collapse whitespace (全角/半角 variants share a key)"""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query vectors keyed by model name + normalized text.
+    Vectors are held as float32 arrays; the Redis tier stores their raw bytes.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        redis_client=None,
+        redis_prefix: str = "rag:emb:"
+    ):
+        self.max_entries = max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or settings.EMBEDDING_CACHE_TTL_SECONDS
+        self.redis = redis_client
+        self.redis_prefix = redis_prefix
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+
+    @classmethod
+    def from_settings(cls) -> "EmbeddingCache":
+        """Build the cache, attaching Redis when EMBEDDING_CACHE_REDIS_ENABLED is set"""
+        redis_client = None
+        if settings.EMBEDDING_CACHE_REDIS_ENABLED:
+            import redis.asyncio as aioredis
+            redis_client = aioredis.from_url(settings.REDIS_URL)
+        return cls(redis_client=redis_client)
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        digest = hashlib.sha256(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def get_local(self, key: str) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, vector = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            EMBEDDING_CACHE_EVICTIONS.labels(reason="expired").inc()
+            EMBEDDING_CACHE_SIZE.set(len(self._entries))
+            return None
+
+        self._entries.move_to_end(key)
+        return vector
+
+    def put_local(self, key: str, vector: np.ndarray) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            EMBEDDING_CACHE_EVICTIONS.labels(reason="capacity").inc()
+        EMBEDDING_CACHE_SIZE.set(len(self._entries))
+
+    async def get(self, key: str) -> Optional[np.ndarray]:
+        """Look up the local tier, then Redis (promoting hits into the local tier)"""
+        vector = self.get_local(key)
+        if vector is not None:
+            EMBEDDING_CACHE_HITS.labels(tier="local").inc()
+            return vector
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.redis_prefix + key)
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis read error: {str(e)}")
+                raw = None
+            if raw:
+                vector = np.frombuffer(raw, dtype=np.float32)
+                self.put_local(key, vector)
+                EMBEDDING_CACHE_HITS.labels(tier="redis").inc()
+                return vector
+
+        EMBEDDING_CACHE_MISSES.inc()
+        return None
+
+    async def put(self, key: str, vector: np.ndarray) -> None:
+        self.put_local(key, vector)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.redis_prefix + key, vector.tobytes(), ex=int(self.ttl_seconds))
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis write error: {str(e)}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        EMBEDDING_CACHE_SIZE.set(0)
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+class CachedEmbeddings:
+    """
+    Drop-in wrapper around a LangChain embeddings object that caches
+    query vectors. Document embedding is passed through uncached.
+    """
+
+    def __init__(self, embedder, model: str, cache: Optional[EmbeddingCache] = None):
+        self.embedder = embedder
+        self.model = model
+        self.cache = cache or EmbeddingCache()
+
+    async def aembed_query_array(self, text: str) -> np.ndarray:
+        """Return the query vector as a float32 array, embedding on a miss"""
+        key = EmbeddingCache.make_key(self.model, text)
+        vector = await self.cache.get(key)
+        if vector is None:
+            vector = np.asarray(await self.embedder.aembed_query(text), dtype=np.float32)
+            await self.cache.put(key, vector)
+        return vector
+
+    async def aembed_queries_array(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed many queries, sending all cache misses in one embedding API call"""
+        keys = [EmbeddingCache.make_key(self.model, text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [await self.cache.get(key) for key in keys]
+
+        # Deduplicate misses so repeated questions in one batch are embedded once
+        missing: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+
+        if missing:
+            embedded = await self.embedder.aembed_documents(list(missing.values()))
+            fresh = {}
+            for key, raw in zip(missing, embedded):
+                fresh[key] = np.asarray(raw, dtype=np.float32)
+                await self.cache.put(key, fresh[key])
+            vectors = [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_query_array(text)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = EmbeddingCache.make_key(self.model, text)
+        vector = self.cache.get_local(key)
+        if vector is None:
+            vector = np.asarray(self.embedder.embed_query(text), dtype=np.float32)
+            self.cache.put_local(key, vector)
+        return vector.tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embedder.aembed_documents(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
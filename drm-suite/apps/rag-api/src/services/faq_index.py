@@ -0,0 +1,406 @@
+"""
+FAQ fast path
+Per-tenant index of admin Q&A templates and frequently asked, high-confidence
+answers from rag_query_logs, matched before retrieval and generation
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.metrics import FAQ_BUILD_SECONDS, FAQ_ENTRIES, FAQ_LOOKUPS
+from ..models.schemas import MaskPolicy, QueryFilter
+from .embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# (query, answer, retrieved_docs, confidence), newest first
+AnsweredQuery = Tuple[str, str, List[str], float]
+DocumentLister = Callable[[str], Awaitable[List[Dict[str, Any]]]]
+
+
+@dataclass
+class FAQEntry:
+    entry_id: str
+    question: str
+    answer: str
+    source: str  # "template" or "log"
+    doc_types: List[str] = field(default_factory=list)  # empty = shown regardless of allowed doc types
+    retrieved_docs: List[str] = field(default_factory=list)
+    asked: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class FAQMatch:
+    entry: Optional[FAQEntry] = None  # set when strong enough to answer directly
+    similarity: float = 0.0
+    suggestions: List[str] = field(default_factory=list)
+
+
+class FAQStore:
+    """Admin templates and answered-query history for building FAQ indexes"""
+
+    async def start(self) -> None:
+        pass
+
+    async def templates(self, tenant_id: str) -> List[FAQEntry]:
+        raise NotImplementedError
+
+    async def answered_queries(
+        self, tenant_id: str, min_confidence: float, since: datetime, limit: int
+    ) -> List[AnsweredQuery]:
+        raise NotImplementedError
+
+    async def add_template(
+        self, tenant_id: str, question: str, answer: str, doc_types: List[str], created_by: Optional[str]
+    ) -> FAQEntry:
+        raise NotImplementedError
+
+    async def delete_template(self, tenant_id: str, entry_id: str) -> bool:
+        raise NotImplementedError
+
+
+class PostgresFAQStore(FAQStore):
+    """Templates in rag_faq_templates; history from the tenant's rows in rag_query_logs"""
+
+    def __init__(
+        self,
+        connection: Callable[[], Any],
+        template_table: str = "rag_faq_templates",
+        log_table: str = "rag_query_logs"
+    ):
+        # `connection` is an async context manager factory, e.g. PGVectorStore.connection
+        self.connection = connection
+        self.template_table = template_table
+        self.log_table = log_table
+
+    async def start(self) -> None:
+        async with self.connection() as conn:
+            await conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.template_table} (
+                    id text PRIMARY KEY,
+                    company_id text NOT NULL,
+                    question text NOT NULL,
+                    answer text NOT NULL,
+                    doc_types text[] NOT NULL DEFAULT '{{}}',
+                    created_by text,
+                    created_at timestamptz NOT NULL DEFAULT now()
+                )
+            """)
+            await conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.template_table}_company_id_idx "
+                f"ON {self.template_table} (company_id)"
+            )
+
+    async def templates(self, tenant_id: str) -> List[FAQEntry]:
+        async with self.connection() as conn:
+            rows = await conn.fetch(
+                f"SELECT id, question, answer, doc_types FROM {self.template_table} "
+                f"WHERE company_id = $1 ORDER BY created_at",
+                tenant_id
+            )
+        return [
+            FAQEntry(row["id"], row["question"], row["answer"], "template", list(row["doc_types"] or []))
+            for row in rows
+        ]
+
+    async def answered_queries(
+        self, tenant_id: str, min_confidence: float, since: datetime, limit: int
+    ) -> List[AnsweredQuery]:
+        async with self.connection() as conn:
+            rows = await conn.fetch(
+                f"""
+                SELECT query, answer, retrieved_docs, confidence
+                FROM {self.log_table}
+                WHERE company_id = $1 AND confidence >= $2 AND created_at >= $3
+                ORDER BY created_at DESC
+                LIMIT $4
+                """,
+                tenant_id, min_confidence, since, limit
+            )
+        return [
+            (row["query"], row["answer"], list(row["retrieved_docs"] or []), float(row["confidence"]))
+            for row in rows
+        ]
+
+    async def add_template(
+        self, tenant_id: str, question: str, answer: str, doc_types: List[str], created_by: Optional[str]
+    ) -> FAQEntry:
+        entry = FAQEntry(f"tpl-{uuid.uuid4().hex[:12]}", question, answer, "template", list(doc_types))
+        async with self.connection() as conn:
+            await conn.execute(
+                f"INSERT INTO {self.template_table} (id, company_id, question, answer, doc_types, created_by) "
+                f"VALUES ($1, $2, $3, $4, $5, $6)",
+                entry.entry_id, tenant_id, question, answer, entry.doc_types, created_by
+            )
+        return entry
+
+    async def delete_template(self, tenant_id: str, entry_id: str) -> bool:
+        async with self.connection() as conn:
+            result = await conn.execute(
+                f"DELETE FROM {self.template_table} WHERE company_id = $1 AND id = $2",
+                tenant_id, entry_id
+            )
+        return result.split()[-1] != "0"
+
+
+class InMemoryFAQStore(FAQStore):
+    """Process-local store (tests and benchmarks)"""
+
+    def __init__(self):
+        self._templates: Dict[str, List[FAQEntry]] = {}
+        self._answered: Dict[str, List[AnsweredQuery]] = {}
+
+    def record_answer(
+        self, tenant_id: str, query: str, answer: str, retrieved_docs: List[str], confidence: float
+    ) -> None:
+        self._answered.setdefault(tenant_id, []).insert(0, (query, answer, list(retrieved_docs), confidence))
+
+    async def templates(self, tenant_id: str) -> List[FAQEntry]:
+        return list(self._templates.get(tenant_id, []))
+
+    async def answered_queries(
+        self, tenant_id: str, min_confidence: float, since: datetime, limit: int
+    ) -> List[AnsweredQuery]:
+        rows = [row for row in self._answered.get(tenant_id, []) if row[3] >= min_confidence]
+        return rows[:limit]
+
+    async def add_template(
+        self, tenant_id: str, question: str, answer: str, doc_types: List[str], created_by: Optional[str]
+    ) -> FAQEntry:
+        entry = FAQEntry(f"tpl-{uuid.uuid4().hex[:12]}", question, answer, "template", list(doc_types))
+        self._templates.setdefault(tenant_id, []).append(entry)
+        return entry
+
+    async def delete_template(self, tenant_id: str, entry_id: str) -> bool:
+        entries = self._templates.get(tenant_id, [])
+        kept = [entry for entry in entries if entry.entry_id != entry_id]
+        self._templates[tenant_id] = kept
+        return len(kept) != len(entries)
+
+
+def frequent_answers(
+    rows: Iterable[AnsweredQuery],
+    min_occurrences: int,
+    ignore_answers: Iterable[str] = ()
+) -> List[FAQEntry]:
+    """
+    Group answered queries by normalized text and keep those asked at least
+    `min_occurrences` times, most asked first, each with its newest answer
+    """
+    ignored = set(ignore_answers)
+    groups: Dict[str, FAQEntry] = {}
+    for query, answer, retrieved_docs, _ in rows:
+        if answer in ignored:
+            continue
+        key = normalize_query(query)
+        entry = groups.get(key)
+        if entry is None:
+            entry = FAQEntry(
+                f"log-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}",
+                query, answer, "log", retrieved_docs=list(retrieved_docs)
+            )
+            groups[key] = entry
+        entry.asked += 1
+    frequent = [entry for entry in groups.values() if entry.asked >= min_occurrences]
+    frequent.sort(key=lambda entry: entry.asked, reverse=True)
+    return frequent
+
+
+class _TenantFAQ:
+    def __init__(self, entries: List[FAQEntry], vectors: List[np.ndarray]):
+        self.entries = entries
+        self.matrix = np.vstack([_normalize(vector) for vector in vectors]) if vectors else None
+        self.built_at = time.monotonic()
+
+
+class FAQIndex:
+    """
+    Question vectors per tenant, matched against the query embedding. A match
+    at or above `answer_threshold` answers directly (the caller still masks it);
+    weaker matches above `suggest_threshold` are offered as suggested questions.
+    Tenants are (re)built in the background, so lookups never wait on the store.
+    """
+
+    def __init__(
+        self,
+        store: FAQStore,
+        embeddings,
+        documents: DocumentLister,
+        answer_threshold: Optional[float] = None,
+        suggest_threshold: Optional[float] = None,
+        max_suggestions: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        min_confidence: Optional[float] = None,
+        min_occurrences: Optional[int] = None,
+        log_window_days: Optional[int] = None,
+        refresh_seconds: Optional[float] = None,
+        ignore_answers: Iterable[str] = ()
+    ):
+        # `embeddings` is CachedEmbeddings; `documents` lists a tenant's document metadata
+        self.store = store
+        self.embeddings = embeddings
+        self.documents = documents
+        self.answer_threshold = answer_threshold or settings.FAQ_ANSWER_THRESHOLD
+        self.suggest_threshold = suggest_threshold or settings.FAQ_SUGGEST_THRESHOLD
+        self.max_suggestions = max_suggestions or settings.FAQ_MAX_SUGGESTIONS
+        self.max_entries = max_entries or settings.FAQ_MAX_ENTRIES_PER_TENANT
+        self.min_confidence = settings.FAQ_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.min_occurrences = min_occurrences or settings.FAQ_MIN_OCCURRENCES
+        self.log_window_days = log_window_days or settings.FAQ_LOG_WINDOW_DAYS
+        self.refresh_seconds = refresh_seconds or settings.FAQ_REFRESH_SECONDS
+        self.ignore_answers = list(ignore_answers)
+
+        self._tenants: Dict[str, _TenantFAQ] = {}
+        self._generations: Dict[str, int] = {}
+        self._builds: Dict[str, asyncio.Task] = {}
+
+    def match(
+        self,
+        tenant_id: str,
+        query_vector: np.ndarray,
+        mask_policy: Optional[MaskPolicy] = None,
+        query_filter: Optional[QueryFilter] = None
+    ) -> FAQMatch:
+        """Best visible entry for the query, and suggestions from the near misses"""
+        tenant = self._tenants.get(tenant_id)
+        if tenant is None or time.monotonic() - tenant.built_at > self.refresh_seconds:
+            self._schedule_build(tenant_id)
+        if tenant is None or tenant.matrix is None:
+            FAQ_LOOKUPS.labels(result="miss").inc()
+            return FAQMatch()
+
+        allowed = {_text(doc_type) for doc_type in mask_policy.allowed_doc_types} if mask_policy else set()
+        similarities = tenant.matrix @ _normalize(query_vector)
+        result = FAQMatch()
+        for index in np.argsort(-similarities):
+            similarity = float(similarities[index])
+            if similarity < self.suggest_threshold or len(result.suggestions) >= self.max_suggestions:
+                break
+            entry = tenant.entries[index]
+            if allowed and not set(entry.doc_types) <= allowed:
+                continue
+            if (
+                result.entry is None
+                and not result.suggestions
+                and similarity >= self.answer_threshold
+                and _answerable(entry, query_filter)
+            ):
+                result.entry, result.similarity = entry, similarity
+            elif entry.question not in result.suggestions:
+                result.suggestions.append(entry.question)
+
+        FAQ_LOOKUPS.labels(
+            result="answer" if result.entry else "suggest" if result.suggestions else "miss"
+        ).inc()
+        return result
+
+    def entries(self, tenant_id: str) -> List[FAQEntry]:
+        tenant = self._tenants.get(tenant_id)
+        return list(tenant.entries) if tenant else []
+
+    async def build_tenant(self, tenant_id: str) -> int:
+        """Load templates and history, embed the questions and swap the tenant in"""
+        generation = self._generations.get(tenant_id, 0)
+        started = time.perf_counter()
+        since = datetime.utcnow() - timedelta(days=self.log_window_days)
+        templates, answered, documents = await asyncio.gather(
+            self.store.templates(tenant_id),
+            self.store.answered_queries(tenant_id, self.min_confidence, since, self.max_entries * 50),
+            self.documents(tenant_id)
+        )
+
+        # Curated templates win over history for the same question
+        entries = list(templates)[:self.max_entries]
+        seen = {normalize_query(entry.question) for entry in entries}
+        doc_types = {metadata.get("document_id"): metadata.get("doc_type") for metadata in documents}
+        for entry in frequent_answers(answered, self.min_occurrences, self.ignore_answers):
+            if len(entries) >= self.max_entries:
+                break
+            types = [doc_types.get(document_id) for document_id in entry.retrieved_docs]
+            if not types or None in types or normalize_query(entry.question) in seen:
+                continue  # no sources, or a source document was deleted since it was answered
+            entry.doc_types = sorted({_text(doc_type) for doc_type in types})
+            entries.append(entry)
+            seen.add(normalize_query(entry.question))
+
+        vectors = await self.embeddings.aembed_queries_array([entry.question for entry in entries]) if entries else []
+        if self._generations.get(tenant_id, 0) != generation:
+            return 0  # dropped while building: documents changed, the next lookup rebuilds
+
+        self._tenants[tenant_id] = _TenantFAQ(entries, vectors)
+        self._update_size()
+        FAQ_BUILD_SECONDS.observe(time.perf_counter() - started)
+        logger.info(f"FAQ index for tenant {tenant_id}: {len(entries)} entries ({len(templates)} templates)")
+        return len(entries)
+
+    def drop_tenant(self, tenant_id: str) -> None:
+        """Forget a tenant's entries (documents or templates changed); rebuilt on next lookup"""
+        self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+        if self._tenants.pop(tenant_id, None) is not None:
+            self._update_size()
+
+    async def close(self) -> None:
+        for task in list(self._builds.values()):
+            task.cancel()
+        await asyncio.gather(*self._builds.values(), return_exceptions=True)
+        self._builds.clear()
+
+    def _schedule_build(self, tenant_id: str) -> None:
+        if tenant_id in self._builds:
+            return
+
+        async def build() -> None:
+            try:
+                await self.build_tenant(tenant_id)
+            except Exception as e:
+                logger.error(f"FAQ index build error for tenant {tenant_id}: {str(e)}")
+                # Serve what we had (or nothing) and retry after the refresh interval
+                previous = self._tenants.get(tenant_id)
+                self._tenants[tenant_id] = _TenantFAQ([], []) if previous is None else previous
+                self._tenants[tenant_id].built_at = time.monotonic()
+            finally:
+                self._builds.pop(tenant_id, None)
+
+        self._builds[tenant_id] = asyncio.create_task(build())
+
+    def _update_size(self) -> None:
+        counts: Dict[str, int] = {"template": 0, "log": 0}
+        for tenant in self._tenants.values():
+            for entry in tenant.entries:
+                counts[entry.source] = counts.get(entry.source, 0) + 1
+        for source, count in counts.items():
+            FAQ_ENTRIES.labels(source=source).set(count)
+
+
+def _answerable(entry: FAQEntry, query_filter: Optional[QueryFilter]) -> bool:
+    """A stored answer only stands in for a filtered query it provably satisfies"""
+    if query_filter is None:
+        return True
+    if query_filter.store_ids or query_filter.project_ids or query_filter.date_range:
+        return False
+    if query_filter.doc_types:
+        requested: Set[str] = {_text(doc_type) for doc_type in query_filter.doc_types}
+        return bool(entry.doc_types) and set(entry.doc_types) <= requested
+    return True
+
+
+def _text(value) -> str:
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
@@ -0,0 +1,639 @@
+"""
+Document ingestion pipeline
+Streams pages through parse -> chunk -> embed -> bulk insert with bounded memory
+"""
+
+import asyncio
+import codecs
+import csv
+import hashlib
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from ..core.config import settings
+from ..core.metrics import (
+    INGEST_DOCUMENTS,
+    INGEST_IN_PROGRESS,
+    INGEST_CHUNKS,
+    INGEST_RETRIES,
+    INGEST_EMBED_BATCH_SECONDS,
+)
+from ..models.schemas import DocumentType, DocumentUpload, ProcessingStatus
+
+logger = logging.getLogger(__name__)
+
+PDF_TYPES = {DocumentType.ESTIMATE_PDF, DocumentType.COST_PDF, DocumentType.CONTRACT_PDF}
+
+# Japanese text has no spaces, so sentence and clause marks are split points too
+CHUNK_SEPARATORS = ["\n\n", "\n", "。", "、", " ", ""]
+
+Page = Tuple[int, str]
+PageChunks = Tuple[int, List[str]]
+ChunkBatch = List[Tuple[str, Dict[str, Any]]]
+
+# Metadata written by the pipeline itself; anything else came from DocumentUpload.metadata
+PIPELINE_METADATA_KEYS = {
+    "document_id", "file_name", "file_url", "doc_type", "company_id", "store_id", "project_id",
+    "document_date", "chunk_index", "page_number", "content_hash",
+}
+
+
+def chunk_hash(text: str) -> str:
+    """Identity of an embedding: chunk text plus everything that shaped it"""
+    key = f"{settings.EMBEDDING_MODEL}\0{settings.CHUNK_SIZE}\0{settings.CHUNK_OVERLAP}\0{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def document_from_metadata(metadata: Dict[str, Any]) -> DocumentUpload:
+    """Rebuild the upload request from a stored chunk's metadata"""
+    return DocumentUpload(
+        file_name=metadata.get("file_name") or "",
+        file_url=metadata["file_url"],
+        file_size=0,
+        doc_type=DocumentType(metadata["doc_type"]),
+        company_id=metadata["company_id"],
+        store_id=metadata.get("store_id"),
+        project_id=metadata.get("project_id"),
+        document_date=metadata.get("document_date"),
+        metadata={k: v for k, v in metadata.items() if k not in PIPELINE_METADATA_KEYS}
+    )
+
+
+# Parsing (runs in worker processes, so everything here is module-level and picklable)
+
+@lru_cache(maxsize=8)
+def _splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=CHUNK_SEPARATORS
+    )
+
+
+def split_text(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    return [chunk for chunk in _splitter(chunk_size, chunk_overlap).split_text(text) if chunk.strip()]
+
+
+def count_pdf_pages(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def parse_pdf_pages(path: str, start: int, stop: int, chunk_size: int, chunk_overlap: int) -> List[PageChunks]:
+    """Extract and chunk pages [start, stop) of a PDF"""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [
+        (number + 1, split_text(reader.pages[number].extract_text() or "", chunk_size, chunk_overlap))
+        for number in range(start, stop)
+    ]
+
+
+def chunk_pages(pages: List[Page], chunk_size: int, chunk_overlap: int) -> List[PageChunks]:
+    return [(number, split_text(text, chunk_size, chunk_overlap)) for number, text in pages]
+
+
+def detect_encoding(path: str, sample_bytes: int = 65536) -> str:
+    """UTF-8 (with or without BOM), falling back to cp932 for Shift_JIS exports"""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+    try:
+        codecs.getincrementaldecoder("utf-8-sig")().decode(sample, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp932"
+
+
+def iter_csv_pages(path: str, rows_per_page: int) -> Iterator[Page]:
+    """Group CSV rows into pages of "column: value" lines so each chunk keeps its headers"""
+    with open(path, newline="", encoding=detect_encoding(path), errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        rows: List[str] = []
+        number = 0
+        for row in reader:
+            rows.append(" / ".join(
+                f"{header[i]}: {value}" if i < len(header) else value
+                for i, value in enumerate(row) if value
+            ))
+            if len(rows) >= rows_per_page:
+                number += 1
+                yield number, "\n".join(rows)
+                rows = []
+        if rows:
+            yield number + 1, "\n".join(rows)
+
+
+def iter_markdown_pages(path: str, max_chars: int) -> Iterator[Page]:
+    """Split Markdown at headings, capping each section at max_chars"""
+    with open(path, encoding=detect_encoding(path), errors="replace") as f:
+        lines: List[str] = []
+        size = 0
+        number = 0
+        for line in f:
+            if lines and (line.startswith("#") or size + len(line) > max_chars):
+                number += 1
+                yield number, "".join(lines)
+                lines, size = [], 0
+            lines.append(line)
+            size += len(line)
+        if lines:
+            yield number + 1, "".join(lines)
+
+
+def _take(iterator: Iterator[Page], count: int) -> List[Page]:
+    pages = []
+    for page in iterator:
+        pages.append(page)
+        if len(pages) >= count:
+            break
+    return pages
+
+
+class UnsafeFileURL(ValueError):
+    """A file_url outside the allowed document sources"""
+
+
+class FileTooLarge(ValueError):
+    """A download over MAX_FILE_SIZE_MB"""
+
+
+def _host_allowed(host: Optional[str]) -> bool:
+    host = (host or "").lower().rstrip(".")
+    for allowed in settings.INGEST_ALLOWED_URL_HOSTS.split(","):
+        allowed = allowed.strip().lower()
+        if not allowed or not host:
+            continue
+        if allowed.startswith(".") and host.endswith(allowed):
+            return True
+        if host == allowed:
+            return True
+    return False
+
+
+def validate_file_url(file_url: str, allow_local: bool = True) -> str:
+    """
+    Accept http(s) URLs on INGEST_ALLOWED_URL_HOSTS and, when
+    INGEST_LOCAL_FILE_ROOT is set, file:// URLs inside it. Returns the URL
+    (or the resolved local path); raises UnsafeFileURL for anything else.
+    """
+    parsed = urlsplit(file_url)
+    if parsed.scheme in ("http", "https"):
+        if parsed.username or parsed.password:
+            raise UnsafeFileURL("file_url must not contain credentials")
+        if not _host_allowed(parsed.hostname):
+            raise UnsafeFileURL(f"file_url host {parsed.hostname!r} is not an allowed document source")
+        return file_url
+
+    root = settings.INGEST_LOCAL_FILE_ROOT
+    if allow_local and root and parsed.scheme == "file" and parsed.netloc in ("", "localhost"):
+        root = os.path.realpath(root)
+        path = os.path.realpath(unquote(parsed.path))
+        if path.startswith(root + os.sep):
+            return path
+    raise UnsafeFileURL("file_url must be an http(s) URL on an allowed host")
+
+
+@asynccontextmanager
+async def open_local_copy(file_url: str) -> AsyncIterator[str]:
+    """
+    Yield a local path for the upload, streaming remote files to a temp file.
+    Downloads over MAX_FILE_SIZE_MB raise FileTooLarge, from Content-Length
+    when the server sends it and otherwise once that many bytes arrived.
+    """
+    checked = validate_file_url(file_url)
+    limit = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    if urlsplit(file_url).scheme == "file":
+        if os.path.getsize(checked) > limit:
+            raise FileTooLarge(f"file exceeds the {settings.MAX_FILE_SIZE_MB} MB limit")
+        yield checked
+        return
+
+    import httpx
+
+    fd, path = tempfile.mkstemp(prefix="rag-ingest-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # Redirects are followed by hand so every hop is checked against the allowed hosts
+            async with httpx.AsyncClient(timeout=60.0, follow_redirects=False) as client:
+                url = file_url
+                for _ in range(settings.INGEST_MAX_REDIRECTS + 1):
+                    async with client.stream("GET", url) as response:
+                        if response.is_redirect:
+                            url = validate_file_url(
+                                str(response.url.join(response.headers["location"])), allow_local=False
+                            )
+                            continue
+                        response.raise_for_status()
+                        declared = response.headers.get("content-length")
+                        if declared and declared.isdigit() and int(declared) > limit:
+                            raise FileTooLarge(
+                                f"file is {int(declared)} bytes, over the {settings.MAX_FILE_SIZE_MB} MB limit"
+                            )
+                        received = 0
+                        async for block in response.aiter_bytes(settings.INGEST_DOWNLOAD_CHUNK_BYTES):
+                            received += len(block)
+                            if received > limit:
+                                raise FileTooLarge(f"file exceeds the {settings.MAX_FILE_SIZE_MB} MB limit")
+                            f.write(block)
+                        break
+                else:
+                    raise UnsafeFileURL(f"file_url redirected more than {settings.INGEST_MAX_REDIRECTS} times")
+        yield path
+    finally:
+        os.unlink(path)
+
+
+@dataclass
+class IngestionProgress:
+    """Live progress of one document, served by /documents/{id}/status"""
+
+    document_id: str
+    company_id: str
+    file_name: str
+    status: ProcessingStatus = ProcessingStatus.PENDING
+    pages_total: Optional[int] = None
+    pages_done: int = 0
+    chunks_total: int = 0
+    chunks_done: int = 0
+    parsing_complete: bool = False
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+
+    @property
+    def progress(self) -> float:
+        if self.status == ProcessingStatus.COMPLETED:
+            return 1.0
+        embedded = self.chunks_done / self.chunks_total if self.chunks_total else 0.0
+        if self.parsing_complete:
+            return embedded
+        # chunks_total is still growing: scale by the share of pages parsed when known
+        parsed = self.pages_done / self.pages_total if self.pages_total else 0.0
+        return embedded * parsed
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "document_id": self.document_id,
+            "file_name": self.file_name,
+            "status": self.status.value,
+            "progress": round(self.progress, 4),
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "chunks_total_final": self.parsing_complete,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class _ReusePlan:
+    """Existing chunks of a document, matched against re-chunked text by content hash"""
+
+    def __init__(self, existing: Dict[str, Dict[str, Any]]):
+        self.by_hash: Dict[str, List[str]] = defaultdict(list)
+        self.stored_metadata = existing
+        for chunk_id, metadata in existing.items():
+            self.by_hash[metadata.get("content_hash")].append(chunk_id)
+        self.skipped = 0
+        self.metadata_updates: List[Tuple[str, Dict[str, Any]]] = []
+
+    def reuse(self, metadata: Dict[str, Any]) -> bool:
+        """Keep an unchanged chunk, refreshing its metadata if it moved"""
+        chunk_ids = self.by_hash.get(metadata["content_hash"])
+        if not chunk_ids:
+            return False
+        chunk_id = chunk_ids.pop()
+        if self.stored_metadata[chunk_id] != metadata:
+            self.metadata_updates.append((chunk_id, metadata))
+        self.skipped += 1
+        return True
+
+    def orphans(self) -> List[str]:
+        return [chunk_id for chunk_ids in self.by_hash.values() for chunk_id in chunk_ids]
+
+
+class IngestionPipeline:
+    """
+    Parses pages in a process pool, groups chunks into size-bounded batches
+    and embeds/inserts them with a fixed number of workers. Stages are
+    connected by bounded queues, so memory depends on batch size and
+    concurrency, not on file size.
+
+    `vector_store` must provide add_embeddings() and delete_document(),
+    plus chunk_metadata(), update_metadata() and delete_chunks() for
+    reindexing (PGVectorStore does).
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        vector_store=None,
+        on_complete: Optional[Callable[[str], None]] = None,
+        parse_workers: Optional[int] = None
+    ):
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.on_complete = on_complete
+        self.parse_workers = parse_workers or settings.INGEST_PARSE_WORKERS
+
+        self._executor: Optional[Executor] = None
+        self._document_slots = asyncio.Semaphore(settings.INGEST_MAX_CONCURRENT_DOCUMENTS)
+        self._embed_slots = asyncio.Semaphore(settings.INGEST_EMBED_CONCURRENCY)
+        self._progress: "OrderedDict[str, IngestionProgress]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def attach_vector_store(self, vector_store) -> None:
+        self.vector_store = vector_store
+
+    def start(self) -> None:
+        """Start the parser process pool (spawned, so workers do not inherit the event loop)"""
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Ingestion pipeline started ({self.parse_workers} parse workers)")
+
+    async def close(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Ingestion pipeline closed")
+
+    def submit(self, document: DocumentUpload, document_id: Optional[str] = None) -> IngestionProgress:
+        """Queue a document for background ingestion and return its progress record"""
+        progress = self._track(document, document_id or str(uuid.uuid4()))
+        task = asyncio.create_task(self._run(document, progress))
+        self._tasks[progress.document_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(progress.document_id, None))
+        return progress
+
+    def get_progress(self, document_id: str) -> Optional[IngestionProgress]:
+        return self._progress.get(document_id)
+
+    async def ingest(
+        self,
+        document: DocumentUpload,
+        document_id: Optional[str] = None,
+        progress: Optional[IngestionProgress] = None
+    ) -> IngestionProgress:
+        """Ingest one document end to end, raising if it fails"""
+        progress = progress or self._track(document, document_id or str(uuid.uuid4()))
+        async with self._document_slots:
+            progress.status = ProcessingStatus.PROCESSING
+            INGEST_IN_PROGRESS.inc()
+            try:
+                # Re-ingesting a document replaces its chunks
+                await self.vector_store.delete_document(document.company_id, progress.document_id)
+                async with open_local_copy(document.file_url) as path:
+                    await self._process(path, document, progress)
+                progress.status = ProcessingStatus.COMPLETED
+                INGEST_DOCUMENTS.labels(status="completed").inc()
+                logger.info(f"Ingested {progress.document_id}: {progress.chunks_done} chunks")
+            except BaseException as e:
+                progress.status = ProcessingStatus.FAILED
+                progress.error = "cancelled" if isinstance(e, asyncio.CancelledError) else str(e)
+                INGEST_DOCUMENTS.labels(status="failed").inc()
+                await self._discard_partial(document, progress)
+                raise
+            finally:
+                progress.completed_at = datetime.utcnow()
+                INGEST_IN_PROGRESS.dec()
+
+        if self.on_complete is not None:
+            self.on_complete(document.company_id)
+        return progress
+
+    async def reindex_document(self, document: DocumentUpload, document_id: str) -> Dict[str, int]:
+        """
+        Re-chunk a document and embed only chunks whose content hash is new.
+        New chunks are written before orphans are deleted, so retrieval never
+        sees the document missing.
+        """
+        progress = IngestionProgress(
+            document_id=document_id,
+            company_id=document.company_id,
+            file_name=document.file_name
+        )
+        async with self._document_slots:
+            plan = _ReusePlan(await self.vector_store.chunk_metadata(document.company_id, document_id))
+            async with open_local_copy(document.file_url) as path:
+                await self._process(path, document, progress, plan)
+            if plan.metadata_updates:
+                await self._with_retry("write", self.vector_store.update_metadata, plan.metadata_updates)
+            orphans = plan.orphans()
+            if orphans:
+                await self._with_retry("write", self.vector_store.delete_chunks, orphans)
+
+        return {"skipped": plan.skipped, "embedded": progress.chunks_done, "deleted": len(orphans)}
+
+    async def _run(self, document: DocumentUpload, progress: IngestionProgress) -> None:
+        try:
+            await self.ingest(document, progress=progress)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion failed for {progress.document_id}: {str(e)}")
+
+    def _track(self, document: DocumentUpload, document_id: str) -> IngestionProgress:
+        progress = IngestionProgress(
+            document_id=document_id,
+            company_id=document.company_id,
+            file_name=document.file_name
+        )
+        self._progress[document_id] = progress
+        self._progress.move_to_end(document_id)
+
+        # Keep a bounded history of finished documents
+        finished = (ProcessingStatus.COMPLETED, ProcessingStatus.FAILED)
+        for old_id in list(self._progress):
+            if len(self._progress) <= settings.INGEST_STATUS_RETENTION:
+                break
+            if self._progress[old_id].status in finished:
+                del self._progress[old_id]
+        return progress
+
+    async def _discard_partial(self, document: DocumentUpload, progress: IngestionProgress) -> None:
+        """Remove chunks written before a failure so retrieval never sees half a document"""
+        try:
+            await self.vector_store.delete_document(document.company_id, progress.document_id)
+        except Exception as e:
+            logger.warning(f"Could not remove partial chunks of {progress.document_id}: {str(e)}")
+
+    async def _process(
+        self,
+        path: str,
+        document: DocumentUpload,
+        progress: IngestionProgress,
+        reuse: Optional[_ReusePlan] = None
+    ) -> None:
+        concurrency = settings.INGEST_EMBED_CONCURRENCY
+        batches: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        tasks = [asyncio.create_task(self._produce(path, document, progress, batches, concurrency, reuse))]
+        tasks += [asyncio.create_task(self._embed_and_write(batches, progress)) for _ in range(concurrency)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _produce(
+        self,
+        path: str,
+        document: DocumentUpload,
+        progress: IngestionProgress,
+        batches: asyncio.Queue,
+        consumers: int,
+        reuse: Optional[_ReusePlan] = None
+    ) -> None:
+        """Group chunks into batches bounded by count and characters"""
+        base_metadata = {
+            **document.metadata,
+            "document_id": progress.document_id,
+            "file_name": document.file_name,
+            "file_url": document.file_url,
+            "doc_type": document.doc_type.value,
+            "company_id": document.company_id,
+            "store_id": document.store_id,
+            "project_id": document.project_id,
+            "document_date": (document.document_date or datetime.utcnow().date()).isoformat(),
+        }
+        batch: ChunkBatch = []
+        batch_chars = 0
+        async for page_number, chunks in self._iter_page_chunks(path, document.doc_type, progress):
+            for text in chunks:
+                metadata = {
+                    **base_metadata,
+                    "chunk_index": progress.chunks_total,
+                    "page_number": page_number,
+                    "content_hash": chunk_hash(text),
+                }
+                progress.chunks_total += 1
+                if reuse is not None and reuse.reuse(metadata):
+                    continue
+                if batch and (
+                    len(batch) >= settings.INGEST_EMBED_BATCH_SIZE
+                    or batch_chars + len(text) > settings.INGEST_EMBED_BATCH_MAX_CHARS
+                ):
+                    await batches.put(batch)
+                    batch, batch_chars = [], 0
+                batch.append((text, metadata))
+                batch_chars += len(text)
+            progress.pages_done += 1
+
+        if batch:
+            await batches.put(batch)
+        progress.parsing_complete = True
+        for _ in range(consumers):
+            await batches.put(None)
+
+    async def _iter_page_chunks(
+        self,
+        path: str,
+        doc_type: DocumentType,
+        progress: IngestionProgress
+    ) -> AsyncIterator[PageChunks]:
+        loop = asyncio.get_running_loop()
+        chunk_size, chunk_overlap = settings.CHUNK_SIZE, settings.CHUNK_OVERLAP
+
+        if doc_type in PDF_TYPES:
+            total = await loop.run_in_executor(self._executor, count_pdf_pages, path)
+            progress.pages_total = total
+            step = settings.INGEST_PDF_PAGES_PER_TASK
+            windows = iter(range(0, total, step))
+            pending: deque = deque()
+
+            def submit_next() -> None:
+                start = next(windows, None)
+                if start is not None:
+                    pending.append(loop.run_in_executor(
+                        self._executor, parse_pdf_pages, path, start, min(start + step, total),
+                        chunk_size, chunk_overlap
+                    ))
+
+            # Keep one window in flight per parse worker, in page order
+            for _ in range(self.parse_workers):
+                submit_next()
+            try:
+                while pending:
+                    pages = await pending.popleft()
+                    submit_next()
+                    for page in pages:
+                        yield page
+            finally:
+                for future in pending:
+                    future.cancel()
+            return
+
+        if doc_type == DocumentType.INVENTORY_CSV:
+            pages_iter = iter_csv_pages(path, settings.INGEST_CSV_ROWS_PER_PAGE)
+        else:
+            pages_iter = iter_markdown_pages(path, settings.INGEST_TEXT_UNIT_CHARS)
+
+        while True:
+            pages = await asyncio.to_thread(_take, pages_iter, settings.INGEST_PDF_PAGES_PER_TASK)
+            if not pages:
+                break
+            for page in await loop.run_in_executor(self._executor, chunk_pages, pages, chunk_size, chunk_overlap):
+                yield page
+
+    async def _embed_and_write(self, batches: asyncio.Queue, progress: IngestionProgress) -> None:
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                return
+            texts = [text for text, _ in batch]
+            vectors = await self._with_retry("embed", self._embed, texts)
+            await self._with_retry(
+                "write", self.vector_store.add_embeddings, texts, vectors, [metadata for _, metadata in batch]
+            )
+            progress.chunks_done += len(batch)
+            INGEST_CHUNKS.inc(len(batch))
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        # Shared across documents so concurrent uploads respect one provider limit
+        async with self._embed_slots:
+            started = time.perf_counter()
+            vectors = await self.embeddings.aembed_documents(texts)
+            INGEST_EMBED_BATCH_SECONDS.observe(time.perf_counter() - started)
+        return vectors
+
+    @staticmethod
+    async def _with_retry(stage: str, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Exponential backoff with full jitter"""
+        for attempt in range(settings.INGEST_EMBED_MAX_RETRIES + 1):
+            try:
+                return await func(*args)
+            except Exception as e:
+                if attempt >= settings.INGEST_EMBED_MAX_RETRIES:
+                    raise
+                delay = random.uniform(
+                    0, min(settings.INGEST_RETRY_MAX_DELAY, settings.INGEST_RETRY_BASE_DELAY * 2 ** attempt)
+                )
+                INGEST_RETRIES.labels(stage=stage).inc()
+                logger.warning(f"Ingestion {stage} failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {str(e)}")
+                await asyncio.sleep(delay)
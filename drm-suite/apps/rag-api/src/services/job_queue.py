@@ -0,0 +1,599 @@
+"""
+Background job queue
+Ingestion and reindex jobs with priority lanes, per-tenant fairness,
+retries and a dead-letter list (Redis, or in-memory for tests and dev)
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import (
+    JOB_ENQUEUED,
+    JOB_FINISHED,
+    JOB_RETRIES,
+    JOB_QUEUE_WAIT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Lanes in priority order: uploads someone is waiting on, then bulk work
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+COMPLETED = "completed"
+DEAD = "dead"
+
+# Job status as reported through ProcessingStatus-shaped endpoints
+PROCESSING_STATUS = {QUEUED: "pending", RUNNING: "processing", RETRYING: "pending", COMPLETED: "completed", DEAD: "failed"}
+
+TenantCallback = Callable[[str], Any]
+
+
+@dataclass
+class Job:
+    kind: str
+    company_id: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    lane: str = INTERACTIVE
+    job_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    dedupe_key: Optional[str] = None
+    status: str = QUEUED
+    attempts: int = 0
+    max_attempts: int = field(default_factory=lambda: settings.JOB_MAX_ATTEMPTS)
+    error: Optional[str] = None
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Dict[str, Any] = field(default_factory=dict)
+    enqueued_at: float = field(default_factory=time.time)
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    updated_at: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETED, DEAD)
+
+    def as_status(self) -> Dict[str, Any]:
+        """Progress reported by the worker, overlaid with queue state"""
+        return {
+            **self.progress,
+            **self.result,
+            "job_id": self.job_id,
+            "status": PROCESSING_STATUS[self.status],
+            "job_status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "Job":
+        return cls(**json.loads(raw))
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def retry_delay(attempts: int) -> float:
+    return min(settings.JOB_RETRY_MAX_DELAY, settings.JOB_RETRY_BASE_DELAY * 2 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    """
+    Lanes are served interactive-first, but after JOB_BULK_EVERY consecutive
+    interactive jobs a waiting bulk job goes next so reindexing cannot starve.
+    Within a lane, tenants are served round-robin. A dequeued job is leased;
+    if the worker dies the lease expires and the job is retried.
+    """
+
+    async def enqueue(self, job: Job) -> Job:
+        """Queue a job; with a dedupe_key, return the unfinished job already holding it"""
+        raise NotImplementedError
+
+    async def dequeue(self, timeout: Optional[float] = None) -> Optional[Job]:
+        raise NotImplementedError
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    async def heartbeat(self, job: Job) -> bool:
+        """
+        Extend the lease and publish progress. False when the lease has
+        expired or the job was re-queued since: the caller must abandon it.
+        """
+        raise NotImplementedError
+
+    async def complete(self, job: Job, result: Optional[Dict[str, Any]] = None) -> None:
+        raise NotImplementedError
+
+    async def fail(self, job: Job, error: str) -> None:
+        """Retry with exponential backoff, or dead-letter after max_attempts"""
+        raise NotImplementedError
+
+    async def release_dedupe(self, job: Job) -> None:
+        """Let a new job with the same dedupe_key be queued while this one still runs"""
+        raise NotImplementedError
+
+    async def dead_letters(self, limit: int = 100) -> List[Job]:
+        raise NotImplementedError
+
+    async def notify_tenant_changed(self, company_id: str) -> None:
+        """Tell API processes to drop per-tenant caches"""
+        raise NotImplementedError
+
+    async def watch_tenant_changes(self, callback: TenantCallback) -> None:
+        """Run `callback(company_id)` for every notification until cancelled"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    @staticmethod
+    def _record_dequeue(job: Job) -> None:
+        JOB_QUEUE_WAIT_SECONDS.labels(lane=job.lane).observe(max(0.0, time.time() - job.enqueued_at))
+
+    @staticmethod
+    def _finish(job: Job, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.updated_at = datetime.utcnow().isoformat()
+        JOB_FINISHED.labels(kind=job.kind, status=status).inc()
+
+
+class InMemoryJobQueue(JobQueue):
+    """Single-process queue with the same scheduling rules"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lanes: Dict[str, "OrderedDict[str, Deque[str]]"] = {lane: OrderedDict() for lane in LANES}
+        self._delayed: List[Tuple[float, str]] = []
+        self._leases: Dict[str, float] = {}
+        self._dedupe: Dict[str, str] = {}
+        self._dead: Deque[str] = deque()
+        # Finished job ids by finish time, forgotten after JOB_RESULT_TTL_SECONDS like Redis records
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._interactive_streak = 0
+        self._condition = asyncio.Condition()
+        self._tenant_callbacks: List[TenantCallback] = []
+
+    async def enqueue(self, job: Job) -> Job:
+        async with self._condition:
+            if job.dedupe_key is not None:
+                existing = self._jobs.get(self._dedupe.get(job.dedupe_key, ""))
+                if existing is not None and not existing.finished:
+                    return existing
+                self._dedupe[job.dedupe_key] = job.job_id
+            self._jobs[job.job_id] = job
+            self._push(job)
+            JOB_ENQUEUED.labels(kind=job.kind, lane=job.lane).inc()
+            self._condition.notify()
+        return job
+
+    def _push(self, job: Job) -> None:
+        job.status = QUEUED
+        job.enqueued_at = time.time()
+        self._lanes[job.lane].setdefault(job.company_id, deque()).append(job.job_id)
+
+    def _expire_finished(self) -> None:
+        cutoff = time.time() - settings.JOB_RESULT_TTL_SECONDS
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at > cutoff:
+                break
+            del self._finished[job_id]
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                continue  # the id was reused by a newer job
+            del self._jobs[job_id]
+            if job.status == DEAD and job_id in self._dead:
+                self._dead.remove(job_id)
+
+    def _mark_finished(self, job: Job) -> None:
+        self._finished.pop(job.job_id, None)
+        self._finished[job.job_id] = time.time()
+
+    def _pop(self) -> Optional[Job]:
+        now = time.time()
+        self._expire_finished()
+        for job_id, deadline in list(self._leases.items()):
+            if deadline <= now:
+                del self._leases[job_id]
+                self._retry_or_bury(self._jobs[job_id], "lease expired")
+        for ready_at, job_id in list(self._delayed):
+            if ready_at <= now:
+                self._delayed.remove((ready_at, job_id))
+                self._push(self._jobs[job_id])
+
+        order = LANES if self._interactive_streak < settings.JOB_BULK_EVERY else tuple(reversed(LANES))
+        for lane in order:
+            tenants = self._lanes[lane]
+            if not tenants:
+                continue
+            tenant, queue = next(iter(tenants.items()))
+            job_id = queue.popleft()
+            # Rotate the tenant to the back of the ring
+            del tenants[tenant]
+            if queue:
+                tenants[tenant] = queue
+            self._interactive_streak = self._interactive_streak + 1 if lane == INTERACTIVE else 0
+            return self._jobs[job_id]
+        return None
+
+    async def dequeue(self, timeout: Optional[float] = None) -> Optional[Job]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        async with self._condition:
+            while True:
+                job = self._pop()
+                if job is not None:
+                    job.status = RUNNING
+                    job.attempts += 1
+                    job.updated_at = datetime.utcnow().isoformat()
+                    self._leases[job.job_id] = time.time() + settings.JOB_LEASE_SECONDS
+                    self._record_dequeue(job)
+                    return job
+                wait = settings.JOB_POLL_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return None
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def heartbeat(self, job: Job) -> bool:
+        deadline = self._leases.get(job.job_id)
+        if deadline is None or deadline <= time.time() or job.status != RUNNING:
+            return False
+        self._leases[job.job_id] = time.time() + settings.JOB_LEASE_SECONDS
+        job.updated_at = datetime.utcnow().isoformat()
+        return True
+
+    async def complete(self, job: Job, result: Optional[Dict[str, Any]] = None) -> None:
+        self._leases.pop(job.job_id, None)
+        job.result = result or {}
+        self._finish(job, COMPLETED)
+        self._mark_finished(job)
+        self._drop_dedupe(job)
+
+    async def fail(self, job: Job, error: str) -> None:
+        self._leases.pop(job.job_id, None)
+        async with self._condition:
+            self._retry_or_bury(job, error)
+            self._condition.notify()
+
+    def _retry_or_bury(self, job: Job, error: str) -> None:
+        if job.attempts < job.max_attempts:
+            delay = retry_delay(job.attempts)
+            job.status = RETRYING
+            job.error = error
+            self._delayed.append((time.time() + delay, job.job_id))
+            JOB_RETRIES.labels(kind=job.kind).inc()
+            logger.warning(f"Job {job.job_id} ({job.kind}) failed, retrying in {delay:.0f}s: {error}")
+            return
+        self._finish(job, DEAD, error)
+        self._dead.appendleft(job.job_id)
+        self._mark_finished(job)
+        self._drop_dedupe(job)
+        logger.error(f"Job {job.job_id} ({job.kind}) dead-lettered after {job.attempts} attempts: {error}")
+
+    async def release_dedupe(self, job: Job) -> None:
+        self._drop_dedupe(job)
+
+    def _drop_dedupe(self, job: Job) -> None:
+        if job.dedupe_key is not None and self._dedupe.get(job.dedupe_key) == job.job_id:
+            del self._dedupe[job.dedupe_key]
+
+    async def dead_letters(self, limit: int = 100) -> List[Job]:
+        return [self._jobs[job_id] for job_id in list(self._dead)[:limit]]
+
+    async def notify_tenant_changed(self, company_id: str) -> None:
+        for callback in self._tenant_callbacks:
+            callback(company_id)
+
+    async def watch_tenant_changes(self, callback: TenantCallback) -> None:
+        self._tenant_callbacks.append(callback)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self._tenant_callbacks.remove(callback)
+
+
+# Round-robin pop across tenants of the first non-empty lane (see JobQueue).
+# The popped job is marked running and leased in the same script, so a worker
+# dying mid-dequeue leaves a lease that expires rather than a lost job. Keys
+# are built inside the script, so this targets a single Redis node rather
+# than a cluster.
+_POP_SCRIPT = """
+local prefix = ARGV[1]
+local bulk_every = tonumber(ARGV[2])
+local lease_until = ARGV[3]
+local now = ARGV[4]
+
+local function claim(job_id)
+    local key = prefix .. 'job:' .. job_id
+    if redis.call('HEXISTS', key, 'record') == 0 then
+        return false
+    end
+    redis.call('HSET', key, 'status', 'running', 'updated_at', now)
+    redis.call('HINCRBY', key, 'attempts', 1)
+    redis.call('ZADD', prefix .. 'leases', lease_until, job_id)
+    return true
+end
+
+local function pop_lane(lane)
+    local ring = prefix .. 'ring:' .. lane
+    local active = prefix .. 'active:' .. lane
+    local tenant = redis.call('LPOP', ring)
+    while tenant do
+        local queue = prefix .. 'queue:' .. lane .. ':' .. tenant
+        local job_id = redis.call('LPOP', queue)
+        if redis.call('LLEN', queue) > 0 then
+            redis.call('RPUSH', ring, tenant)
+        else
+            redis.call('SREM', active, tenant)
+        end
+        if job_id then
+            return job_id
+        end
+        tenant = redis.call('LPOP', ring)
+    end
+    return false
+end
+
+local streak = tonumber(redis.call('GET', prefix .. 'streak') or '0')
+local lanes = {'interactive', 'bulk'}
+if streak >= bulk_every then
+    lanes = {'bulk', 'interactive'}
+end
+for _, lane in ipairs(lanes) do
+    local job_id = pop_lane(lane)
+    while job_id do
+        if claim(job_id) then
+            if lane == 'interactive' then
+                redis.call('INCR', prefix .. 'streak')
+            else
+                redis.call('SET', prefix .. 'streak', 0)
+            end
+            return job_id
+        end
+        -- The record expired while queued: skip the id
+        job_id = pop_lane(lane)
+    end
+end
+return false
+"""
+
+_PUSH_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+if redis.call('SADD', KEYS[3], ARGV[2]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+end
+"""
+
+# Renew the lease and save progress only while this attempt still owns the job:
+# the lease is live and no later dequeue has claimed it (attempts unchanged)
+_HEARTBEAT_SCRIPT = """
+local lease = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not lease or tonumber(lease) <= tonumber(ARGV[3]) then
+    return 0
+end
+local state = redis.call('HMGET', KEYS[2], 'status', 'attempts')
+if state[1] ~= 'running' or state[2] ~= ARGV[4] then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('HSET', KEYS[2], 'record', ARGV[5], 'updated_at', ARGV[6])
+return 1
+"""
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Redis layout under JOB_QUEUE_PREFIX:
+    job:{id} (hash: JSON record, plus status / attempts / updated_at which
+    the dequeue script updates in place), queue:{lane}:{tenant} (job ids), ring:{lane} /
+    active:{lane} (tenant round-robin), delayed and leases (sorted sets by
+    due time), dedupe:{key}, dead (list), tenant-changed (pub/sub channel).
+    """
+
+    def __init__(self, redis_client=None, prefix: Optional[str] = None):
+        if redis_client is None:
+            import redis.asyncio as aioredis
+            redis_client = aioredis.from_url(settings.REDIS_URL)
+        self.redis = redis_client
+        self.prefix = prefix or settings.JOB_QUEUE_PREFIX
+        self._pop_script = self.redis.register_script(_POP_SCRIPT)
+        self._push_script = self.redis.register_script(_PUSH_SCRIPT)
+        self._heartbeat_script = self.redis.register_script(_HEARTBEAT_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    async def _save(self, job: Job, ttl: Optional[int] = None) -> None:
+        key = self._key("job", job.job_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "record": job.to_json(),
+                "status": job.status,
+                "attempts": job.attempts,
+                "updated_at": job.updated_at or "",
+            })
+            if ttl:
+                pipe.expire(key, ttl)
+            else:
+                pipe.persist(key)
+            await pipe.execute()
+
+    async def _push(self, job: Job) -> None:
+        job.status = QUEUED
+        job.enqueued_at = time.time()
+        await self._save(job)
+        await self._push_script(
+            keys=[
+                self._key("queue", job.lane, job.company_id),
+                self._key("ring", job.lane),
+                self._key("active", job.lane),
+            ],
+            args=[job.job_id, job.company_id]
+        )
+
+    async def enqueue(self, job: Job) -> Job:
+        if job.dedupe_key is not None:
+            dedupe = self._key("dedupe", job.dedupe_key)
+            if not await self.redis.set(dedupe, job.job_id, nx=True):
+                existing_id = await self.redis.get(dedupe)
+                existing = await self.get(_text(existing_id))
+                if existing is not None and not existing.finished:
+                    return existing
+                await self.redis.set(dedupe, job.job_id)
+        await self._push(job)
+        JOB_ENQUEUED.labels(kind=job.kind, lane=job.lane).inc()
+        return job
+
+    async def _promote_due(self) -> None:
+        """Requeue due retries and jobs whose worker stopped heartbeating"""
+        now = time.time()
+        for job_id in await self.redis.zrangebyscore(self._key("delayed"), "-inf", now, start=0, num=100):
+            # ZREM decides which worker owns the transition
+            if await self.redis.zrem(self._key("delayed"), job_id):
+                job = await self.get(_text(job_id))
+                if job is not None:
+                    await self._push(job)
+
+        for job_id in await self.redis.zrangebyscore(self._key("leases"), "-inf", now, start=0, num=100):
+            if await self.redis.zrem(self._key("leases"), job_id):
+                job = await self.get(_text(job_id))
+                if job is not None:
+                    await self._retry_or_bury(job, "lease expired")
+
+    async def dequeue(self, timeout: Optional[float] = None) -> Optional[Job]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            await self._promote_due()
+            job_id = await self._pop_script(args=[
+                self.prefix,
+                settings.JOB_BULK_EVERY,
+                time.time() + settings.JOB_LEASE_SECONDS,
+                datetime.utcnow().isoformat(),
+            ])
+            if job_id:
+                job = await self.get(_text(job_id))
+                if job is not None:
+                    self._record_dequeue(job)
+                    return job
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        raw = await self.redis.hgetall(self._key("job", job_id))
+        fields = {_text(name): _text(value) for name, value in raw.items()}
+        if "record" not in fields:
+            return None
+        job = Job.from_json(fields["record"])
+        job.status = fields.get("status") or job.status
+        job.attempts = int(fields.get("attempts") or job.attempts)
+        job.updated_at = fields.get("updated_at") or job.updated_at
+        return job
+
+    async def heartbeat(self, job: Job) -> bool:
+        job.updated_at = datetime.utcnow().isoformat()
+        renewed = await self._heartbeat_script(
+            keys=[self._key("leases"), self._key("job", job.job_id)],
+            args=[
+                job.job_id,
+                time.time() + settings.JOB_LEASE_SECONDS,
+                time.time(),
+                job.attempts,
+                job.to_json(),
+                job.updated_at,
+            ]
+        )
+        return bool(renewed)
+
+    async def complete(self, job: Job, result: Optional[Dict[str, Any]] = None) -> None:
+        await self.redis.zrem(self._key("leases"), job.job_id)
+        job.result = result or {}
+        self._finish(job, COMPLETED)
+        await self._save(job, ttl=settings.JOB_RESULT_TTL_SECONDS)
+        await self.release_dedupe(job)
+
+    async def fail(self, job: Job, error: str) -> None:
+        await self.redis.zrem(self._key("leases"), job.job_id)
+        await self._retry_or_bury(job, error)
+
+    async def _retry_or_bury(self, job: Job, error: str) -> None:
+        if job.attempts < job.max_attempts:
+            delay = retry_delay(job.attempts)
+            job.status = RETRYING
+            job.error = error
+            await self._save(job)
+            await self.redis.zadd(self._key("delayed"), {job.job_id: time.time() + delay})
+            JOB_RETRIES.labels(kind=job.kind).inc()
+            logger.warning(f"Job {job.job_id} ({job.kind}) failed, retrying in {delay:.0f}s: {error}")
+            return
+        self._finish(job, DEAD, error)
+        await self._save(job, ttl=settings.JOB_RESULT_TTL_SECONDS)
+        await self.redis.lpush(self._key("dead"), job.job_id)
+        await self.release_dedupe(job)
+        logger.error(f"Job {job.job_id} ({job.kind}) dead-lettered after {job.attempts} attempts: {error}")
+
+    async def release_dedupe(self, job: Job) -> None:
+        if job.dedupe_key is None:
+            return
+        dedupe = self._key("dedupe", job.dedupe_key)
+        holder = await self.redis.get(dedupe)
+        if holder is not None and _text(holder) == job.job_id:
+            await self.redis.delete(dedupe)
+
+    async def dead_letters(self, limit: int = 100) -> List[Job]:
+        jobs = []
+        for job_id in await self.redis.lrange(self._key("dead"), 0, limit - 1):
+            job = await self.get(_text(job_id))
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    async def notify_tenant_changed(self, company_id: str) -> None:
+        await self.redis.publish(self._key("tenant-changed"), company_id)
+
+    async def watch_tenant_changes(self, callback: TenantCallback) -> None:
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self._key("tenant-changed"))
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                callback(_text(message["data"]))
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_job_queue() -> JobQueue:
+    """Redis when JOB_QUEUE_BACKEND=redis, otherwise in-memory"""
+    if settings.JOB_QUEUE_BACKEND == "redis":
+        return RedisJobQueue()
+    return InMemoryJobQueue()
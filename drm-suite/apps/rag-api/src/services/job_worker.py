@@ -0,0 +1,171 @@
+"""
+Job worker
+Runs ingestion, reindex and ANN index build jobs from the job queue outside the request path
+"""
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set
+
+from ..core.config import settings
+from ..core.metrics import JOB_RUNNING
+from ..models.schemas import DocumentUpload
+from .job_queue import BULK, INTERACTIVE, Job, JobQueue
+
+if TYPE_CHECKING:
+    # Only workers need the pipeline; the API imports this module for the job builders
+    from .ingestion import IngestionPipeline
+    from .reindex import ReindexService
+
+logger = logging.getLogger(__name__)
+
+INGEST = "ingest"
+REINDEX = "reindex"
+ANN_BUILD = "ann_build"
+
+
+def ingest_job(document: DocumentUpload, document_id: str) -> Job:
+    """Uploads go to the interactive lane; the job id is the document id"""
+    return Job(
+        kind=INGEST,
+        company_id=document.company_id,
+        payload={"document": document.model_dump(mode="json")},
+        lane=INTERACTIVE,
+        job_id=document_id
+    )
+
+
+def reindex_job(company_id: str) -> Job:
+    """One reindex per tenant at a time, in the bulk lane"""
+    return Job(kind=REINDEX, company_id=company_id, lane=BULK, dedupe_key=f"reindex:{company_id}")
+
+
+def ann_build_job(company_id: str) -> Job:
+    """Rebuild the tenant's local ANN index; changes made while one waits share it"""
+    return Job(kind=ANN_BUILD, company_id=company_id, lane=BULK, dedupe_key=f"ann_build:{company_id}")
+
+
+class JobWorker:
+    """
+    Pulls jobs with `concurrency` slots. While a job runs, its progress is
+    copied to the queue and its lease extended every JOB_HEARTBEAT_INTERVAL;
+    if the lease was lost meanwhile, the attempt is cancelled and left to
+    whoever holds the job now.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        pipeline: "IngestionPipeline",
+        reindex_service: Optional["ReindexService"] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.queue = queue
+        self.pipeline = pipeline
+        if reindex_service is None:
+            from .reindex import ReindexService
+            reindex_service = ReindexService(pipeline)
+        self.reindex_service = reindex_service
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self._slots: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        """Process jobs until stop() is called"""
+        logger.info(f"Job worker started ({self.concurrency} slots)")
+        self._slots = {asyncio.create_task(self._slot()) for _ in range(self.concurrency)}
+        try:
+            await asyncio.gather(*self._slots)
+        finally:
+            logger.info("Job worker stopped")
+
+    async def stop(self) -> None:
+        """Stop taking jobs and cancel running ones (their leases expire and they are retried)"""
+        self._stopping.set()
+        for slot in self._slots:
+            slot.cancel()
+        await asyncio.gather(*self._slots, return_exceptions=True)
+
+    async def _slot(self) -> None:
+        while not self._stopping.is_set():
+            job = await self.queue.dequeue(timeout=settings.JOB_POLL_INTERVAL * 10)
+            if job is not None:
+                await self.handle(job)
+
+    async def handle(self, job: Job) -> None:
+        JOB_RUNNING.labels(kind=job.kind).inc()
+        work = asyncio.create_task(self._execute(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, work))
+        try:
+            result = await work
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled():
+                return  # lease lost: the job was re-queued, this attempt must not finish it
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.job_id} ({job.kind}) attempt {job.attempts} failed: {str(e)}")
+            self._copy_progress(job)
+            await self.queue.fail(job, str(e))
+            return
+        finally:
+            heartbeat.cancel()
+            JOB_RUNNING.labels(kind=job.kind).dec()
+
+        self._copy_progress(job)
+        await self.queue.complete(job, result)
+        await self.queue.notify_tenant_changed(job.company_id)
+        if job.kind in (INGEST, REINDEX):
+            await self.schedule_index_build(job.company_id)
+
+    async def schedule_index_build(self, company_id: str) -> None:
+        """With RETRIEVAL_BACKEND=ann, queue a rebuild of the tenant's index"""
+        if settings.RETRIEVAL_BACKEND != "ann":
+            return
+        try:
+            await self.queue.enqueue(ann_build_job(company_id))
+        except Exception as e:
+            logger.warning(f"Could not queue ANN index build for {company_id}: {str(e)}")
+
+    async def _execute(self, job: Job) -> Dict[str, Any]:
+        if job.kind == INGEST:
+            document = DocumentUpload(**job.payload["document"])
+            progress = await self.pipeline.ingest(document, document_id=job.job_id)
+            return {"chunks_created": progress.chunks_done}
+        if job.kind == REINDEX:
+            task = await self.reindex_service.run_task(job.job_id, job.company_id)
+            if task.error and task.documents_failed == task.documents_total and task.documents_total:
+                raise RuntimeError(task.error)
+            return task.as_dict()
+        if job.kind == ANN_BUILD:
+            from .ann_index import build_tenant_index_from_store
+
+            # Changes finishing after the export starts queue the next build
+            await self.queue.release_dedupe(job)
+            vectors = await build_tenant_index_from_store(self.pipeline.vector_store, job.company_id)
+            return {"vectors": vectors}
+        raise ValueError(f"Unknown job kind: {job.kind}")
+
+    def _copy_progress(self, job: Job) -> None:
+        if job.kind == INGEST:
+            progress = self.pipeline.get_progress(job.job_id)
+            if progress is not None:
+                job.progress = progress.as_dict()
+        elif job.kind == REINDEX:
+            task = self.reindex_service.get_task(job.job_id)
+            if task is not None:
+                job.progress = task.as_dict()
+
+    async def _heartbeat(self, job: Job, work: asyncio.Task) -> None:
+        """Runs until cancelled, or returns after cancelling `work` when the lease is lost"""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+            self._copy_progress(job)
+            try:
+                renewed = await self.queue.heartbeat(job)
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job.job_id} failed: {str(e)}")
+                continue
+            if not renewed:
+                logger.warning(f"Job {job.job_id} ({job.kind}) lost its lease; abandoning attempt {job.attempts}")
+                work.cancel()
+                return
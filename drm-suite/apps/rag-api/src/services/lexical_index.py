@@ -0,0 +1,364 @@
+"""
+Lexical retrieval for hybrid search
+Per-tenant BM25 over character bigrams (Japanese text has no spaces) plus
+whole alphanumeric tokens (part numbers, contract IDs), fused with vector
+results by reciprocal rank fusion
+"""
+
+import asyncio
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from ..core.config import settings
+from ..core.metrics import LEXICAL_INDEX_BYTES, LEXICAL_INDEX_EVICTIONS
+from .retriever import matches_filter
+
+logger = logging.getLogger(__name__)
+
+FILTER_FIELDS = ("doc_type", "store_id", "project_id")
+
+# Rough CPython sizes for the memory estimate: per posting entry, per chunk
+# (metadata and list slots) and per character of stored text
+_POSTING_BYTES = 50
+_CHUNK_BYTES = 600
+_CHAR_BYTES = 2
+
+_ALNUM_RUN = re.compile(r"[a-z0-9][a-z0-9\-_/]*[a-z0-9]|[a-z0-9]")
+_SEPARATORS = re.compile(r"[\s、。，．,.・:;：；!?！？()（）\[\]「」『』【】/\\|\"'`~]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Alphanumeric runs as whole tokens, everything else as character bigrams"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = [f"#{match}" for match in _ALNUM_RUN.findall(text)]
+    for segment in _SEPARATORS.split(_ALNUM_RUN.sub(" ", text)):
+        if len(segment) == 1:
+            tokens.append(segment)
+        tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+
+def doc_key(doc: Document) -> Tuple[Any, ...]:
+    """Stable identity of a chunk across retrievers"""
+    metadata = doc.metadata
+    if metadata.get("document_id") is not None:
+        return (metadata.get("document_id"), metadata.get("chunk_index"))
+    return (hash(doc.page_content),)
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Document]],
+    k: int,
+    rrf_k: int = 60
+) -> List[Document]:
+    """Fuse best-first lists: score(d) = sum 1 / (rrf_k + rank)"""
+    scores: Dict[Tuple[Any, ...], float] = defaultdict(float)
+    first_seen: Dict[Tuple[Any, ...], Document] = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked, start=1):
+            key = doc_key(doc)
+            scores[key] += 1.0 / (rrf_k + rank)
+            first_seen.setdefault(key, doc)
+
+    fused = sorted(scores, key=scores.get, reverse=True)[:k]
+    results = []
+    for key in fused:
+        doc = first_seen[key]
+        doc.metadata["rrf_score"] = scores[key]
+        results.append(doc)
+    return results
+
+
+class _TenantIndex:
+    """BM25 postings for one tenant; update() may run while it is being searched"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Document] = []
+        self.lengths: List[int] = []
+        self.alive: List[bool] = []
+        self.fields: Dict[str, List[str]] = {field: [] for field in FILTER_FIELDS}
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._by_key: Dict[Tuple[Any, ...], int] = {}
+        self._by_document: Dict[Any, Set[Tuple[Any, ...]]] = defaultdict(set)
+        self._arrays: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        # Approximate memory held, dead rows included until compact()
+        self.nbytes = 0
+
+    @property
+    def live_count(self) -> int:
+        return len(self._by_key)
+
+    def add(self, doc: Document) -> None:
+        key = doc_key(doc)
+        if key in self._by_key:
+            self.alive[self._by_key[key]] = False
+
+        position = len(self.documents)
+        counts = Counter(tokenize(doc.page_content))
+        for term, tf in counts.items():
+            self._postings[term][position] = tf
+        self.documents.append(doc)
+        self.lengths.append(sum(counts.values()))
+        self.alive.append(True)
+        for field in FILTER_FIELDS:
+            value = doc.metadata.get(field)
+            self.fields[field].append("" if value is None else str(value))
+        self._by_key[key] = position
+        if len(key) == 2:
+            self._by_document[key[0]].add(key)
+        self.nbytes += _CHUNK_BYTES + _CHAR_BYTES * len(doc.page_content) + _POSTING_BYTES * len(counts)
+        self._arrays = None
+
+    def remove_document(self, document_id: str) -> int:
+        keys = self._by_document.pop(document_id, set())
+        for key in keys:
+            self.alive[self._by_key.pop(key)] = False
+        if keys:
+            self._arrays = None
+        return len(keys)
+
+    def update(self, document_ids: Set[Any], documents: List[Document]) -> None:
+        """Replace the chunks of changed (or removed) documents"""
+        with self._lock:
+            for document_id in document_ids:
+                self.remove_document(document_id)
+            for doc in documents:
+                self.add(doc)
+
+    def content_hashes(self) -> Optional[Dict[Tuple[Any, ...], Any]]:
+        """content_hash of every live chunk, or None when chunks lack a document_id"""
+        if len(self._by_key) != sum(len(keys) for keys in self._by_document.values()):
+            return None
+        return {
+            key: self.documents[position].metadata.get("content_hash")
+            for key, position in self._by_key.items()
+        }
+
+    def compact(self) -> "_TenantIndex":
+        """A copy without the rows removed or replaced since it was built"""
+        index = _TenantIndex(self.k1, self.b)
+        with self._lock:
+            for position in sorted(self._by_key.values()):
+                index.add(self.documents[position])
+        return index
+
+    def _finalize(self) -> Dict[str, Any]:
+        if self._arrays is None:
+            lengths = np.asarray(self.lengths, dtype=np.float32)
+            alive = np.asarray(self.alive, dtype=bool)
+            self._arrays = {
+                "lengths": lengths,
+                "avg_length": float(lengths[alive].mean()) if alive.any() else 1.0,
+                "alive": alive,
+                "live_count": int(alive.sum()),
+                "fields": {field: np.asarray(values) for field, values in self.fields.items()},
+            }
+        return self._arrays
+
+    def search(self, query: str, k: int, search_filter: Dict[str, Any]) -> List[Tuple[int, float]]:
+        with self._lock:
+            return self._search(query, k, search_filter)
+
+    def _search(self, query: str, k: int, search_filter: Dict[str, Any]) -> List[Tuple[int, float]]:
+        arrays = self._finalize()
+        if not self.documents:
+            return []
+
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * arrays["lengths"] / arrays["avg_length"])
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            positions = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = math.log(1 + (arrays["live_count"] - len(postings) + 0.5) / (len(postings) + 0.5))
+            scores[positions] += idf * tf * (self.k1 + 1) / (tf + norm[positions])
+
+        mask = arrays["alive"] & (scores > 0)
+        extra = {}
+        for key, expected in search_filter.items():
+            if key == "company_id":
+                continue
+            if key not in arrays["fields"]:
+                extra[key] = expected
+                continue
+            values = expected["$in"] if isinstance(expected, dict) and "$in" in expected else [expected]
+            allowed = [str(v.value if hasattr(v, "value") else v) for v in values]
+            mask &= np.isin(arrays["fields"][key], allowed)
+
+        candidates = np.nonzero(mask)[0]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        results = []
+        for position in ranked:
+            if extra and not matches_filter(self.documents[position].metadata, extra):
+                continue
+            results.append((int(position), float(scores[position])))
+            if len(results) >= k:
+                break
+        return results
+
+
+class LexicalIndex:
+    """
+    Per-tenant lexical indexes, loaded lazily from a source of
+    (document, metadata) batches such as PGVectorStore.iterate_chunks.
+
+    Tenants are kept in LRU order, bounded by LEXICAL_INDEX_MAX_TENANTS and
+    an approximate LEXICAL_INDEX_MAX_BYTES. After documents change, a stale
+    tenant is refreshed on its next search: chunk metadata is listed without
+    text, and only documents whose content hashes differ are re-read and
+    re-tokenized.
+    """
+
+    def __init__(
+        self,
+        source: Optional[Callable[..., Any]] = None,
+        max_tenants: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.source = source
+        self.max_tenants = max_tenants or settings.LEXICAL_INDEX_MAX_TENANTS
+        self.max_bytes = max_bytes or settings.LEXICAL_INDEX_MAX_BYTES
+        self._tenants: "OrderedDict[str, _TenantIndex]" = OrderedDict()
+        self._stale: Set[str] = set()
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.nbytes for index in self._tenants.values())
+
+    def add_documents(self, tenant_id: str, documents: List[Document]) -> None:
+        index = self._tenants.setdefault(tenant_id, _TenantIndex())
+        for doc in documents:
+            index.add(doc)
+        self._evict(tenant_id)
+
+    def remove_document(self, tenant_id: str, document_id: str) -> int:
+        index = self._tenants.get(tenant_id)
+        return index.remove_document(document_id) if index else 0
+
+    def drop_tenant(self, tenant_id: str) -> None:
+        self._tenants.pop(tenant_id, None)
+        self._stale.discard(tenant_id)
+        LEXICAL_INDEX_BYTES.set(self.nbytes)
+
+    def mark_stale(self, tenant_id: str) -> None:
+        """Documents changed: refresh the tenant's postings before its next search"""
+        if tenant_id in self._tenants:
+            self._stale.add(tenant_id)
+
+    async def ensure_loaded(self, tenant_id: str) -> None:
+        if self.source is None or (tenant_id in self._tenants and tenant_id not in self._stale):
+            if tenant_id in self._tenants:
+                self._tenants.move_to_end(tenant_id)
+            return
+        async with self._locks[tenant_id]:
+            if tenant_id in self._tenants and tenant_id not in self._stale:
+                return
+            # A change notified while this runs marks the tenant stale again
+            self._stale.discard(tenant_id)
+            index = self._tenants.get(tenant_id)
+            if index is not None:
+                index = await self._refresh(tenant_id, index)
+            if index is None:
+                index = _TenantIndex()
+                async for batch in self.source(filter={"company_id": tenant_id}):
+                    for document, metadata in batch:
+                        index.add(Document(page_content=document, metadata=metadata))
+                logger.info(f"Loaded lexical index for tenant {tenant_id} ({index.live_count} chunks)")
+            self._tenants[tenant_id] = index
+            self._tenants.move_to_end(tenant_id)
+            self._evict(tenant_id)
+
+    async def _refresh(self, tenant_id: str, index: _TenantIndex) -> Optional[_TenantIndex]:
+        """Re-read changed documents only; None when the tenant must be loaded in full"""
+        known = index.content_hashes()
+        if known is None:
+            return None
+
+        current: Dict[Tuple[Any, ...], Any] = {}
+        async for batch in self.source(filter={"company_id": tenant_id}, with_text=False):
+            for _, metadata in batch:
+                if metadata.get("document_id") is None:
+                    return None
+                current[(metadata["document_id"], metadata.get("chunk_index"))] = metadata.get("content_hash")
+
+        changed = {
+            key[0] for key, content_hash in current.items()
+            if content_hash is None or known.get(key) != content_hash
+        }
+        removed = {key[0] for key in known if key not in current}
+        documents = []
+        if changed:
+            changed_filter = {"company_id": tenant_id, "document_id": {"$in": sorted(changed, key=str)}}
+            async for batch in self.source(filter=changed_filter):
+                documents.extend(Document(page_content=document, metadata=metadata) for document, metadata in batch)
+        await asyncio.to_thread(index.update, changed | removed, documents)
+
+        if len(index.documents) > 2 * max(index.live_count, 1):
+            index = await asyncio.to_thread(index.compact)
+        logger.info(
+            f"Refreshed lexical index for tenant {tenant_id} "
+            f"({len(changed)} documents re-read, {len(removed - changed)} removed)"
+        )
+        return index
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used tenants over the count or memory budget"""
+        while len(self._tenants) > 1 and (len(self._tenants) > self.max_tenants or self.nbytes > self.max_bytes):
+            tenant_id = next(iter(self._tenants))
+            if tenant_id == keep:
+                self._tenants.move_to_end(tenant_id)
+                continue
+            del self._tenants[tenant_id]
+            self._stale.discard(tenant_id)
+            LEXICAL_INDEX_EVICTIONS.inc()
+        LEXICAL_INDEX_BYTES.set(self.nbytes)
+
+    async def search(
+        self,
+        tenant_id: str,
+        query: str,
+        k: int,
+        search_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        await self.ensure_loaded(tenant_id)
+        index = self._tenants.get(tenant_id)
+        if index is None:
+            return []
+        hits = await asyncio.to_thread(index.search, query, k, search_filter or {})
+        return [(index.documents[position], score) for position, score in hits]
+
+
+def fuse_hybrid(
+    vector_docs: List[Document],
+    lexical_hits: List[Tuple[Document, float]],
+    k: int
+) -> List[Document]:
+    """RRF-fuse vector and lexical results, keeping vector distance as the score"""
+    lexical_docs = []
+    for doc, score in lexical_hits:
+        doc = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+        doc.metadata["lexical_score"] = score
+        doc.metadata.setdefault("score", 1.0)  # no vector distance: treat as farthest
+        lexical_docs.append(doc)
+
+    vector_keys = {doc_key(doc): doc for doc in vector_docs}
+    for doc in lexical_docs:
+        match = vector_keys.get(doc_key(doc))
+        if match is not None:
+            match.metadata["lexical_score"] = doc.metadata["lexical_score"]
+
+    return reciprocal_rank_fusion([vector_docs, lexical_docs], k=k, rrf_k=settings.HYBRID_RRF_K)
@@ -0,0 +1,261 @@
+"""
+LLM gateway
+Single-flight, per-provider rate limits and concurrency, timeouts and hedged failover
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import (
+    LLM_COALESCED,
+    LLM_FAILOVERS,
+    LLM_IN_FLIGHT,
+    LLM_QUEUE_WAIT_SECONDS,
+    LLM_REQUESTS,
+    LLM_TOKENS,
+)
+from ..core.observability import span
+
+logger = logging.getLogger(__name__)
+
+
+def _content(message) -> str:
+    return message.content if hasattr(message, "content") else str(message)
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to `capacity`; waiters are served FIFO"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        # A single oversized request may not wait forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class LLMProvider:
+    """One chat model behind request/token buckets, a concurrency cap and a timeout"""
+
+    def __init__(
+        self,
+        name: str,
+        llm,
+        max_concurrency: int,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        timeout: Optional[float] = None,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        self.name = name
+        self.llm = llm
+        self.model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or name
+        self.count_tokens = count_tokens or (lambda text: len(text) // 2)
+        self._prompt_tokens = LLM_TOKENS.labels(model=self.model, direction="prompt")
+        self._completion_tokens = LLM_TOKENS.labels(model=self.model, direction="completion")
+        self.timeout = timeout or settings.LLM_TIMEOUT_SECONDS
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def admit(self, cost: int):
+        """Wait for rate limit budget, then a concurrency slot; the wait is reported"""
+        start = time.monotonic()
+        with span(f"llm.{self.name}.queue"):
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None:
+                await self.tokens.acquire(cost)
+            await self._slots.acquire()
+        LLM_QUEUE_WAIT_SECONDS.labels(provider=self.name).observe(time.monotonic() - start)
+        LLM_IN_FLIGHT.labels(provider=self.name).inc()
+        try:
+            with span(f"llm.{self.name}", model=self.model):
+                yield
+        finally:
+            LLM_IN_FLIGHT.labels(provider=self.name).dec()
+            self._slots.release()
+
+    def _count(self, cost: int, answer: str) -> None:
+        self._prompt_tokens.inc(cost)
+        self._completion_tokens.inc(self.count_tokens(answer))
+
+    async def invoke(self, prompt: str, cost: int) -> str:
+        async with self.admit(cost):
+            try:
+                response = await asyncio.wait_for(self.llm.ainvoke(prompt), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                LLM_REQUESTS.labels(provider=self.name, outcome="timeout").inc()
+                raise
+            except Exception:
+                LLM_REQUESTS.labels(provider=self.name, outcome="error").inc()
+                raise
+        LLM_REQUESTS.labels(provider=self.name, outcome="success").inc()
+        answer = _content(response)
+        self._count(cost, answer)
+        return answer
+
+    async def stream(self, prompt: str, cost: int) -> AsyncIterator[str]:
+        """Token stream; `timeout` bounds the wait for each chunk, not the whole answer"""
+        streamed = []
+        async with self.admit(cost):
+            chunks = self.llm.astream(prompt).__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    token = _content(chunk)
+                    streamed.append(token)
+                    yield token
+            except asyncio.TimeoutError:
+                LLM_REQUESTS.labels(provider=self.name, outcome="timeout").inc()
+                raise
+            except Exception:
+                LLM_REQUESTS.labels(provider=self.name, outcome="error").inc()
+                raise
+            finally:
+                aclose = getattr(chunks, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+        LLM_REQUESTS.labels(provider=self.name, outcome="success").inc()
+        self._count(cost, "".join(streamed))
+
+
+class LLMGateway:
+    """
+    Front door for answer generation. Identical prompts in flight on the same
+    provider share one call. A primary that fails, or has not answered after
+    `hedge_delay`, is raced against the failover provider and the first
+    successful answer wins. Streams fail over only before the first token.
+    """
+
+    def __init__(
+        self,
+        providers: Dict[str, LLMProvider],
+        failover: Optional[Dict[str, str]] = None,
+        hedge_delay: Optional[float] = None,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        self.providers = providers
+        self.failover = failover if failover is not None else settings.LLM_FAILOVER
+        self.hedge_delay = hedge_delay or settings.LLM_HEDGE_DELAY_SECONDS
+        self.count_tokens = count_tokens or (lambda text: len(text) // 2)
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    @classmethod
+    def from_settings(cls, llms: Dict[str, object], count_tokens: Optional[Callable[[str], int]] = None) -> "LLMGateway":
+        providers = {
+            name: LLMProvider(
+                name,
+                llm,
+                max_concurrency=settings.LLM_MAX_CONCURRENCY.get(name, 8),
+                requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE.get(name),
+                tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE.get(name),
+                count_tokens=count_tokens
+            )
+            for name, llm in llms.items()
+        }
+        return cls(providers, count_tokens=count_tokens)
+
+    def _candidates(self, provider: str) -> List[LLMProvider]:
+        candidates = [self.providers[provider]]
+        fallback = self.failover.get(provider)
+        if fallback and fallback != provider and fallback in self.providers:
+            candidates.append(self.providers[fallback])
+        return candidates
+
+    async def ainvoke(self, prompt: str, provider: str) -> str:
+        """Answer text for `prompt`, coalesced with identical in-flight calls"""
+        key = (provider, hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._hedged(prompt, provider))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        else:
+            LLM_COALESCED.inc()
+        # A caller that goes away does not cancel the call other callers share
+        return await asyncio.shield(task)
+
+    def _settle(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark retrieved so failures nobody awaited are not reported as unhandled
+            task.exception()
+
+    async def _hedged(self, prompt: str, provider: str) -> str:
+        candidates = self._candidates(provider)
+        cost = self.count_tokens(prompt)
+        primary = asyncio.create_task(candidates[0].invoke(prompt, cost))
+        if len(candidates) == 1:
+            return await primary
+
+        pending = {primary}
+        errors: List[BaseException] = []
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if primary in done:
+                if primary.exception() is None:
+                    return primary.result()
+                errors.append(primary.exception())
+                reason = "timeout" if isinstance(primary.exception(), asyncio.TimeoutError) else "error"
+            else:
+                reason = "slow"
+
+            fallback = candidates[1]
+            LLM_FAILOVERS.labels(provider=fallback.name, reason=reason).inc()
+            logger.warning(f"LLM {candidates[0].name} {reason}; hedging with {fallback.name}")
+            pending.add(asyncio.create_task(fallback.invoke(prompt, cost)))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, prompt: str, provider: str) -> AsyncIterator[str]:
+        """Answer tokens for `prompt`; switches provider only if nothing was streamed yet"""
+        candidates = self._candidates(provider)
+        cost = self.count_tokens(prompt)
+        for index, candidate in enumerate(candidates):
+            streamed = False
+            try:
+                async for token in candidate.stream(prompt, cost):
+                    streamed = True
+                    yield token
+                return
+            except Exception as e:
+                if streamed or index == len(candidates) - 1:
+                    raise
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                LLM_FAILOVERS.labels(provider=candidates[index + 1].name, reason=reason).inc()
+                logger.warning(f"LLM stream {candidate.name} {reason}: {str(e)}; failing over")
@@ -0,0 +1,274 @@
+"""
+Compiled mask-policy engine
+Caches policies per (company, role) and masks answers in one regex pass
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import regex
+
+from ..core.config import settings
+from ..core.metrics import MASK_POLICY_CACHE_HITS, MASK_POLICY_CACHE_MISSES
+from ..models.schemas import MaskPolicy, UserContext
+
+logger = logging.getLogger(__name__)
+
+_DIGITS = r"[0-9０-９]"
+_NUMBER = rf"{_DIGITS}[0-9０-９,，.．]*"
+
+# 1,234円 / 12万円 / 1億2,000万円 / ¥1,234 / ￥12万
+YEN_AMOUNT = (
+    rf"(?:[¥￥]\s*{_NUMBER}(?:[億万千]{_NUMBER})*[億万千]?円?"
+    rf"|{_NUMBER}(?:[億万千]{_NUMBER})*[億万千]?円)"
+)
+PERCENT = rf"{_NUMBER}\s*[%％]"
+RATE_UNIT = r"\s*(?:/|／|per\s*)(?:人工|人日|日|時間|h)"
+
+# Separators between a keyword and its value: "粗利率: 25%", "日当は2万円", "利益 120万円"
+_LABEL_TAIL = r"(?:\s|[:：=＝]|は|が|を|で|約|およそ){0,6}"
+
+
+def _keywords(words: List[str]) -> str:
+    """Longest-first alternation so overlapping keywords match their longest form"""
+    return "|".join(re.escape(word) for word in sorted(set(words), key=len, reverse=True))
+
+
+class CompiledMask:
+    """
+    All rules enabled by one MaskPolicy joined into a single alternation.
+    Keyword rules keep the keyword and mask only its value.
+    """
+
+    def __init__(self, policy: MaskPolicy, replacement: Optional[str] = None):
+        self.replacement = replacement if replacement is not None else settings.MASK_REPLACEMENT
+        alternatives: List[Tuple[str, str, bool]] = []
+
+        # Keyword + value rules first: they start earlier in the text than a bare amount
+        if policy.mask_profit_data:
+            alternatives.append(("profit", _keywords(settings.MASK_PROFIT_KEYWORDS), True))
+        if policy.mask_cost_data:
+            alternatives.append(("cost", _keywords(settings.MASK_COST_KEYWORDS), True))
+        if policy.mask_contractor_rates:
+            alternatives.append(("contractor", _keywords(settings.MASK_CONTRACTOR_KEYWORDS), True))
+            alternatives.append(("contractor_rate", rf"{YEN_AMOUNT}{RATE_UNIT}", False))
+        if policy.mask_cost_data:
+            alternatives.append(("cost_amount", YEN_AMOUNT, False))
+
+        parts = []
+        self._labels: Dict[str, Optional[str]] = {}
+        for name, pattern, keyword_rule in alternatives:
+            if keyword_rule:
+                value = rf"(?:{YEN_AMOUNT}(?:{RATE_UNIT})?|{PERCENT}|{_NUMBER})"
+                parts.append(rf"(?P<{name}>(?P<{name}_label>(?:{pattern}){_LABEL_TAIL}){value})")
+                self._labels[name] = f"{name}_label"
+            else:
+                parts.append(rf"(?P<{name}>{pattern})")
+                self._labels[name] = None
+
+        self.pattern = re.compile("|".join(parts)) if parts else None
+        # Same pattern with partial matching, for cutting streamed text safely
+        self._partial = regex.compile(self.pattern.pattern) if parts else None
+
+    def mask(self, text: str) -> str:
+        if self.pattern is None or not text:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """
+        (start, end) of every match in text. A match that more text could
+        still extend or complete is reported with end past the end of text.
+        """
+        if self._partial is None or not text:
+            return []
+        spans = []
+        for match in self._partial.finditer(text, partial=True):
+            end = match.end()
+            # A shorter alternative can match while a longer one ("120" before "120万円") is still open
+            if match.partial or end == len(text) or self._partial.fullmatch(text, match.start(), partial=True):
+                end = len(text) + 1
+            spans.append((match.start(), end))
+        return spans
+
+    def _replace(self, match: "re.Match[str]") -> str:
+        label_group = self._labels[match.lastgroup]
+        label = match.group(label_group) if label_group else ""
+        return label + self.replacement
+
+
+@lru_cache(maxsize=256)
+def _compile(policy_json: str) -> CompiledMask:
+    return CompiledMask(MaskPolicy.model_validate_json(policy_json))
+
+
+def compile_policy(policy: Optional[MaskPolicy]) -> CompiledMask:
+    """Compiled matcher for a policy, shared by every request with the same flags"""
+    return _compile((policy or MaskPolicy()).model_dump_json())
+
+
+def precompile_policies() -> int:
+    """Compile every mask flag combination so first requests do not pay for it"""
+    combinations = list(itertools.product((False, True), repeat=3))
+    for cost, profit, contractor in combinations:
+        compile_policy(MaskPolicy(mask_cost_data=cost, mask_profit_data=profit, mask_contractor_rates=contractor))
+    return len(combinations)
+
+
+class MaskEngine:
+    """
+    Drop-in replacement for MaskPolicyService in the query path.
+    Policies are fetched from the service once per (company_id, role) and
+    cached with a TTL; concurrent misses for the same key share one fetch.
+    With Redis attached, API workers share fetched policies and invalidations.
+    """
+
+    def __init__(
+        self,
+        policy_service,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        redis_client=None,
+        redis_prefix: str = "rag:mask:"
+    ):
+        self.policy_service = policy_service
+        self.ttl_seconds = ttl_seconds or settings.MASK_POLICY_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.MASK_POLICY_CACHE_MAX_ENTRIES
+        self.redis = redis_client
+        self.redis_prefix = redis_prefix
+        self._policies: "OrderedDict[Tuple[str, str], Tuple[float, MaskPolicy]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    @classmethod
+    def from_settings(cls, policy_service) -> "MaskEngine":
+        """Build the engine, attaching Redis when MASK_POLICY_CACHE_REDIS_ENABLED is set"""
+        redis_client = None
+        if settings.MASK_POLICY_CACHE_REDIS_ENABLED:
+            import redis.asyncio as aioredis
+            redis_client = aioredis.from_url(settings.REDIS_URL)
+        return cls(policy_service, redis_client=redis_client)
+
+    def _redis_key(self, company_id: str, role: str) -> str:
+        return f"{self.redis_prefix}{company_id}:{role}"
+
+    async def get_mask_policy(self, user_context: UserContext) -> MaskPolicy:
+        key = (user_context.company_id, user_context.role)
+        entry = self._policies.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._policies.move_to_end(key)
+            MASK_POLICY_CACHE_HITS.labels(tier="local").inc()
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            MASK_POLICY_CACHE_MISSES.inc()
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            policy = await self._get_shared(key)
+            if policy is None:
+                MASK_POLICY_CACHE_MISSES.inc()
+                policy = await self.policy_service.get_mask_policy(user_context)
+                await self._put_shared(key, policy)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark retrieved so waiter-less failures are not reported as unhandled
+                future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(policy)
+        self._policies[key] = (time.monotonic() + self.ttl_seconds, policy)
+        self._policies.move_to_end(key)
+        while len(self._policies) > self.max_entries:
+            self._policies.popitem(last=False)
+        return policy
+
+    async def _get_shared(self, key: Tuple[str, str]) -> Optional[MaskPolicy]:
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(self._redis_key(*key))
+        except Exception as e:
+            logger.warning(f"Mask policy cache Redis read error: {str(e)}")
+            return None
+        if not raw:
+            return None
+        MASK_POLICY_CACHE_HITS.labels(tier="redis").inc()
+        return MaskPolicy.model_validate_json(raw)
+
+    async def _put_shared(self, key: Tuple[str, str], policy: MaskPolicy) -> None:
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self._redis_key(*key), policy.model_dump_json(), ex=int(self.ttl_seconds))
+        except Exception as e:
+            logger.warning(f"Mask policy cache Redis write error: {str(e)}")
+
+    def invalidate(self, company_id: Optional[str] = None, role: Optional[str] = None) -> int:
+        """Forget cached policies for a company (optionally one role), or all of them"""
+        keys = [
+            key for key in self._policies
+            if (company_id is None or key[0] == company_id) and (role is None or key[1] == role)
+        ]
+        for key in keys:
+            del self._policies[key]
+        logger.info(f"Mask policy cache invalidated ({len(keys)} entries, company={company_id}, role={role})")
+        return len(keys)
+
+    async def invalidate_shared(self, company_id: Optional[str] = None, role: Optional[str] = None) -> int:
+        """Invalidate here, in Redis, and (via pub/sub) in every other API worker"""
+        invalidated = self.invalidate(company_id, role)
+        if self.redis is None:
+            return invalidated
+        try:
+            pattern = self._redis_key(company_id or "*", role or "*")
+            keys = [key async for key in self.redis.scan_iter(match=pattern)]
+            if keys:
+                await self.redis.delete(*keys)
+            await self.redis.publish(
+                self.redis_prefix + "invalidate",
+                json.dumps({"company_id": company_id, "role": role})
+            )
+        except Exception as e:
+            logger.warning(f"Mask policy cache Redis invalidation error: {str(e)}")
+        return invalidated
+
+    async def watch_invalidations(self) -> None:
+        """Apply invalidations published by other workers until cancelled"""
+        if self.redis is None:
+            return
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self.redis_prefix + "invalidate")
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                scope = json.loads(message["data"])
+                self.invalidate(scope.get("company_id"), scope.get("role"))
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def mask(self, text: str, policy: Optional[MaskPolicy]) -> str:
+        return compile_policy(policy).mask(text)
+
+    async def apply_masking(self, text: str, policy: Optional[MaskPolicy]) -> str:
+        """Same signature as MaskPolicyService.apply_masking, but a single in-process pass"""
+        return self.mask(text, policy)
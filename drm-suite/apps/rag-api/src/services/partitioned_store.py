@@ -0,0 +1,296 @@
+"""
+Per-tenant partitioned pgvector store
+One LIST partition per company_id with filter fields promoted to indexed columns
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import asyncpg
+from langchain.schema import Document
+
+from ..core.config import settings
+from .vector_store import PGVectorStore, _sql_value
+
+logger = logging.getLogger(__name__)
+
+# Filter keys stored as real columns (type used for casts); anything else stays in cmetadata
+PUSHDOWN_COLUMNS = {
+    "company_id": "text",
+    "document_id": "text",
+    "doc_type": "text",
+    "store_id": "text",
+    "project_id": "text",
+    "document_date": "date",
+}
+_INDEXED_COLUMNS = [("document_id",), ("doc_type", "document_date"), ("store_id",), ("project_id",), ("uuid",)]
+
+
+class PartitionedPGVectorStore(PGVectorStore):
+    """
+    Drop-in PGVectorStore over a table partitioned by company_id. A search
+    names its tenant, so Postgres prunes to that tenant's partition, and the
+    remaining filters (including document_date ranges) hit B-tree indexes
+    instead of JSON extraction: latency follows the tenant's own size, not
+    the number of tenants.
+    """
+
+    def __init__(self, embeddings, table: Optional[str] = None, **kwargs):
+        super().__init__(embeddings, **kwargs)
+        self.table = table or settings.VECTOR_PARTITIONED_TABLE
+        if not self.table.replace("_", "").isalnum():
+            raise ValueError(f"Invalid table name: {self.table}")
+        self._partitions: Set[str] = set()
+
+    async def _prepare(self, conn) -> None:
+        """Create the partitioned table and its (per-partition) indexes if missing"""
+        await conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                uuid uuid NOT NULL,
+                company_id text NOT NULL,
+                document_id text,
+                doc_type text,
+                store_id text,
+                project_id text,
+                document_date date,
+                document text,
+                cmetadata jsonb,
+                embedding vector,
+                PRIMARY KEY (company_id, uuid)
+            ) PARTITION BY LIST (company_id)
+        """)
+        for columns in _INDEXED_COLUMNS:
+            await conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_{'_'.join(columns)}_idx "
+                f"ON {self.table} ({', '.join(columns)})"
+            )
+        rows = await conn.fetch(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = $1::regclass",
+            self.table
+        )
+        self._partitions = {row["relname"] for row in rows}
+        logger.info(f"Partitioned vector table {self.table} ready ({len(self._partitions)} tenant partitions)")
+
+    def partition_name(self, company_id: str) -> str:
+        """Stable, identifier-safe partition name for a tenant"""
+        return f"{self.table}_{hashlib.sha1(company_id.encode('utf-8')).hexdigest()[:16]}"
+
+    async def _ensure_partitions(self, conn, company_ids: Iterable[str]) -> None:
+        for company_id in set(company_ids):
+            name = self.partition_name(company_id)
+            if name in self._partitions:
+                continue
+            # Partition bounds cannot be bind parameters; let the server quote them
+            ddl = await conn.fetchval(
+                "SELECT format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES IN (%L)', "
+                "$1::text, $2::text, $3::text)",
+                name, self.table, company_id
+            )
+            try:
+                await conn.execute(ddl)
+            except (asyncpg.exceptions.DuplicateTableError, asyncpg.exceptions.UniqueViolationError):
+                pass  # created concurrently by another worker
+            self._partitions.add(name)
+            logger.info(f"Created vector partition {name} for tenant {company_id}")
+
+    async def asimilarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Cosine-distance search inside one tenant's partition"""
+        search_filter = dict(filter or {})
+        tenant_id = search_filter.pop("company_id", None)
+        if tenant_id is None:
+            raise ValueError("Partitioned retrieval requires a company_id filter")
+
+        where, params = self._build_where(search_filter, first_param=3, columns=PUSHDOWN_COLUMNS)
+        sql = f"""
+            SELECT document, cmetadata, embedding <=> $1 AS distance
+            FROM {self.table}
+            WHERE company_id = $2{where}
+            ORDER BY distance
+            LIMIT {int(k)}
+        """
+
+        async with self.connection() as conn:
+            rows = await conn.fetch(sql, embedding, str(tenant_id), *params)
+
+        return [
+            (Document(page_content=row["document"], metadata=_metadata(row["cmetadata"])), float(row["distance"]))
+            for row in rows
+        ]
+
+    async def iterate_embeddings(
+        self,
+        filter: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[str, Dict[str, Any], List[float]]]]:
+        where, params = self._build_where(filter or {}, first_param=1, columns=PUSHDOWN_COLUMNS)
+        async with self.connection() as conn:
+            async with conn.transaction():
+                cursor = conn.cursor(
+                    f"SELECT document, cmetadata, embedding FROM {self.table} WHERE TRUE{where}",
+                    *params,
+                    prefetch=batch_size
+                )
+                batch = []
+                async for row in cursor:
+                    batch.append((row["document"], _metadata(row["cmetadata"]), row["embedding"]))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+    async def iterate_chunks(
+        self,
+        filter: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000,
+        with_text: bool = True
+    ) -> AsyncIterator[List[Tuple[Optional[str], Dict[str, Any]]]]:
+        where, params = self._build_where(filter or {}, first_param=1, columns=PUSHDOWN_COLUMNS)
+        document = "document" if with_text else "NULL AS document"
+        async with self.connection() as conn:
+            async with conn.transaction():
+                cursor = conn.cursor(
+                    f"SELECT {document}, cmetadata FROM {self.table} WHERE TRUE{where}",
+                    *params,
+                    prefetch=batch_size
+                )
+                batch = []
+                async for row in cursor:
+                    batch.append((row["document"], _metadata(row["cmetadata"])))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+    async def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ) -> int:
+        """COPY chunks into the parent table; Postgres routes rows to tenant partitions"""
+        records = [
+            (
+                uuid.uuid4(),
+                str(metadata["company_id"]),
+                *(_column_value(metadata.get(column), PUSHDOWN_COLUMNS[column]) for column in _PROMOTED),
+                text,
+                json.dumps(metadata, ensure_ascii=False),
+                embedding,
+            )
+            for text, embedding, metadata in zip(texts, embeddings, metadatas)
+        ]
+        async with self.connection() as conn:
+            await self._ensure_partitions(conn, (record[1] for record in records))
+            await conn.copy_records_to_table(
+                self.table,
+                records=records,
+                columns=["uuid", "company_id", *_PROMOTED, "document", "cmetadata", "embedding"]
+            )
+        return len(records)
+
+    async def delete_document(self, company_id: str, document_id: str) -> int:
+        async with self.connection() as conn:
+            result = await conn.execute(
+                f"DELETE FROM {self.table} WHERE company_id = $1 AND document_id = $2",
+                company_id, document_id
+            )
+        return int(result.split()[-1])
+
+    async def list_documents(self, company_id: str) -> List[Dict[str, Any]]:
+        async with self.connection() as conn:
+            rows = await conn.fetch(
+                f"SELECT DISTINCT ON (document_id) cmetadata FROM {self.table} "
+                f"WHERE company_id = $1 AND document_id IS NOT NULL ORDER BY document_id",
+                company_id
+            )
+        return [_metadata(row["cmetadata"]) for row in rows]
+
+    async def chunk_metadata(self, company_id: str, document_id: str) -> Dict[str, Dict[str, Any]]:
+        async with self.connection() as conn:
+            rows = await conn.fetch(
+                f"SELECT uuid, cmetadata FROM {self.table} WHERE company_id = $1 AND document_id = $2",
+                company_id, document_id
+            )
+        return {str(row["uuid"]): _metadata(row["cmetadata"]) for row in rows}
+
+    async def update_metadata(self, updates: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Rewrite metadata and the promoted columns derived from it"""
+        assignments = ", ".join(f"{column} = ${i + 4}" for i, column in enumerate(_PROMOTED))
+        async with self.connection() as conn:
+            await conn.executemany(
+                f"UPDATE {self.table} SET cmetadata = $3, {assignments} WHERE company_id = $2 AND uuid = $1",
+                [
+                    (
+                        uuid.UUID(chunk_id),
+                        str(metadata["company_id"]),
+                        json.dumps(metadata, ensure_ascii=False),
+                        *(_column_value(metadata.get(column), PUSHDOWN_COLUMNS[column]) for column in _PROMOTED),
+                    )
+                    for chunk_id, metadata in updates
+                ]
+            )
+
+    async def delete_chunks(self, chunk_ids: List[str]) -> int:
+        async with self.connection() as conn:
+            result = await conn.execute(
+                f"DELETE FROM {self.table} WHERE uuid = ANY($1::uuid[])",
+                [uuid.UUID(chunk_id) for chunk_id in chunk_ids]
+            )
+        return int(result.split()[-1])
+
+    async def migrate_collection(self, collection_name: Optional[str] = None) -> int:
+        """
+        Copy a LangChain PGVector collection into the partitioned table, once,
+        when switching VECTOR_STORE_LAYOUT. Rows already copied are skipped.
+        """
+        async with self.connection() as conn:
+            collection_id = await conn.fetchval(
+                "SELECT uuid FROM langchain_pg_collection WHERE name = $1",
+                collection_name or self.collection_name
+            )
+            if collection_id is None:
+                return 0
+            tenants = await conn.fetch(
+                "SELECT DISTINCT cmetadata->>'company_id' AS company_id FROM langchain_pg_embedding "
+                "WHERE collection_id = $1 AND cmetadata->>'company_id' IS NOT NULL",
+                collection_id
+            )
+            await self._ensure_partitions(conn, (row["company_id"] for row in tenants))
+            promoted = ", ".join(_PROMOTED)
+            extracted = ", ".join(
+                f"(cmetadata->>'{column}')::{PUSHDOWN_COLUMNS[column]}" for column in _PROMOTED
+            )
+            result = await conn.execute(
+                f"INSERT INTO {self.table} (uuid, company_id, {promoted}, document, cmetadata, embedding) "
+                f"SELECT uuid, cmetadata->>'company_id', {extracted}, document, cmetadata::jsonb, embedding "
+                f"FROM langchain_pg_embedding "
+                f"WHERE collection_id = $1 AND cmetadata->>'company_id' IS NOT NULL "
+                f"ON CONFLICT DO NOTHING",
+                collection_id
+            )
+        return int(result.split()[-1])
+
+
+# Promoted columns other than the partition key, in a fixed order
+_PROMOTED = [column for column in PUSHDOWN_COLUMNS if column != "company_id"]
+
+
+def _column_value(value: Any, column_type: str) -> Any:
+    return None if value is None else _sql_value(value, column_type)
+
+
+def _metadata(raw: Any) -> Dict[str, Any]:
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw or {}
@@ -0,0 +1,215 @@
+"""
+Compressed first-pass vectors
+Matryoshka truncation with float32, int8 or product-quantized codes, scanned
+before re-scoring a shortlist against the full-precision vectors
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+FIRST_PASS_KINDS = ("float", "int8", "pq")
+
+
+def truncate(vectors: np.ndarray, dims: Optional[int] = None) -> np.ndarray:
+    """
+    Keep the leading `dims` dimensions and re-normalize. text-embedding-3
+    models are trained so that prefixes are usable embeddings on their own.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dims:
+        vectors = vectors[..., :dims]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _sample(vectors: np.ndarray, sample_size: int, seed: int) -> np.ndarray:
+    if len(vectors) <= sample_size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+
+class FloatCodec:
+    """Truncated float32 vectors, no quantization"""
+
+    kind = "float"
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float32)
+
+    def prepare(self, query: np.ndarray) -> np.ndarray:
+        return query
+
+    def score(self, codes: np.ndarray, prepared: np.ndarray) -> np.ndarray:
+        return codes @ prepared
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+
+class Int8Codec:
+    """
+    Symmetric per-dimension int8 quantization: one byte per dimension.
+    The query is multiplied by the scales once, so scoring is a single matmul.
+    """
+
+    kind = "int8"
+
+    def __init__(self, scale: np.ndarray):
+        self.scale = scale
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, sample_size: int = 65536, seed: int = 0) -> "Int8Codec":
+        # A high quantile rather than the max keeps one outlier from wasting the range
+        scale = np.quantile(np.abs(_sample(vectors, sample_size, seed)), 0.9999, axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        return cls(scale.astype(np.float32))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def prepare(self, query: np.ndarray) -> np.ndarray:
+        return (query * self.scale).astype(np.float32)
+
+    def score(self, codes: np.ndarray, prepared: np.ndarray) -> np.ndarray:
+        return codes @ prepared
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+
+class PQCodec:
+    """
+    Product quantization: the vector is split into `subspaces` equal parts and
+    each part stored as the id of its nearest of 256 trained centroids (one byte).
+    Scores are summed from a per-query lookup table (asymmetric distance).
+    """
+
+    kind = "pq"
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = centroids  # (subspaces, 256, dims / subspaces)
+
+    @property
+    def subspaces(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def fit(
+        cls,
+        vectors: np.ndarray,
+        subspaces: int,
+        iterations: int = 10,
+        sample_size: int = 64 * 256,
+        seed: int = 0
+    ) -> "PQCodec":
+        dims = vectors.shape[1]
+        if dims % subspaces:
+            raise ValueError(f"{dims} dimensions cannot be split into {subspaces} subspaces")
+        sample = _sample(vectors, sample_size, seed)
+        ksub = min(256, len(sample))
+        rng = np.random.default_rng(seed)
+        parts = sample.reshape(len(sample), subspaces, dims // subspaces)
+
+        centroids = np.empty((subspaces, ksub, dims // subspaces), dtype=np.float32)
+        for s in range(subspaces):
+            points = np.ascontiguousarray(parts[:, s, :])
+            center = points[rng.choice(len(points), ksub, replace=False)].copy()
+            for _ in range(iterations):
+                # argmin |x - c|^2 == argmax (x.c - |c|^2 / 2)
+                assignments = np.argmax(points @ center.T - 0.5 * (center ** 2).sum(axis=1), axis=1)
+                counts = np.bincount(assignments, minlength=ksub)
+                nonempty = counts > 0
+                starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+                sums = np.add.reduceat(points[np.argsort(assignments, kind="stable")], starts, axis=0)
+                center[nonempty] = sums / counts[nonempty, None]
+            centroids[s] = center
+        return cls(centroids)
+
+    def encode(self, vectors: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        subspaces, _, dsub = self.centroids.shape
+        half_norms = 0.5 * (self.centroids ** 2).sum(axis=2)
+        codes = np.empty((len(vectors), subspaces), dtype=np.uint8)
+        for start in range(0, len(vectors), batch_size):
+            parts = vectors[start:start + batch_size].reshape(-1, subspaces, dsub)
+            for s in range(subspaces):
+                codes[start:start + len(parts), s] = np.argmax(parts[:, s, :] @ self.centroids[s].T - half_norms[s], axis=1)
+        return codes
+
+    def prepare(self, query: np.ndarray) -> np.ndarray:
+        subspaces, _, dsub = self.centroids.shape
+        return np.einsum("skd,sd->sk", self.centroids, query.reshape(subspaces, dsub))
+
+    def score(self, codes: np.ndarray, prepared: np.ndarray) -> np.ndarray:
+        return prepared[np.arange(self.subspaces), codes].sum(axis=1)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+
+class FirstPass:
+    """Compressed copy of an index's vectors, row-aligned with them"""
+
+    def __init__(self, codec, codes: np.ndarray, dims: Optional[int] = None):
+        self.codec = codec
+        self.codes = codes
+        self.dims = dims or None
+
+    @property
+    def kind(self) -> str:
+        return self.codec.kind
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        kind: str,
+        dims: Optional[int] = None,
+        pq_subspaces: int = 64,
+        seed: int = 0
+    ) -> "FirstPass":
+        if kind not in FIRST_PASS_KINDS:
+            raise ValueError(f"Unknown first-pass kind: {kind}")
+        reduced = truncate(vectors, dims)
+        if kind == "int8":
+            codec = Int8Codec.fit(reduced, seed=seed)
+        elif kind == "pq":
+            codec = PQCodec.fit(reduced, pq_subspaces, seed=seed)
+        else:
+            codec = FloatCodec()
+        return cls(codec, codec.encode(reduced), dims)
+
+    def scores(self, positions: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of `query` to the rows at `positions`"""
+        return self.codec.score(self.codes[positions], self.codec.prepare(truncate(query, self.dims)))
+
+    def save(self, path: str) -> None:
+        with open(os.path.join(path, "first_pass.json"), "w") as f:
+            json.dump({"kind": self.kind, "dims": self.dims}, f)
+        np.save(os.path.join(path, "first_pass_codes.npy"), self.codes)
+        for name, array in self.codec.arrays().items():
+            np.save(os.path.join(path, f"first_pass_{name}.npy"), array)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> Optional["FirstPass"]:
+        try:
+            with open(os.path.join(path, "first_pass.json")) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if meta["kind"] == "int8":
+            codec = Int8Codec(np.load(os.path.join(path, "first_pass_scale.npy")))
+        elif meta["kind"] == "pq":
+            codec = PQCodec(np.load(os.path.join(path, "first_pass_centroids.npy")))
+        else:
+            codec = FloatCodec()
+        codes = np.load(os.path.join(path, "first_pass_codes.npy"), mmap_mode="r" if mmap else None)
+        return cls(codec, codes, meta["dims"])
@@ -0,0 +1,195 @@
+"""
+Buffered query log writer
+Accumulates rag_query_logs rows and flushes them in bulk
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import (
+    QUERY_LOG_BUFFERED,
+    QUERY_LOG_WRITTEN,
+    QUERY_LOG_DROPPED,
+    QUERY_LOG_FLUSH_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_COLUMNS = (
+    "id", "user_id", "company_id", "query", "answer", "retrieved_docs", "confidence", "response_time", "created_at"
+)
+
+QueryLogRow = Tuple[str, Optional[str], Optional[str], str, str, List[str], float, int, datetime]
+
+
+class LogSink:
+    """Destination for batches of query log rows"""
+
+    async def start(self) -> None:
+        pass
+
+    async def write_batch(self, rows: List[QueryLogRow]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class PostgresLogSink(LogSink):
+    """COPY batches into rag_query_logs over a pooled connection"""
+
+    def __init__(self, connection: Callable[[], Any], table: str = "rag_query_logs"):
+        # `connection` is an async context manager factory, e.g. PGVectorStore.connection
+        self.connection = connection
+        self.table = table
+
+    async def start(self) -> None:
+        # The FAQ index reads a tenant's history by company_id, without joining users
+        async with self.connection() as conn:
+            await conn.execute(f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS company_id text")
+            await conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_company_id_created_at_idx "
+                f"ON {self.table} (company_id, created_at)"
+            )
+
+    async def write_batch(self, rows: List[QueryLogRow]) -> None:
+        async with self.connection() as conn:
+            await conn.copy_records_to_table(self.table, records=rows, columns=list(QUERY_LOG_COLUMNS))
+
+
+class SQLiteLogSink(LogSink):
+    """executemany into a local SQLite file (tests and offline runs)"""
+
+    def __init__(self, path: str = ":memory:", table: str = "rag_query_logs"):
+        self.table = table
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id TEXT PRIMARY KEY, user_id TEXT, company_id TEXT, query TEXT, answer TEXT, retrieved_docs TEXT, "
+            "confidence REAL, response_time INTEGER, created_at TEXT)"
+        )
+
+    async def write_batch(self, rows: List[QueryLogRow]) -> None:
+        encoded = [
+            (*row[:5], json.dumps(row[5]), row[6], row[7], row[8].isoformat())
+            for row in rows
+        ]
+        placeholders = ", ".join("?" for _ in QUERY_LOG_COLUMNS)
+        await asyncio.to_thread(self._write, f"INSERT INTO {self.table} VALUES ({placeholders})", encoded)
+
+    def _write(self, sql: str, rows: List[tuple]) -> None:
+        with self._conn:
+            self._conn.executemany(sql, rows)
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+class InMemoryLogSink(LogSink):
+    """Keeps written rows in a list"""
+
+    def __init__(self):
+        self.rows: List[QueryLogRow] = []
+        self.batches = 0
+
+    async def write_batch(self, rows: List[QueryLogRow]) -> None:
+        self.rows.extend(rows)
+        self.batches += 1
+
+
+class QueryLogWriter:
+    """
+    Non-blocking query log buffer. Rows are flushed when the batch size is
+    reached or every flush interval; when the buffer is full new rows are
+    dropped and counted instead of slowing down requests.
+    """
+
+    def __init__(
+        self,
+        sink: LogSink,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_buffer: Optional[int] = None
+    ):
+        self.sink = sink
+        self.batch_size = batch_size or settings.QUERY_LOG_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.QUERY_LOG_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.QUERY_LOG_MAX_BUFFER
+
+        self._buffer: List[QueryLogRow] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._timer_task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    async def start(self) -> None:
+        await self.sink.start()
+        self._timer_task = asyncio.create_task(self._flush_loop())
+
+    def submit(
+        self,
+        query_id: str,
+        user_id: Optional[str],
+        company_id: Optional[str],
+        query: str,
+        answer: str,
+        retrieved_docs: List[str],
+        confidence: float,
+        response_time: int
+    ) -> bool:
+        """Buffer one row; returns False if it was dropped"""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            QUERY_LOG_DROPPED.labels(reason="buffer_full").inc()
+            return False
+
+        self._buffer.append(
+            (query_id, user_id, company_id, query, answer, retrieved_docs, confidence, response_time, datetime.utcnow())
+        )
+        QUERY_LOG_BUFFERED.set(len(self._buffer))
+
+        if len(self._buffer) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+        return True
+
+    async def flush(self) -> None:
+        """Write everything currently buffered, in batches"""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                QUERY_LOG_BUFFERED.set(len(self._buffer))
+
+                try:
+                    with QUERY_LOG_FLUSH_SECONDS.time():
+                        await self.sink.write_batch(batch)
+                    QUERY_LOG_WRITTEN.inc(len(batch))
+                except Exception as e:
+                    logger.error(f"Query log flush error ({len(batch)} rows dropped): {str(e)}")
+                    self.dropped += len(batch)
+                    QUERY_LOG_DROPPED.labels(reason="write_error").inc(len(batch))
+
+    async def close(self) -> None:
+        """Stop the timer and flush all remaining rows"""
+        if self._timer_task:
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+            self._timer_task = None
+        if self._flush_task:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        await self.sink.close()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._buffer:
+                await self.flush()
@@ -4,186 +4,624 @@ Handles retrieval and generation using LangChain + OpenAI/Claude
 """
 
 import asyncio
-import time
 import uuid
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator, Set, Tuple, Union
 import logging
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import PGVector
-from langchain_community.chat_models import ChatAnthropic
 from langchain.schema import Document
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+import numpy as np
 import tiktoken
 
+from ..core.config import settings
 from ..core.database import get_database
-from ..models.schemas import UserContext, QueryFilter, MaskPolicy
+from ..core.metrics import FAQ_LLM_CALLS_SAVED, PROMPT_TOKENS, STREAM_TIME_TO_FIRST_BYTE
+from ..core.timing import StageTimer
+from ..core.observability import TraceStore, activate, deactivate, observe_query, observe_scores, start_trace
+from ..models.schemas import UserContext, QueryFilter, MaskPolicy, RAGQuery
 from .mask_service import MaskPolicyService
+from .mask_engine import MaskEngine, precompile_policies
 from .monitoring_service import MonitoringService
+from .retriever import Retriever, build_search_filter
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .answer_cache import SemanticAnswerCache
+from .faq_index import FAQEntry, FAQIndex
+from .conversation import ConversationManager, Session, SessionStore
+from .streaming import StreamingMasker
+from .query_log_writer import QueryLogWriter
+from .context_packer import CONTEXT_SEPARATOR, ContextPacker, format_context_block
+from .reranker import rerank_documents
+from .lexical_index import LexicalIndex, fuse_hybrid
+from .llm_gateway import LLMGateway
 
 logger = logging.getLogger(__name__)
 
+GENERATION_ERROR_MESSAGE = "申し訳ございませんが、回答の生成中にエラーが発生しました。"
+NO_RESULTS_MESSAGE = "該当する情報が見つかりませんでした。より具体的なキーワードで検索してみてください。"
+SUGGESTIONS_MESSAGE = "該当する情報が見つかりませんでした。次のような質問はいかがでしょうか:"
+
 
 class RAGService:
-    def __init__(self):
-        self.openai_llm = ChatOpenAI(
-            model="gpt-4",
-            temperature=0.1,
-            max_tokens=1000
-        )
+    def __init__(
+        self,
+        vector_store: Optional[Retriever] = None,
+        openai_llm=None,
+        claude_llm=None,
+        embedder=None,
+        tokenizer=None
+    ):
+        """
+        Models, embeddings and tokenizer default to the live providers; load
+        tests and unit tests pass local stand-ins instead.
+        """
+        if openai_llm is None:
+            # Provider SDKs are imported only when used: they dominate import time
+            from langchain_openai import ChatOpenAI
+            
+            openai_llm = ChatOpenAI(
+                model="gpt-4",
+                temperature=0.1,
+                max_tokens=1000
+            )
+        if claude_llm is None:
+            from langchain_community.chat_models import ChatAnthropic
+            
+            claude_llm = ChatAnthropic(
+                model="claude-3-haiku-20240307",
+                temperature=0.1,
+                max_tokens=2000
+            )
+        self.openai_llm = openai_llm
+        self.claude_llm = claude_llm
         
-        self.claude_llm = ChatAnthropic(
-            model="claude-3-haiku-20240307",
-            temperature=0.1,
-            max_tokens=2000
+        if embedder is None:
+            from langchain_openai import OpenAIEmbeddings
+            embedder = OpenAIEmbeddings(model="text-embedding-3-large")
+        self.embeddings = CachedEmbeddings(
+            embedder,
+            model="text-embedding-3-large",
+            cache=EmbeddingCache.from_settings()
         )
-        
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-        self.mask_service = MaskPolicyService()
+        self.mask_service = MaskEngine.from_settings(MaskPolicyService())
         self.monitoring = MonitoringService()
         
         # Token counter for OpenAI
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.tokenizer = tokenizer or tiktoken.get_encoding("cl100k_base")
+        self.context_packer = ContextPacker(self.tokenizer)
+        
+        # Rate limits, concurrency caps, single-flight and failover in front of both models
+        self.llm_gateway = LLMGateway.from_settings(
+            {"openai": self.openai_llm, "claude": self.claude_llm},
+            count_tokens=self._count_tokens
+        )
+        
+        # Retrieval backend (pooled pgvector or local ANN index), attached in the app lifespan
+        self.vector_store = vector_store
+        
+        # Near-duplicate answer cache, scoped by tenant / mask policy / filters
+        self.answer_cache = SemanticAnswerCache() if settings.ANSWER_CACHE_ENABLED else None
+        
+        # Query logging / metrics tasks running off the request path
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+        # Buffered rag_query_logs writer, attached in the app lifespan
+        self.log_writer: Optional[QueryLogWriter] = None
+        
+        # Character n-gram BM25 index for hybrid retrieval, attached in the app lifespan
+        self.lexical_index: Optional[LexicalIndex] = None
+        
+        # Curated per-tenant Q&A checked before retrieval, attached in the app lifespan
+        self.faq_index: Optional[FAQIndex] = None
+        
+        # Traces of slow queries, inspectable by query_id
+        self.trace_store = TraceStore()
+        
+        # Bounded conversation history for follow-up questions (RAGQuery.session_id)
+        self.conversations = ConversationManager(
+            SessionStore.from_settings(), self.llm_gateway, self.tokenizer
+        )
+
+    def attach_vector_store(self, vector_store: Retriever) -> None:
+        """Use a long-lived retrieval backend owned by the application lifespan"""
+        self.vector_store = vector_store
+
+    def attach_log_writer(self, log_writer: QueryLogWriter) -> None:
+        """Batch query logs through a buffered writer instead of per-row INSERTs"""
+        self.log_writer = log_writer
+
+    def attach_lexical_index(self, lexical_index: LexicalIndex) -> None:
+        """Enable hybrid lexical + vector retrieval (RETRIEVAL_MODE=hybrid)"""
+        self.lexical_index = lexical_index
+
+    def attach_faq_index(self, faq_index: FAQIndex) -> None:
+        """Answer strong FAQ matches without retrieval or an LLM call"""
+        self.faq_index = faq_index
+
+    async def warm_up(self) -> None:
+        """Pay first-request costs (regex compilation, tokenizer setup) before taking traffic"""
+        precompile_policies()
+        self.tokenizer.encode("ウォームアップ warm-up")
+
+    def invalidate_tenant(self, tenant_id: str) -> None:
+        """Drop per-tenant derived state after documents change"""
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_tenant(tenant_id)
+        if self.lexical_index is not None:
+            self.lexical_index.mark_stale(tenant_id)
+        if self.faq_index is not None:
+            self.faq_index.drop_tenant(tenant_id)
 
     async def retrieve_and_generate(
         self, 
         query: str,
         tenant_id: str,
-        filters: Optional[Dict[str, Any]] = None,
-        user_context: Optional[UserContext] = None
+        filters: Optional[Union[QueryFilter, Dict[str, Any]]] = None,
+        user_context: Optional[UserContext] = None,
+        max_results: Optional[int] = None,
+        include_sources: bool = True,
+        mask_policy: Optional[MaskPolicy] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        session_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Main RAG function: retrieve relevant documents and generate answer
+        Main RAG function: retrieve relevant documents and generate answer.
+        A precomputed mask policy / query embedding (batch queries) skips those stages.
+        With a session_id, follow-ups are condensed for retrieval and answered with
+        the session's bounded history.
         """
-        start_time = time.time()
         query_id = str(uuid.uuid4())
+        trace = start_trace(query_id, tenant_id=tenant_id)
+        trace_token = activate(trace)
+        timer = StageTimer(trace)
+        k = self._effective_k(max_results)
+        response: Optional[Dict[str, Any]] = None
+        session: Optional[Session] = None
+        turn = {"session_id": None, "condensed_query": None}
         
         try:
             logger.info(f"Processing RAG query: {query_id}")
+            query_filter = QueryFilter.model_validate(filters or {})
             
-            # 1. Get mask policy for user
-            mask_policy = await self.mask_service.get_mask_policy(user_context)
+            # 0. Follow-ups are rewritten into a standalone question before retrieval
+            search_query, history = query, ""
+            if session_id:
+                session, search_query, history = await self._open_session(
+                    session_id, query, tenant_id, user_context, timer
+                )
+                turn = {
+                    "session_id": session_id,
+                    "condensed_query": search_query if search_query != query else None
+                }
             
-            # 2. Retrieve relevant documents
-            retrieved_docs = await self._retrieve_documents(
-                query=query,
+            # 1. Get mask policy and embed query (cached) concurrently
+            if mask_policy is None or query_embedding is None:
+                mask_policy, query_embedding = await asyncio.gather(
+                    timer.measure("policy", self._resolve_policy(mask_policy, user_context)),
+                    timer.measure("embed", self._resolve_embedding(query_embedding, search_query))
+                )
+            
+            # 2. Check the answer cache for this tenant / policy / filter scope
+            #    (answers that depend on conversation history are never cached)
+            cache_scope = None
+            if self.answer_cache is not None and not history:
+                with timer.stage("answer_cache"):
+                    cache_scope = SemanticAnswerCache.scope_key(
+                        tenant_id,
+                        mask_policy,
+                        query_filter.model_dump(mode="json", exclude_none=True),
+                        variant={"k": k, "sources": include_sources}
+                    )
+                    cached_response = self.answer_cache.get(cache_scope, query_embedding)
+                if cached_response is not None:
+                    response = self._serve_cached(cached_response, query, query_id, timer, user_context)
+                    return response
+            
+            # 3. A strong FAQ match answers directly; weaker ones become suggestions
+            suggestions: List[str] = []
+            if self.faq_index is not None:
+                with timer.stage("faq"):
+                    faq_match = self.faq_index.match(tenant_id, query_embedding, mask_policy, query_filter)
+                if faq_match.entry is not None:
+                    response = await self._serve_faq(
+                        faq_match.entry, faq_match.similarity, search_query, query_id, timer, user_context, mask_policy
+                    )
+                    return response
+                suggestions = faq_match.suggestions
+            
+            # 4. Retrieve relevant documents
+            retrieved_docs = await timer.measure("retrieve", self._retrieve_documents(
+                query=search_query,
                 tenant_id=tenant_id,
-                filters=filters,
-                mask_policy=mask_policy
-            )
+                filters=query_filter,
+                mask_policy=mask_policy,
+                query_embedding=query_embedding,
+                k=k
+            ))
             
             if not retrieved_docs:
-                return await self._handle_no_results(query, query_id, start_time)
+                response = await self._handle_no_results(query, query_id, timer, suggestions)
+                return response
             
-            # 3. Choose LLM based on context length
-            total_tokens = self._count_tokens(query + " ".join([doc.page_content for doc in retrieved_docs]))
-            llm = self.claude_llm if total_tokens > 3000 else self.openai_llm
+            # 5. Pack context into the model's token budget, minus the history (off the event loop)
+            provider, context_docs = await timer.measure(
+                "pack", self._pack_context(query, retrieved_docs, history)
+            )
             
-            # 4. Generate answer with context
-            answer = await self._generate_answer(
+            # 6. Generate answer with context
+            answer = await timer.measure("generate", self._generate_answer(
                 query=query,
-                documents=retrieved_docs,
-                llm=llm,
-                mask_policy=mask_policy
-            )
+                documents=context_docs,
+                provider=provider,
+                mask_policy=mask_policy,
+                history=history
+            ))
             
-            # 5. Apply masking to final answer
-            masked_answer = await self.mask_service.apply_masking(answer, mask_policy)
+            # 7. Apply masking to final answer
+            masked_answer = await timer.measure(
+                "mask", self.mask_service.apply_masking(answer, mask_policy)
+            )
             
-            # 6. Calculate confidence and response time
-            response_time_ms = int((time.time() - start_time) * 1000)
+            # 8. Calculate confidence and response time
+            response_time_ms = int(timer.elapsed_ms())
             confidence = self._calculate_confidence(retrieved_docs, answer)
+            retrieved_ids = [doc.metadata.get("document_id", "") for doc in retrieved_docs]
             
-            # 7. Log query for monitoring
-            await self._log_query(
-                query_id=query_id,
-                user_id=user_context.user_id if user_context else None,
-                query=query,
-                answer=masked_answer,
-                retrieved_docs=[doc.metadata.get("document_id", "") for doc in retrieved_docs],
-                confidence=confidence,
-                response_time=response_time_ms
+            # 9. Log query and update metrics off the critical path; a follow-up is
+            #    logged as its standalone question, which is what FAQ learning reads
+            with timer.stage("log"):
+                self._record_in_background(
+                    query_id=query_id,
+                    user_context=user_context,
+                    query=search_query,
+                    answer=masked_answer,
+                    retrieved_docs=retrieved_ids,
+                    confidence=confidence,
+                    response_time_ms=response_time_ms
+                )
+            
+            response = {
+                "answer": masked_answer,
+                "confidence": confidence,
+                "sources": self._build_sources(retrieved_docs) if include_sources else [],
+                "retrieved_docs": retrieved_ids,
+                "response_time_ms": response_time_ms,
+                "query_id": query_id,
+                "cached": False,
+                "stage_timings_ms": timer.as_dict()
+            }
+            
+            # 10. Store in the answer cache (never cache generation failures)
+            if cache_scope is not None and answer != GENERATION_ERROR_MESSAGE:
+                self.answer_cache.put(cache_scope, query_embedding, response)
+            
+            logger.debug(f"Query {query_id} stage timings: {response['stage_timings_ms']}")
+            return response
+            
+        except Exception as e:
+            logger.error(f"RAG service error for query {query_id}: {str(e)}")
+            await self.monitoring.record_error(str(e))
+            raise
+        finally:
+            if response is not None:
+                response.update(turn)
+                self._remember_turn(session, query, response)
+            self._observe(timer, tenant_id, response)
+            deactivate(trace_token)
+
+    async def batch_retrieve_and_generate(
+        self,
+        queries: List[RAGQuery],
+        tenant_id: str,
+        user_context: Optional[UserContext] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Answer many queries for one user: the mask policy is
+        fetched once, all queries are embedded in a single API call, and the
+        per-item pipelines run concurrently up to BATCH_QUERY_CONCURRENCY.
+        Returns one {"index", "result"} or {"index", "error"} per query.
+        """
+        mask_policy, embeddings = await asyncio.gather(
+            self.mask_service.get_mask_policy(user_context),
+            self.embeddings.aembed_queries_array([item.query for item in queries])
+        )
+        semaphore = asyncio.Semaphore(settings.BATCH_QUERY_CONCURRENCY)
+        
+        async def run(index: int, item: RAGQuery) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    result = await self.retrieve_and_generate(
+                        query=item.query,
+                        tenant_id=tenant_id,
+                        filters=item.filters,
+                        user_context=user_context,
+                        max_results=item.max_results,
+                        include_sources=item.include_sources is not False,
+                        mask_policy=mask_policy,
+                        query_embedding=embeddings[index]
+                    )
+                    return {"index": index, "result": result}
+                except Exception as e:
+                    return {"index": index, "error": str(e)}
+        
+        return await asyncio.gather(*[
+            run(index, item) for index, item in enumerate(queries)
+        ])
+
+    @staticmethod
+    def _effective_k(max_results: Optional[int]) -> int:
+        """Clamp the requested result count to [1, RAG_MAX_RESULTS_CAP]"""
+        if not max_results:
+            return settings.RAG_DEFAULT_RESULTS
+        return max(1, min(int(max_results), settings.RAG_MAX_RESULTS_CAP))
+
+    async def _resolve_policy(
+        self,
+        mask_policy: Optional[MaskPolicy],
+        user_context: Optional[UserContext]
+    ) -> MaskPolicy:
+        if mask_policy is not None:
+            return mask_policy
+        return await self.mask_service.get_mask_policy(user_context)
+
+    async def _resolve_embedding(self, query_embedding: Optional[np.ndarray], query: str) -> np.ndarray:
+        if query_embedding is not None:
+            return query_embedding
+        return await self.embeddings.aembed_query_array(query)
+
+    async def stream_retrieve_and_generate(
+        self,
+        query: str,
+        tenant_id: str,
+        filters: Optional[Union[QueryFilter, Dict[str, Any]]] = None,
+        user_context: Optional[UserContext] = None,
+        max_results: Optional[int] = None,
+        include_sources: bool = True,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of retrieve_and_generate.
+        Yields (event, payload): "sources" first, then masked "token" chunks,
+        then "done" with confidence and timings ("error" on failure).
+        """
+        query_id = str(uuid.uuid4())
+        trace = start_trace(query_id, tenant_id=tenant_id, stream=True)
+        trace_token = activate(trace)
+        timer = StageTimer(trace)
+        k = self._effective_k(max_results)
+        first_byte_ms: Optional[int] = None
+        response: Optional[Dict[str, Any]] = None
+        session: Optional[Session] = None
+        turn = {"session_id": None, "condensed_query": None}
+        
+        def mark_first_byte() -> None:
+            nonlocal first_byte_ms
+            if first_byte_ms is None:
+                first_byte_ms = int(timer.elapsed_ms())
+                STREAM_TIME_TO_FIRST_BYTE.observe(first_byte_ms)
+        
+        try:
+            logger.info(f"Processing streaming RAG query: {query_id}")
+            query_filter = QueryFilter.model_validate(filters or {})
+            
+            search_query, history = query, ""
+            if session_id:
+                session, search_query, history = await self._open_session(
+                    session_id, query, tenant_id, user_context, timer
+                )
+                turn = {
+                    "session_id": session_id,
+                    "condensed_query": search_query if search_query != query else None
+                }
+            
+            mask_policy, query_embedding = await asyncio.gather(
+                timer.measure("policy", self.mask_service.get_mask_policy(user_context)),
+                timer.measure("embed", self.embeddings.aembed_query_array(search_query))
             )
             
-            # 8. Update metrics
-            await self.monitoring.record_query_metrics(
-                response_time_ms=response_time_ms,
-                confidence=confidence,
-                doc_count=len(retrieved_docs)
+            cache_scope = None
+            if self.answer_cache is not None and not history:
+                with timer.stage("answer_cache"):
+                    cache_scope = SemanticAnswerCache.scope_key(
+                        tenant_id,
+                        mask_policy,
+                        query_filter.model_dump(mode="json", exclude_none=True),
+                        variant={"k": k, "sources": include_sources}
+                    )
+                    cached_response = self.answer_cache.get(cache_scope, query_embedding)
+                if cached_response is not None:
+                    response = self._serve_cached(
+                        cached_response, query, query_id, timer, user_context
+                    )
+                    mark_first_byte()
+                    yield "sources", {"query_id": query_id, "sources": response["sources"]}
+                    yield "token", {"text": response["answer"]}
+                    yield "done", {**self._stream_summary(response, first_byte_ms), **turn}
+                    return
+            
+            suggestions: List[str] = []
+            if self.faq_index is not None:
+                with timer.stage("faq"):
+                    faq_match = self.faq_index.match(tenant_id, query_embedding, mask_policy, query_filter)
+                if faq_match.entry is not None:
+                    response = await self._serve_faq(
+                        faq_match.entry, faq_match.similarity, search_query, query_id, timer, user_context, mask_policy
+                    )
+                    mark_first_byte()
+                    yield "sources", {"query_id": query_id, "sources": []}
+                    yield "token", {"text": response["answer"]}
+                    yield "done", {**self._stream_summary(response, first_byte_ms), **turn}
+                    return
+                suggestions = faq_match.suggestions
+            
+            retrieved_docs = await timer.measure("retrieve", self._retrieve_documents(
+                query=search_query,
+                tenant_id=tenant_id,
+                filters=query_filter,
+                mask_policy=mask_policy,
+                query_embedding=query_embedding,
+                k=k
+            ))
+            
+            if not retrieved_docs:
+                response = await self._handle_no_results(query, query_id, timer, suggestions)
+                mark_first_byte()
+                yield "sources", {"query_id": query_id, "sources": []}
+                yield "token", {"text": response["answer"]}
+                yield "done", {**self._stream_summary(response, first_byte_ms), **turn}
+                return
+            
+            sources = self._build_sources(retrieved_docs) if include_sources else []
+            mark_first_byte()
+            yield "sources", {"query_id": query_id, "sources": sources}
+            
+            provider, context_docs = await timer.measure(
+                "pack", self._pack_context(query, retrieved_docs, history)
             )
+            prompt = self._build_prompt(query, context_docs, history)
+            masker = StreamingMasker(self.mask_service, mask_policy)
+            raw_answer = ""
+            generation_failed = False
+            with timer.stage("generate"):
+                try:
+                    async for token in self.llm_gateway.astream(prompt, provider):
+                        raw_answer += token
+                        masked = await masker.feed(token)
+                        if masked:
+                            yield "token", {"text": masked}
+                except Exception as e:
+                    logger.error(f"Streaming generation error: {str(e)}")
+                    generation_failed = True
+                
+                tail = await masker.flush()
+                if tail:
+                    yield "token", {"text": tail}
+                if generation_failed:
+                    yield "token", {"text": GENERATION_ERROR_MESSAGE}
+            
+            response_time_ms = int(timer.elapsed_ms())
+            confidence = self._calculate_confidence(retrieved_docs, raw_answer)
+            retrieved_ids = [doc.metadata.get("document_id", "") for doc in retrieved_docs]
+            masked_answer = masker.masked_text if not generation_failed else GENERATION_ERROR_MESSAGE
             
-            return {
+            response = {
                 "answer": masked_answer,
                 "confidence": confidence,
-                "sources": [
-                    {
-                        "chunk_index": doc.metadata.get("chunk_index", 0),
-                        "text": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                        "page_number": doc.metadata.get("page_number"),
-                        "confidence_score": doc.metadata.get("score", 0.0),
-                        "metadata": {
-                            "document_id": doc.metadata.get("document_id"),
-                            "file_name": doc.metadata.get("file_name"),
-                            "doc_type": doc.metadata.get("doc_type")
-                        }
-                    }
-                    for doc in retrieved_docs
-                ],
-                "retrieved_docs": [doc.metadata.get("document_id", "") for doc in retrieved_docs],
+                "sources": sources,
+                "retrieved_docs": retrieved_ids,
                 "response_time_ms": response_time_ms,
-                "query_id": query_id
+                "query_id": query_id,
+                "cached": False,
+                "stage_timings_ms": timer.as_dict()
             }
+            yield "done", {**self._stream_summary(response, first_byte_ms), **turn}
+            
+            self._record_in_background(
+                query_id=query_id,
+                user_context=user_context,
+                query=search_query,
+                answer=masked_answer,
+                retrieved_docs=retrieved_ids,
+                confidence=confidence,
+                response_time_ms=response_time_ms
+            )
+            
+            if cache_scope is not None and not generation_failed:
+                self.answer_cache.put(cache_scope, query_embedding, response)
             
         except Exception as e:
-            logger.error(f"RAG service error for query {query_id}: {str(e)}")
+            logger.error(f"Streaming RAG error for query {query_id}: {str(e)}")
             await self.monitoring.record_error(str(e))
-            raise
+            yield "error", {"query_id": query_id, "detail": str(e)}
+        finally:
+            if response is not None:
+                self._remember_turn(session, query, response)
+            self._observe(timer, tenant_id, response)
+            deactivate(trace_token)
+
+    def _observe(self, timer: StageTimer, tenant_id: str, response: Optional[Dict[str, Any]]) -> None:
+        """Export stage timings and outcome; keep the trace if the query was slow"""
+        if response is None:
+            outcome = "error"
+        elif response.get("cached"):
+            outcome = "cached"
+        elif response.get("faq_id"):
+            outcome = "faq"
+        elif not response["retrieved_docs"]:
+            outcome = "no_results"
+        elif response["answer"] == GENERATION_ERROR_MESSAGE:
+            outcome = "generation_error"
+        else:
+            outcome = "answered"
+        observe_query(timer.stages, timer.elapsed_ms(), tenant_id, outcome, timer.trace, self.trace_store)
+
+    @staticmethod
+    def _stream_summary(response: Dict[str, Any], first_byte_ms: Optional[int]) -> Dict[str, Any]:
+        return {
+            "query_id": response["query_id"],
+            "confidence": response["confidence"],
+            "retrieved_docs": response["retrieved_docs"],
+            "response_time_ms": response["response_time_ms"],
+            "time_to_first_byte_ms": first_byte_ms,
+            "cached": response.get("cached", False),
+            "faq_id": response.get("faq_id"),
+            "suggested_questions": response.get("suggested_questions", []),
+            "stage_timings_ms": response.get("stage_timings_ms", {})
+        }
 
     async def _retrieve_documents(
         self,
         query: str,
         tenant_id: str,
-        filters: Optional[Dict[str, Any]] = None,
-        mask_policy: Optional[MaskPolicy] = None
+        filters: Optional[QueryFilter] = None,
+        mask_policy: Optional[MaskPolicy] = None,
+        query_embedding: Optional[Any] = None,
+        k: int = 5
     ) -> List[Document]:
-        """Retrieve relevant documents from vector database"""
+        """Retrieve the top-k relevant documents from vector database"""
         
         try:
-            # Build search filter with RLS (Row-Level Security)
-            search_filter = {"company_id": tenant_id}
-            
-            if filters:
-                if "doc_types" in filters:
-                    search_filter["doc_type"] = {"$in": filters["doc_types"]}
-                if "store_ids" in filters:
-                    search_filter["store_id"] = {"$in": filters["store_ids"]}
-                if "project_ids" in filters:
-                    search_filter["project_id"] = {"$in": filters["project_ids"]}
-            
-            # Apply mask policy filters
-            if mask_policy and mask_policy.allowed_doc_types:
-                search_filter["doc_type"] = {"$in": mask_policy.allowed_doc_types}
-            
-            # Create vector store connection
-            vector_store = PGVector(
-                collection_name="rag_embeddings",
-                embedding_function=self.embeddings,
-                connection_string=await get_database().get_connection_string(),
-                pre_delete_collection=False
+            # Build search filter with RLS (Row-Level Security), narrowed by the mask policy
+            search_filter = build_search_filter(
+                tenant_id, filters, mask_policy.allowed_doc_types if mask_policy else None
             )
             
-            # Perform similarity search
-            docs = await vector_store.asimilarity_search_with_score(
-                query=query,
-                k=5,
+            if self.vector_store is None:
+                raise RuntimeError("Vector store is not initialized")
+            
+            # Perform similarity search on the pooled store
+            if query_embedding is None:
+                query_embedding = await self.embeddings.aembed_query_array(query)
+            hybrid = self.lexical_index is not None and settings.RETRIEVAL_MODE == "hybrid"
+            
+            # Over-fetch when re-ranking or fusing, then cut down to k
+            fetch_k = k
+            if hybrid:
+                fetch_k = max(k, settings.HYBRID_CANDIDATES)
+            elif settings.RAG_RERANK_ENABLED:
+                fetch_k = k * settings.RAG_OVERFETCH_FACTOR
+            
+            vector_search = self.vector_store.asimilarity_search_by_vector_with_score(
+                embedding=query_embedding,
+                k=fetch_k,
                 filter=search_filter
             )
+            if hybrid:
+                docs, lexical_hits = await asyncio.gather(
+                    vector_search,
+                    self.lexical_index.search(tenant_id, query, fetch_k, search_filter)
+                )
+            else:
+                docs, lexical_hits = await vector_search, []
             
             # Convert to Document objects with scores
             retrieved_docs = []
             for doc, score in docs:
                 doc.metadata["score"] = float(score)
                 retrieved_docs.append(doc)
+            observe_scores(doc.metadata["score"] for doc in retrieved_docs)
+            
+            if hybrid:
+                retrieved_docs = fuse_hybrid(retrieved_docs, lexical_hits, k)
+            elif len(retrieved_docs) > k:
+                retrieved_docs = rerank_documents(query, retrieved_docs, k)
             
             logger.info(f"Retrieved {len(retrieved_docs)} documents for tenant {tenant_id}")
             return retrieved_docs
@@ -196,34 +634,43 @@ class RAGService:
         self,
         query: str,
         documents: List[Document],
-        llm,
-        mask_policy: Optional[MaskPolicy] = None
+        provider: str,
+        mask_policy: Optional[MaskPolicy] = None,
+        history: str = ""
     ) -> str:
-        """Generate answer using LangChain conversation chain"""
+        """Generate answer from the packed context and the session history"""
         
         try:
-            # Prepare context from retrieved documents
-            context_texts = []
-            for doc in documents:
-                context = f"[出典: {doc.metadata.get('file_name', '不明')}]\\n{doc.page_content}"
-                context_texts.append(context)
-            
-            combined_context = "\\n\\n".join(context_texts)
-            
-            # Create conversation chain
-            memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True,
-                output_key="answer"
-            )
+            # Generate response
+            answer = await self.llm_gateway.ainvoke(self._build_prompt(query, documents, history), provider)
+            
+            return answer
             
-            # Japanese prompt template
-            prompt_template = f"""あなたは建設・リフォーム業界のプロフェッショナルアシスタントです。
+        except Exception as e:
+            logger.error(f"Answer generation error: {str(e)}")
+            return GENERATION_ERROR_MESSAGE
+
+    def _build_prompt(self, query: str, documents: List[Document], history: str = "") -> str:
+        """Build the Japanese answer prompt from retrieved documents and the session history"""
+        
+        # Prepare context from retrieved documents
+        context_texts = [format_context_block(doc) for doc in documents]
+        
+        combined_context = CONTEXT_SEPARATOR.join(context_texts)
+        
+        # Summary + recent turns, already capped by the ConversationManager
+        history_section = f"""
+            会話の履歴:
+            {history}
+""" if history else ""
+        
+        # Japanese prompt template
+        prompt_template = f"""あなたは建設・リフォーム業界のプロフェッショナルアシスタントです。
             提供された情報を基に、正確で分かりやすい回答をしてください。
 
             コンテキスト:
             {combined_context}
-
+{history_section}
             質問: {query}
 
             回答の際は以下を心がけてください:
@@ -234,24 +681,133 @@ class RAGService:
             5. 専門用語は分かりやすく説明する
 
             回答:"""
-            
-            # Generate response
-            response = await llm.ainvoke(prompt_template)
-            answer = response.content if hasattr(response, 'content') else str(response)
-            
-            return answer
-            
-        except Exception as e:
-            logger.error(f"Answer generation error: {str(e)}")
-            return "申し訳ございませんが、回答の生成中にエラーが発生しました。"
+        
+        return prompt_template
+
+    async def _pack_context(
+        self,
+        query: str,
+        documents: List[Document],
+        history: str = ""
+    ) -> Tuple[str, List[Document]]:
+        """
+        Pack chunks into the configured model's token budget and return that model's provider.
+        Session history is reserved out of the same budget, so prompts do not grow per turn.
+        """
+        model = settings.CONTEXT_MODEL
+        history_tokens = self.conversations.history_tokens(history) if history else 0
+        budget = max(0, settings.CONTEXT_TOKEN_BUDGETS[model] - history_tokens)
+        packed = await asyncio.to_thread(self.context_packer.pack, query, documents, budget)
+        PROMPT_TOKENS.labels(mode="session" if history else "single").observe(packed.token_count + history_tokens)
+        logger.debug(
+            f"Packed {len(packed.documents)}/{len(documents)} chunks into {packed.token_count} tokens "
+            f"(history_tokens={history_tokens}, truncated={packed.truncated}, "
+            f"deduplicated_chars={packed.deduplicated_chars})"
+        )
+        return model, packed.documents
+
+    @staticmethod
+    def _build_sources(documents: List[Document]) -> List[Dict[str, Any]]:
+        """Serialize retrieved documents as DocumentChunk-shaped dicts"""
+        return [
+            {
+                "chunk_index": doc.metadata.get("chunk_index", 0),
+                "text": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                "page_number": doc.metadata.get("page_number"),
+                "confidence_score": doc.metadata.get("score", 0.0),
+                "metadata": {
+                    "document_id": doc.metadata.get("document_id"),
+                    "file_name": doc.metadata.get("file_name"),
+                    "doc_type": doc.metadata.get("doc_type")
+                }
+            }
+            for doc in documents
+        ]
 
-    async def _handle_no_results(self, query: str, query_id: str, start_time: float) -> Dict[str, Any]:
-        """Handle case when no documents are retrieved"""
+    def _serve_cached(
+        self,
+        cached_response: Dict[str, Any],
+        query: str,
+        query_id: str,
+        timer: StageTimer,
+        user_context: Optional[UserContext]
+    ) -> Dict[str, Any]:
+        """Return a cached answer under a fresh query id, still logged and measured"""
+        response_time_ms = int(timer.elapsed_ms())
+        response = {
+            **cached_response,
+            "response_time_ms": response_time_ms,
+            "query_id": query_id,
+            "cached": True,
+            "stage_timings_ms": timer.as_dict()
+        }
         
-        response_time_ms = int((time.time() - start_time) * 1000)
+        self._record_in_background(
+            query_id=query_id,
+            user_context=user_context,
+            query=query,
+            answer=response["answer"],
+            retrieved_docs=response["retrieved_docs"],
+            confidence=response["confidence"],
+            response_time_ms=response_time_ms
+        )
         
-        # TODO: Implement similar Q&A template suggestions
-        fallback_answer = "該当する情報が見つかりませんでした。より具体的なキーワードで検索してみてください。"
+        return response
+
+    async def _serve_faq(
+        self,
+        entry: FAQEntry,
+        similarity: float,
+        query: str,
+        query_id: str,
+        timer: StageTimer,
+        user_context: Optional[UserContext],
+        mask_policy: Optional[MaskPolicy]
+    ) -> Dict[str, Any]:
+        """Return a stored FAQ answer, masked for this user, still logged and measured"""
+        masked_answer = await timer.measure(
+            "mask", self.mask_service.apply_masking(entry.answer, mask_policy)
+        )
+        response_time_ms = int(timer.elapsed_ms())
+        FAQ_LLM_CALLS_SAVED.inc()
+        
+        self._record_in_background(
+            query_id=query_id,
+            user_context=user_context,
+            query=query,
+            answer=masked_answer,
+            retrieved_docs=entry.retrieved_docs,
+            confidence=similarity,
+            response_time_ms=response_time_ms
+        )
+        
+        return {
+            "answer": masked_answer,
+            "confidence": similarity,
+            "sources": [],
+            "retrieved_docs": entry.retrieved_docs,
+            "response_time_ms": response_time_ms,
+            "query_id": query_id,
+            "cached": False,
+            "faq_id": entry.entry_id,
+            "stage_timings_ms": timer.as_dict()
+        }
+
+    async def _handle_no_results(
+        self,
+        query: str,
+        query_id: str,
+        timer: StageTimer,
+        suggestions: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Handle case when no documents are retrieved, suggesting similar FAQ questions"""
+        
+        response_time_ms = int(timer.elapsed_ms())
+        
+        if suggestions:
+            fallback_answer = "\n".join([SUGGESTIONS_MESSAGE] + [f"・{question}" for question in suggestions])
+        else:
+            fallback_answer = NO_RESULTS_MESSAGE
         
         return {
             "answer": fallback_answer,
@@ -259,23 +815,104 @@ class RAGService:
             "sources": [],
             "retrieved_docs": [],
             "response_time_ms": response_time_ms,
-            "query_id": query_id
+            "query_id": query_id,
+            "suggested_questions": suggestions or [],
+            "stage_timings_ms": timer.as_dict()
         }
 
+    async def _open_session(
+        self,
+        session_id: str,
+        query: str,
+        tenant_id: str,
+        user_context: Optional[UserContext],
+        timer: StageTimer
+    ) -> Tuple[Session, str, str]:
+        """Load the session and condense a follow-up; returns (session, search query, history)"""
+        session = await timer.measure("session", self.conversations.load(
+            tenant_id, user_context.user_id if user_context else None, session_id
+        ))
+        if not session.has_history:
+            return session, query, ""
+        search_query = await timer.measure("condense", self.conversations.condense(session, query))
+        return session, search_query, self.conversations.history_text(session)
+
+    def _remember_turn(self, session: Optional[Session], query: str, response: Dict[str, Any]) -> None:
+        """Append the answered turn to its session without delaying the response"""
+        if session is None or response["answer"] == GENERATION_ERROR_MESSAGE:
+            return
+        
+        async def remember() -> None:
+            try:
+                await self.conversations.record(session.key, query, response["answer"])
+            except Exception as e:
+                logger.error(f"Session update error: {str(e)}")
+        
+        self._spawn(remember())
+
+    def _record_in_background(
+        self,
+        query_id: str,
+        user_context: Optional[UserContext],
+        query: str,
+        answer: str,
+        retrieved_docs: List[str],
+        confidence: float,
+        response_time_ms: int
+    ) -> None:
+        """Schedule query logging and metrics without delaying the response"""
+        
+        async def record() -> None:
+            await self._log_query(
+                query_id=query_id,
+                user_id=user_context.user_id if user_context else None,
+                company_id=user_context.company_id if user_context else None,
+                query=query,
+                answer=answer,
+                retrieved_docs=retrieved_docs,
+                confidence=confidence,
+                response_time=response_time_ms
+            )
+            try:
+                await self.monitoring.record_query_metrics(
+                    response_time_ms=response_time_ms,
+                    confidence=confidence,
+                    doc_count=len(retrieved_docs)
+                )
+            except Exception as e:
+                logger.error(f"Query metrics error: {str(e)}")
+        
+        self._spawn(record())
+
+    def _spawn(self, coro) -> None:
+        """Run a coroutine off the request path, tracked for drain_background_tasks"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def drain_background_tasks(self, timeout: float = 10.0) -> None:
+        """Wait for pending log/metrics tasks (called on shutdown)"""
+        if not self._background_tasks:
+            return
+        done, pending = await asyncio.wait(set(self._background_tasks), timeout=timeout)
+        if pending:
+            logger.warning(f"{len(pending)} background tasks still pending at shutdown")
+
     def _count_tokens(self, text: str) -> int:
         """Count tokens in text using OpenAI tokenizer"""
-        return len(self.tokenizer.encode(text))
+        return self.context_packer.count_tokens(text)
 
     def _calculate_confidence(self, documents: List[Document], answer: str) -> float:
         """Calculate confidence score based on document similarity scores"""
         if not documents:
             return 0.0
         
-        scores = [doc.metadata.get("score", 0.0) for doc in documents]
+        # Scores are cosine distances (lower is closer); confidence is the mean similarity
+        scores = [doc.metadata.get("score", 1.0) for doc in documents]
         avg_score = sum(scores) / len(scores)
         
-        # Normalize score to 0-1 range (assuming similarity scores are 0-1)
-        confidence = min(max(avg_score, 0.0), 1.0)
+        # Clamp to 0-1 range
+        confidence = min(max(1.0 - avg_score, 0.0), 1.0)
         
         return confidence
 
@@ -283,6 +920,7 @@ class RAGService:
         self,
         query_id: str,
         user_id: Optional[str],
+        company_id: Optional[str],
         query: str,
         answer: str,
         retrieved_docs: List[str],
@@ -291,14 +929,20 @@ class RAGService:
     ) -> None:
         """Log query for audit and monitoring"""
         
+        if self.log_writer is not None:
+            self.log_writer.submit(
+                query_id, user_id, company_id, query, answer, retrieved_docs, confidence, response_time
+            )
+            return
+        
         try:
             db = await get_database()
             await db.execute(
                 """
-                INSERT INTO rag_query_logs (id, user_id, query, answer, retrieved_docs, confidence, response_time, created_at)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, NOW())
+                INSERT INTO rag_query_logs (id, user_id, company_id, query, answer, retrieved_docs, confidence, response_time, created_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NOW())
                 """,
-                query_id, user_id, query, answer, retrieved_docs, confidence, response_time
+                query_id, user_id, company_id, query, answer, retrieved_docs, confidence, response_time
             )
         except Exception as e:
             logger.error(f"Query logging error: {str(e)}")
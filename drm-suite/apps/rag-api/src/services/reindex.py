@@ -0,0 +1,204 @@
+"""
+Incremental reindexing
+Re-embeds only chunks whose content hash changed, with resumable checkpoints
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from ..core.config import settings
+from ..core.metrics import REINDEX_CHUNKS, REINDEX_TASKS
+from ..models.schemas import ProcessingStatus
+from .ingestion import IngestionPipeline, document_from_metadata
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReindexTask:
+    """Progress of one tenant-wide reindex, persisted as its checkpoint"""
+
+    task_id: str
+    company_id: str
+    status: ProcessingStatus = ProcessingStatus.PENDING
+    documents_total: int = 0
+    documents_failed: int = 0
+    chunks_skipped: int = 0
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    completed_documents: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    updated_at: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (ProcessingStatus.COMPLETED, ProcessingStatus.FAILED)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["status"] = self.status.value
+        data["documents_done"] = len(data.pop("completed_documents"))
+        return data
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["status"] = self.status.value
+        return json.dumps(data, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "ReindexTask":
+        data = json.loads(raw)
+        data["status"] = ProcessingStatus(data["status"])
+        return cls(**data)
+
+
+class ReindexCheckpointStore:
+    """One JSON file per task, replaced atomically after every document"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.REINDEX_CHECKPOINT_DIR
+
+    def _path(self, task_id: str) -> str:
+        return os.path.join(self.directory, f"{task_id}.json")
+
+    def save(self, task: ReindexTask) -> None:
+        task.updated_at = datetime.utcnow().isoformat()
+        self.write(task.task_id, task.to_json())
+
+    def write(self, task_id: str, raw: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(task_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(raw)
+        os.replace(tmp_path, self._path(task_id))
+
+    def load(self, task_id: str) -> Optional[ReindexTask]:
+        try:
+            with open(self._path(task_id), encoding="utf-8") as f:
+                return ReindexTask.from_json(f.read())
+        except FileNotFoundError:
+            return None
+
+    def list_tasks(self) -> List[ReindexTask]:
+        if not os.path.isdir(self.directory):
+            return []
+        tasks = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                task = self.load(name[:-len(".json")])
+                if task is not None:
+                    tasks.append(task)
+        return sorted(tasks, key=lambda task: task.created_at)
+
+    def prune(self, keep: int) -> None:
+        """Delete the oldest finished checkpoints beyond `keep`"""
+        finished = [task for task in self.list_tasks() if task.finished]
+        for task in finished[:max(0, len(finished) - keep)]:
+            os.remove(self._path(task.task_id))
+
+
+class ReindexService:
+    """
+    Tenant-wide incremental reindex built on IngestionPipeline.reindex_document.
+    Each document is re-chunked from its stored file_url; unchanged chunks are
+    kept, changed ones re-embedded, and orphans deleted. Completed documents are
+    checkpointed so a retried job resumes where the previous attempt stopped.
+    """
+
+    def __init__(self, pipeline: IngestionPipeline, checkpoints: Optional[ReindexCheckpointStore] = None):
+        self.pipeline = pipeline
+        self.checkpoints = checkpoints or ReindexCheckpointStore()
+        self._tasks: Dict[str, ReindexTask] = {}
+        self._save_lock = asyncio.Lock()
+
+    async def run_task(self, task_id: str, company_id: str) -> ReindexTask:
+        """Run a reindex, resuming from its checkpoint if an earlier attempt stopped"""
+        task = await asyncio.to_thread(self.checkpoints.load, task_id)
+        if task is None:
+            task = ReindexTask(task_id=task_id, company_id=company_id)
+        elif task.completed_documents:
+            logger.info(f"Resuming reindex {task_id} ({len(task.completed_documents)} documents done)")
+
+        self._tasks[task_id] = task
+        try:
+            return await self.run(task)
+        finally:
+            self._tasks.pop(task_id, None)
+
+    def get_task(self, task_id: str) -> Optional[ReindexTask]:
+        """The live task while it runs in this process"""
+        return self._tasks.get(task_id)
+
+    async def run(self, task: ReindexTask) -> ReindexTask:
+        """Reindex every stored document of the tenant, skipping checkpointed ones"""
+        task.status = ProcessingStatus.PROCESSING
+        # Failed documents are not checkpointed, so a resumed task retries them
+        task.documents_failed = 0
+        try:
+            documents = await self.pipeline.vector_store.list_documents(task.company_id)
+            task.documents_total = len(documents)
+            await self._checkpoint(task)
+
+            done: Set[str] = set(task.completed_documents)
+            pending = [metadata for metadata in documents if metadata["document_id"] not in done]
+            await asyncio.gather(*(self._reindex_one(task, metadata) for metadata in pending))
+
+            task.status = ProcessingStatus.COMPLETED
+            if task.documents_failed:
+                task.error = f"{task.documents_failed} documents could not be reindexed"
+            REINDEX_TASKS.labels(status="completed").inc()
+            logger.info(
+                f"Reindex {task.task_id} done: {task.chunks_embedded} embedded, "
+                f"{task.chunks_skipped} unchanged, {task.chunks_deleted} deleted"
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            task.status = ProcessingStatus.FAILED
+            task.error = str(e)
+            REINDEX_TASKS.labels(status="failed").inc()
+            raise
+        finally:
+            if task.finished:
+                await self._checkpoint(task)
+                await asyncio.to_thread(self.checkpoints.prune, settings.REINDEX_TASK_RETENTION)
+
+        if self.pipeline.on_complete is not None:
+            self.pipeline.on_complete(task.company_id)
+        return task
+
+    async def _checkpoint(self, task: ReindexTask) -> None:
+        """Serialize on the event loop, write off it, one writer at a time"""
+        async with self._save_lock:
+            task.updated_at = datetime.utcnow().isoformat()
+            await asyncio.to_thread(self.checkpoints.write, task.task_id, task.to_json())
+
+    async def _reindex_one(self, task: ReindexTask, metadata: Dict[str, Any]) -> None:
+        document_id = metadata["document_id"]
+        if not metadata.get("file_url"):
+            # Ingested before sources were recorded; nothing to re-chunk from
+            logger.warning(f"Reindex {task.task_id}: no file_url for {document_id}, skipping")
+            task.documents_failed += 1
+            return
+
+        try:
+            # Concurrency is bounded by the pipeline's per-document slots
+            counts = await self.pipeline.reindex_document(document_from_metadata(metadata), document_id)
+        except Exception as e:
+            logger.error(f"Reindex {task.task_id}: {document_id} failed: {str(e)}")
+            task.documents_failed += 1
+            return
+
+        task.chunks_skipped += counts["skipped"]
+        task.chunks_embedded += counts["embedded"]
+        task.chunks_deleted += counts["deleted"]
+        for result, count in counts.items():
+            REINDEX_CHUNKS.labels(result=result).inc(count)
+        task.completed_documents.append(document_id)
+        await self._checkpoint(task)
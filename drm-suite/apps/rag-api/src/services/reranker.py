@@ -0,0 +1,37 @@
+"""
+Lightweight re-ranking of over-fetched candidates
+Blends vector distance with character-bigram coverage of the query,
+which suits Japanese text without word boundaries
+"""
+
+import unicodedata
+from typing import List, Set
+
+from langchain.schema import Document
+
+
+def _bigrams(text: str) -> Set[str]:
+    text = "".join(unicodedata.normalize("NFKC", text).lower().split())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def rerank_documents(
+    query: str,
+    documents: List[Document],
+    k: int,
+    lexical_weight: float = 0.3
+) -> List[Document]:
+    """
+    Keep the best `k` documents by blended score. Documents carry the
+    cosine distance in metadata["score"] (lower is closer).
+    """
+    query_bigrams = _bigrams(query)
+    if not query_bigrams or len(documents) <= 1:
+        return documents[:k]
+
+    def blended(doc: Document) -> float:
+        similarity = 1.0 - doc.metadata.get("score", 1.0)
+        coverage = len(query_bigrams & _bigrams(doc.page_content)) / len(query_bigrams)
+        return (1.0 - lexical_weight) * similarity + lexical_weight * coverage
+
+    return sorted(documents, key=blended, reverse=True)[:k]
@@ -0,0 +1,91 @@
+"""
+Retriever interface
+Backends that _retrieve_documents can search through
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from ..models.schemas import QueryFilter
+
+
+class Retriever:
+    """
+    Vector search backend. Filters use the PGVector dialect:
+    {"company_id": "...", "doc_type": {"$in": [...]}, "document_date": {"$gte": ..., "$lte": ...}}.
+    Scores are cosine distances, lower is closer.
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def health_check(self) -> bool:
+        return True
+
+    async def asimilarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        raise NotImplementedError
+
+
+def build_search_filter(
+    tenant_id: str,
+    query_filter: Optional[QueryFilter] = None,
+    allowed_doc_types: Optional[List[Any]] = None
+) -> Dict[str, Any]:
+    """
+    Tenant (row-level security) filter plus validated query filters.
+    A mask policy's allowed doc types narrow, never widen, the requested ones.
+    """
+    search_filter: Dict[str, Any] = {"company_id": tenant_id}
+    if query_filter is not None:
+        if query_filter.doc_types is not None:
+            search_filter["doc_type"] = {"$in": [doc_type.value for doc_type in query_filter.doc_types]}
+        if query_filter.store_ids is not None:
+            search_filter["store_id"] = {"$in": query_filter.store_ids}
+        if query_filter.project_ids is not None:
+            search_filter["project_id"] = {"$in": query_filter.project_ids}
+        date_range = query_filter.date_range
+        if date_range is not None and (date_range.start or date_range.end):
+            bounds = {}
+            if date_range.start:
+                bounds["$gte"] = date_range.start.isoformat()
+            if date_range.end:
+                bounds["$lte"] = date_range.end.isoformat()
+            search_filter["document_date"] = bounds
+
+    if allowed_doc_types:
+        allowed = [str(v.value if hasattr(v, "value") else v) for v in allowed_doc_types]
+        requested = search_filter.get("doc_type")
+        if requested is not None:
+            allowed = [doc_type for doc_type in requested["$in"] if doc_type in allowed]
+        search_filter["doc_type"] = {"$in": allowed}
+    return search_filter
+
+
+def matches_filter(metadata: Dict[str, Any], search_filter: Dict[str, Any]) -> bool:
+    """Evaluate a PGVector-style filter against a metadata dict"""
+    for key, expected in search_filter.items():
+        value = metadata.get(key)
+        if isinstance(expected, dict) and "$in" in expected:
+            allowed = {str(v.value if hasattr(v, "value") else v) for v in expected["$in"]}
+            if str(value) not in allowed:
+                return False
+        elif isinstance(expected, dict):
+            # Range bounds compare as strings: ISO dates sort lexicographically
+            if value is None:
+                return False
+            if "$gte" in expected and str(value) < str(expected["$gte"]):
+                return False
+            if "$lte" in expected and str(value) > str(expected["$lte"]):
+                return False
+        elif str(value) != str(expected):
+            return False
+    return True
@@ -0,0 +1,84 @@
+"""
+Streaming helpers
+Server-sent event formatting and incremental answer masking
+"""
+
+import json
+from typing import Any, Optional
+
+from ..models.schemas import MaskPolicy
+from .mask_engine import compile_policy
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event frame"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class StreamingMasker:
+    """
+    Applies MaskEngine.apply_masking to a token stream.
+
+    Tokens accumulate in a rolling buffer that is released up to the last
+    sentence boundary outside every match of the policy's compiled pattern,
+    including a match still open at the end of the buffer ("原価:\n" waiting
+    for its amount), so a masked term split across tokens is always masked
+    as a whole. Without such a boundary the buffer is force-released once it
+    exceeds max_buffer, at the last position outside a match; only a single
+    open match longer than that falls back to keeping `holdback` characters.
+    """
+
+    BOUNDARY_CHARS = "。！？!?\n、"
+
+    def __init__(
+        self,
+        mask_service,
+        mask_policy: Optional[MaskPolicy],
+        holdback: int = 64,
+        max_buffer: int = 256
+    ):
+        self.mask_service = mask_service
+        self.mask_policy = mask_policy
+        self.compiled = compile_policy(mask_policy)
+        self.holdback = holdback
+        self.max_buffer = max(max_buffer, holdback * 2)
+        self._buffer = ""
+        self.masked_text = ""
+
+    async def feed(self, token: str) -> str:
+        """Add a token and return the masked text that is safe to emit"""
+        self._buffer += token
+        cut = self._cut()
+        if cut <= 0:
+            return ""
+
+        ready, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return await self._mask(ready)
+
+    def _cut(self) -> int:
+        buffer = self._buffer
+        spans = self.compiled.spans(buffer)
+
+        def outside(position: int) -> bool:
+            return not any(start < position < end for start, end in spans)
+
+        for position in range(len(buffer), 0, -1):
+            if buffer[position - 1] in self.BOUNDARY_CHARS and outside(position):
+                return position
+        if len(buffer) <= self.max_buffer:
+            return 0
+        for position in range(len(buffer), 0, -1):
+            if outside(position):
+                return position
+        return len(buffer) - self.holdback
+
+    async def flush(self) -> str:
+        """Mask and release whatever is left at the end of the stream"""
+        ready, self._buffer = self._buffer, ""
+        return await self._mask(ready) if ready else ""
+
+    async def _mask(self, text: str) -> str:
+        masked = await self.mask_service.apply_masking(text, self.mask_policy)
+        self.masked_text += masked
+        return masked
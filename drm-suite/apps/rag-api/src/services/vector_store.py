@@ -0,0 +1,401 @@
+"""
+Pooled pgvector store
+Long-lived retrieval backend owned by the application lifespan
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import asyncpg
+from pgvector.asyncpg import register_vector
+from langchain.schema import Document
+
+from ..core.config import settings
+from ..core.metrics import (
+    VECTOR_POOL_SIZE,
+    VECTOR_POOL_IN_USE,
+    VECTOR_POOL_MAX_SIZE,
+    VECTOR_POOL_WAITING,
+    VECTOR_POOL_ACQUIRE_TIMEOUTS,
+    VECTOR_POOL_HEALTHY,
+)
+from .retriever import Retriever
+
+logger = logging.getLogger(__name__)
+
+
+def _asyncpg_dsn(database_url: str) -> str:
+    """Strip SQLAlchemy driver suffixes (postgresql+psycopg2://) for asyncpg"""
+    scheme, sep, rest = database_url.partition("://")
+    return f"{scheme.split('+')[0]}{sep}{rest}"
+
+
+def _sql_value(value: Any, cast: str) -> Any:
+    value = value.value if hasattr(value, "value") else value
+    if cast == "date":
+        return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    return str(value)
+
+
+class PGVectorStore(Retriever):
+    """
+    Similarity search over the LangChain PGVector tables through a bounded
+    asyncpg pool. The collection id is resolved once at startup instead of
+    per query.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        dsn: Optional[str] = None,
+        collection_name: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        acquire_timeout: Optional[float] = None,
+        health_check_interval: Optional[float] = None
+    ):
+        self.embeddings = embeddings
+        self.dsn = _asyncpg_dsn(dsn or settings.DATABASE_URL)
+        self.collection_name = collection_name or settings.VECTOR_COLLECTION_NAME
+        self.min_size = min_size or settings.VECTOR_POOL_MIN_SIZE
+        self.max_size = max_size or settings.VECTOR_POOL_MAX_SIZE
+        self.acquire_timeout = acquire_timeout or settings.VECTOR_POOL_ACQUIRE_TIMEOUT
+        self.health_check_interval = health_check_interval or settings.VECTOR_POOL_HEALTH_CHECK_INTERVAL
+
+        self._pool: Optional[asyncpg.Pool] = None
+        self._collection_id: Optional[str] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._in_use = 0
+        self._waiting = 0
+
+    async def start(self) -> None:
+        """Open the connection pool and resolve the collection"""
+        self._pool = await asyncpg.create_pool(
+            dsn=self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            init=register_vector
+        )
+        VECTOR_POOL_MAX_SIZE.set(self.max_size)
+        self._update_pool_metrics()
+
+        async with self.connection() as conn:
+            await self._prepare(conn)
+
+        VECTOR_POOL_HEALTHY.set(1)
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"Vector store pool started (min={self.min_size}, max={self.max_size})")
+
+    async def _prepare(self, conn) -> None:
+        """Resolve the collection once instead of per query"""
+        self._collection_id = await conn.fetchval(
+            "SELECT uuid FROM langchain_pg_collection WHERE name = $1",
+            self.collection_name
+        )
+        if self._collection_id is None:
+            logger.warning(f"Vector collection '{self.collection_name}' not found")
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop health checks and drain the pool, terminating after timeout"""
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+        if self._pool is None:
+            return
+
+        try:
+            await asyncio.wait_for(self._pool.close(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Vector store pool did not drain in time, terminating")
+            self._pool.terminate()
+        finally:
+            self._pool = None
+            VECTOR_POOL_SIZE.set(0)
+            VECTOR_POOL_IN_USE.set(0)
+            VECTOR_POOL_HEALTHY.set(0)
+        logger.info("Vector store pool closed")
+
+    @asynccontextmanager
+    async def connection(self):
+        """Acquire a pooled connection while tracking saturation"""
+        if self._pool is None:
+            raise RuntimeError("Vector store is not started")
+
+        self._waiting += 1
+        VECTOR_POOL_WAITING.set(self._waiting)
+        try:
+            conn = await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            VECTOR_POOL_ACQUIRE_TIMEOUTS.inc()
+            raise
+        finally:
+            self._waiting -= 1
+            VECTOR_POOL_WAITING.set(self._waiting)
+
+        self._in_use += 1
+        self._update_pool_metrics()
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            await self._pool.release(conn)
+            self._update_pool_metrics()
+
+    async def health_check(self) -> bool:
+        """Round-trip a trivial query through the pool"""
+        try:
+            async with self.connection() as conn:
+                await conn.fetchval("SELECT 1")
+            VECTOR_POOL_HEALTHY.set(1)
+            return True
+        except Exception as e:
+            logger.error(f"Vector store health check failed: {str(e)}")
+            VECTOR_POOL_HEALTHY.set(0)
+            return False
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Embed the query and search (PGVector-compatible signature)"""
+        embedding = await self.embeddings.aembed_query(query)
+        return await self.asimilarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+    async def asimilarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        """Cosine-distance search, lower score is closer (same as PGVector)"""
+        if self._collection_id is None:
+            return []
+
+        where, params = self._build_where(filter or {}, first_param=3)
+        sql = f"""
+            SELECT document, cmetadata, embedding <=> $1 AS distance
+            FROM langchain_pg_embedding
+            WHERE collection_id = $2{where}
+            ORDER BY distance
+            LIMIT {int(k)}
+        """
+
+        async with self.connection() as conn:
+            rows = await conn.fetch(sql, embedding, self._collection_id, *params)
+
+        results = []
+        for row in rows:
+            metadata = row["cmetadata"]
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            results.append((Document(page_content=row["document"], metadata=metadata or {}), float(row["distance"])))
+        return results
+
+    async def iterate_embeddings(
+        self,
+        filter: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[str, Dict[str, Any], List[float]]]]:
+        """Page through (document, metadata, embedding) rows, e.g. to build a local index"""
+        if self._collection_id is None:
+            return
+
+        where, params = self._build_where(filter or {}, first_param=2)
+        async with self.connection() as conn:
+            async with conn.transaction():
+                cursor = conn.cursor(
+                    f"SELECT document, cmetadata, embedding FROM langchain_pg_embedding "
+                    f"WHERE collection_id = $1{where}",
+                    self._collection_id, *params,
+                    prefetch=batch_size
+                )
+                batch = []
+                async for row in cursor:
+                    metadata = row["cmetadata"]
+                    if isinstance(metadata, str):
+                        metadata = json.loads(metadata)
+                    batch.append((row["document"], metadata or {}, row["embedding"]))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+    async def iterate_chunks(
+        self,
+        filter: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000,
+        with_text: bool = True
+    ) -> AsyncIterator[List[Tuple[Optional[str], Dict[str, Any]]]]:
+        """Page through (document, metadata) rows without embeddings; document is None without with_text"""
+        if self._collection_id is None:
+            return
+
+        where, params = self._build_where(filter or {}, first_param=2)
+        document = "document" if with_text else "NULL AS document"
+        async with self.connection() as conn:
+            async with conn.transaction():
+                cursor = conn.cursor(
+                    f"SELECT {document}, cmetadata FROM langchain_pg_embedding "
+                    f"WHERE collection_id = $1{where}",
+                    self._collection_id, *params,
+                    prefetch=batch_size
+                )
+                batch = []
+                async for row in cursor:
+                    metadata = row["cmetadata"]
+                    if isinstance(metadata, str):
+                        metadata = json.loads(metadata)
+                    batch.append((row["document"], metadata or {}))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                if batch:
+                    yield batch
+
+    async def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ) -> int:
+        """Bulk-insert chunks with COPY instead of one INSERT per row"""
+        if self._collection_id is None:
+            raise RuntimeError(f"Vector collection '{self.collection_name}' not found")
+
+        records = [
+            (uuid.uuid4(), self._collection_id, embedding, text, json.dumps(metadata, ensure_ascii=False))
+            for text, embedding, metadata in zip(texts, embeddings, metadatas)
+        ]
+        async with self.connection() as conn:
+            await conn.copy_records_to_table(
+                "langchain_pg_embedding",
+                records=records,
+                columns=["uuid", "collection_id", "embedding", "document", "cmetadata"]
+            )
+        return len(records)
+
+    async def delete_document(self, company_id: str, document_id: str) -> int:
+        """Remove every chunk of a document (before re-ingesting it)"""
+        if self._collection_id is None:
+            return 0
+
+        async with self.connection() as conn:
+            result = await conn.execute(
+                "DELETE FROM langchain_pg_embedding "
+                "WHERE collection_id = $1 AND cmetadata->>'company_id' = $2 AND cmetadata->>'document_id' = $3",
+                self._collection_id, company_id, document_id
+            )
+        return int(result.split()[-1])
+
+    async def list_documents(self, company_id: str) -> List[Dict[str, Any]]:
+        """One chunk's metadata per stored document of a tenant"""
+        if self._collection_id is None:
+            return []
+
+        async with self.connection() as conn:
+            rows = await conn.fetch(
+                "SELECT DISTINCT ON (cmetadata->>'document_id') cmetadata FROM langchain_pg_embedding "
+                "WHERE collection_id = $1 AND cmetadata->>'company_id' = $2 "
+                "AND cmetadata->>'document_id' IS NOT NULL "
+                "ORDER BY cmetadata->>'document_id'",
+                self._collection_id, company_id
+            )
+        return [json.loads(row["cmetadata"]) if isinstance(row["cmetadata"], str) else row["cmetadata"] for row in rows]
+
+    async def chunk_metadata(self, company_id: str, document_id: str) -> Dict[str, Dict[str, Any]]:
+        """Metadata of every chunk of a document, keyed by row uuid"""
+        if self._collection_id is None:
+            return {}
+
+        async with self.connection() as conn:
+            rows = await conn.fetch(
+                "SELECT uuid, cmetadata FROM langchain_pg_embedding "
+                "WHERE collection_id = $1 AND cmetadata->>'company_id' = $2 AND cmetadata->>'document_id' = $3",
+                self._collection_id, company_id, document_id
+            )
+        return {
+            str(row["uuid"]): json.loads(row["cmetadata"]) if isinstance(row["cmetadata"], str) else row["cmetadata"]
+            for row in rows
+        }
+
+    async def update_metadata(self, updates: List[Tuple[str, Dict[str, Any]]]) -> None:
+        async with self.connection() as conn:
+            await conn.executemany(
+                "UPDATE langchain_pg_embedding SET cmetadata = $2 WHERE uuid = $1",
+                [(uuid.UUID(chunk_id), json.dumps(metadata, ensure_ascii=False)) for chunk_id, metadata in updates]
+            )
+
+    async def delete_chunks(self, chunk_ids: List[str]) -> int:
+        async with self.connection() as conn:
+            result = await conn.execute(
+                "DELETE FROM langchain_pg_embedding WHERE uuid = ANY($1::uuid[])",
+                [uuid.UUID(chunk_id) for chunk_id in chunk_ids]
+            )
+        return int(result.split()[-1])
+
+    @staticmethod
+    def _build_where(
+        search_filter: Dict[str, Any],
+        first_param: int,
+        columns: Optional[Dict[str, str]] = None
+    ) -> Tuple[str, List[Any]]:
+        """
+        Translate {"key": value | {"$in": [...]} | {"$gte": ..., "$lte": ...}} filters
+        into SQL: keys in `columns` map to typed columns ("text" or "date"), the rest
+        are compared as text on cmetadata.
+        """
+        columns = columns or {}
+        clauses = []
+        params: List[Any] = []
+        for key, value in search_filter.items():
+            if not key.replace("_", "").isalnum():
+                raise ValueError(f"Invalid filter key: {key}")
+            column_type = columns.get(key)
+            expression = key if column_type else f"cmetadata->>'{key}'"
+            cast = column_type or "text"
+            if isinstance(value, dict) and "$in" in value:
+                clauses.append(f"{expression} = ANY(${first_param + len(params)}::{cast}[])")
+                params.append([_sql_value(v, cast) for v in value["$in"]])
+            elif isinstance(value, dict):
+                for operator, comparison in (("$gte", ">="), ("$lte", "<=")):
+                    if operator in value:
+                        clauses.append(f"{expression} {comparison} ${first_param + len(params)}::{cast}")
+                        params.append(_sql_value(value[operator], cast))
+            else:
+                clauses.append(f"{expression} = ${first_param + len(params)}::{cast}")
+                params.append(_sql_value(value, cast))
+
+        where = "".join(f" AND {clause}" for clause in clauses)
+        return where, params
+
+    def _update_pool_metrics(self) -> None:
+        if self._pool is None:
+            return
+        VECTOR_POOL_SIZE.set(self._pool.get_size())
+        VECTOR_POOL_IN_USE.set(self._in_use)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await self.health_check()
+
+
+def create_vector_store(embeddings) -> PGVectorStore:
+    """Per-tenant partitioned tables when VECTOR_STORE_LAYOUT=partitioned, else the LangChain collection"""
+    if settings.VECTOR_STORE_LAYOUT == "partitioned":
+        from .partitioned_store import PartitionedPGVectorStore
+        return PartitionedPGVectorStore(embeddings=embeddings)
+    return PGVectorStore(embeddings=embeddings)
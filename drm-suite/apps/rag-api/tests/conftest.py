@@ -0,0 +1,116 @@
+"""
+Shared fixtures: a RAGService on fake models and an in-memory store, for tests of the query path
+"""
+
+import importlib
+import sys
+import types
+from typing import List
+
+import pytest
+
+from src.models.schemas import MaskPolicy, UserContext
+from src.services.mask_engine import MaskEngine
+from src.services.query_log_writer import InMemoryLogSink, QueryLogWriter
+from tests.fakes import FakeChatModel, FakeEmbeddings, FakeTokenizer, InMemoryVectorStore
+
+TENANTS = ("tenant-a", "tenant-b")
+TOPICS = ["外壁塗装", "屋根葺き替え", "浴室リフォーム", "給湯器交換"]
+
+
+class RolePolicyService:
+    """Staff see amounts masked, managers do not"""
+
+    async def get_mask_policy(self, user_context: UserContext) -> MaskPolicy:
+        masked = user_context.role != "manager"
+        return MaskPolicy(mask_cost_data=masked, mask_profit_data=masked)
+
+
+class NullMonitoring:
+    async def record_query_metrics(self, **kwargs) -> None:
+        pass
+
+    async def record_error(self, error: str) -> None:
+        pass
+
+
+async def _no_database():
+    raise RuntimeError("No database in unit tests")
+
+
+async def _no_token_verifier(token: str) -> UserContext:
+    raise RuntimeError("No token verifier in unit tests")
+
+
+# Services deployed separately that rag_service and core.auth import, when they are not installed
+EXTERNAL_SERVICES = {
+    "src.core.database": {"get_database": _no_database},
+    "src.middleware": {},
+    "src.middleware.auth": {"verify_token": _no_token_verifier},
+    "src.services.mask_service": {"MaskPolicyService": RolePolicyService},
+    "src.services.monitoring_service": {"MonitoringService": NullMonitoring},
+}
+
+
+@pytest.fixture
+def external_services(monkeypatch):
+    """Stand-in modules for the missing services, removed again after the test"""
+    for name, attributes in EXTERNAL_SERVICES.items():
+        try:
+            importlib.import_module(name)
+            continue
+        except ModuleNotFoundError as e:
+            if e.name != name:
+                raise
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        monkeypatch.setitem(sys.modules, name, module)
+        parent, _, child = name.rpartition(".")
+        monkeypatch.setattr(sys.modules[parent], child, module, raising=False)
+
+    # rag_service binds the stand-ins on import: import it fresh, and forget it afterwards
+    services = importlib.import_module("src.services")
+    sys.modules.pop("src.services.rag_service", None)
+    monkeypatch.setattr(services, "rag_service", None, raising=False)
+    yield
+    sys.modules.pop("src.services.rag_service", None)
+
+
+def user(tenant_id: str, user_id: str = "user-1", role: str = "staff") -> UserContext:
+    return UserContext(user_id=user_id, company_id=tenant_id, role=role)
+
+
+async def seed(rag, tenant_id: str) -> List[str]:
+    """The same topics for every tenant, with document ids that name the tenant"""
+    texts, metadatas = [], []
+    for index, topic in enumerate(TOPICS):
+        texts.append(f"{topic}の標準工期と保証内容について。{tenant_id}の社内資料です。")
+        metadatas.append({
+            "company_id": tenant_id, "document_id": f"{tenant_id}-doc-{index}", "chunk_index": 0,
+            "doc_type": "manual_md", "file_name": f"{tenant_id}-doc-{index}.md",
+        })
+    await rag.vector_store.add_embeddings(texts, await rag.embeddings.aembed_documents(texts), metadatas)
+    return [metadata["document_id"] for metadata in metadatas]
+
+
+@pytest.fixture
+async def rag(external_services):
+    from src.services.rag_service import RAGService
+
+    service = RAGService(
+        InMemoryVectorStore(),
+        openai_llm=FakeChatModel(latency=0.0),
+        claude_llm=FakeChatModel(latency=0.0),
+        embedder=FakeEmbeddings(),
+        tokenizer=FakeTokenizer()
+    )
+    service.mask_service = MaskEngine(RolePolicyService())
+    service.monitoring = NullMonitoring()
+    log_writer = QueryLogWriter(InMemoryLogSink())
+    await log_writer.start()
+    service.attach_log_writer(log_writer)
+    for tenant_id in TENANTS:
+        await seed(service, tenant_id)
+    yield service
+    await service.drain_background_tasks()
+    await log_writer.close()
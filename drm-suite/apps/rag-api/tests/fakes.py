@@ -0,0 +1,215 @@
+"""
+Local stand-ins for external providers
+Deterministic chat models, embeddings and an in-memory vector store for unit tests and benchmarks;
+RAGService takes them in place of the providers
+"""
+
+import asyncio
+import hashlib
+import random
+import re
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.messages import AIMessage, AIMessageChunk
+
+from src.services.retriever import Retriever, matches_filter
+
+
+class FakeChatModel:
+    """
+    ainvoke / astream compatible with ChatOpenAI and ChatAnthropic.
+    Replies are derived from the prompt hash, so identical prompts get identical
+    answers; latency, per-token delay and failure rate are configurable.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        token_latency: float = 0.0,
+        failure_rate: float = 0.0,
+        reply_tokens: int = 40,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.failure_rate = failure_rate
+        self.reply_tokens = reply_tokens
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def reply(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [f"回答{digest[i % 32:i % 32 + 4]}" for i in range(self.reply_tokens)]
+        return "提供された情報によると、" + "、".join(words) + "です。"
+
+    def _maybe_fail(self) -> None:
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise RuntimeError("fake provider error")
+
+    async def ainvoke(self, prompt: str, **kwargs) -> AIMessage:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        self._maybe_fail()
+        return AIMessage(content=self.reply(prompt))
+
+    async def astream(self, prompt: str, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        self._maybe_fail()
+        for token in re.findall(r"[^、]*、|[^、]+", self.reply(prompt)):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield AIMessageChunk(content=token)
+
+
+class FakeEmbeddings:
+    """
+    Hashed character-bigram embeddings: deterministic, and texts sharing
+    vocabulary land close together, so retrieval results are meaningful.
+    """
+
+    def __init__(self, dim: int = 256, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for i in range(max(1, len(text) - 1)):
+            vector[zlib.crc32(text[i:i + 2].encode("utf-8")) % self.dim] += 1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.embed_documents(texts)
+
+
+class InMemoryVectorStore(Retriever):
+    """Exact cosine search over numpy arrays with the PGVectorStore write API"""
+
+    def __init__(self):
+        self._rows: Dict[str, Tuple[str, Dict[str, Any], np.ndarray]] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    async def asimilarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Document, float]]:
+        if not self._rows:
+            return []
+        if self._matrix is None:
+            self._ids = list(self._rows)
+            self._matrix = np.stack([self._rows[row_id][2] for row_id in self._ids])
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= float(np.linalg.norm(query)) or 1.0
+        distances = 1.0 - self._matrix @ query
+        results = []
+        for index in np.argsort(distances):
+            text, metadata, _ = self._rows[self._ids[index]]
+            if filter and not matches_filter(metadata, filter):
+                continue
+            results.append((Document(page_content=text, metadata=dict(metadata)), float(distances[index])))
+            if len(results) == k:
+                break
+        return results
+
+    async def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ) -> int:
+        for text, embedding, metadata in zip(texts, embeddings, metadatas):
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector /= float(np.linalg.norm(vector)) or 1.0
+            self._rows[str(uuid.uuid4())] = (text, dict(metadata), vector)
+        self._matrix = None
+        return len(texts)
+
+    async def delete_document(self, company_id: str, document_id: str) -> int:
+        chunk_ids = [
+            row_id for row_id, (_, metadata, _) in self._rows.items()
+            if metadata.get("company_id") == company_id and metadata.get("document_id") == document_id
+        ]
+        return await self.delete_chunks(chunk_ids)
+
+    async def list_documents(self, company_id: str) -> List[Dict[str, Any]]:
+        documents: Dict[str, Dict[str, Any]] = {}
+        for _, metadata, _ in self._rows.values():
+            if metadata.get("company_id") == company_id and metadata.get("document_id"):
+                documents.setdefault(metadata["document_id"], dict(metadata))
+        return [documents[document_id] for document_id in sorted(documents)]
+
+    async def iterate_embeddings(
+        self,
+        filter: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[str, Dict[str, Any], List[float]]]]:
+        rows = [
+            (text, dict(metadata), vector.tolist()) for text, metadata, vector in list(self._rows.values())
+            if matches_filter(metadata, filter or {})
+        ]
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    async def iterate_chunks(
+        self,
+        filter: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000,
+        with_text: bool = True
+    ) -> AsyncIterator[List[Tuple[Optional[str], Dict[str, Any]]]]:
+        async for batch in self.iterate_embeddings(filter, batch_size):
+            yield [(text if with_text else None, metadata) for text, metadata, _ in batch]
+
+    async def chunk_metadata(self, company_id: str, document_id: str) -> Dict[str, Dict[str, Any]]:
+        return {
+            row_id: dict(metadata) for row_id, (_, metadata, _) in self._rows.items()
+            if metadata.get("company_id") == company_id and metadata.get("document_id") == document_id
+        }
+
+    async def update_metadata(self, updates: List[Tuple[str, Dict[str, Any]]]) -> None:
+        for chunk_id, metadata in updates:
+            text, _, vector = self._rows[chunk_id]
+            self._rows[chunk_id] = (text, dict(metadata), vector)
+
+    async def delete_chunks(self, chunk_ids: List[str]) -> int:
+        deleted = sum(self._rows.pop(chunk_id, None) is not None for chunk_id in chunk_ids)
+        if deleted:
+            self._matrix = None
+        return deleted
+
+
+class FakeTokenizer:
+    """One token per character, with the encode / decode of a tiktoken Encoding"""
+
+    def encode(self, text: str) -> List[str]:
+        return list(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
@@ -0,0 +1,70 @@
+"""
+ANN index retriever: rebuilt versions are picked up without blocking the event loop
+"""
+
+import threading
+
+import numpy as np
+
+from src.services.ann_index import ANNIndexRetriever, IVFIndex, save_tenant_index
+
+TENANT = "tenant-a"
+
+
+def index_of(count: int) -> IVFIndex:
+    rng = np.random.default_rng(count)
+    vectors = rng.normal(size=(count, 8)).astype(np.float32)
+    metadatas = [{"company_id": TENANT, "document_id": f"doc-{i}", "chunk_index": 0} for i in range(count)]
+    return IVFIndex.build(vectors, [f"chunk {i}" for i in range(count)], metadatas)
+
+
+def record_load_threads(monkeypatch):
+    threads = []
+    load = IVFIndex.load.__func__
+
+    def recording_load(cls, path, mmap=True):
+        threads.append(threading.current_thread())
+        return load(cls, path, mmap)
+
+    monkeypatch.setattr(IVFIndex, "load", classmethod(recording_load))
+    return threads
+
+
+async def test_version_is_rechecked_only_after_the_reload_interval(monkeypatch, tmp_path):
+    threads = record_load_threads(monkeypatch)
+    clock = [1000.0]
+    monkeypatch.setattr("src.services.ann_index.time.monotonic", lambda: clock[0])
+    save_tenant_index(index_of(20), str(tmp_path), TENANT)
+    retriever = ANNIndexRetriever(str(tmp_path), reload_check_seconds=5.0)
+
+    assert len(await retriever.get_index(TENANT)) == 20
+    save_tenant_index(index_of(30), str(tmp_path), TENANT)
+    assert len(await retriever.get_index(TENANT)) == 20
+
+    clock[0] += 5.0
+    assert len(await retriever.get_index(TENANT)) == 30
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+async def test_unchanged_version_is_not_reloaded(monkeypatch, tmp_path):
+    threads = record_load_threads(monkeypatch)
+    save_tenant_index(index_of(20), str(tmp_path), TENANT)
+    retriever = ANNIndexRetriever(str(tmp_path), reload_check_seconds=0.0)
+
+    first = await retriever.get_index(TENANT)
+    assert await retriever.get_index(TENANT) is first
+    assert len(threads) == 1
+
+
+async def test_tenant_without_an_index_uses_the_fallback(tmp_path):
+    class Fallback:
+        async def asimilarity_search_by_vector_with_score(self, embedding, k=5, filter=None):
+            return ["fallback"]
+
+    retriever = ANNIndexRetriever(str(tmp_path), fallback=Fallback(), reload_check_seconds=0.0)
+
+    assert await retriever.get_index(TENANT) is None
+    assert await retriever.asimilarity_search_by_vector_with_score([0.0] * 8, filter={"company_id": TENANT}) == [
+        "fallback"
+    ]
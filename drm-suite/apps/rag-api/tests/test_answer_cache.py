@@ -0,0 +1,184 @@
+"""
+Semantic answer cache: similarity threshold, TTL and LRU bounds, no cached
+failures, invalidation after document changes, and answers that never cross
+tenant, mask policy or filter scopes
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.models.schemas import DocumentUpload, MaskPolicy
+from src.services.answer_cache import SemanticAnswerCache
+from src.services.job_queue import InMemoryJobQueue
+from src.services.job_worker import JobWorker, ingest_job, reindex_job
+from tests.conftest import user
+
+VECTOR = np.array([0.6, 0.8, 0.0], dtype=np.float32)
+NEAR = np.array([0.6, 0.8, 0.1], dtype=np.float32)  # cosine 0.995 to VECTOR
+FAR = np.array([0.8, 0.6, 0.0], dtype=np.float32)  # cosine 0.96 to VECTOR
+QUERY = "外壁塗装の標準工期を教えてください"
+
+
+def scope(tenant_id: str = "tenant-a", **filters):
+    return SemanticAnswerCache.scope_key(tenant_id, None, filters)
+
+
+def test_only_queries_above_the_similarity_threshold_hit():
+    cache = SemanticAnswerCache(similarity_threshold=0.99)
+    cache.put(scope(), VECTOR, {"answer": "cached"})
+
+    assert cache.get(scope(), NEAR)["answer"] == "cached"
+    assert cache.get(scope(), FAR) is None
+
+    cache.similarity_threshold = 0.95
+    assert cache.get(scope(), FAR)["answer"] == "cached"
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("src.services.answer_cache.time.monotonic", lambda: clock[0])
+    cache = SemanticAnswerCache(similarity_threshold=0.99, ttl_seconds=10)
+    cache.put(scope(), VECTOR, {"answer": "cached"})
+
+    clock[0] += 10
+    assert cache.get(scope(), VECTOR)["answer"] == "cached"
+    clock[0] += 0.1
+    assert cache.get(scope(), VECTOR) is None
+    assert cache._size == 0
+
+
+def test_least_recently_used_scope_is_evicted_first():
+    cache = SemanticAnswerCache(similarity_threshold=0.99, max_entries=2)
+    for name in ("roof", "bath"):
+        cache.put(scope(topic=name), VECTOR, {"answer": name})
+    assert cache.get(scope(topic="roof"), VECTOR)["answer"] == "roof"
+
+    cache.put(scope(topic="kitchen"), VECTOR, {"answer": "kitchen"})
+
+    assert cache.get(scope(topic="bath"), VECTOR) is None
+    assert cache.get(scope(topic="roof"), VECTOR)["answer"] == "roof"
+    assert cache.get(scope(topic="kitchen"), VECTOR)["answer"] == "kitchen"
+
+
+def test_oldest_answer_in_a_full_scope_is_dropped():
+    cache = SemanticAnswerCache(similarity_threshold=0.99, max_entries_per_scope=2)
+    axes = np.eye(3, dtype=np.float32)
+    for i, axis in enumerate(axes):
+        cache.put(scope(), axis, {"answer": i})
+
+    assert cache.get(scope(), axes[0]) is None
+    assert [cache.get(scope(), axis)["answer"] for axis in axes[1:]] == [1, 2]
+
+
+def test_lookups_only_match_their_own_scope():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    masked = MaskPolicy(mask_cost_data=True)
+    scope_a = SemanticAnswerCache.scope_key("tenant-a", masked, {})
+    cache.put(scope_a, VECTOR, {"answer": "tenant-a answer"})
+
+    assert cache.get(scope_a, VECTOR * 2)["answer"] == "tenant-a answer"
+    assert cache.get(SemanticAnswerCache.scope_key("tenant-b", masked, {}), VECTOR) is None
+    assert cache.get(SemanticAnswerCache.scope_key("tenant-a", MaskPolicy(), {}), VECTOR) is None
+    assert cache.get(SemanticAnswerCache.scope_key("tenant-a", masked, {"doc_types": ["cost_pdf"]}), VECTOR) is None
+
+
+def test_invalidating_a_tenant_keeps_other_tenants():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    scopes = {tenant: scope(tenant) for tenant in ("tenant-a", "tenant-b")}
+    for tenant, tenant_scope in scopes.items():
+        cache.put(tenant_scope, VECTOR, {"answer": tenant})
+
+    cache.invalidate_tenant("tenant-a")
+
+    assert cache.get(scopes["tenant-a"], VECTOR) is None
+    assert cache.get(scopes["tenant-b"], VECTOR)["answer"] == "tenant-b"
+
+
+async def test_cached_answer_is_not_served_to_another_tenant(rag):
+    first = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+    again = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+    other = await rag.retrieve_and_generate(QUERY, "tenant-b", user_context=user("tenant-b"))
+
+    assert (first["cached"], again["cached"]) == (False, True)
+    assert other["cached"] is False
+    assert other["retrieved_docs"] and all(doc.startswith("tenant-b-") for doc in other["retrieved_docs"])
+
+
+async def test_cached_answer_is_not_served_under_another_mask_policy(rag):
+    query = "屋根葺き替えの保証内容は？"
+    await rag.retrieve_and_generate(query, "tenant-a", user_context=user("tenant-a", role="manager"))
+    staff = await rag.retrieve_and_generate(query, "tenant-a", user_context=user("tenant-a", "user-2"))
+    assert staff["cached"] is False
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_generation_failures_are_never_cached(rag, streaming):
+    from src.services.rag_service import GENERATION_ERROR_MESSAGE
+
+    for llm in (rag.openai_llm, rag.claude_llm):
+        llm.failure_rate = 1.0
+
+    async def ask():
+        if not streaming:
+            return await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+        tokens = []
+        async for event, data in rag.stream_retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a")):
+            if event == "token":
+                tokens.append(data["text"])
+            elif event == "done":
+                return {**data, "answer": "".join(tokens)}
+
+    failed = await ask()
+    for llm in (rag.openai_llm, rag.claude_llm):
+        llm.failure_rate = 0.0
+    retried = await ask()
+
+    assert failed["answer"] == GENERATION_ERROR_MESSAGE
+    assert retried["cached"] is False
+    assert retried["answer"] != GENERATION_ERROR_MESSAGE
+
+
+class FinishedPipeline:
+    """Ingestion and reindexing that complete at once"""
+
+    vector_store = None
+
+    async def ingest(self, document, document_id: str):
+        return SimpleNamespace(chunks_done=1)
+
+    def get_progress(self, document_id: str):
+        return None
+
+    async def run_task(self, task_id: str, company_id: str):
+        return SimpleNamespace(error=None, documents_failed=0, documents_total=1, as_dict=dict)
+
+    def get_task(self, task_id: str):
+        return None
+
+
+@pytest.mark.parametrize("kind", ["upload", "reindex"])
+async def test_document_changes_invalidate_the_tenants_answers(rag, kind):
+    queue = InMemoryJobQueue()
+    watch = asyncio.create_task(queue.watch_tenant_changes(rag.invalidate_tenant))
+    await asyncio.sleep(0)
+    for tenant_id in ("tenant-a", "tenant-b"):
+        await rag.retrieve_and_generate(QUERY, tenant_id, user_context=user(tenant_id))
+
+    if kind == "upload":
+        document = DocumentUpload(
+            file_name="new.md", file_url="https://crm.example.com/new.md", file_size=1,
+            doc_type="manual_md", company_id="tenant-a"
+        )
+        await queue.enqueue(ingest_job(document, "tenant-a-new"))
+    else:
+        await queue.enqueue(reindex_job("tenant-a"))
+    pipeline = FinishedPipeline()
+    await JobWorker(queue, pipeline, reindex_service=pipeline, concurrency=1).handle(await queue.dequeue(timeout=1))
+    watch.cancel()
+
+    a = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+    b = await rag.retrieve_and_generate(QUERY, "tenant-b", user_context=user("tenant-b"))
+    assert (a["cached"], b["cached"]) == (False, True)
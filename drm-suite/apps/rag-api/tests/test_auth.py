@@ -0,0 +1,140 @@
+"""
+Verified-token cache: one verification per token until its `exp` (capped by
+the max TTL), no entry past expiry, a bounded LRU, and 401 for bad tokens
+"""
+
+import base64
+import json
+import sys
+
+import pytest
+
+from src.models.schemas import UserContext
+
+NOW = 1_800_000_000.0
+
+
+def jwt(**claims) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    return f"eyJhbGciOiJIUzI1NiJ9.{payload}.signature"
+
+
+class CountingVerifier:
+    """Accepts every token whose subject is not "revoked", counting calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, token: str) -> UserContext:
+        self.calls += 1
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        if claims.get("sub") == "revoked":
+            raise ValueError("signature verification failed")
+        return UserContext(user_id=claims.get("sub", "user-1"), company_id="tenant-a", role="staff")
+
+
+@pytest.fixture
+def auth(external_services):
+    """src.core.auth bound to the stand-in verifier, forgotten afterwards"""
+    import src.core.auth as auth
+
+    yield auth
+    sys.modules.pop("src.core.auth", None)
+
+
+@pytest.fixture
+def clock(auth, monkeypatch):
+    now = [NOW]
+    monkeypatch.setattr("src.core.auth.time.time", lambda: now[0])
+    return now
+
+
+def test_expiry_is_read_from_the_exp_claim(auth):
+    assert auth.token_expiry(jwt(sub="user-1", exp=NOW + 60)) == NOW + 60
+    assert auth.token_expiry(jwt(sub="user-1")) is None
+    assert auth.token_expiry("not-a-jwt") is None
+
+
+async def test_token_is_verified_once_until_it_expires(auth, clock):
+    verifier = CountingVerifier()
+    cache = auth.TokenCache(max_ttl_seconds=1800, verifier=verifier)
+    token = jwt(sub="user-1", exp=NOW + 60)
+
+    for _ in range(3):
+        assert (await cache.verify(token)).user_id == "user-1"
+    assert verifier.calls == 1
+
+    clock[0] = NOW + 59.9
+    await cache.verify(token)
+    assert verifier.calls == 1
+
+    # From `exp` on the entry is rejected and the token goes back to the verifier
+    clock[0] = NOW + 60
+    await cache.verify(token)
+    assert verifier.calls == 2
+
+
+async def test_long_lived_tokens_are_reverified_after_the_max_ttl(auth, clock):
+    verifier = CountingVerifier()
+    cache = auth.TokenCache(max_ttl_seconds=300, verifier=verifier)
+    token = jwt(sub="user-1", exp=NOW + 86400)
+
+    await cache.verify(token)
+    clock[0] = NOW + 300
+    await cache.verify(token)
+
+    assert verifier.calls == 2
+
+
+async def test_expired_tokens_are_never_cached(auth, clock):
+    verifier = CountingVerifier()
+    cache = auth.TokenCache(verifier=verifier)
+    token = jwt(sub="user-1", exp=NOW - 1)
+
+    await cache.verify(token)
+    await cache.verify(token)
+
+    assert verifier.calls == 2
+    assert not cache._entries
+
+
+async def test_entries_are_keyed_by_hash_and_bounded(auth, clock):
+    verifier = CountingVerifier()
+    cache = auth.TokenCache(max_entries=2, verifier=verifier)
+    tokens = [jwt(sub=f"user-{i}", exp=NOW + 60) for i in range(3)]
+
+    for token in (tokens[0], tokens[1], tokens[0], tokens[2]):
+        await cache.verify(token)
+    assert verifier.calls == 3
+    assert all(token not in cache._entries for token in tokens)
+
+    await cache.verify(tokens[0])
+    await cache.verify(tokens[1])
+    assert verifier.calls == 4
+
+
+async def test_failed_verification_is_a_401_and_not_cached(auth, clock, monkeypatch):
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    verifier = CountingVerifier()
+    monkeypatch.setattr(auth, "token_cache", auth.TokenCache(verifier=verifier))
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=jwt(sub="revoked", exp=NOW + 60))
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as raised:
+            await auth.get_user_context(credentials)
+        assert raised.value.status_code == 401
+    assert verifier.calls == 2
+
+
+async def test_non_admins_are_refused_with_403(auth):
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as raised:
+        await auth.require_admin(UserContext(user_id="user-1", company_id="tenant-a", role="staff"))
+    assert raised.value.status_code == 403
+
+    admin = UserContext(user_id="admin", company_id="tenant-a", role="admin", is_admin=True)
+    assert await auth.require_admin(admin) is admin
@@ -0,0 +1,70 @@
+"""
+Batch queries: one policy lookup and one embedding call per batch, at most
+BATCH_QUERY_CONCURRENCY pipelines at a time, and failures kept per item
+"""
+
+import asyncio
+
+from src.core.config import settings
+from src.models.schemas import RAGQuery
+from tests.conftest import TOPICS, user
+
+
+async def test_batch_runs_at_most_the_configured_pipelines_at_once(rag, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_QUERY_CONCURRENCY", 3)
+    running, peak = 0, 0
+    retrieve_and_generate = rag.retrieve_and_generate
+
+    async def tracked(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            await asyncio.sleep(0.01)
+            return await retrieve_and_generate(**kwargs)
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(rag, "retrieve_and_generate", tracked)
+    queries = [RAGQuery(query=f"{topic}の工期は？") for topic in TOPICS * 2]
+
+    results = await rag.batch_retrieve_and_generate(queries, "tenant-a", user_context=user("tenant-a"))
+
+    assert peak == 3
+    assert [item["index"] for item in results] == list(range(len(queries)))
+    assert all("result" in item for item in results)
+
+
+async def test_policy_and_embeddings_are_fetched_once_per_batch(rag, monkeypatch):
+    lookups = []
+    get_mask_policy = rag.mask_service.get_mask_policy
+
+    async def counted(user_context):
+        lookups.append(user_context.user_id)
+        return await get_mask_policy(user_context)
+
+    monkeypatch.setattr(rag.mask_service, "get_mask_policy", counted)
+    calls = rag.embeddings.embedder.calls
+    queries = [RAGQuery(query=f"{topic}の保証内容は？") for topic in TOPICS]
+
+    await rag.batch_retrieve_and_generate(queries, "tenant-a", user_context=user("tenant-a"))
+
+    assert lookups == ["user-1"]
+    assert rag.embeddings.embedder.calls == calls + 1
+
+
+async def test_a_failing_item_does_not_fail_the_batch(rag, monkeypatch):
+    retrieve_and_generate = rag.retrieve_and_generate
+
+    async def failing_second(**kwargs):
+        if "屋根" in kwargs["query"]:
+            raise RuntimeError("vector store timeout")
+        return await retrieve_and_generate(**kwargs)
+
+    monkeypatch.setattr(rag, "retrieve_and_generate", failing_second)
+    queries = [RAGQuery(query="外壁塗装の工期は？"), RAGQuery(query="屋根の工期は？"), RAGQuery(query="浴室の工期は？")]
+
+    results = await rag.batch_retrieve_and_generate(queries, "tenant-a", user_context=user("tenant-a"))
+
+    assert results[1] == {"index": 1, "error": "vector store timeout"}
+    assert "result" in results[0] and "result" in results[2]
@@ -0,0 +1,169 @@
+"""
+Change events: coalescing per document, dead-lettering and offset commits
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytest
+
+from src.core.config import settings
+from src.services.change_events import CommitFailed, DocumentChangeConsumer, InMemoryBroker, next_offsets
+
+TOPIC = "document-changes"
+GROUP = "rag-ingestion"
+
+
+class RecordingPipeline:
+    """The IngestionPipeline calls the consumer makes, recorded and optionally failing per document"""
+
+    def __init__(self, broker: InMemoryBroker, failing: Set[str] = frozenset()):
+        self.broker = broker
+        self.failing = failing
+        self.vector_store = self
+        self.applied: List[Tuple[str, str, Optional[str]]] = []
+        self.committed_while_applying: List[int] = []
+
+    def _record(self, op: str, document_id: str, file_name: Optional[str]) -> None:
+        self.committed_while_applying.append(sum(
+            self.broker.committed(GROUP, TOPIC, partition) for partition in range(self.broker.partitions)
+        ))
+        if document_id in self.failing:
+            raise RuntimeError("embedding provider down")
+        self.applied.append((op, document_id, file_name))
+
+    async def reindex_document(self, document, document_id: str) -> Dict[str, int]:
+        self._record("upsert", document_id, document.file_name)
+        return {"added": 1, "kept": 2}
+
+    async def delete_document(self, company_id: str, document_id: str) -> int:
+        self._record("delete", document_id, None)
+        return 3
+
+
+def event(kind: str, document_id: str, version: int = 0, company_id: str = "a") -> Dict:
+    data = {"type": f"document.{kind}", "company_id": company_id, "document_id": document_id}
+    if kind != "deleted":
+        data["document"] = {
+            "file_name": f"{document_id}-v{version}.md",
+            "file_url": f"https://crm.example.com/files/{document_id}/{version}",
+            "file_size": 100,
+            "doc_type": "manual_md",
+        }
+    return data
+
+
+@pytest.fixture(autouse=True)
+def change_settings(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_ALLOWED_URL_HOSTS", "crm.example.com")
+    monkeypatch.setattr(settings, "INGEST_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(settings, "CHANGE_EVENTS_DEAD_LETTER_TOPIC", "document-changes.dead-letter")
+
+
+def consumer_for(broker: InMemoryBroker, pipeline: RecordingPipeline, **kwargs) -> DocumentChangeConsumer:
+    return DocumentChangeConsumer(
+        broker.consumer(TOPIC, GROUP), pipeline, batch_size=100, window_seconds=0.05, **kwargs
+    )
+
+
+async def test_batch_applies_only_the_last_change_per_document():
+    broker = InMemoryBroker()
+    for data in [
+        event("created", "roof", 0),
+        event("updated", "roof", 1),
+        event("created", "bath", 0),
+        event("updated", "roof", 2),
+        event("updated", "bath", 1),
+        event("deleted", "bath"),
+    ]:
+        broker.produce(TOPIC, data["document_id"], data)
+    pipeline = RecordingPipeline(broker)
+    notified: List[str] = []
+
+    async def on_tenant_changed(company_id: str) -> None:
+        notified.append(company_id)
+
+    consumer = consumer_for(broker, pipeline, on_tenant_changed=on_tenant_changed)
+    stats = await consumer.process(await consumer.next_batch())
+
+    assert sorted(pipeline.applied) == [("delete", "bath", None), ("upsert", "roof", "roof-v2.md")]
+    assert stats["events"] == 6
+    assert stats["coalesced"] == 4
+    assert stats["applied"] == 2
+    assert stats["chunks_added"] == 1
+    assert stats["chunks_deleted"] == 3
+    assert notified == ["a"]
+
+
+async def test_offsets_are_committed_after_the_batch_is_applied():
+    broker = InMemoryBroker()
+    records = [broker.produce(TOPIC, f"doc{i}", event("created", f"doc{i}")) for i in range(10)]
+    pipeline = RecordingPipeline(broker)
+    consumer = consumer_for(broker, pipeline)
+
+    await consumer.process(await consumer.next_batch())
+
+    assert set(pipeline.committed_while_applying) == {0}
+    for (topic, partition), offset in next_offsets(records).items():
+        assert broker.committed(GROUP, topic, partition) == offset
+    assert sum((await consumer.source.lag()).values()) == 0
+
+
+async def test_uncommitted_events_are_redelivered_to_a_new_consumer():
+    broker = InMemoryBroker()
+    broker.produce(TOPIC, "roof", event("created", "roof"))
+    crashed = consumer_for(broker, RecordingPipeline(broker))
+    assert len(await crashed.next_batch()) == 1  # read, then the process died before committing
+
+    pipeline = RecordingPipeline(broker)
+    restarted = consumer_for(broker, pipeline)
+    await restarted.process(await restarted.next_batch())
+    assert pipeline.applied == [("upsert", "roof", "roof-v0.md")]
+    assert await restarted.next_batch() == []
+
+
+async def test_failing_and_invalid_events_are_dead_lettered_and_committed_past():
+    broker = InMemoryBroker()
+    broker.produce(TOPIC, "roof", event("created", "roof"))
+    broker.produce(TOPIC, "bath", event("created", "bath"))
+    broker.produce(TOPIC, "bad", {"type": "document.renamed", "company_id": "a", "document_id": "bad"})
+    broker.produce(TOPIC, "evil", {**event("created", "evil"), "document": {
+        **event("created", "evil")["document"], "file_url": "file:///etc/passwd"
+    }})
+    pipeline = RecordingPipeline(broker, failing={"bath"})
+    consumer = consumer_for(broker, pipeline, max_attempts=2)
+
+    stats = await consumer.process(await consumer.next_batch())
+
+    assert pipeline.applied == [("upsert", "roof", "roof-v0.md")]
+    assert (stats["applied"], stats["failed"], stats["invalid"]) == (1, 1, 2)
+    dead_letters = sorted(
+        record.key for log in broker.log(settings.CHANGE_EVENTS_DEAD_LETTER_TOPIC) for record in log
+    )
+    assert dead_letters == [b"bad", b"bath", b"evil"]
+    assert sum((await consumer.source.lag()).values()) == 0
+
+
+async def test_batch_not_committed_after_a_rebalance_is_read_again_in_smaller_batches():
+    broker = InMemoryBroker()
+    for i in range(8):
+        broker.produce(TOPIC, f"doc{i}", event("created", f"doc{i}"))
+    pipeline = RecordingPipeline(broker)
+    consumer = consumer_for(broker, pipeline)
+    commit = consumer.source.commit
+    failures = [CommitFailed("group rebalanced")]
+
+    async def commit_once_failing(offsets):
+        if failures:
+            raise failures.pop()
+        await commit(offsets)
+
+    consumer.source.commit = commit_once_failing
+
+    stats = await consumer.process(await consumer.next_batch())
+    assert stats["uncommitted"] == 8
+    assert consumer.batch_size == 50
+    assert sum((await consumer.source.lag()).values()) == 8
+
+    await consumer.process(await consumer.next_batch())
+    assert len(pipeline.applied) == 16
+    assert sum((await consumer.source.lag()).values()) == 0
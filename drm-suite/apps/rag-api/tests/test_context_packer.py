@@ -0,0 +1,45 @@
+"""
+Context packing: budget accounting including separators, and skipping chunks that do not fit
+"""
+
+from typing import List
+
+from langchain.schema import Document
+
+from src.services.context_packer import CONTEXT_SEPARATOR, ContextPacker, format_context_block
+from tests.fakes import FakeTokenizer
+
+
+def chunk(text: str, document_id: str) -> Document:
+    return Document(page_content=text, metadata={"document_id": document_id, "file_name": f"{document_id}.pdf"})
+
+
+def prompt_tokens(query: str, documents: List[Document]) -> int:
+    return len(query) + len(CONTEXT_SEPARATOR.join(format_context_block(doc) for doc in documents))
+
+
+def test_chunk_too_large_to_truncate_does_not_stop_packing():
+    packer = ContextPacker(FakeTokenizer(), min_truncated_tokens=64)
+    documents = [
+        chunk("屋根の標準工期は5日です。", "roof"),
+        chunk("外壁" * 200, "wall"),
+        chunk("浴室の保証は2年です。", "bath"),
+    ]
+    budget = prompt_tokens("工期", documents[:1]) + 60
+
+    packed = packer.pack("工期", documents, budget)
+
+    assert [doc.metadata["document_id"] for doc in packed.documents] == ["roof", "bath"]
+    assert packed.dropped == 1
+    assert packed.truncated == 0
+
+
+def test_token_count_includes_separators_and_stays_within_budget():
+    packer = ContextPacker(FakeTokenizer(), min_truncated_tokens=8)
+    documents = [chunk(f"{i}番目の資料の本文です。" * 3, f"doc{i}") for i in range(6)]
+    query = "資料"
+
+    for budget in range(40, 400, 7):
+        packed = packer.pack(query, documents, budget)
+        assert packed.token_count == prompt_tokens(query, packed.documents)
+        assert packed.token_count <= budget
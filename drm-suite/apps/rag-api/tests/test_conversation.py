@@ -0,0 +1,176 @@
+"""
+Conversation sessions: older turns folded into a bounded summary, follow-ups
+condensed (or left as asked when that fails), turns of one session recorded
+in order, and sessions private to the tenant and user that started them
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from src.services.conversation import ConversationManager, Session, SessionStore, Turn
+from src.services.query_log_writer import QUERY_LOG_COLUMNS
+from tests.conftest import user
+from tests.fakes import FakeTokenizer
+
+SESSION_ID = "session-1"
+KEY = SessionStore.make_key("tenant-a", "user-1", SESSION_ID)
+
+
+class ScriptedGateway:
+    """LLM gateway returning `reply` (or raising `error`) after `delay`, recording prompts"""
+
+    def __init__(self, reply: str = "", error: Exception = None, delay: float = 0.0):
+        self.reply = reply
+        self.error = error
+        self.delay = delay
+        self.prompts = []
+
+    async def ainvoke(self, prompt: str, provider: str) -> str:
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+
+def manager(gateway: ScriptedGateway, **kwargs) -> ConversationManager:
+    limits = {"max_recent_turns": 2, "recent_token_budget": 200, "summary_max_tokens": 50, "turn_max_tokens": 80}
+    return ConversationManager(SessionStore(), gateway, FakeTokenizer(), **{**limits, **kwargs})
+
+
+async def test_oldest_turns_are_folded_into_the_summary():
+    gateway = ScriptedGateway(reply="  外壁塗装の工期と保証を相談中  ")
+    conversations = manager(gateway)
+    for question in ("工期は？", "保証は？", "費用は？"):
+        await conversations.record(KEY, question, "回答です。")
+
+    session = await conversations.store.get(KEY)
+    assert [turn.question for turn in session.turns] == ["保証は？", "費用は？"]
+    assert session.summary == "外壁塗装の工期と保証を相談中"
+    assert session.turn_count == 3
+    assert len(gateway.prompts) == 1 and "工期は？" in gateway.prompts[0]
+
+
+async def test_failed_summary_keeps_the_latest_text_within_its_cap():
+    conversations = manager(ScriptedGateway(error=RuntimeError("provider down")), max_recent_turns=1)
+    for i in range(3):
+        await conversations.record(KEY, f"質問{i}" * 10, f"回答{i}" * 10)
+
+    session = await conversations.store.get(KEY)
+    assert len(session.summary) == conversations.summary_max_tokens
+    assert session.summary.endswith("回答1" * 10)
+
+
+async def test_history_stays_within_max_history_tokens():
+    rng = random.Random(0)
+    conversations = manager(ScriptedGateway(reply="要約" * 500))
+
+    for turn in range(30):
+        question = "質" * rng.randint(1, 200)
+        answer = "答" * rng.randint(1, 400)
+        await conversations.record(KEY, question, answer)
+        history = conversations.history_text(await conversations.store.get(KEY))
+        assert conversations.history_tokens(history) <= conversations.max_history_tokens
+
+
+async def test_follow_up_is_condensed_into_a_standalone_question():
+    gateway = ScriptedGateway(reply=" 外壁塗装の保証期間は何年ですか \n")
+    conversations = manager(gateway)
+
+    assert await conversations.condense(Session(KEY), "保証は？") == "保証は？"
+    assert gateway.prompts == []  # nothing to condense against
+
+    with_history = Session(KEY, turns=[Turn("外壁塗装の工期は？", "5日です。")])
+    assert await conversations.condense(with_history, "保証は？") == "外壁塗装の保証期間は何年ですか"
+
+
+@pytest.mark.parametrize("gateway", [
+    ScriptedGateway(error=RuntimeError("provider down")),
+    ScriptedGateway(reply="   "),
+    ScriptedGateway(reply="長" * 81),
+], ids=["error", "empty", "too-long"])
+async def test_condensing_falls_back_to_the_question_as_asked(gateway):
+    session = Session(KEY, turns=[Turn("外壁塗装の工期は？", "5日です。")])
+    assert await manager(gateway).condense(session, "保証は？") == "保証は？"
+
+
+async def test_concurrent_turns_of_one_session_are_all_recorded():
+    # Every record after the first summarizes, so unserialized writers would overwrite each other
+    conversations = manager(ScriptedGateway(reply="要約", delay=0.01), max_recent_turns=1)
+    other = SessionStore.make_key("tenant-a", "user-2", SESSION_ID)
+
+    await asyncio.gather(*(
+        conversations.record(key, f"質問{i}", f"回答{i}") for i in range(5) for key in (KEY, other)
+    ))
+
+    for key in (KEY, other):
+        session = await conversations.store.get(key)
+        assert session.turn_count == 5
+        assert [turn.question for turn in session.turns] == ["質問4"]
+
+
+async def test_same_session_id_is_separate_per_tenant_and_user():
+    store = SessionStore(max_sessions=10, ttl_seconds=60)
+    key = SessionStore.make_key("tenant-a", "user-1", SESSION_ID)
+    await store.put(Session(key, turns=[Turn("外壁塗装の工期は？", "5日です。")]))
+
+    assert (await store.get(key)).turns[0].answer == "5日です。"
+    assert await store.get(SessionStore.make_key("tenant-b", "user-1", SESSION_ID)) is None
+    assert await store.get(SessionStore.make_key("tenant-a", "user-2", SESSION_ID)) is None
+    assert not await store.delete(SessionStore.make_key("tenant-b", "user-1", SESSION_ID))
+    assert await store.get(key) is not None
+
+
+async def test_redis_sessions_are_keyed_by_tenant_and_user():
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.FakeAsyncRedis()
+    writer = SessionStore(redis_client=redis_client)
+    key = SessionStore.make_key("tenant-a", "user-1", SESSION_ID)
+    await writer.put(Session(key, summary="外壁塗装の相談"))
+
+    # Another worker, with nothing in its local LRU
+    reader = SessionStore(redis_client=redis_client)
+    assert (await reader.get(key)).summary == "外壁塗装の相談"
+    assert await reader.get(SessionStore.make_key("tenant-b", "user-1", SESSION_ID)) is None
+    await writer.close()
+
+
+async def test_history_is_not_shared_across_tenants_or_users(rag):
+    await rag.retrieve_and_generate(
+        "外壁塗装の標準工期を教えてください", "tenant-a", user_context=user("tenant-a"), session_id=SESSION_ID
+    )
+    await rag.drain_background_tasks()
+
+    assert (await rag.conversations.load("tenant-a", "user-1", SESSION_ID)).has_history
+    assert not (await rag.conversations.load("tenant-b", "user-1", SESSION_ID)).has_history
+    assert not (await rag.conversations.load("tenant-a", "user-2", SESSION_ID)).has_history
+
+    follow_up = await rag.retrieve_and_generate(
+        "保証はどうですか", "tenant-b", user_context=user("tenant-b"), session_id=SESSION_ID
+    )
+    assert follow_up["condensed_query"] is None
+    assert all(doc.startswith("tenant-b-") for doc in follow_up["retrieved_docs"])
+
+
+async def test_follow_up_is_logged_as_its_standalone_question(rag, monkeypatch):
+    async def condense(session, question):
+        return "外壁塗装の保証内容を教えてください"
+
+    monkeypatch.setattr(rag.conversations, "condense", condense)
+    await rag.retrieve_and_generate(
+        "外壁塗装の標準工期を教えてください", "tenant-a", user_context=user("tenant-a"), session_id=SESSION_ID
+    )
+    await rag.drain_background_tasks()
+    follow_up = await rag.retrieve_and_generate(
+        "保証はどうですか", "tenant-a", user_context=user("tenant-a"), session_id=SESSION_ID
+    )
+    await rag.drain_background_tasks()
+    await rag.log_writer.flush()
+
+    query = QUERY_LOG_COLUMNS.index("query")
+    assert follow_up["condensed_query"] == "外壁塗装の保証内容を教えてください"
+    assert [row[query] for row in rag.log_writer.sink.rows] == [
+        "外壁塗装の標準工期を教えてください", "外壁塗装の保証内容を教えてください"
+    ]
@@ -0,0 +1,106 @@
+"""
+Query-embedding cache: normalized keys, LRU and TTL eviction, the shared Redis
+tier, and one embedding call for the misses of a batch
+"""
+
+import numpy as np
+import pytest
+
+from src.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from tests.fakes import FakeEmbeddings
+
+MODEL = "text-embedding-3-large"
+
+
+def vector(value: float) -> np.ndarray:
+    return np.full(4, value, dtype=np.float32)
+
+
+def test_width_and_case_variants_share_a_key_per_model():
+    key = EmbeddingCache.make_key(MODEL, "ＲＣ造の 工期は？")
+    assert EmbeddingCache.make_key(MODEL, "  rc造の　工期は? ") == key
+    assert EmbeddingCache.make_key("text-embedding-3-small", "ＲＣ造の 工期は？") != key
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=60)
+    cache.put_local("a", vector(1))
+    cache.put_local("b", vector(2))
+    assert cache.get_local("a") is not None
+
+    cache.put_local("c", vector(3))
+
+    assert cache.get_local("b") is None
+    assert cache.get_local("a") is not None and cache.get_local("c") is not None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("src.services.embedding_cache.time.monotonic", lambda: clock[0])
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=30)
+    cache.put_local("a", vector(1))
+
+    clock[0] += 30
+    assert cache.get_local("a") is not None
+    clock[0] += 1
+    assert cache.get_local("a") is None
+
+
+async def test_redis_tier_is_shared_and_promoted_into_the_local_tier():
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.FakeAsyncRedis()
+    writer = EmbeddingCache(max_entries=10, ttl_seconds=60, redis_client=redis_client)
+    await writer.put("a", vector(0.5))
+
+    # Another worker, with nothing in its local tier
+    reader = EmbeddingCache(max_entries=10, ttl_seconds=60, redis_client=redis_client)
+    assert reader.get_local("a") is None
+    np.testing.assert_array_equal(await reader.get("a"), vector(0.5))
+    np.testing.assert_array_equal(reader.get_local("a"), vector(0.5))
+    assert 0 < await redis_client.ttl("rag:emb:a") <= 60
+    await writer.close()
+
+
+async def test_unreachable_redis_is_a_miss_not_an_error():
+    class DownRedis:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def set(self, key, value, ex=None):
+            raise ConnectionError("redis down")
+
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=60, redis_client=DownRedis())
+    assert await cache.get("a") is None
+    await cache.put("a", vector(1))
+    assert await cache.get("a") is not None
+
+
+async def test_repeated_queries_are_embedded_once():
+    embedder = FakeEmbeddings(dim=8)
+    embeddings = CachedEmbeddings(embedder, MODEL, EmbeddingCache(max_entries=10, ttl_seconds=60))
+
+    first = await embeddings.aembed_query_array("外壁塗装の工期は？")
+    again = await embeddings.aembed_query_array("外壁塗装の工期は? ")
+
+    assert embedder.calls == 1
+    np.testing.assert_array_equal(first, again)
+
+
+async def test_batch_misses_are_embedded_in_one_call_without_duplicates():
+    embedder = FakeEmbeddings(dim=8)
+    embeddings = CachedEmbeddings(embedder, MODEL, EmbeddingCache(max_entries=10, ttl_seconds=60))
+    cached = await embeddings.aembed_query_array("屋根の工期は？")
+    embedded = []
+    aembed_documents = embedder.aembed_documents
+
+    async def recording(texts):
+        embedded.append(list(texts))
+        return await aembed_documents(texts)
+
+    embedder.aembed_documents = recording
+
+    vectors = await embeddings.aembed_queries_array(["屋根の工期は？", "浴室の費用は？", "浴室の費用は？", "防水の保証は？"])
+
+    assert embedded == [["浴室の費用は？", "防水の保証は？"]]
+    np.testing.assert_array_equal(vectors[0], cached)
+    np.testing.assert_array_equal(vectors[1], vectors[2])
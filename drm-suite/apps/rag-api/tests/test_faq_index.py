@@ -0,0 +1,210 @@
+"""
+FAQ index: answer and suggestion thresholds, doc-type visibility, learning
+from answered-query history, background rebuilds, and entries that stay
+within their tenant
+"""
+
+import asyncio
+from typing import Dict, List
+
+import numpy as np
+
+from src.models.schemas import DocumentType, MaskPolicy
+from src.services.faq_index import FAQIndex, InMemoryFAQStore, frequent_answers
+from tests.conftest import TENANTS, user
+
+QUESTION = "外壁塗装の保証期間は何年ですか"
+ANSWER = "外壁塗装の保証期間は10年です。"
+
+
+async def faq_index_for(rag, store: InMemoryFAQStore) -> FAQIndex:
+    faq_index = FAQIndex(store, rag.embeddings, rag.vector_store.list_documents, min_occurrences=2)
+    for tenant_id in TENANTS:
+        await faq_index.build_tenant(tenant_id)
+    return faq_index
+
+
+async def test_template_answers_only_its_own_tenant(rag):
+    store = InMemoryFAQStore()
+    template = await store.add_template("tenant-a", QUESTION, ANSWER, [], "admin")
+    rag.attach_faq_index(await faq_index_for(rag, store))
+
+    own = await rag.retrieve_and_generate(QUESTION, "tenant-a", user_context=user("tenant-a"))
+    other = await rag.retrieve_and_generate(QUESTION, "tenant-b", user_context=user("tenant-b"))
+
+    assert own["faq_id"] == template.entry_id
+    assert own["answer"] == ANSWER
+    assert "faq_id" not in other
+    assert other["answer"] != ANSWER
+    assert all(doc.startswith("tenant-b-") for doc in other["retrieved_docs"])
+    await rag.faq_index.close()
+
+
+async def test_frequent_answers_are_learned_per_tenant(rag):
+    store = InMemoryFAQStore()
+    for _ in range(3):
+        store.record_answer("tenant-a", QUESTION, ANSWER, ["tenant-a-doc-0"], 0.9)
+    faq_index = await faq_index_for(rag, store)
+    vector = await rag.embeddings.aembed_query_array(QUESTION)
+
+    assert [entry.answer for entry in faq_index.entries("tenant-a")] == [ANSWER]
+    assert faq_index.entries("tenant-b") == []
+    assert faq_index.match("tenant-a", vector).entry is not None
+    assert faq_index.match("tenant-b", vector).entry is None
+    await faq_index.close()
+
+
+async def test_dropping_a_tenant_keeps_other_tenants(rag):
+    store = InMemoryFAQStore()
+    for tenant_id in TENANTS:
+        await store.add_template(tenant_id, QUESTION, f"{tenant_id}: {ANSWER}", [], "admin")
+    faq_index = await faq_index_for(rag, store)
+    vector = await rag.embeddings.aembed_query_array(QUESTION)
+
+    faq_index.drop_tenant("tenant-a")
+
+    assert faq_index.match("tenant-a", vector).entry is None
+    assert faq_index.match("tenant-b", vector).entry.answer == f"tenant-b: {ANSWER}"
+    await faq_index.close()
+
+
+class AxisEmbeddings:
+    """Each known question embeds to a fixed vector; `gate`, when set, holds embedding until released"""
+
+    def __init__(self, vectors: Dict[str, np.ndarray]):
+        self.vectors = vectors
+        self.gate = None
+
+    async def aembed_queries_array(self, texts: List[str]) -> List[np.ndarray]:
+        if self.gate is not None:
+            await self.gate.wait()
+        return [self.vectors[text] for text in texts]
+
+
+def unit(angle_degrees: float) -> np.ndarray:
+    """A vector at `angle_degrees` from [1, 0]: cosine to it is cos(angle)"""
+    angle = np.radians(angle_degrees)
+    return np.array([np.cos(angle), np.sin(angle)], dtype=np.float32)
+
+
+async def no_documents(tenant_id: str) -> List[Dict]:
+    return []
+
+
+def faq_index_over(store, vectors, documents=no_documents, **kwargs) -> FAQIndex:
+    return FAQIndex(
+        store, AxisEmbeddings(vectors), documents, answer_threshold=0.95, suggest_threshold=0.80, **kwargs
+    )
+
+
+async def test_strong_matches_answer_and_weaker_ones_are_suggested():
+    store = InMemoryFAQStore()
+    await store.add_template("tenant-a", QUESTION, ANSWER, [], "admin")
+    faq_index = faq_index_over(store, {QUESTION: unit(0)})
+    await faq_index.build_tenant("tenant-a")
+
+    answered = faq_index.match("tenant-a", unit(10))  # cosine 0.985
+    suggested = faq_index.match("tenant-a", unit(30))  # cosine 0.866
+    missed = faq_index.match("tenant-a", unit(60))  # cosine 0.5
+
+    assert answered.entry.answer == ANSWER and answered.suggestions == []
+    assert suggested.entry is None and suggested.suggestions == [QUESTION]
+    assert missed.entry is None and missed.suggestions == []
+    await faq_index.close()
+
+
+async def test_entries_outside_the_allowed_doc_types_are_hidden():
+    store = InMemoryFAQStore()
+    await store.add_template("tenant-a", QUESTION, ANSWER, ["cost_pdf"], "admin")
+    faq_index = faq_index_over(store, {QUESTION: unit(0)})
+    await faq_index.build_tenant("tenant-a")
+
+    manuals_only = MaskPolicy(allowed_doc_types=[DocumentType.MANUAL_MD])
+    with_costs = MaskPolicy(allowed_doc_types=[DocumentType.MANUAL_MD, DocumentType.COST_PDF])
+
+    hidden = faq_index.match("tenant-a", unit(0), manuals_only)
+    assert (hidden.entry, hidden.suggestions) == (None, [])
+    assert faq_index.match("tenant-a", unit(0), with_costs).entry.answer == ANSWER
+    assert faq_index.match("tenant-a", unit(0), MaskPolicy()).entry.answer == ANSWER
+    await faq_index.close()
+
+
+def test_frequent_answers_keep_questions_asked_often_enough():
+    rows = [
+        (QUESTION, "newest answer", ["doc-1"], 0.9),
+        (f" {QUESTION}\u3000", "older answer", ["doc-1"], 0.9),  # same question once normalized
+        (QUESTION, "older answer", ["doc-1"], 0.9),
+        ("屋根の工期は？", "5日です。", ["doc-2"], 0.9),
+        ("屋根の工期は？", "5日です。", ["doc-2"], 0.9),
+        ("浴室の費用は？", "failed", ["doc-3"], 0.9),
+        ("浴室の費用は？", "failed", ["doc-3"], 0.9),
+        ("浴室の費用は？", "failed", ["doc-3"], 0.9),
+    ]
+
+    frequent = frequent_answers(rows, min_occurrences=3, ignore_answers=["failed"])
+
+    assert [(entry.question, entry.answer, entry.asked) for entry in frequent] == [
+        (QUESTION, "newest answer", 3)
+    ]
+    assert [entry.question for entry in frequent_answers(rows, min_occurrences=2, ignore_answers=["failed"])] == [
+        QUESTION, "屋根の工期は？"
+    ]
+
+
+async def test_only_confident_answers_with_live_sources_are_learned():
+    store = InMemoryFAQStore()
+    low = "屋根の工期は？"
+    deleted = "浴室の費用は？"
+    for _ in range(3):
+        store.record_answer("tenant-a", QUESTION, ANSWER, ["doc-1"], 0.9)
+        store.record_answer("tenant-a", low, "5日です。", ["doc-1"], 0.6)
+        store.record_answer("tenant-a", deleted, "80万円です。", ["doc-gone"], 0.9)
+
+    async def documents(tenant_id: str) -> List[Dict]:
+        return [{"document_id": "doc-1", "doc_type": "manual_md"}]
+
+    vectors = {QUESTION: unit(0), low: unit(45), deleted: unit(90)}
+    faq_index = faq_index_over(store, vectors, documents, min_confidence=0.75, min_occurrences=3)
+    assert await faq_index.build_tenant("tenant-a") == 1
+
+    [entry] = faq_index.entries("tenant-a")
+    assert (entry.question, entry.source, entry.doc_types) == (QUESTION, "log", ["manual_md"])
+    await faq_index.close()
+
+
+async def test_tenant_dropped_during_a_build_is_not_swapped_in():
+    store = InMemoryFAQStore()
+    await store.add_template("tenant-a", QUESTION, ANSWER, [], "admin")
+    faq_index = faq_index_over(store, {QUESTION: unit(0)})
+    faq_index.embeddings.gate = asyncio.Event()
+
+    build = asyncio.create_task(faq_index.build_tenant("tenant-a"))
+    await asyncio.sleep(0.01)
+    faq_index.drop_tenant("tenant-a")
+    faq_index.embeddings.gate.set()
+
+    assert await build == 0
+    assert faq_index.entries("tenant-a") == []
+    await faq_index.close()
+
+
+async def test_stale_tenant_is_rebuilt_in_the_background(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("src.services.faq_index.time.monotonic", lambda: clock[0])
+    store = InMemoryFAQStore()
+    await store.add_template("tenant-a", QUESTION, ANSWER, [], "admin")
+    new_question = "屋根の工期は？"
+    faq_index = faq_index_over(store, {QUESTION: unit(0), new_question: unit(90)}, refresh_seconds=60)
+    await faq_index.build_tenant("tenant-a")
+    await store.add_template("tenant-a", new_question, "5日です。", [], "admin")
+
+    assert faq_index.match("tenant-a", unit(90)).entry is None
+    assert "tenant-a" not in faq_index._builds
+
+    clock[0] += 61
+    stale = faq_index.match("tenant-a", unit(90))
+    assert stale.entry is None  # served from the old entries while rebuilding
+    await faq_index._builds["tenant-a"]
+
+    assert faq_index.match("tenant-a", unit(90)).entry.answer == "5日です。"
+    await faq_index.close()
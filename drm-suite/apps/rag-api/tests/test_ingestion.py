@@ -0,0 +1,93 @@
+"""
+Ingestion: remote downloads are bounded by MAX_FILE_SIZE_MB
+"""
+
+import functools
+import os
+
+import httpx
+import pytest
+
+from src.core.config import settings
+from src.services.ingestion import FileTooLarge, open_local_copy
+
+FILE_URL = "https://crm.example.com/files/manual.md"
+MB = 1024 * 1024
+BLOCK = 256 * 1024
+
+
+@pytest.fixture(autouse=True)
+def download_settings(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_ALLOWED_URL_HOSTS", "crm.example.com")
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 1)
+    monkeypatch.setattr(settings, "INGEST_DOWNLOAD_CHUNK_BYTES", BLOCK)
+
+
+def serve(monkeypatch, handler):
+    """Route open_local_copy's client to handler; returns the requests it received"""
+    requests = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return handler(request)
+
+    client = functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(record))
+    monkeypatch.setattr(httpx, "AsyncClient", client)
+    return requests
+
+
+def stream(blocks: int):
+    async def body():
+        for _ in range(blocks):
+            yield b"x" * BLOCK
+
+    return body()
+
+
+async def test_download_within_the_limit_is_written_to_a_temp_file(monkeypatch):
+    serve(monkeypatch, lambda request: httpx.Response(200, content=stream(3)))
+
+    async with open_local_copy(FILE_URL) as path:
+        assert os.path.getsize(path) == 3 * BLOCK
+    assert not os.path.exists(path)
+
+
+async def test_declared_content_length_over_the_limit_is_refused_before_reading(monkeypatch):
+    read = []
+
+    async def body():
+        read.append(True)
+        yield b"x"
+
+    serve(monkeypatch, lambda request: httpx.Response(200, headers={"content-length": str(2 * MB)}, content=body()))
+
+    with pytest.raises(FileTooLarge):
+        async with open_local_copy(FILE_URL):
+            pass
+    assert read == []
+
+
+async def test_stream_without_content_length_stops_past_the_limit(monkeypatch):
+    sent = []
+
+    async def body():
+        for _ in range(100):
+            sent.append(True)
+            yield b"x" * BLOCK
+
+    serve(monkeypatch, lambda request: httpx.Response(200, content=body()))
+
+    with pytest.raises(FileTooLarge):
+        async with open_local_copy(FILE_URL):
+            pass
+    assert len(sent) == 5
+
+
+async def test_local_file_over_the_limit_is_refused(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "INGEST_LOCAL_FILE_ROOT", str(tmp_path))
+    large = tmp_path / "large.md"
+    large.write_bytes(b"x" * (MB + 1))
+
+    with pytest.raises(FileTooLarge):
+        async with open_local_copy(large.as_uri()):
+            pass
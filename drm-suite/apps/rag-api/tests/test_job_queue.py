@@ -0,0 +1,173 @@
+"""
+Job queue: retries, lease expiry, dead-lettering and dedupe (in-memory and Redis),
+and workers abandoning jobs whose lease was lost
+"""
+
+import asyncio
+
+import pytest
+
+from src.core.config import settings
+from src.models.schemas import DocumentUpload
+from src.services.job_queue import (
+    BULK,
+    COMPLETED,
+    DEAD,
+    RETRYING,
+    RUNNING,
+    InMemoryJobQueue,
+    Job,
+    RedisJobQueue,
+)
+from src.services.job_worker import JobWorker, ingest_job
+
+
+@pytest.fixture(params=["memory", "redis"])
+async def queue(request, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.2)
+    if request.param == "memory":
+        yield InMemoryJobQueue()
+        return
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_queue = RedisJobQueue(fakeredis.FakeAsyncRedis(), prefix="test:jobs:")
+    yield redis_queue
+    await redis_queue.close()
+
+
+async def test_failed_job_is_retried_then_completes(queue):
+    job = await queue.enqueue(Job(kind="ingest", company_id="a"))
+
+    first = await queue.dequeue(timeout=1)
+    assert (first.job_id, first.status, first.attempts) == (job.job_id, RUNNING, 1)
+    await queue.fail(first, "embedding provider down")
+    assert (await queue.get(job.job_id)).status == RETRYING
+
+    second = await queue.dequeue(timeout=1)
+    assert (second.job_id, second.attempts) == (job.job_id, 2)
+    await queue.complete(second, {"chunks": 3})
+
+    finished = await queue.get(job.job_id)
+    assert finished.status == COMPLETED
+    assert finished.result == {"chunks": 3}
+    assert await queue.dequeue(timeout=0.05) is None
+
+
+async def test_job_is_dead_lettered_after_max_attempts(queue):
+    job = await queue.enqueue(Job(kind="ingest", company_id="a", max_attempts=2, dedupe_key="ingest:a:doc"))
+
+    for _ in range(2):
+        running = await queue.dequeue(timeout=1)
+        await queue.fail(running, "unreadable PDF")
+
+    dead = await queue.get(job.job_id)
+    assert (dead.status, dead.attempts, dead.error) == (DEAD, 2, "unreadable PDF")
+    assert [job.job_id for job in await queue.dead_letters()] == [job.job_id]
+    assert await queue.dequeue(timeout=0.05) is None
+
+    # A dead job no longer holds its dedupe key
+    again = await queue.enqueue(Job(kind="ingest", company_id="a", dedupe_key="ingest:a:doc"))
+    assert again.job_id != job.job_id
+
+
+async def test_expired_lease_is_retried(queue):
+    job = await queue.enqueue(Job(kind="ingest", company_id="a"))
+    await queue.dequeue(timeout=1)
+
+    # The worker stopped heartbeating
+    await asyncio.sleep(0.3)
+    retried = await queue.dequeue(timeout=1)
+    assert (retried.job_id, retried.attempts) == (job.job_id, 2)
+
+
+async def test_heartbeat_keeps_the_lease(queue):
+    await queue.enqueue(Job(kind="ingest", company_id="a"))
+    running = await queue.dequeue(timeout=1)
+
+    for _ in range(4):
+        await asyncio.sleep(0.1)
+        await queue.heartbeat(running)
+        assert await queue.dequeue(timeout=0.01) is None
+    await queue.complete(running)
+    assert (await queue.get(running.job_id)).attempts == 1
+
+
+async def test_unfinished_job_holds_its_dedupe_key(queue):
+    first = await queue.enqueue(Job(kind="reindex", company_id="a", lane=BULK, dedupe_key="reindex:a"))
+    second = await queue.enqueue(Job(kind="reindex", company_id="a", lane=BULK, dedupe_key="reindex:a"))
+    assert second.job_id == first.job_id
+
+    running = await queue.dequeue(timeout=1)
+    await queue.complete(running)
+    third = await queue.enqueue(Job(kind="reindex", company_id="a", lane=BULK, dedupe_key="reindex:a"))
+    assert third.job_id != first.job_id
+
+
+async def test_in_memory_queue_forgets_finished_jobs_after_ttl(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RESULT_TTL_SECONDS", 0)
+    queue = InMemoryJobQueue()
+    job = await queue.enqueue(Job(kind="ingest", company_id="a", max_attempts=1))
+    await queue.fail(await queue.dequeue(timeout=1), "unreadable PDF")
+    assert (await queue.get(job.job_id)).status == DEAD
+
+    assert await queue.dequeue(timeout=0.01) is None
+    assert await queue.get(job.job_id) is None
+    assert await queue.dead_letters() == []
+
+
+async def test_heartbeat_after_the_lease_was_lost_does_not_save(queue):
+    job = await queue.enqueue(Job(kind="ingest", company_id="a"))
+    stale = await queue.dequeue(timeout=1)
+    await asyncio.sleep(0.3)
+    assert not await queue.heartbeat(stale)
+
+    # Reaped and claimed by another worker: the first worker still must not renew or save
+    current = await queue.dequeue(timeout=1)
+    assert current.attempts == 2
+    if isinstance(queue, RedisJobQueue):
+        stale.progress = {"chunks_done": 1}
+        assert not await queue.heartbeat(stale)
+        saved = await queue.get(job.job_id)
+        assert (saved.status, saved.attempts, saved.progress) == (RUNNING, 2, {})
+    assert await queue.heartbeat(current)
+
+
+class BlockingPipeline:
+    """Ingestion that never finishes on its own"""
+
+    vector_store = None
+
+    def __init__(self):
+        self.cancelled = asyncio.Event()
+
+    async def ingest(self, document, document_id: str):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+    def get_progress(self, document_id: str):
+        return None
+
+
+async def test_worker_abandons_a_job_whose_lease_was_lost(queue, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_HEARTBEAT_INTERVAL", 0.05)
+    document = DocumentUpload(
+        file_name="a.md", file_url="https://crm.example.com/a.md", file_size=1, doc_type="manual_md", company_id="a"
+    )
+    job = await queue.enqueue(ingest_job(document, "doc-1"))
+    pipeline = BlockingPipeline()
+    worker = JobWorker(queue, pipeline, reindex_service=object(), concurrency=1)
+    running = await queue.dequeue(timeout=1)
+
+    async def lost(job: Job) -> bool:
+        return False
+
+    monkeypatch.setattr(queue, "heartbeat", lost)
+    await asyncio.wait_for(worker.handle(running), timeout=2)
+
+    assert pipeline.cancelled.is_set()
+    # Neither completed nor failed by the abandoned attempt
+    assert (await queue.get(job.job_id)).status == RUNNING
@@ -0,0 +1,77 @@
+"""
+Lexical index: tenant LRU / memory bound and incremental refresh after changes
+"""
+
+from typing import List
+
+from tests.fakes import FakeEmbeddings, InMemoryVectorStore
+from src.services.lexical_index import LexicalIndex
+
+
+class CountingSource:
+    """iterate_chunks of an in-memory store, recording the chunks read with text"""
+
+    def __init__(self, store: InMemoryVectorStore):
+        self.store = store
+        self.texts_read = 0
+
+    async def __call__(self, filter=None, batch_size: int = 1000, with_text: bool = True):
+        async for batch in self.store.iterate_chunks(filter, batch_size, with_text):
+            self.texts_read += sum(1 for text, _ in batch if text is not None)
+            yield batch
+
+
+async def add_document(store: InMemoryVectorStore, tenant: str, document_id: str, texts: List[str]) -> None:
+    await store.delete_document(tenant, document_id)
+    metadatas = [
+        {"company_id": tenant, "document_id": document_id, "chunk_index": i, "content_hash": str(hash(text))}
+        for i, text in enumerate(texts)
+    ]
+    await store.add_embeddings(texts, await FakeEmbeddings().aembed_documents(texts), metadatas)
+
+
+async def test_refresh_rereads_only_changed_documents():
+    store = InMemoryVectorStore()
+    await add_document(store, "a", "roof", ["屋根葺き替えの標準工期は5日です", "屋根材はガルバリウム鋼板"])
+    await add_document(store, "a", "bath", ["浴室リフォームの保証は2年"])
+    await add_document(store, "a", "wall", ["外壁塗装は3回塗り"])
+    source = CountingSource(store)
+    index = LexicalIndex(source=source)
+    assert [doc.metadata["document_id"] for doc, _ in await index.search("a", "屋根", 5)] == ["roof", "roof"]
+    assert source.texts_read == 4
+
+    await add_document(store, "a", "bath", ["浴室リフォームの保証は5年、屋根は対象外"])
+    await store.delete_document("a", "wall")
+    index.mark_stale("a")
+    hits = await index.search("a", "屋根", 5)
+
+    assert source.texts_read == 5  # only the changed document was read again
+    assert {doc.metadata["document_id"] for doc, _ in hits} == {"roof", "bath"}
+    assert await index.search("a", "外壁塗装", 5) == []
+
+
+async def test_tenants_are_evicted_least_recently_used_first():
+    store = InMemoryVectorStore()
+    for tenant in ("a", "b", "c"):
+        await add_document(store, tenant, "doc", [f"{tenant}社の見積書テンプレート"])
+    index = LexicalIndex(source=store.iterate_chunks, max_tenants=2)
+
+    await index.search("a", "見積", 5)
+    await index.search("b", "見積", 5)
+    await index.search("a", "見積", 5)
+    await index.search("c", "見積", 5)
+
+    assert list(index._tenants) == ["a", "c"]
+
+
+async def test_memory_budget_keeps_the_tenant_being_searched():
+    store = InMemoryVectorStore()
+    for tenant in ("a", "b"):
+        await add_document(store, tenant, "doc", ["見積書テンプレート" * 50])
+    index = LexicalIndex(source=store.iterate_chunks, max_bytes=1)
+
+    await index.search("a", "見積", 5)
+    hits = await index.search("b", "見積", 5)
+
+    assert list(index._tenants) == ["b"]
+    assert len(hits) == 1
@@ -0,0 +1,103 @@
+"""
+Worker lifecycle: /ready turns ready only after startup and warm-up, fails on
+an unreachable or hung dependency, and fails again once draining begins;
+startup phases are timed, and the launcher shares warm caches across workers
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from serve import share_caches
+from src.core.lifecycle import Readiness, process_uptime
+from src.core.metrics import STARTUP_SECONDS
+
+
+class Dependency:
+    """Health check whose result and delay the test controls"""
+
+    def __init__(self):
+        self.healthy = True
+        self.delay = 0.0
+
+    async def __call__(self) -> bool:
+        await asyncio.sleep(self.delay)
+        if self.healthy is None:
+            raise ConnectionError("connection refused")
+        return self.healthy
+
+
+async def test_ready_only_between_warm_up_and_drain():
+    readiness = Readiness(check_timeout=0.05)
+    readiness.add_check("vector_store", Dependency())
+
+    assert (await readiness.check())[0] is False
+    readiness.started = True
+    ready, checks = await readiness.check()
+    assert ready is False
+    assert checks == {"vector_store": True, "started": True, "warm": False, "draining": False}
+
+    readiness.warm = True
+    assert (await readiness.check())[0] is True
+
+    readiness.draining = True
+    ready, checks = await readiness.check()
+    assert ready is False and checks["draining"] is True
+
+
+@pytest.mark.parametrize("healthy, delay", [(False, 0.0), (None, 0.0), (True, 1.0)])
+async def test_failing_raising_or_hung_dependency_is_not_ready(healthy, delay):
+    readiness = Readiness(check_timeout=0.05)
+    readiness.started = readiness.warm = True
+    dependency = Dependency()
+    readiness.add_check("vector_store", dependency)
+    readiness.add_check("redis", Dependency())
+    dependency.healthy, dependency.delay = healthy, delay
+
+    ready, checks = await asyncio.wait_for(readiness.check(), timeout=0.5)
+
+    assert ready is False
+    assert (checks["vector_store"], checks["redis"]) == (False, True)
+
+    dependency.healthy, dependency.delay = True, 0.0
+    assert (await readiness.check())[0] is True
+
+
+def test_startup_phases_are_timed_into_the_payload_and_gauge():
+    readiness = Readiness()
+    readiness.record("boot", 1.23456)
+    with readiness.phase("init"):
+        pass
+
+    assert readiness.phases["boot"] == 1.235
+    assert 0 <= readiness.phases["init"] < 0.1
+    assert STARTUP_SECONDS.labels(phase="boot")._value.get() == 1.23456
+
+
+def test_process_uptime_is_positive_where_proc_is_available():
+    uptime = process_uptime()
+    assert uptime is None or uptime >= 0
+
+
+def test_multi_worker_launch_shares_caches_through_redis(monkeypatch):
+    for name in ("TIKTOKEN_CACHE_DIR", "EMBEDDING_CACHE_REDIS_ENABLED", "MASK_POLICY_CACHE_REDIS_ENABLED"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("MASK_POLICY_CACHE_REDIS_ENABLED", "false")
+
+    share_caches(workers=4)
+
+    assert os.environ["TIKTOKEN_CACHE_DIR"]
+    assert os.environ["EMBEDDING_CACHE_REDIS_ENABLED"] == "true"
+    # Explicit settings win
+    assert os.environ["MASK_POLICY_CACHE_REDIS_ENABLED"] == "false"
+
+
+def test_single_worker_launch_keeps_caches_local(monkeypatch):
+    for name in ("TIKTOKEN_CACHE_DIR", "EMBEDDING_CACHE_REDIS_ENABLED", "MASK_POLICY_CACHE_REDIS_ENABLED"):
+        monkeypatch.delenv(name, raising=False)
+
+    share_caches(workers=1)
+
+    assert "EMBEDDING_CACHE_REDIS_ENABLED" not in os.environ
+    assert "MASK_POLICY_CACHE_REDIS_ENABLED" not in os.environ
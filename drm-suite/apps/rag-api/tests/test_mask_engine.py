@@ -0,0 +1,149 @@
+"""
+Mask engine: compiled rules keep keywords and mask their values, policies are
+fetched once per (company, role) until the TTL expires, concurrent misses share
+one fetch, and invalidations reach other workers through Redis
+"""
+
+import asyncio
+
+import pytest
+
+from src.models.schemas import MaskPolicy, UserContext
+from src.services.mask_engine import MaskEngine, compile_policy, precompile_policies
+
+ALL = MaskPolicy(mask_cost_data=True, mask_profit_data=True, mask_contractor_rates=True)
+
+
+def staff(company_id: str = "tenant-a", role: str = "staff") -> UserContext:
+    return UserContext(user_id="user-1", company_id=company_id, role=role)
+
+
+class CountingPolicyService:
+    """Returns ALL for staff and nothing for managers, counting fetches"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.fetches = 0
+
+    async def get_mask_policy(self, user_context: UserContext) -> MaskPolicy:
+        self.fetches += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("policy service unavailable")
+        return MaskPolicy() if user_context.role == "manager" else ALL
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("原価: 1,200,000円です。", "原価: ***です。"),
+    ("粗利率は25%、利益 120万円。", "粗利率は***、利益 ***。"),
+    ("日当 2万円/人日で手配", "日当 ***で手配"),
+    ("協力会社へ 1万5千円/日", "協力会社へ ***"),
+    ("材料一式 ￥12万", "材料一式 ***"),
+    ("外壁塗装の工期は10日です。", "外壁塗装の工期は10日です。"),
+])
+def test_rules_mask_values_and_keep_their_keywords(text, expected):
+    assert compile_policy(ALL).mask(text) == expected
+
+
+def test_only_rules_enabled_by_the_policy_apply():
+    text = "原価 80万円、粗利率 25%、日当 2万円"
+
+    assert compile_policy(MaskPolicy()).mask(text) == text
+    assert compile_policy(MaskPolicy(mask_profit_data=True)).mask(text) == "原価 80万円、粗利率 ***、日当 2万円"
+    assert compile_policy(MaskPolicy(mask_cost_data=True)).mask(text) == "原価 ***、粗利率 25%、日当 ***"
+
+
+def test_policies_with_the_same_flags_share_one_compiled_matcher():
+    assert precompile_policies() == 8
+    assert compile_policy(MaskPolicy(mask_cost_data=True)) is compile_policy(MaskPolicy(mask_cost_data=True))
+    assert compile_policy(None) is compile_policy(MaskPolicy())
+
+
+async def test_policy_is_fetched_once_per_company_and_role_until_the_ttl(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("src.services.mask_engine.time.monotonic", lambda: clock[0])
+    service = CountingPolicyService()
+    engine = MaskEngine(service, ttl_seconds=60)
+
+    for _ in range(3):
+        assert await engine.get_mask_policy(staff()) == ALL
+    assert await engine.get_mask_policy(staff(role="manager")) == MaskPolicy()
+    assert await engine.get_mask_policy(staff("tenant-b")) == ALL
+    assert service.fetches == 3
+
+    clock[0] += 60
+    await engine.get_mask_policy(staff())
+    assert service.fetches == 4
+
+
+async def test_concurrent_misses_share_one_fetch():
+    service = CountingPolicyService(delay=0.01)
+    engine = MaskEngine(service)
+
+    policies = await asyncio.gather(*(engine.get_mask_policy(staff()) for _ in range(10)))
+
+    assert service.fetches == 1
+    assert all(policy == ALL for policy in policies)
+
+
+async def test_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    service = CountingPolicyService(delay=0.01, fail=True)
+    engine = MaskEngine(service)
+
+    results = await asyncio.gather(*(engine.get_mask_policy(staff()) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert service.fetches == 1
+
+    service.fail = False
+    assert await engine.get_mask_policy(staff()) == ALL
+    assert service.fetches == 2
+
+
+async def test_least_recently_used_policy_is_evicted_at_capacity():
+    service = CountingPolicyService()
+    engine = MaskEngine(service, max_entries=2)
+    for company_id in ("tenant-a", "tenant-b", "tenant-a", "tenant-c"):
+        await engine.get_mask_policy(staff(company_id))
+    assert service.fetches == 3
+
+    await engine.get_mask_policy(staff("tenant-a"))
+    await engine.get_mask_policy(staff("tenant-b"))
+    assert service.fetches == 4
+
+
+async def test_invalidation_is_scoped_to_company_and_role():
+    service = CountingPolicyService()
+    engine = MaskEngine(service)
+    for context in (staff(), staff(role="manager"), staff("tenant-b")):
+        await engine.get_mask_policy(context)
+
+    assert engine.invalidate("tenant-a", "manager") == 1
+    assert engine.invalidate("tenant-a") == 1
+    assert engine.invalidate() == 1
+
+
+async def test_invalidation_reaches_other_workers_through_redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_client = fakeredis.FakeAsyncRedis()
+    service = CountingPolicyService()
+    worker_a = MaskEngine(service, redis_client=redis_client)
+    worker_b = MaskEngine(service, redis_client=redis_client)
+    watch = asyncio.create_task(worker_b.watch_invalidations())
+    await asyncio.sleep(0.05)
+
+    await worker_a.get_mask_policy(staff())
+    await worker_b.get_mask_policy(staff())
+    assert service.fetches == 1  # worker_b read the policy worker_a stored
+
+    await worker_a.invalidate_shared("tenant-a")
+    for _ in range(50):
+        if not worker_b._policies:
+            break
+        await asyncio.sleep(0.01)
+
+    assert not worker_b._policies
+    assert await redis_client.get("rag:mask:tenant-a:staff") is None
+    watch.cancel()
+    await asyncio.gather(watch, return_exceptions=True)
+    await worker_a.close()
@@ -0,0 +1,132 @@
+"""
+Query observability: spans land on the current trace (and only there), slow
+traces are kept in a bounded store, tenant labels stay bounded, and a served
+query exports its stages, outcome and provider calls
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from src.core.metrics import LLM_REQUESTS, QUERY_STAGE_SECONDS, TENANT_QUERIES
+from src.core.observability import (
+    TenantLabels,
+    Trace,
+    TraceStore,
+    activate,
+    current_trace,
+    deactivate,
+    observe_query,
+    span,
+)
+from tests.conftest import user
+
+QUERY = "外壁塗装の標準工期を教えてください"
+
+
+def finished_trace(trace_id: str, duration_ms: float, **attributes) -> Trace:
+    trace = Trace(trace_id, **attributes)
+    trace.end = trace.start + duration_ms / 1000
+    return trace
+
+
+def test_spans_without_a_current_trace_are_dropped():
+    assert current_trace() is None
+    with span("retrieve"):
+        pass
+    assert current_trace() is None
+
+
+async def test_spans_are_recorded_on_the_trace_of_the_task_that_started_them():
+    trace = Trace("query-1", tenant_id="tenant-a")
+    token = activate(trace)
+    try:
+        with span("retrieve", k=5):
+            await asyncio.sleep(0)
+
+        async def call_provider():
+            with span("llm.openai", model="gpt"):
+                await asyncio.sleep(0)
+
+        # Tasks created while the trace is current inherit it
+        await asyncio.gather(asyncio.create_task(call_provider()))
+    finally:
+        deactivate(token)
+
+    assert current_trace() is None
+    spans = trace.as_dict()["spans"]
+    assert [(s["name"], s.get("k"), s.get("model")) for s in spans] == [("retrieve", 5, None), ("llm.openai", None, "gpt")]
+    assert all(s["duration_ms"] >= 0 and s["start_ms"] >= 0 for s in spans)
+
+
+def test_only_slow_traces_are_kept_and_the_store_is_bounded():
+    store = TraceStore(slow_ms=100, max_entries=2)
+
+    assert store.offer(finished_trace("fast", 99)) is False
+    for i in range(3):
+        assert store.offer(finished_trace(f"slow-{i}", 150, tenant_id="tenant-a" if i else "tenant-b"))
+
+    assert store.get("fast") is None and store.get("slow-0") is None
+    assert [trace.trace_id for trace in store.recent()] == ["slow-2", "slow-1"]
+    assert [trace.trace_id for trace in store.recent(tenant_id="tenant-b")] == []
+    assert [trace.trace_id for trace in store.recent(tenant_id="tenant-a", limit=1)] == ["slow-2"]
+
+
+def test_finishing_a_trace_freezes_its_duration():
+    trace = Trace("query-1")
+    trace.finish()
+    duration = trace.duration_ms()
+    time.sleep(0.01)
+    trace.finish()
+    assert trace.duration_ms() == duration
+
+
+def test_tenants_past_the_label_limit_share_the_other_label():
+    labels = TenantLabels(limit=2)
+
+    assert [labels.label(t) for t in ("tenant-a", "tenant-b", "tenant-c", "tenant-a")] == [
+        "tenant-a", "tenant-b", "other", "tenant-a"
+    ]
+    assert labels.label(None) == "other"
+
+
+def test_observing_a_query_exports_stages_tenant_and_slow_trace():
+    counter = TENANT_QUERIES.labels(tenant="tenant-a", outcome="answered")
+    queries = counter._value.get()
+    stage_seconds = QUERY_STAGE_SECONDS.labels(stage="retrieve")._sum.get()
+    store = TraceStore(slow_ms=0)
+    trace = Trace("query-1", tenant_id="tenant-a")
+
+    observe_query({"retrieve": 250.0}, 300.0, "tenant-a", "answered", trace, store)
+
+    assert counter._value.get() == queries + 1
+    assert QUERY_STAGE_SECONDS.labels(stage="retrieve")._sum.get() == pytest.approx(stage_seconds + 0.25)
+    assert store.get("query-1").attributes == {"tenant_id": "tenant-a", "outcome": "answered"}
+
+
+async def test_served_query_is_traced_under_its_query_id(rag):
+    rag.trace_store = TraceStore(slow_ms=0)
+    successes = sum(
+        LLM_REQUESTS.labels(provider=provider, outcome="success")._value.get() for provider in ("openai", "claude")
+    )
+
+    result = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+
+    trace = rag.trace_store.get(result["query_id"]).as_dict()
+    names = [s["name"] for s in trace["spans"]]
+    assert trace["attributes"] == {"tenant_id": "tenant-a", "outcome": "answered"}
+    assert {"embed", "retrieve", "generate", "mask"} <= set(names)
+    assert any(name.startswith("llm.") for name in names)
+    assert set(result["stage_timings_ms"]) <= set(names)
+    assert sum(
+        LLM_REQUESTS.labels(provider=provider, outcome="success")._value.get() for provider in ("openai", "claude")
+    ) == successes + 1
+
+
+async def test_fast_queries_leave_no_trace(rag):
+    rag.trace_store = TraceStore(slow_ms=60_000)
+
+    result = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+
+    assert rag.trace_store.get(result["query_id"]) is None
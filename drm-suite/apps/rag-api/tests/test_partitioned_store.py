@@ -0,0 +1,194 @@
+"""
+Filter push-down: query filters become typed SQL on promoted columns (date
+casts, $in arrays, ranges) and the in-memory matcher agrees with them; the
+partitioned store searches one tenant's partition and creates each partition once
+"""
+
+from datetime import date
+from typing import Any, List, Tuple
+
+import pytest
+from pydantic import ValidationError
+
+from src.models.schemas import DocumentType, QueryFilter
+from src.services.partitioned_store import PUSHDOWN_COLUMNS, PartitionedPGVectorStore
+from src.services.retriever import build_search_filter, matches_filter
+from src.services.vector_store import PGVectorStore
+
+FILTER = QueryFilter(
+    doc_types=[DocumentType.MANUAL_MD, DocumentType.COST_PDF],
+    store_ids=["store-1"],
+    date_range={"start": "2024-04-01", "end": "2024-09-30"},
+)
+
+
+def test_query_filters_become_tenant_scoped_search_filters():
+    assert build_search_filter("tenant-a", FILTER) == {
+        "company_id": "tenant-a",
+        "doc_type": {"$in": ["manual_md", "cost_pdf"]},
+        "store_id": {"$in": ["store-1"]},
+        "document_date": {"$gte": "2024-04-01", "$lte": "2024-09-30"},
+    }
+    open_ended = QueryFilter(date_range={"end": "2024-09-30"})
+    assert build_search_filter("tenant-a", open_ended)["document_date"] == {"$lte": "2024-09-30"}
+
+
+def test_allowed_doc_types_narrow_but_never_widen_the_request():
+    narrowed = build_search_filter("tenant-a", FILTER, allowed_doc_types=[DocumentType.MANUAL_MD, "contract_pdf"])
+    assert narrowed["doc_type"] == {"$in": ["manual_md"]}
+    assert build_search_filter("tenant-a", None, ["contract_pdf"])["doc_type"] == {"$in": ["contract_pdf"]}
+
+
+def test_invalid_query_filters_are_rejected():
+    with pytest.raises(ValidationError):
+        QueryFilter(date_range={"start": "2024-10-01", "end": "2024-09-30"})
+    with pytest.raises(ValidationError):
+        QueryFilter(company_id="tenant-b")
+
+
+@pytest.mark.parametrize("metadata, expected", [
+    ({"doc_type": "manual_md", "store_id": "store-1", "document_date": "2024-04-01"}, True),
+    ({"doc_type": "manual_md", "store_id": "store-1", "document_date": "2024-09-30"}, True),
+    ({"doc_type": "manual_md", "store_id": "store-1", "document_date": "2024-10-01"}, False),
+    ({"doc_type": "estimate_pdf", "store_id": "store-1", "document_date": "2024-05-01"}, False),
+    ({"doc_type": "manual_md", "store_id": "store-1"}, False),
+])
+def test_in_memory_matching_follows_the_sql_semantics(metadata, expected):
+    search_filter = build_search_filter("tenant-a", FILTER)
+    assert matches_filter({"company_id": "tenant-a", **metadata}, search_filter) is expected
+
+
+def test_promoted_keys_are_typed_columns_and_the_rest_json_text():
+    where, params = PGVectorStore._build_where(
+        {
+            "doc_type": {"$in": [DocumentType.MANUAL_MD, "cost_pdf"]},
+            "document_date": {"$gte": "2024-04-01T09:00:00", "$lte": date(2024, 9, 30)},
+            "category": "外壁",
+        },
+        first_param=3,
+        columns=PUSHDOWN_COLUMNS,
+    )
+
+    assert where == (
+        " AND doc_type = ANY($3::text[])"
+        " AND document_date >= $4::date AND document_date <= $5::date"
+        " AND cmetadata->>'category' = $6::text"
+    )
+    assert params == [["manual_md", "cost_pdf"], date(2024, 4, 1), date(2024, 9, 30), "外壁"]
+
+
+def test_without_promoted_columns_every_key_reads_cmetadata():
+    where, params = PGVectorStore._build_where({"document_date": {"$gte": "2024-04-01"}}, first_param=2)
+
+    assert where == " AND cmetadata->>'document_date' >= $2::text"
+    assert params == ["2024-04-01"]
+
+
+@pytest.mark.parametrize("key", ["doc_type'; DROP TABLE x; --", "a-b", "cmetadata->>'x'"])
+def test_filter_keys_that_are_not_identifiers_are_refused(key):
+    with pytest.raises(ValueError):
+        PGVectorStore._build_where({key: "x"}, first_param=1)
+
+
+class RecordingConnection:
+    """asyncpg connection surface that records statements and copied rows"""
+
+    def __init__(self):
+        self.statements: List[Tuple[str, Tuple[Any, ...]]] = []
+        self.copied: List[tuple] = []
+
+    async def execute(self, sql: str, *args) -> str:
+        self.statements.append((sql, args))
+        return "DELETE 0"
+
+    async def fetch(self, sql: str, *args):
+        self.statements.append((sql, args))
+        return []
+
+    async def fetchval(self, sql: str, *args):
+        self.statements.append((sql, args))
+        return f"CREATE TABLE {args[0]}" if "format(" in sql else 1
+
+    async def copy_records_to_table(self, table: str, records, columns) -> None:
+        self.copied.extend(dict(zip(columns, record)) for record in records)
+
+
+class SingleConnectionPool:
+    """asyncpg.Pool surface around one RecordingConnection"""
+
+    def __init__(self):
+        self.conn = RecordingConnection()
+
+    async def acquire(self, timeout: float):
+        return self.conn
+
+    async def release(self, conn) -> None:
+        pass
+
+    def get_size(self) -> int:
+        return 1
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+async def store(monkeypatch):
+    async def create_pool(**kwargs):
+        return SingleConnectionPool()
+
+    monkeypatch.setattr("src.services.vector_store.asyncpg.create_pool", create_pool)
+    vector_store = PartitionedPGVectorStore(
+        embeddings=None, table="rag_chunks", dsn="postgresql://localhost/rag", health_check_interval=3600
+    )
+    await vector_store.start()
+    yield vector_store
+    await vector_store.close()
+
+
+def test_table_names_must_be_identifiers():
+    with pytest.raises(ValueError):
+        PartitionedPGVectorStore(embeddings=None, table="rag_chunks; DROP TABLE users")
+
+
+def test_partition_names_are_stable_and_identifier_safe():
+    store = PartitionedPGVectorStore(embeddings=None, table="rag_chunks")
+    name = store.partition_name("株式会社 ABC'; --")
+
+    assert name == store.partition_name("株式会社 ABC'; --")
+    assert name != store.partition_name("tenant-b")
+    assert name.replace("_", "").isalnum() and name.startswith("rag_chunks_")
+
+
+async def test_search_prunes_to_the_tenant_partition_and_pushes_filters_down(store):
+    search_filter = build_search_filter("tenant-a", FILTER)
+
+    await store.asimilarity_search_by_vector_with_score([0.1, 0.2], k=3, filter=search_filter)
+
+    sql, args = store._pool.conn.statements[-1]
+    assert "FROM rag_chunks" in sql and "WHERE company_id = $2 AND doc_type = ANY($3::text[])" in sql
+    assert "document_date >= $5::date AND document_date <= $6::date" in sql
+    assert "cmetadata" not in sql.split("FROM")[1]
+    assert args == ([0.1, 0.2], "tenant-a", ["manual_md", "cost_pdf"], ["store-1"], date(2024, 4, 1), date(2024, 9, 30))
+
+
+async def test_search_without_a_tenant_is_refused(store):
+    with pytest.raises(ValueError):
+        await store.asimilarity_search_by_vector_with_score([0.1, 0.2], filter={"doc_type": "manual_md"})
+
+
+async def test_rows_are_copied_with_promoted_columns_and_partitions_created_once(store):
+    metadatas = [
+        {"company_id": "tenant-a", "document_id": "doc-1", "doc_type": "manual_md", "document_date": "2024-05-01"},
+        {"company_id": "tenant-a", "document_id": "doc-2", "doc_type": "cost_pdf"},
+    ]
+
+    for _ in range(2):
+        await store.add_embeddings(["外壁", "屋根"], [[0.1, 0.2], [0.3, 0.4]], metadatas)
+
+    conn = store._pool.conn
+    created = [args for sql, args in conn.statements if "PARTITION OF" in sql]
+    assert created == [(store.partition_name("tenant-a"), "rag_chunks", "tenant-a")]
+    assert conn.copied[0]["document_date"] == date(2024, 5, 1)
+    assert conn.copied[1]["document_date"] is None and conn.copied[1]["store_id"] is None
+    assert {row["company_id"] for row in conn.copied} == {"tenant-a"}
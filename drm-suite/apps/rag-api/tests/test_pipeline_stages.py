@@ -0,0 +1,73 @@
+"""
+Query pipeline stages: independent stages run concurrently and every stage is
+timed, including ones that fail
+"""
+
+import asyncio
+
+import pytest
+
+from src.core.timing import StageTimer
+from tests.conftest import user
+
+QUERY = "外壁塗装の標準工期を教えてください"
+
+
+async def test_policy_lookup_and_query_embedding_overlap(rag):
+    events = []
+    get_mask_policy = rag.mask_service.get_mask_policy
+    aembed_query = rag.embeddings.embedder.aembed_query
+
+    async def slow_policy(user_context):
+        events.append("policy started")
+        await asyncio.sleep(0.05)
+        events.append("policy done")
+        return await get_mask_policy(user_context)
+
+    async def slow_embedding(text):
+        events.append("embed started")
+        await asyncio.sleep(0.05)
+        events.append("embed done")
+        return await aembed_query(text)
+
+    rag.mask_service.get_mask_policy = slow_policy
+    rag.embeddings.embedder.aembed_query = slow_embedding
+
+    response = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+
+    assert set(events[:2]) == {"policy started", "embed started"}
+    timings = response["stage_timings_ms"]
+    assert {"policy", "embed", "retrieve", "pack", "generate", "mask", "log"} <= set(timings)
+    assert timings["policy"] >= 50 and timings["embed"] >= 50
+
+
+async def test_precomputed_policy_and_embedding_skip_those_stages(rag):
+    policy = await rag.mask_service.get_mask_policy(user("tenant-a"))
+    embedding = await rag.embeddings.aembed_query_array(QUERY)
+    calls = rag.embeddings.embedder.calls
+
+    response = await rag.retrieve_and_generate(
+        QUERY, "tenant-a", user_context=user("tenant-a"), mask_policy=policy, query_embedding=embedding
+    )
+
+    assert rag.embeddings.embedder.calls == calls
+    assert "policy" not in response["stage_timings_ms"] and "embed" not in response["stage_timings_ms"]
+
+
+async def test_repeated_and_failing_stages_are_recorded():
+    timer = StageTimer()
+
+    for _ in range(2):
+        with timer.stage("mask"):
+            await asyncio.sleep(0.01)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        await timer.measure("generate", fail())
+
+    assert timer.stages["mask"] >= 20
+    assert timer.stages["generate"] >= 10
+    assert set(timer.as_dict()) == {"mask", "generate"}
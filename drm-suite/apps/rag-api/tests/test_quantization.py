@@ -0,0 +1,117 @@
+"""
+Compressed first pass: truncated, int8 and PQ codes approximate cosine scores,
+survive a save / load round trip, and the two-stage IVF search returns the
+exact neighbours and full-precision distances after re-scoring its shortlist
+"""
+
+import numpy as np
+import pytest
+
+from src.services.ann_index import IVFIndex
+from src.services.quantization import FirstPass, PQCodec, truncate
+
+DIMS = 64
+# Variance falling off along the dimensions, as in Matryoshka-trained embeddings
+SPECTRUM = np.exp(-np.arange(DIMS) / 16)
+
+
+def unit_vectors(count: int, seed: int = 0) -> np.ndarray:
+    return truncate(np.random.default_rng(seed).normal(size=(count, DIMS)) * SPECTRUM)
+
+
+def test_truncation_keeps_the_prefix_and_renormalizes():
+    vectors = np.array([[3.0, 4.0, 12.0], [0.0, 0.0, 5.0]], dtype=np.float32)
+
+    reduced = truncate(vectors, dims=2)
+
+    np.testing.assert_allclose(reduced[0], [0.6, 0.8], rtol=1e-6)
+    # A prefix of zeros stays zero instead of dividing by zero
+    np.testing.assert_array_equal(reduced[1], [0.0, 0.0])
+
+
+@pytest.mark.parametrize("kind, dims, max_error", [("float", None, 1e-6), ("int8", None, 0.02), ("float", 32, 0.5)])
+def test_first_pass_scores_approximate_cosine_similarity(kind, dims, max_error):
+    vectors = unit_vectors(500)
+    query = unit_vectors(1, seed=1)[0]
+    first_pass = FirstPass.build(vectors, kind, dims=dims)
+
+    approx = first_pass.scores(np.arange(len(vectors)), query)
+
+    assert np.abs(approx - vectors @ query).max() < max_error
+    assert first_pass.nbytes == len(vectors) * (dims or DIMS) * (1 if kind == "int8" else 4)
+
+
+def test_pq_stores_one_byte_per_subspace_and_keeps_the_ranking():
+    vectors = unit_vectors(2000)
+    query = vectors[7] + 0.05 * unit_vectors(1, seed=1)[0]
+    first_pass = FirstPass.build(vectors, "pq", pq_subspaces=16)
+
+    approx = first_pass.scores(np.arange(len(vectors)), query)
+
+    assert first_pass.codes.shape == (2000, 16) and first_pass.codes.dtype == np.uint8
+    assert 7 in np.argsort(-approx)[:10]
+
+
+def test_unknown_kind_and_uneven_subspaces_are_rejected():
+    with pytest.raises(ValueError):
+        FirstPass.build(unit_vectors(10), "binary")
+    with pytest.raises(ValueError):
+        PQCodec.fit(unit_vectors(10), subspaces=7)
+
+
+@pytest.mark.parametrize("kind", ["float", "int8", "pq"])
+def test_saved_first_pass_loads_with_identical_scores(kind, tmp_path):
+    vectors = unit_vectors(300)
+    query = unit_vectors(1, seed=1)[0]
+    first_pass = FirstPass.build(vectors, kind, dims=32, pq_subspaces=8)
+
+    first_pass.save(str(tmp_path))
+    loaded = FirstPass.load(str(tmp_path))
+
+    assert (loaded.kind, loaded.dims) == (kind, 32)
+    positions = np.arange(0, 300, 3)
+    np.testing.assert_allclose(loaded.scores(positions, query), first_pass.scores(positions, query), rtol=1e-6)
+
+
+def test_index_without_a_first_pass_loads_none(tmp_path):
+    assert FirstPass.load(str(tmp_path)) is None
+
+
+def build_index(first_pass=None, **kwargs) -> IVFIndex:
+    vectors = unit_vectors(2000)
+    metadatas = [
+        {"company_id": "tenant-a", "document_id": f"doc-{i}", "doc_type": "manual_md" if i % 2 else "cost_pdf"}
+        for i in range(len(vectors))
+    ]
+    return IVFIndex.build(vectors, [f"chunk {i}" for i in range(len(vectors))], metadatas,
+                          nlist=8, first_pass=first_pass, **kwargs)
+
+
+@pytest.mark.parametrize("first_pass, options", [("int8", {}), ("pq", {"pq_subspaces": 16}), ("int8", {"first_pass_dims": 32})])
+def test_two_stage_search_rescores_the_shortlist_at_full_precision(first_pass, options):
+    exact = build_index()
+    compressed = build_index(first_pass, **options)
+    queries = unit_vectors(20, seed=2)
+
+    recall = []
+    for query in queries:
+        expected = exact.search(query, k=10, nprobe=8)
+        results = compressed.search(query, k=10, nprobe=8, rescore_factor=10)
+        recall.append(len({p for p, _ in results} & {p for p, _ in expected}) / 10)
+        # Returned distances come from the full-precision vectors, not the codes
+        for position, distance in results:
+            assert distance == pytest.approx(1.0 - float(compressed.vectors[position] @ query), abs=1e-5)
+
+    assert np.mean(recall) >= 0.9
+
+
+def test_filters_checked_row_by_row_skip_the_first_pass():
+    exact = build_index()
+    compressed = build_index("pq", pq_subspaces=16)
+    query = unit_vectors(1, seed=3)[0]
+    search_filter = {"document_id": {"$in": [f"doc-{i}" for i in range(0, 2000, 7)]}}
+
+    expected = exact.search(query, k=5, search_filter=search_filter, nprobe=8)
+    results = compressed.search(query, k=5, search_filter=search_filter, nprobe=8, rescore_factor=1)
+
+    assert results == expected
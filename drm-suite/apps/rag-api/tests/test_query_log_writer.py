@@ -0,0 +1,122 @@
+"""
+Query log writer: batched flushes by size and interval, bounded buffering that
+drops instead of blocking, flush on close, and rows that carry the tenant the
+FAQ index reads history by
+"""
+
+import asyncio
+import json
+import sqlite3
+
+from src.services.query_log_writer import (
+    QUERY_LOG_COLUMNS,
+    InMemoryLogSink,
+    LogSink,
+    QueryLogWriter,
+    SQLiteLogSink,
+)
+from tests.conftest import user
+
+
+def submit(writer: QueryLogWriter, index: int) -> bool:
+    return writer.submit(f"q{index}", "user-1", "tenant-a", "工期は？", "5日です。", ["doc-1"], 0.9, 120)
+
+
+class BlockedSink(LogSink):
+    """Holds every write until released"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.rows = []
+
+    async def write_batch(self, rows) -> None:
+        await self.release.wait()
+        self.rows.extend(rows)
+
+
+async def test_full_batch_is_flushed_without_waiting_for_the_timer():
+    sink = InMemoryLogSink()
+    writer = QueryLogWriter(sink, batch_size=3, flush_interval=3600, max_buffer=100)
+    await writer.start()
+
+    for i in range(2):
+        submit(writer, i)
+    await asyncio.sleep(0.01)
+    assert sink.rows == []
+
+    for i in range(2, 7):
+        submit(writer, i)
+    await asyncio.sleep(0.01)
+
+    assert [row[0] for row in sink.rows] == [f"q{i}" for i in range(7)]
+    assert sink.batches == 3  # written batch_size rows at a time
+    await writer.close()
+
+
+async def test_partial_batch_is_flushed_by_the_interval():
+    sink = InMemoryLogSink()
+    writer = QueryLogWriter(sink, batch_size=100, flush_interval=0.02, max_buffer=100)
+    await writer.start()
+
+    submit(writer, 0)
+    await asyncio.sleep(0.1)
+
+    assert len(sink.rows) == 1
+    await writer.close()
+
+
+async def test_slow_sink_makes_submit_drop_rows_instead_of_blocking():
+    sink = BlockedSink()
+    writer = QueryLogWriter(sink, batch_size=2, flush_interval=3600, max_buffer=4)
+    await writer.start()
+
+    accepted = [submit(writer, i) for i in range(2)]
+    await asyncio.sleep(0.01)  # the first batch is now stuck in the sink
+    accepted += [submit(writer, i) for i in range(2, 8)]
+
+    assert accepted == [True] * 6 + [False] * 2
+    assert writer.dropped == 2
+    sink.release.set()
+    await writer.close()
+    assert len(sink.rows) == 6
+
+
+async def test_failed_write_drops_the_batch_and_keeps_going():
+    class FlakySink(InMemoryLogSink):
+        async def write_batch(self, rows) -> None:
+            if self.batches == 0:
+                self.batches += 1
+                raise ConnectionError("database restarting")
+            await super().write_batch(rows)
+
+    sink = FlakySink()
+    writer = QueryLogWriter(sink, batch_size=2, flush_interval=3600, max_buffer=100)
+    for i in range(4):
+        submit(writer, i)
+    await writer.flush()
+
+    assert writer.dropped == 2
+    assert [row[0] for row in sink.rows] == ["q2", "q3"]
+
+
+async def test_sqlite_sink_writes_every_column(tmp_path):
+    path = str(tmp_path / "logs.db")
+    writer = QueryLogWriter(SQLiteLogSink(path), batch_size=10, flush_interval=3600, max_buffer=100)
+    submit(writer, 0)
+    await writer.close()
+
+    with sqlite3.connect(path) as conn:
+        conn.row_factory = sqlite3.Row
+        [row] = conn.execute("SELECT * FROM rag_query_logs").fetchall()
+    assert tuple(row.keys()) == QUERY_LOG_COLUMNS
+    assert (row["company_id"], json.loads(row["retrieved_docs"]), row["response_time"]) == ("tenant-a", ["doc-1"], 120)
+
+
+async def test_logged_queries_record_the_tenant(rag):
+    for tenant_id in ("tenant-a", "tenant-b"):
+        await rag.retrieve_and_generate("外壁塗装の標準工期を教えてください", tenant_id, user_context=user(tenant_id))
+    await rag.drain_background_tasks()
+    await rag.log_writer.flush()
+
+    company = QUERY_LOG_COLUMNS.index("company_id")
+    assert [row[company] for row in rag.log_writer.sink.rows] == ["tenant-a", "tenant-b"]
@@ -0,0 +1,158 @@
+"""
+Incremental reindexing: unchanged chunks are kept by content hash, changed ones
+re-embedded and orphans deleted, and a retried task resumes from its checkpoint
+"""
+
+import pytest
+
+from src.core.config import settings
+from src.models.schemas import DocumentType, DocumentUpload, ProcessingStatus
+from src.services.ingestion import IngestionPipeline
+from src.services.reindex import ReindexCheckpointStore, ReindexService, ReindexTask
+from tests.fakes import FakeEmbeddings, InMemoryVectorStore
+
+SECTIONS = {
+    "外壁": "外壁塗装の標準工期は足場設置を含めて10日です。",
+    "屋根": "屋根葺き替えは既存屋根材の撤去から7日です。",
+    "浴室": "浴室リフォームはユニットバス交換で4日です。",
+    "給湯器": "給湯器交換は当日中に完了します。",
+}
+
+
+def markdown(sections) -> str:
+    return "".join(f"# {title}\n{body}\n\n" for title, body in sections.items())
+
+
+@pytest.fixture
+def manual(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "INGEST_LOCAL_FILE_ROOT", str(tmp_path))
+    path = tmp_path / "manual.md"
+    path.write_text(markdown(SECTIONS), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def pipeline():
+    return IngestionPipeline(FakeEmbeddings(dim=32), InMemoryVectorStore(), parse_workers=1)
+
+
+def upload(path) -> DocumentUpload:
+    return DocumentUpload(
+        file_name=path.name, file_url=path.as_uri(), file_size=path.stat().st_size,
+        doc_type=DocumentType.MANUAL_MD, company_id="tenant-a"
+    )
+
+
+def stored_texts(store: InMemoryVectorStore):
+    return sorted(text for text, _, _ in store._rows.values())
+
+
+async def test_unchanged_document_is_not_re_embedded(manual, pipeline):
+    await pipeline.ingest(upload(manual), "doc-1")
+    calls = pipeline.embeddings.calls
+    chunk_ids = set(pipeline.vector_store._rows)
+
+    counts = await pipeline.reindex_document(upload(manual), "doc-1")
+
+    assert counts == {"skipped": 4, "embedded": 0, "deleted": 0}
+    assert pipeline.embeddings.calls == calls
+    assert set(pipeline.vector_store._rows) == chunk_ids
+
+
+async def test_changed_chunk_is_re_embedded_and_its_old_version_deleted(manual, pipeline):
+    await pipeline.ingest(upload(manual), "doc-1")
+    manual.write_text(markdown({**SECTIONS, "屋根": "屋根葺き替えは既存屋根材の撤去から8日です。"}), encoding="utf-8")
+
+    counts = await pipeline.reindex_document(upload(manual), "doc-1")
+
+    assert counts == {"skipped": 3, "embedded": 1, "deleted": 1}
+    texts = stored_texts(pipeline.vector_store)
+    assert len(texts) == 4
+    assert any("8日" in text for text in texts) and not any("7日" in text for text in texts)
+
+
+async def test_kept_chunks_that_moved_get_their_metadata_refreshed(manual, pipeline):
+    await pipeline.ingest(upload(manual), "doc-1")
+    manual.write_text(markdown({"概要": "施工マニュアルの概要です。", **SECTIONS}), encoding="utf-8")
+
+    counts = await pipeline.reindex_document(upload(manual), "doc-1")
+
+    assert counts == {"skipped": 4, "embedded": 1, "deleted": 0}
+    metadata = await pipeline.vector_store.chunk_metadata("tenant-a", "doc-1")
+    indexes = {text.split("\n")[0]: metadata[chunk_id]["chunk_index"]
+               for chunk_id, (text, _, _) in pipeline.vector_store._rows.items()}
+    assert indexes == {"# 概要": 0, "# 外壁": 1, "# 屋根": 2, "# 浴室": 3, "# 給湯器": 4}
+
+
+class RecordingPipeline:
+    """reindex_document that records its calls and fails for chosen documents"""
+
+    on_complete = None
+
+    def __init__(self, documents, failing=()):
+        self.vector_store = self
+        self.documents = documents
+        self.failing = set(failing)
+        self.reindexed = []
+
+    async def list_documents(self, company_id: str):
+        return self.documents
+
+    async def reindex_document(self, document, document_id: str):
+        self.reindexed.append(document_id)
+        if document_id in self.failing:
+            raise RuntimeError("embedding provider unavailable")
+        return {"skipped": 2, "embedded": 1, "deleted": 0}
+
+
+def stored_document(document_id: str, file_url: str = "https://crm.example.com/manual.md"):
+    return {"document_id": document_id, "file_url": file_url, "doc_type": "manual_md", "company_id": "tenant-a"}
+
+
+async def test_completed_documents_are_checkpointed_and_skipped_on_resume(tmp_path):
+    checkpoints = ReindexCheckpointStore(str(tmp_path))
+    earlier = ReindexTask(task_id="task-1", company_id="tenant-a", completed_documents=["doc-1"])
+    checkpoints.save(earlier)
+    pipeline = RecordingPipeline([stored_document(f"doc-{i}") for i in range(1, 4)])
+
+    task = await ReindexService(pipeline, checkpoints).run_task("task-1", "tenant-a")
+
+    assert sorted(pipeline.reindexed) == ["doc-2", "doc-3"]
+    assert task.status == ProcessingStatus.COMPLETED
+    saved = checkpoints.load("task-1")
+    assert sorted(saved.completed_documents) == ["doc-1", "doc-2", "doc-3"]
+    assert (saved.chunks_skipped, saved.chunks_embedded) == (4, 2)
+
+
+async def test_failed_documents_are_not_checkpointed_so_a_retry_picks_them_up(tmp_path):
+    checkpoints = ReindexCheckpointStore(str(tmp_path))
+    documents = [stored_document("doc-1"), stored_document("doc-2"), stored_document("doc-3", file_url="")]
+    pipeline = RecordingPipeline(documents, failing={"doc-2"})
+
+    first = await ReindexService(pipeline, checkpoints).run_task("task-1", "tenant-a")
+    assert first.documents_failed == 2
+    assert first.error == "2 documents could not be reindexed"
+    assert checkpoints.load("task-1").completed_documents == ["doc-1"]
+
+    pipeline.failing.clear()
+    pipeline.reindexed.clear()
+    retried = await ReindexService(pipeline, checkpoints).run_task("task-1", "tenant-a")
+
+    # doc-3 has no file_url to re-chunk from and is never sent to the pipeline
+    assert pipeline.reindexed == ["doc-2"]
+    assert retried.documents_failed == 1
+    assert sorted(retried.completed_documents) == ["doc-1", "doc-2"]
+
+
+def test_only_the_newest_finished_checkpoints_are_kept(tmp_path):
+    checkpoints = ReindexCheckpointStore(str(tmp_path))
+    for i in range(3):
+        checkpoints.save(ReindexTask(
+            task_id=f"done-{i}", company_id="tenant-a", status=ProcessingStatus.COMPLETED,
+            created_at=f"2026-01-0{i + 1}T00:00:00"
+        ))
+    checkpoints.save(ReindexTask(task_id="running", company_id="tenant-a", created_at="2025-12-31T00:00:00"))
+
+    checkpoints.prune(keep=1)
+
+    assert [task.task_id for task in checkpoints.list_tasks()] == ["running", "done-2"]
@@ -0,0 +1,70 @@
+"""
+max_results and include_sources: honored by retrieval, capped, part of the
+answer cache scope, and over-fetched for re-ranking when enabled
+"""
+
+from langchain.schema import Document
+
+from src.core.config import settings
+from src.services.reranker import rerank_documents
+from tests.conftest import user
+
+QUERY = "外壁塗装の標準工期を教えてください"
+
+
+async def test_max_results_limits_retrieval_and_is_capped(rag, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_DEFAULT_RESULTS", 2)
+    monkeypatch.setattr(settings, "RAG_MAX_RESULTS_CAP", 3)
+    rag.answer_cache = None
+
+    async def docs(max_results):
+        response = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"), max_results=max_results)
+        return len(response["retrieved_docs"])
+
+    assert [await docs(1), await docs(None), await docs(100)] == [1, 2, 3]
+
+
+async def test_sources_are_left_out_on_request(rag):
+    without = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"), include_sources=False)
+    with_sources = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"))
+
+    assert without["sources"] == [] and without["retrieved_docs"]
+    assert with_sources["cached"] is False  # a cached answer without sources is not reused
+    assert [source["metadata"]["document_id"] for source in with_sources["sources"]] == with_sources["retrieved_docs"]
+
+
+async def test_cached_answers_are_kept_per_result_count(rag):
+    first = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"), max_results=2)
+    other_k = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"), max_results=3)
+    same_k = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"), max_results=2)
+
+    assert (first["cached"], other_k["cached"], same_k["cached"]) == (False, False, True)
+    assert len(other_k["retrieved_docs"]) == 3
+
+
+async def test_reranking_over_fetches_then_keeps_k(rag, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_RERANK_ENABLED", True)
+    monkeypatch.setattr(settings, "RAG_OVERFETCH_FACTOR", 2)
+    requested = []
+    search = rag.vector_store.asimilarity_search_by_vector_with_score
+
+    async def recording(embedding, k=5, filter=None):
+        requested.append(k)
+        return await search(embedding, k=k, filter=filter)
+
+    monkeypatch.setattr(rag.vector_store, "asimilarity_search_by_vector_with_score", recording)
+
+    response = await rag.retrieve_and_generate(QUERY, "tenant-a", user_context=user("tenant-a"), max_results=2)
+
+    assert requested == [4]
+    assert len(response["retrieved_docs"]) == 2
+
+
+def test_rerank_prefers_documents_covering_the_query():
+    close_but_off_topic = Document(page_content="キッチン交換の費用", metadata={"score": 0.20})
+    on_topic = Document(page_content="外壁塗装の標準工期は5日", metadata={"score": 0.25})
+
+    ranked = rerank_documents("外壁塗装の標準工期", [close_but_off_topic, on_topic], k=1)
+
+    assert ranked == [on_topic]
+    assert rerank_documents("", [close_but_off_topic, on_topic], k=1) == [close_but_off_topic]
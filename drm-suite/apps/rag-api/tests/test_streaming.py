@@ -0,0 +1,66 @@
+"""
+Streamed answers must be masked exactly like the blocking response
+"""
+
+import random
+
+import pytest
+
+from src.models.schemas import MaskPolicy
+from src.services.mask_engine import MaskEngine, compile_policy
+from src.services.streaming import StreamingMasker
+
+POLICY = MaskPolicy(mask_cost_data=True, mask_profit_data=True, mask_contractor_rates=True)
+
+PIECES = [
+    "原価:\n1,200,000円", "粗利率 25%", "利益は\n120万円", "日当 2万円/人日", "¥\n 3,400", "仕入れ値：８００円",
+    "協力会社単価 1万5千円/日", "見積は", "です。", "、", "\n", "外壁塗装の工期", "1", "2", ",", "000", "円", "%",
+]
+
+
+class StaticPolicyService:
+    async def get_mask_policy(self, user_context) -> MaskPolicy:
+        return POLICY
+
+
+async def stream(engine: MaskEngine, text: str, chunk_sizes, **kwargs) -> str:
+    masker = StreamingMasker(engine, POLICY, **kwargs)
+    output, position = "", 0
+    for size in chunk_sizes:
+        output += await masker.feed(text[position:position + size])
+        position += size
+    output += await masker.feed(text[position:])
+    return output + await masker.flush()
+
+
+@pytest.mark.parametrize("text", [
+    "原価:\n1,200,000円です。",
+    "粗利率は\n25%、利益 120万円。",
+    "協力会社単価 1万5千円/日でお願いします",
+])
+async def test_value_after_newline_is_masked_when_split_at_every_character(text):
+    engine = MaskEngine(StaticPolicyService())
+    expected = engine.mask(text, POLICY)
+
+    assert await stream(engine, text, [1] * len(text)) == expected
+    assert "1,200,000" not in expected and "120万" not in expected
+
+
+@pytest.mark.parametrize("seed", range(200))
+async def test_streamed_matches_blocking(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice(PIECES) for _ in range(rng.randint(5, 80)))
+    chunks = [rng.randint(1, 6) for _ in range(len(text))]
+    engine = MaskEngine(StaticPolicyService())
+
+    # A small buffer forces cuts without a sentence boundary
+    streamed = await stream(engine, text, chunks, holdback=16, max_buffer=32)
+
+    assert streamed == engine.mask(text, POLICY)
+
+
+def test_open_match_extends_past_the_end():
+    compiled = compile_policy(MaskPolicy(mask_cost_data=True))
+    text = "見積。原価:\n"
+
+    assert compiled.spans(text) == [(3, len(text) + 1)]
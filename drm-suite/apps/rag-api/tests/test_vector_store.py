@@ -0,0 +1,117 @@
+"""
+Pooled vector store: one pool and one collection lookup for the app's lifetime,
+bounded connection acquisition, and a pool that drains on shutdown
+"""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from src.core.metrics import VECTOR_POOL_ACQUIRE_TIMEOUTS, VECTOR_POOL_HEALTHY, VECTOR_POOL_IN_USE
+from src.services.vector_store import PGVectorStore, _asyncpg_dsn
+
+COLLECTION_ID = "6b1f0c4e-0000-4000-8000-000000000001"
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries: List[str] = []
+
+    async def fetchval(self, sql: str, *args):
+        self.queries.append(sql)
+        return COLLECTION_ID if "langchain_pg_collection" in sql else 1
+
+    async def fetch(self, sql: str, *args):
+        self.queries.append(sql)
+        return [{"document": "外壁塗装の工期は5日です。", "cmetadata": '{"company_id": "a"}', "distance": 0.1}]
+
+
+class FakePool:
+    """asyncpg.Pool surface with `size` connections"""
+
+    def __init__(self, size: int = 1, close_delay: float = 0.0):
+        self.connections = [FakeConnection() for _ in range(size)]
+        self.idle = asyncio.Queue()
+        for conn in self.connections:
+            self.idle.put_nowait(conn)
+        self.close_delay = close_delay
+        self.terminated = False
+
+    async def acquire(self, timeout: float):
+        return await asyncio.wait_for(self.idle.get(), timeout)
+
+    async def release(self, conn) -> None:
+        self.idle.put_nowait(conn)
+
+    def get_size(self) -> int:
+        return len(self.connections)
+
+    async def close(self) -> None:
+        await asyncio.sleep(self.close_delay)
+
+    def terminate(self) -> None:
+        self.terminated = True
+
+
+@pytest.fixture
+def store(monkeypatch):
+    async def create_pool(**kwargs):
+        return FakePool(size=kwargs["max_size"])
+
+    monkeypatch.setattr("src.services.vector_store.asyncpg.create_pool", create_pool)
+    vector_store = PGVectorStore(
+        embeddings=None, dsn="postgresql://localhost/rag", min_size=1, max_size=1,
+        acquire_timeout=0.05, health_check_interval=3600
+    )
+    return vector_store
+
+
+def test_sqlalchemy_driver_suffix_is_stripped_for_asyncpg():
+    assert _asyncpg_dsn("postgresql+psycopg2://u:p@db:5432/rag") == "postgresql://u:p@db:5432/rag"
+    assert _asyncpg_dsn("postgresql://u:p@db/rag") == "postgresql://u:p@db/rag"
+
+
+async def test_collection_is_resolved_once_for_every_query(store):
+    await store.start()
+    for _ in range(3):
+        [(document, distance)] = await store.asimilarity_search_by_vector_with_score([0.1, 0.2], k=5)
+
+    queries = store._pool.connections[0].queries
+    assert sum("langchain_pg_collection" in sql for sql in queries) == 1
+    assert sum("langchain_pg_embedding" in sql for sql in queries) == 3
+    assert (document.metadata, distance) == ({"company_id": "a"}, 0.1)
+    assert VECTOR_POOL_HEALTHY._value.get() == 1
+    await store.close()
+
+
+async def test_exhausted_pool_times_out_instead_of_opening_connections(store):
+    await store.start()
+    timeouts = VECTOR_POOL_ACQUIRE_TIMEOUTS._value.get()
+
+    async with store.connection():
+        assert VECTOR_POOL_IN_USE._value.get() == 1
+        with pytest.raises(asyncio.TimeoutError):
+            async with store.connection():
+                pass
+
+    assert VECTOR_POOL_ACQUIRE_TIMEOUTS._value.get() == timeouts + 1
+    assert VECTOR_POOL_IN_USE._value.get() == 0
+    assert store._waiting == 0
+    async with store.connection():
+        pass  # the connection went back to the pool
+    await store.close()
+
+
+async def test_pool_that_does_not_drain_is_terminated(store):
+    await store.start()
+    pool = store._pool
+    pool.close_delay = 1.0
+
+    await store.close(timeout=0.01)
+
+    assert pool.terminated
+    assert VECTOR_POOL_HEALTHY._value.get() == 0
+    with pytest.raises(RuntimeError):
+        async with store.connection():
+            pass
@@ -0,0 +1,71 @@
+"""
+DRM Suite RAG job worker
+Runs document ingestion, reindex and ANN index build jobs queued by the API (JOB_QUEUE_BACKEND=redis)
+and, with CHANGE_EVENTS_ENABLED, applies CRM document change events from Kafka
+
+    python worker.py
+"""
+
+import asyncio
+import logging
+import signal
+
+from langchain_openai import OpenAIEmbeddings
+
+from src.core.config import settings
+from src.services.vector_store import create_vector_store
+from src.services.change_events import DocumentChangeConsumer, create_event_source
+from src.services.ingestion import IngestionPipeline
+from src.services.job_queue import create_job_queue
+from src.services.job_worker import JobWorker
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    if settings.JOB_QUEUE_BACKEND != "redis":
+        logger.warning("JOB_QUEUE_BACKEND is not 'redis'; this worker will not see jobs queued by the API")
+
+    embeddings = OpenAIEmbeddings(model=settings.EMBEDDING_MODEL)
+    vector_store = create_vector_store(embeddings)
+    await vector_store.start()
+    pipeline = IngestionPipeline(embeddings=embeddings, vector_store=vector_store)
+    pipeline.start()
+    queue = create_job_queue()
+    worker = JobWorker(queue, pipeline)
+
+    # API processes drop per-tenant caches when a change event touches that tenant,
+    # and its ANN index is rebuilt when that backend is in use
+    async def tenant_changed(company_id: str) -> None:
+        await queue.notify_tenant_changed(company_id)
+        await worker.schedule_index_build(company_id)
+
+    consumer = None
+    consumer_task = None
+    if settings.CHANGE_EVENTS_ENABLED:
+        consumer = DocumentChangeConsumer(create_event_source(), pipeline, on_tenant_changed=tenant_changed)
+        consumer_task = asyncio.create_task(consumer.run())
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(worker.stop()))
+
+    try:
+        await worker.run()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if consumer is not None:
+            # Finish the batch in progress so its offsets are committed
+            consumer.stop()
+            await asyncio.gather(consumer_task, return_exceptions=True)
+            await consumer.source.close()
+        await pipeline.close()
+        await queue.close()
+        await vector_store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())